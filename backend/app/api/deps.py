@@ -0,0 +1,160 @@
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.security import decode_access_token
+from app.core.timeutil import naive_utc
+from app.models.user import User, UserRole
+from app.services.log_query import LOG_FIELDS, LogFilters
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+
+# Decoded token payloads and user snapshots. Code that changes a user's
+# role or status drops its entry (invalidate_user); other processes see
+# the change once AUTH_USER_CACHE_TTL expires.
+_token_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_TOKEN_CACHE_TTL, name="auth_tokens")
+_user_cache = TTLCache(settings.AUTH_CACHE_SIZE, settings.AUTH_USER_CACHE_TTL, name="auth_users")
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Authenticated user snapshot, safe to share across requests"""
+    id: int
+    username: str
+    role: UserRole
+    is_active: bool
+
+
+def invalidate_user(username: str) -> None:
+    """Forget the cached snapshot after a user's role or status changes"""
+    _user_cache.pop(username)
+
+
+def log_filters(
+    start_time: Optional[datetime] = Query(None, description="Inclusive lower bound (UTC)"),
+    end_time: Optional[datetime] = Query(None, description="Exclusive upper bound (UTC)"),
+    source_ip: Optional[str] = Query(None, description="Address or CIDR, e.g. 10.20.0.0/16"),
+    destination_ip: Optional[str] = Query(None, description="Address or CIDR"),
+    source_port: Optional[int] = Query(None, ge=0, le=65535),
+    destination_port: Optional[int] = Query(None, ge=0, le=65535),
+    protocol: Optional[List[str]] = Query(None),
+    action: Optional[List[str]] = Query(None),
+    severity: Optional[List[str]] = Query(None),
+    threat_type: Optional[List[str]] = Query(None),
+    log_source: Optional[List[str]] = Query(None),
+    q: Optional[str] = Query(
+        None, max_length=500,
+        description='Full-text search in raw_log/description: all terms, "quoted phrases", prefix*',
+    ),
+) -> LogFilters:
+    """Structured log filters from query parameters; list filters may repeat"""
+    # Stored timestamps are naive UTC, so "...Z"/"+09:00" bounds are converted here
+    return LogFilters(
+        start_time=naive_utc(start_time),
+        end_time=naive_utc(end_time),
+        source_ip=source_ip,
+        destination_ip=destination_ip,
+        source_port=source_port,
+        destination_port=destination_port,
+        protocol=protocol,
+        action=action,
+        severity=severity,
+        threat_type=threat_type,
+        log_source=log_source,
+        q=q,
+    )
+
+
+def log_fields(
+    fields: Optional[str] = Query(
+        None, description="Comma-separated columns to return, e.g. timestamp,source_ip,action"
+    ),
+) -> Optional[List[str]]:
+    """Validated column projection; None returns every column"""
+    if not fields:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in LOG_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(LOG_FIELDS)}",
+        )
+    return names or None
+
+
+def _credentials_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _token_payload(token: str) -> Optional[Dict[str, Any]]:
+    payload = _token_cache.get(token)
+    if payload is None:
+        payload = decode_access_token(token)
+        if payload is None:
+            return None
+        # Never serve a payload past its own expiry
+        _token_cache.set(token, payload, ttl=payload.get("exp", 0) - time.time())
+    elif payload.get("exp", 0) <= time.time():
+        _token_cache.pop(token)
+        return None
+    return payload
+
+
+async def _load_user(username: str) -> Optional[CurrentUser]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(User.id, User.username, User.role, User.is_active).where(User.username == username)
+        )
+        row = result.one_or_none()
+    if row is None:
+        return None
+    return CurrentUser(id=row.id, username=row.username, role=row.role, is_active=row.is_active)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    """User for the bearer token; cache hits need no database query"""
+    return await user_for_token(token)
+
+
+async def user_for_token(token: Optional[str]) -> CurrentUser:
+    """User for a bearer token (also for WebSockets); cache hits need no database query"""
+    payload = _token_payload(token) if token else None
+    username = payload.get("sub") if payload else None
+    if not username:
+        raise _credentials_error()
+
+    user = _user_cache.get(username)
+    if user is None:
+        user = await _load_user(username)
+        if user is None:
+            raise _credentials_error()
+        _user_cache.set(username, user)
+
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    return user
+
+
+def require_roles(*roles: UserRole) -> Callable:
+    """Dependency allowing only users with one of roles"""
+    allowed = frozenset(roles)
+
+    async def check(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+        if user.role not in allowed:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+        return user
+
+    return check
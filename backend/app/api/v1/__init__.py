@@ -1,10 +1,19 @@
-from fastapi import APIRouter
-from app.api.v1.endpoints import auth, logs, users, alert_rules
+from fastapi import APIRouter, Depends
+from app.api.deps import get_current_user
+from app.api.v1.endpoints import auth, logs, users, alert_rules, ingest, sketches, analytics, stream
 
 api_router = APIRouter()
 
+# Everything but login needs a bearer token; writes check roles per route,
+# and the stream router authenticates its WebSocket itself
+authenticated = [Depends(get_current_user)]
+
 # Include all endpoint routers
 api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
-api_router.include_router(logs.router, prefix="/logs", tags=["Firewall Logs"])
+api_router.include_router(sketches.router, prefix="/logs/sketches", tags=["Firewall Logs"], dependencies=authenticated)
+api_router.include_router(analytics.router, prefix="/logs/analytics", tags=["Firewall Logs"], dependencies=authenticated)
+api_router.include_router(stream.router, prefix="/logs/stream", tags=["Firewall Logs"])
+api_router.include_router(logs.router, prefix="/logs", tags=["Firewall Logs"], dependencies=authenticated)
 api_router.include_router(users.router, prefix="/users", tags=["Users"])
-api_router.include_router(alert_rules.router, prefix="/alert-rules", tags=["Alert Rules"])
+api_router.include_router(alert_rules.router, prefix="/alert-rules", tags=["Alert Rules"], dependencies=authenticated)
+api_router.include_router(ingest.router, prefix="/ingest", tags=["Ingestion"], dependencies=authenticated)
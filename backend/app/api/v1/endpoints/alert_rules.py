@@ -1,40 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from typing import List
+from sqlalchemy import func, select
+from typing import List, Optional
 
-from app.core.database import get_db
+from app.api.deps import require_roles
+from app.core.database import get_db, get_read_db
+from app.models.alert_delivery import AlertDelivery
 from app.models.alert_rule import AlertRule
-from app.schemas.alert_rule import AlertRuleCreate, AlertRuleResponse, AlertRuleUpdate
+from app.models.user import UserRole
+from app.schemas.alert_rule import AlertDeliveryResponse, AlertRuleCreate, AlertRuleResponse, AlertRuleUpdate
+from app.services.alert_delivery import alert_dispatcher, webhook_target_error
+from app.services.alert_engine import alert_engine
+from app.services.conditions import ConditionError, compile_conditions
+from app.services.response_cache import ALERT_RULES, response_cache
 
 router = APIRouter()
 
+_rule_list = TypeAdapter(List[AlertRuleResponse])
+# Rules decide where notifications are sent, and deliveries show those
+# targets and the alerted events, so only operators may write or list them
+require_rule_editor = require_roles(UserRole.ADMIN, UserRole.OPERATOR)
+
+
+def _validate_conditions(conditions):
+    """Reject conditions the alert engine cannot compile"""
+    try:
+        compile_conditions(conditions)
+    except ConditionError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid conditions: {e}")
+
+
+def _validate_target(alert_type: str, alert_target: str):
+    """Reject webhook URLs the dispatcher must not call"""
+    if (alert_type or "").lower() != "webhook":
+        return
+    reason = webhook_target_error(alert_target)
+    if reason is not None:
+        raise HTTPException(status_code=400, detail=f"Invalid webhook target: {reason}")
+
 
 @router.get("/", response_model=List[AlertRuleResponse])
 async def get_alert_rules(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     enabled_only: bool = Query(False),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all alert rules with pagination
-    Full implementation in Feature 2.4
+    Served from the response cache until a rule is edited or fires
     """
-    query = select(AlertRule)
+    async def compute():
+        query = select(AlertRule)
+
+        if enabled_only:
+            query = query.where(AlertRule.is_enabled == True)
+
+        result = await db.execute(
+            query.order_by(AlertRule.priority.desc()).offset(skip).limit(limit)
+        )
+        rules = result.scalars().all()
+        return _rule_list.dump_json(_rule_list.validate_python(rules, from_attributes=True)), {}, (None, None)
 
-    if enabled_only:
-        query = query.where(AlertRule.is_enabled == True)
+    params = {"skip": skip, "limit": limit, "enabled_only": enabled_only}
+    return await response_cache.respond(request, "alert_rules", params, compute, scope=ALERT_RULES)
 
+
+@router.get("/deliveries", response_model=List[AlertDeliveryResponse], dependencies=[Depends(require_rule_editor)])
+async def get_alert_deliveries(
+    status: Optional[str] = Query(None, pattern="^(pending|sending|sent|failed)$"),
+    rule_id: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Most recent alert notifications, newest first"""
+    query = select(AlertDelivery)
+    if status:
+        query = query.where(AlertDelivery.status == status)
+    if rule_id is not None:
+        query = query.where(AlertDelivery.rule_id == rule_id)
+
+    result = await db.execute(query.order_by(AlertDelivery.id.desc()).limit(limit))
+    return result.scalars().all()
+
+
+@router.get("/deliveries/stats", dependencies=[Depends(require_rule_editor)])
+async def get_alert_delivery_stats(db: AsyncSession = Depends(get_read_db)):
+    """Queued notifications per status plus this worker's dispatcher counters"""
     result = await db.execute(
-        query.order_by(AlertRule.priority.desc()).offset(skip).limit(limit)
+        select(AlertDelivery.status, func.count()).group_by(AlertDelivery.status)
     )
-    rules = result.scalars().all()
-    return rules
+    return {"queue": dict(result.all()), "dispatcher": alert_dispatcher.stats()}
 
 
 @router.get("/{rule_id}", response_model=AlertRuleResponse)
-async def get_alert_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
+async def get_alert_rule(rule_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a single alert rule by ID"""
     result = await db.execute(select(AlertRule).where(AlertRule.id == rule_id))
     rule = result.scalar_one_or_none()
@@ -45,7 +107,7 @@ async def get_alert_rule(rule_id: int, db: AsyncSession = Depends(get_db)):
     return rule
 
 
-@router.post("/", response_model=AlertRuleResponse, status_code=201)
+@router.post("/", response_model=AlertRuleResponse, status_code=201, dependencies=[Depends(require_rule_editor)])
 async def create_alert_rule(
     rule_data: AlertRuleCreate,
     db: AsyncSession = Depends(get_db)
@@ -59,14 +121,19 @@ async def create_alert_rule(
     if result.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Alert rule name already exists")
 
+    _validate_conditions(rule_data.conditions)
+    _validate_target(rule_data.alert_type, rule_data.alert_target)
+
     rule = AlertRule(**rule_data.model_dump())
     db.add(rule)
     await db.commit()
     await db.refresh(rule)
+    alert_engine.upsert_rule(rule)
+    await response_cache.invalidate_scope(ALERT_RULES)
     return rule
 
 
-@router.patch("/{rule_id}", response_model=AlertRuleResponse)
+@router.patch("/{rule_id}", response_model=AlertRuleResponse, dependencies=[Depends(require_rule_editor)])
 async def update_alert_rule(
     rule_id: int,
     rule_data: AlertRuleUpdate,
@@ -84,9 +151,17 @@ async def update_alert_rule(
 
     # Update fields
     update_data = rule_data.model_dump(exclude_unset=True)
+    if "conditions" in update_data:
+        _validate_conditions(update_data["conditions"])
+    _validate_target(
+        update_data.get("alert_type", rule.alert_type),
+        update_data.get("alert_target", rule.alert_target),
+    )
     for field, value in update_data.items():
         setattr(rule, field, value)
 
     await db.commit()
     await db.refresh(rule)
+    alert_engine.upsert_rule(rule)
+    await response_cache.invalidate_scope(ALERT_RULES)
     return rule
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from datetime import datetime, timedelta
+
+from app.api.deps import log_filters
+from app.core.database import get_read_db
+from app.services.analytics import (
+    GROUP_COLUMNS,
+    METRICS,
+    AnalyticsError,
+    LogWindow,
+    group_by,
+    histogram,
+    percentiles,
+    rates,
+    window_cache,
+)
+from app.services.log_query import LogFilters, LogQueryError
+
+router = APIRouter()
+
+_GROUP_PATTERN = "^(" + "|".join(GROUP_COLUMNS) + ")$"
+_METRIC_PATTERN = "^(" + "|".join(METRICS) + ")$"
+
+
+async def _window(db: AsyncSession, filters: LogFilters) -> LogWindow:
+    """The analysis window, defaulting to the last hour"""
+    filters.end_time = filters.end_time or datetime.utcnow()
+    filters.start_time = filters.start_time or filters.end_time - timedelta(hours=1)
+    try:
+        return await window_cache.get(db, filters)
+    except (AnalyticsError, LogQueryError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _meta(window: LogWindow) -> dict:
+    return {
+        "start_time": datetime.utcfromtimestamp(window.start),
+        "end_time": datetime.utcfromtimestamp(window.end),
+        "rows": len(window),
+    }
+
+
+@router.get("/group-by")
+async def get_group_by(
+    by: List[str] = Query(["source_ip"], description=f"One or two of {', '.join(GROUP_COLUMNS)}"),
+    order_by: str = Query("events", pattern="^(events|" + "|".join(METRICS) + ")$"),
+    top: int = Query(20, ge=1, le=1000),
+    interval: Optional[int] = Query(None, ge=1, description="Add a per-bucket series (seconds)"),
+    filters: LogFilters = Depends(log_filters),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Event, byte and packet totals per group, e.g. per source_ip and minute"""
+    if not 1 <= len(by) <= 2 or any(name not in GROUP_COLUMNS for name in by):
+        raise HTTPException(status_code=400, detail=f"by must be one or two of {', '.join(GROUP_COLUMNS)}")
+    window = await _window(db, filters)
+    if interval is not None and (window.end - window.start) / interval > 10000:
+        raise HTTPException(status_code=400, detail="Too many buckets; use a larger interval")
+    try:
+        groups = group_by(window, by, order_by=order_by, top=top, interval=interval)
+    except AnalyticsError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**_meta(window), "by": by, "groups": groups}
+
+
+@router.get("/histogram")
+async def get_histogram(
+    metric: str = Query("bytes_sent", pattern=_METRIC_PATTERN),
+    bins: int = Query(20, ge=1, le=1000),
+    log_scale: bool = Query(False, description="Logarithmic bins, for heavy-tailed byte counts"),
+    filters: LogFilters = Depends(log_filters),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Distribution of a per-log metric"""
+    window = await _window(db, filters)
+    return {**_meta(window), "metric": metric, **histogram(window, metric, bins=bins, log_scale=log_scale)}
+
+
+@router.get("/percentiles")
+async def get_percentiles(
+    metric: str = Query("bytes_sent", pattern=_METRIC_PATTERN),
+    q: List[float] = Query([50, 90, 99], description="Percentiles between 0 and 100"),
+    by: Optional[str] = Query(None, pattern=_GROUP_PATTERN),
+    top: int = Query(20, ge=1, le=1000),
+    filters: LogFilters = Depends(log_filters),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Percentiles of a metric overall and for the busiest groups"""
+    if any(not 0 <= value <= 100 for value in q):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+    window = await _window(db, filters)
+    return {**_meta(window), "metric": metric, **percentiles(window, metric, q, by=by, top=top)}
+
+
+@router.get("/rates")
+async def get_rates(
+    interval: int = Query(60, ge=1, description="Bucket size in seconds"),
+    by: Optional[str] = Query(None, pattern=_GROUP_PATTERN, description="Rank groups by peak rate"),
+    top: int = Query(20, ge=1, le=1000),
+    filters: LogFilters = Depends(log_filters),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Event and byte rates per bucket, plus the groups with the highest peak rate"""
+    window = await _window(db, filters)
+    if (window.end - window.start) / interval > 10000:
+        raise HTTPException(status_code=400, detail="Too many buckets; use a larger interval")
+    return {**_meta(window), **rates(window, interval, by=by, top=top)}
@@ -1,33 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from datetime import timedelta
+from sqlalchemy import case, select
+from datetime import datetime, timedelta
 
+from app.api.deps import CurrentUser, get_current_user
 from app.core.database import get_db
-from app.core.security import verify_password, create_access_token
+from app.core.security import (
+    PasswordHasherBusy,
+    create_access_token,
+    login_throttle,
+    verify_password_async,
+)
 from app.core.config import settings
 from app.models.user import User
 from app.schemas.user import Token
 
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
 
 @router.post("/login", response_model=Token)
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
 ):
     """
     OAuth2 compatible token login
-    Full implementation in Feature 2.1
+
+    Failed attempts are throttled per client address and per user: at
+    LOGIN_MAX_FAILED_ATTEMPTS failures the account is locked until
+    locked_until, and each further failure locks it again. bcrypt runs on
+    the hashing pool.
     """
-    # This is a placeholder - full implementation in Feature 2.1
+    client_ip = request.client.host if request.client else "unknown"
+    if login_throttle.blocked(client_ip):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(int(settings.LOGIN_IP_WINDOW_SECONDS))},
+        )
+
     result = await db.execute(select(User).where(User.username == form_data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    now = datetime.utcnow()
+    if user and user.locked_until is not None and user.locked_until > now:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Account temporarily locked",
+            headers={"Retry-After": str(int((user.locked_until - now).total_seconds()) + 1)},
+        )
+
+    valid, new_hash = False, None
+    if user:
+        try:
+            valid, new_hash = await verify_password_async(form_data.password, user.hashed_password)
+        except PasswordHasherBusy:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Login service busy, retry shortly",
+                headers={"Retry-After": "1"},
+            )
+
+    if not valid:
+        login_throttle.record_failure(client_ip)
+        if user:
+            # Both evaluated by the UPDATE, so concurrent failures still lock
+            attempts = User.failed_login_attempts + 1
+            user.failed_login_attempts = attempts
+            user.locked_until = case(
+                (attempts >= settings.LOGIN_MAX_FAILED_ATTEMPTS,
+                 datetime.utcnow() + timedelta(seconds=settings.LOGIN_LOCKOUT_SECONDS)),
+                else_=User.locked_until,
+            )
+            await db.commit()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -40,6 +87,14 @@ async def login(
             detail="Inactive user"
         )
 
+    if new_hash:
+        # Stored hash used an outdated cost; upgrade it transparently
+        user.hashed_password = new_hash
+    user.failed_login_attempts = 0
+    user.locked_until = None
+    user.login_count = User.login_count + 1
+    user.last_login = datetime.utcnow()
+
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -48,3 +103,9 @@ async def login(
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
+
+
+@router.get("/me")
+async def read_current_user(user: CurrentUser = Depends(get_current_user)):
+    """The authenticated user (served from the auth cache)"""
+    return {"id": user.id, "username": user.username, "role": user.role, "is_active": user.is_active}
@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+
+from app.core.config import settings
+from app.services import syslog_server
+from app.services.flow_aggregator import flow_aggregator
+from app.services.write_coalescer import write_coalescer
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_ingest_stats():
+    """Queue depth and drop/parse/write counters of the syslog listener"""
+    ingestor = syslog_server.active_ingestor
+    if ingestor is None:
+        return {"enabled": False}
+    return {"enabled": True, **ingestor.stats()}
+
+
+@router.get("/coalescer")
+async def get_coalescer_stats():
+    """Group sizes and counters of the single-row POST /logs write coalescer"""
+    return {"enabled": settings.LOG_WRITE_COALESCING, **write_coalescer.stats()}
+
+
+@router.get("/flows")
+async def get_flow_stats():
+    """Open flows, events folded and the resulting row reduction of the flow aggregator"""
+    return {"enabled": settings.FLOW_AGGREGATION, **flow_aggregator.stats()}
@@ -1,40 +1,233 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List
+from typing import Any, AsyncIterator, Dict, List, Optional
+from dataclasses import asdict
+from datetime import datetime, timedelta
+import orjson
 
-from app.core.database import get_db
-from app.models.firewall_log import FirewallLog
-from app.schemas.firewall_log import FirewallLogCreate, FirewallLogResponse, FirewallLogUpdate
+from app.api.deps import log_fields, log_filters, require_roles
+from app.core.config import settings
+from app.core.database import ReadSessionLocal, get_db, get_read_db
+from app.core.timeutil import naive_utc
+from app.models.user import UserRole
+from app.schemas.firewall_log import (
+    FirewallLogCreate,
+    FirewallLogResponse,
+    FirewallLogBulkResponse,
+)
+from app.services.export import (
+    COMPRESSIONS,
+    FORMATS,
+    MEDIA_TYPES,
+    ExportError,
+    export_filename,
+    iter_export,
+    validate_options,
+)
+from app.services.flow_aggregator import flow_aggregator
+from app.services.ingest import BulkPayloadError, bulk_insert_logs, load_bulk_records
+from app.services.response_cache import response_cache
+from app.services.rollups import GRANULARITY_SECONDS, ceil_bucket, floor_bucket, query_stats
+from app.services.log_query import (
+    LogFilters,
+    LogQueryError,
+    count_logs,
+    decode_cursor,
+    encode_cursor,
+    fetch_log_page,
+    fetch_ranked_page,
+    filter_conditions,
+    get_log_row,
+)
+from app.services.write_coalescer import write_coalescer
 
 router = APIRouter()
 
+# Viewers read logs; only operators may write them
+require_log_writer = require_roles(UserRole.ADMIN, UserRole.OPERATOR)
+
+PAGE_SIZE = 1000
+# Same encoding as ORJSONResponse, for bodies built ahead of the response
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _project(rows: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
+    """Drop the key columns a projected page carries but the client did not ask for"""
+    if not fields or not rows or len(rows[0]) == len(fields):
+        return rows
+    return [{name: row[name] for name in fields} for row in rows]
+
+
+async def _ndjson_lines(
+    filters: LogFilters,
+    cursor: Optional[str],
+    skip: int,
+    limit: int,
+    fields: Optional[List[str]],
+) -> AsyncIterator[bytes]:
+    """Walk pages by cursor, one orjson-encoded row per line"""
+    # Own session: the request's dependency session may be closed while streaming
+    async with ReadSessionLocal() as db:
+        remaining = limit
+        while remaining > 0:
+            size = min(remaining, PAGE_SIZE)
+            rows = await fetch_log_page(db, filters, cursor=cursor, limit=size, skip=skip, columns=fields)
+            skip = 0
+            page = rows[:size]
+            if page:
+                yield b"".join(orjson.dumps(row) + b"\n" for row in _project(page, fields))
+            if len(rows) <= size:
+                return
+            remaining -= size
+            cursor = encode_cursor(page[-1]["timestamp"], page[-1]["id"])
+
 
 @router.get("/", response_model=List[FirewallLogResponse])
 async def get_logs(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    skip: int = Query(0, ge=0, description="Offset paging, kept for compatibility; prefer cursor"),
+    limit: int = Query(100, ge=1, le=settings.LOG_NDJSON_MAX_ROWS, description="At most 1000 unless format=ndjson"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson streams one log per line"),
+    order: str = Query("time", pattern="^(time|relevance)$", description="relevance ranks q= matches (skip/limit paging)"),
+    fields: Optional[List[str]] = Depends(log_fields),
+    filters: LogFilters = Depends(log_filters),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Get firewall logs, newest first, with filtering and keyset pagination.
+    The cursor for the next page is returned in the X-Next-Cursor header
+    and is absent on the last page.
+
+    q= searches raw_log and description through the full-text index;
+    order=relevance returns the best matches first instead (database
+    tables only, paged with skip/limit).
+
+    Rows come straight from the database (no per-row model validation)
+    and are encoded with orjson; fields= limits the selected columns.
+    JSON pages are served from the response cache (with an ETag) until
+    rows are ingested into the time range they cover.
+    """
+    if order == "relevance" and (format == "ndjson" or cursor or not filters.q):
+        raise HTTPException(status_code=400, detail="order=relevance requires q and JSON pages without cursor")
+    if format == "ndjson":
+        try:
+            filter_conditions(filters)
+            if cursor:
+                decode_cursor(cursor)
+        except LogQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return StreamingResponse(
+            _ndjson_lines(filters, cursor, skip, limit, fields),
+            media_type="application/x-ndjson",
+        )
+    if limit > PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit above {PAGE_SIZE} requires format=ndjson")
+
+    async def ranked():
+        try:
+            logs = await fetch_ranked_page(db, filters, limit=limit, skip=skip, columns=fields)
+        except LogQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        body = orjson.dumps(_project(logs, fields), option=ORJSON_OPTIONS)
+        return body, {}, (filters.start_time, filters.end_time)
+
+    async def compute():
+        try:
+            logs = await fetch_log_page(db, filters, cursor=cursor, limit=limit, skip=skip, columns=fields)
+            end = decode_cursor(cursor)[0] if cursor else None
+        except LogQueryError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # The page only depends on rows between its oldest row (when more follow) and the cursor
+        start = filters.start_time
+        if filters.end_time is not None:
+            end = min(end, filters.end_time) if end is not None else filters.end_time
+        headers = {}
+        if len(logs) > limit:
+            logs = logs[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(logs[-1]["timestamp"], logs[-1]["id"])
+            start = logs[-1]["timestamp"]
+        body = orjson.dumps(_project(logs, fields), option=ORJSON_OPTIONS)
+        return body, headers, (start, end)
+
+    params = {"cursor": cursor, "skip": skip, "limit": limit, "order": order, "fields": fields, **asdict(filters)}
+    return await response_cache.respond(request, "logs", params, ranked if order == "relevance" else compute)
+
+
+@router.get("/stats")
+async def get_log_stats(
+    request: Request,
+    start_time: Optional[datetime] = Query(None, description="Defaults to 24 hours before end_time"),
+    end_time: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    top: int = Query(10, ge=0, le=100, description="Number of top source/destination IPs"),
+    interval: Optional[str] = Query(None, pattern="^(minute|hour|day)$", description="Include a time series"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get firewall logs with pagination
-    Full filtering implementation in Feature 2.3
+    Dashboard statistics served from pre-aggregated rollups.
+    The range is aligned to whole minutes; top IP lists use whole hours
+    (reported in ip_window). Responses are cached per aligned range.
     """
-    result = await db.execute(
-        select(FirewallLog)
-        .order_by(FirewallLog.timestamp.desc())
-        .offset(skip)
-        .limit(limit)
+    end_time = naive_utc(end_time) or datetime.utcnow()
+    start_time = naive_utc(start_time) or end_time - timedelta(days=1)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
+    if interval is not None:
+        points = (end_time - start_time).total_seconds() / GRANULARITY_SECONDS[interval]
+        if points > 10000:
+            raise HTTPException(status_code=400, detail="Too many series points; use a coarser interval")
+
+    async def compute():
+        stats = await query_stats(db, start_time, end_time, top=top, interval=interval)
+        window = stats["ip_window"]
+        return orjson.dumps(stats, option=ORJSON_OPTIONS), {}, (window["start_time"], window["end_time"])
+
+    # query_stats aligns to minutes, so requests within the same minute share an entry
+    params = {
+        "start_time": floor_bucket(start_time, "minute"),
+        "end_time": ceil_bucket(end_time, "minute"),
+        "top": top,
+        "interval": interval,
+    }
+    return await response_cache.respond(request, "log_stats", params, compute)
+
+
+@router.get("/export")
+async def export_logs(
+    format: str = Query("csv", pattern="^(" + "|".join(FORMATS) + ")$"),
+    compression: str = Query("none", pattern="^(" + "|".join(COMPRESSIONS) + ")$", description="gzip/zstd; Parquet compresses internally"),
+    fields: Optional[List[str]] = Depends(log_fields),
+    filters: LogFilters = Depends(log_filters),
+):
+    """
+    Stream every matching log as a file download.
+    Rows are read with server-side cursors in EXPORT_CHUNK_ROWS chunks,
+    so exports of any size run in constant memory.
+    """
+    try:
+        validate_options(format, compression)
+        filter_conditions(filters)
+    except (ExportError, LogQueryError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body() -> AsyncIterator[bytes]:
+        async with ReadSessionLocal() as db:
+            async for chunk in iter_export(db, filters, format, compression, fields):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(format, compression)}"'},
     )
-    logs = result.scalars().all()
-    return logs
 
 
 @router.get("/{log_id}", response_model=FirewallLogResponse)
-async def get_log(log_id: int, db: AsyncSession = Depends(get_db)):
+async def get_log(log_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a single firewall log by ID"""
-    result = await db.execute(select(FirewallLog).where(FirewallLog.id == log_id))
-    log = result.scalar_one_or_none()
+    log = await get_log_row(db, log_id)
 
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
@@ -42,25 +235,68 @@ async def get_log(log_id: int, db: AsyncSession = Depends(get_db)):
     return log
 
 
-@router.post("/", response_model=FirewallLogResponse, status_code=201)
+@router.post("/", response_model=FirewallLogResponse, status_code=201, dependencies=[Depends(require_log_writer)])
 async def create_log(
     log_data: FirewallLogCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """
     Create a new firewall log
-    Full implementation in Feature 2.2
+    Goes through the same ingestion path (and alert evaluation) as bulk writes;
+    concurrent requests share one commit when LOG_WRITE_COALESCING is on
     """
-    log = FirewallLog(**log_data.model_dump())
-    db.add(log)
-    await db.commit()
-    await db.refresh(log)
-    return log
+    row = log_data.model_dump()
+    if settings.LOG_WRITE_COALESCING:
+        await write_coalescer.submit(row)
+    else:
+        await bulk_insert_logs(db, [row])
+    return row
+
+
+@router.post("/bulk", response_model=FirewallLogBulkResponse, dependencies=[Depends(require_log_writer)])
+async def create_logs_bulk(
+    request: Request,
+    return_ids: bool = Query(False, description="Include the ids of inserted rows"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Ingest many firewall logs in one request.
+
+    The body is either a JSON array or NDJSON (Content-Type
+    application/x-ndjson). Invalid records are reported per index and
+    skipped; valid ones are written with batched multi-row inserts. With
+    FLOW_AGGREGATION on they are folded into flow records written when
+    their window closes, so no ids can be returned.
+    """
+    if return_ids and settings.FLOW_AGGREGATION:
+        raise HTTPException(status_code=400, detail="return_ids is not available with flow aggregation")
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonl" in content_type
+
+    try:
+        rows, errors = load_bulk_records(await request.body(), ndjson=ndjson)
+    except BulkPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if settings.FLOW_AGGREGATION:
+        await flow_aggregator.submit(rows)
+        ids = []
+    else:
+        ids = await bulk_insert_logs(db, rows)
+
+    return {
+        "accepted": len(rows),
+        "rejected": len(errors),
+        "ids": ids if return_ids else None,
+        "errors": errors,
+    }
 
 
 @router.get("/count/total")
-async def get_log_count(db: AsyncSession = Depends(get_db)):
-    """Get total log count"""
-    result = await db.execute(select(func.count(FirewallLog.id)))
-    count = result.scalar()
-    return {"count": count}
+async def get_log_count(request: Request, db: AsyncSession = Depends(get_read_db)):
+    """Get total log count (cached until the next ingest)"""
+    async def compute():
+        count = await count_logs(db)
+        return orjson.dumps({"count": count}), {}, (None, None)
+
+    return await response_cache.respond(request, "log_count", {}, compute)
@@ -0,0 +1,118 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+
+from app.core.config import settings
+from app.core.database import get_read_db
+from app.core.timeutil import naive_utc
+from app.services.sketches import (
+    SKETCH_FIELDS,
+    WindowSketch,
+    distinct_count,
+    frequency,
+    port_fanout,
+    sketch_store,
+    top_k,
+)
+
+router = APIRouter()
+
+_FIELD_PATTERN = "^(" + "|".join(SKETCH_FIELDS) + ")$"
+
+
+async def _collect(
+    db: AsyncSession,
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+    log_source: Optional[str],
+    action: Optional[str],
+) -> Tuple[Dict[str, Any], List[WindowSketch]]:
+    """Sketches for the range, plus the window-aligned range they actually cover"""
+    # Window keys are naive UTC
+    end_time = naive_utc(end_time) or datetime.utcnow()
+    start_time = naive_utc(start_time) or end_time - timedelta(hours=1)
+    if start_time >= end_time:
+        raise HTTPException(status_code=400, detail="start_time must be before end_time")
+
+    window = timedelta(seconds=sketch_store.window_seconds)
+    aligned_start = sketch_store.window_start(start_time)
+    aligned_end = sketch_store.window_start(end_time)
+    if aligned_end < end_time:
+        aligned_end += window
+
+    sketches = await sketch_store.collect(db, start_time, end_time, log_source, action)
+    meta = {
+        "start_time": aligned_start,
+        "end_time": aligned_end,
+        "log_source": log_source,
+        "action": action,
+        "windows": len(sketches),
+        "events": sum(sketch.events for sketch in sketches),
+    }
+    return meta, sketches
+
+
+@router.get("/top")
+async def get_top_values(
+    field: str = Query("source_ip", pattern=_FIELD_PATTERN),
+    k: int = Query(20, ge=1, le=200),
+    start_time: Optional[datetime] = Query(None, description="Defaults to 1 hour before end_time"),
+    end_time: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    log_source: Optional[str] = None,
+    action: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Approximate top-K values of a field (Space-Saving).
+    Each true count lies in [count - error, count].
+    """
+    meta, sketches = await _collect(db, start_time, end_time, log_source, action)
+    return {**meta, "field": field, **top_k(sketches, field, k)}
+
+
+@router.get("/distinct")
+async def get_distinct_count(
+    field: str = Query("source_ip", pattern=_FIELD_PATTERN),
+    start_time: Optional[datetime] = Query(None, description="Defaults to 1 hour before end_time"),
+    end_time: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    log_source: Optional[str] = None,
+    action: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Approximate number of distinct values of a field (HyperLogLog)"""
+    meta, sketches = await _collect(db, start_time, end_time, log_source, action)
+    return {**meta, "field": field, **distinct_count(sketches, field)}
+
+
+@router.get("/frequency")
+async def get_value_frequency(
+    value: str,
+    field: str = Query("source_ip", pattern=_FIELD_PATTERN),
+    start_time: Optional[datetime] = Query(None, description="Defaults to 1 hour before end_time"),
+    end_time: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    log_source: Optional[str] = None,
+    action: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Approximate occurrences of one value (Count-Min, never undercounts)"""
+    meta, sketches = await _collect(db, start_time, end_time, log_source, action)
+    return {**meta, "field": field, "value": value, **frequency(sketches, field, value)}
+
+
+@router.get("/port-fanout")
+async def get_port_fanout(
+    k: int = Query(20, ge=1, le=200),
+    start_time: Optional[datetime] = Query(None, description="Defaults to 1 hour before end_time"),
+    end_time: Optional[datetime] = Query(None, description="Defaults to now (UTC)"),
+    log_source: Optional[str] = None,
+    action: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Sources with the most distinct destination ports, e.g. port scanners.
+    Only sources tracked as heavy hitters are considered.
+    """
+    meta, sketches = await _collect(db, start_time, end_time, log_source, action)
+    relative_error = 1.04 / (1 << settings.SKETCH_FANOUT_PRECISION) ** 0.5
+    return {**meta, "relative_error": round(relative_error, 4), "sources": port_fanout(sketches, k)}
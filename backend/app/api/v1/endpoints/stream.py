@@ -0,0 +1,147 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import json
+
+from app.api.deps import get_current_user, user_for_token
+from app.core.config import settings
+from app.services.conditions import ConditionError, compile_conditions
+from app.services.stream_hub import POLICIES, HubFull, Subscriber, stream_hub
+
+router = APIRouter()
+
+_POLICY_PATTERN = "^(" + "|".join(POLICIES) + ")$"
+_HEARTBEAT = '{"type":"heartbeat"}'
+
+
+def _parse_conditions(raw: Optional[str]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    try:
+        conditions = json.loads(raw)
+    except ValueError:
+        raise ConditionError("conditions must be a JSON object")
+    if not isinstance(conditions, dict):
+        raise ConditionError("conditions must be a JSON object")
+    return conditions
+
+
+def _parse_subscription(message: str) -> Tuple[Dict[str, Any], str]:
+    try:
+        payload = json.loads(message)
+    except ValueError:
+        raise ConditionError("Subscription must be a JSON object")
+    if not isinstance(payload, dict):
+        raise ConditionError("Subscription must be a JSON object")
+    conditions = payload.get("conditions") or {}
+    if not isinstance(conditions, dict):
+        raise ConditionError("conditions must be a JSON object")
+    return conditions, payload.get("policy", "drop")
+
+
+async def _pump(websocket: WebSocket, subscriber: Subscriber, lock: asyncio.Lock) -> None:
+    while True:
+        message = await subscriber.next_message(settings.STREAM_HEARTBEAT_INTERVAL)
+        async with lock:
+            await websocket.send_text(message or _HEARTBEAT)
+
+
+@router.websocket("/ws")
+async def stream_logs_ws(websocket: WebSocket):
+    """
+    Push newly ingested logs matching a subscription.
+
+    Send {"conditions": {...}, "policy": "drop" | "sample"} to subscribe;
+    sending another one replaces the subscription. Conditions use the alert
+    rule syntax. Messages are {"type": "logs", "skipped": n, "events": [...]},
+    where skipped counts events dropped or sampled out for this client.
+    Browsers cannot set headers on WebSockets, so the bearer token may
+    also be passed as ?token=.
+    """
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    token = credentials if scheme.lower() == "bearer" else websocket.query_params.get("token")
+    try:
+        await user_for_token(token)
+    except HTTPException:
+        await websocket.close(code=1008, reason="Not authenticated")
+        return
+    await websocket.accept()
+    lock = asyncio.Lock()
+    subscriber: Optional[Subscriber] = None
+    pump: Optional[asyncio.Task] = None
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                conditions, policy = _parse_subscription(message)
+                replacement = stream_hub.subscribe(conditions, policy)
+            except (ConditionError, ValueError) as exc:
+                async with lock:
+                    await websocket.send_text(json.dumps({"type": "error", "detail": str(exc)}))
+                continue
+            except HubFull as exc:
+                await websocket.close(code=1013, reason=str(exc))
+                return
+
+            if pump is not None:
+                pump.cancel()
+                stream_hub.unsubscribe(subscriber)
+            subscriber = replacement
+            async with lock:
+                await websocket.send_text(json.dumps({"type": "subscribed", "id": subscriber.id}))
+            pump = asyncio.create_task(_pump(websocket, subscriber, lock))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if pump is not None:
+            pump.cancel()
+        if subscriber is not None:
+            stream_hub.unsubscribe(subscriber)
+
+
+@router.get("/sse", dependencies=[Depends(get_current_user)])
+async def stream_logs_sse(
+    request: Request,
+    conditions: Optional[str] = Query(None, description="JSON conditions document (alert rule syntax)"),
+    policy: str = Query("drop", pattern=_POLICY_PATTERN, description="Slow consumer policy"),
+):
+    """
+    Server-Sent Events variant of the WebSocket stream.
+
+    Each "logs" event carries the same JSON message as the WebSocket;
+    comment lines keep idle connections alive.
+    """
+    try:
+        parsed = _parse_conditions(conditions)
+        compile_conditions(parsed)
+    except ConditionError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if len(stream_hub) >= settings.STREAM_MAX_SUBSCRIBERS:
+        raise HTTPException(status_code=503, detail="Too many stream subscribers")
+
+    async def events():
+        # Subscribe inside the generator so the finally clause always runs
+        try:
+            subscriber = stream_hub.subscribe(parsed, policy)
+        except HubFull:
+            return
+        try:
+            yield f'event: subscribed\ndata: {{"id":{subscriber.id}}}\n\n'
+            while not await request.is_disconnected():
+                message = await subscriber.next_message(settings.STREAM_HEARTBEAT_INTERVAL)
+                yield ": keepalive\n\n" if message is None else f"event: logs\ndata: {message}\n\n"
+        finally:
+            stream_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats", dependencies=[Depends(get_current_user)])
+async def stream_stats():
+    """Subscriber and delivery counters of this worker's hub"""
+    return stream_hub.stats()
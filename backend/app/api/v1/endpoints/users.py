@@ -3,24 +3,25 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import List
 
-from app.core.database import get_db
-from app.core.security import get_password_hash
-from app.models.user import User
-from app.schemas.user import UserCreate, UserResponse, UserUpdate
+from app.api.deps import CurrentUser, get_current_user, require_roles
+from app.core.database import get_db, get_read_db
+from app.core.security import PasswordHasherBusy, hash_password_async
+from app.models.user import User, UserRole
+from app.schemas.user import UserCreate, UserResponse
 
 router = APIRouter()
 
+require_admin = require_roles(UserRole.ADMIN)
+
 
 @router.get("/", response_model=List[UserResponse])
 async def get_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db),
+    _: CurrentUser = Depends(require_admin),
 ):
-    """
-    Get all users with pagination
-    Full authorization implementation in Feature 2.1
-    """
+    """Get all users with pagination (admin only)"""
     result = await db.execute(
         select(User)
         .order_by(User.created_at.desc())
@@ -32,8 +33,14 @@ async def get_users(
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
-    """Get a single user by ID"""
+async def get_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    """Get a single user by ID (admins, or the user themselves)"""
+    if current_user.id != user_id and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Insufficient permissions")
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
 
@@ -46,12 +53,10 @@ async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
 @router.post("/", response_model=UserResponse, status_code=201)
 async def create_user(
     user_data: UserCreate,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    _: CurrentUser = Depends(require_admin),
 ):
-    """
-    Create a new user
-    Full validation implementation in Feature 2.1
-    """
+    """Create a new user (admin only)"""
     # Check if username already exists
     result = await db.execute(select(User).where(User.username == user_data.username))
     if result.scalar_one_or_none():
@@ -63,8 +68,12 @@ async def create_user(
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Create user
+    try:
+        hashed_password = await hash_password_async(user_data.password)
+    except PasswordHasherBusy as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "1"})
     user_dict = user_data.model_dump(exclude={"password"})
-    user = User(**user_dict, hashed_password=get_password_hash(user_data.password))
+    user = User(**user_dict, hashed_password=hashed_password)
     db.add(user)
     await db.commit()
     await db.refresh(user)
@@ -1,13 +1,90 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import itertools
+import time
+from typing import Any, Callable, Dict, List
+from fastapi import Request, Response
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """create_async_engine arguments for the profile selected by the URL's dialect"""
+    parsed = make_url(url)
+    options: Dict[str, Any] = {"echo": settings.DATABASE_ECHO, "future": True}
+
+    if parsed.get_backend_name() == "postgresql":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+        if parsed.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+                "server_settings": {"application_name": settings.PROJECT_NAME},
+            }
+    elif parsed.get_backend_name() == "sqlite" and parsed.database not in (None, "", ":memory:"):
+        # Reuse connections so pragmas, page cache and mmap survive between
+        # sessions (aiosqlite otherwise opens a connection per checkout)
+        options.update(
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT)}")
+    cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _sqlite_query_only(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def create_engine(url: str, read_only: bool = False) -> AsyncEngine:
+    """Async engine with the connection profile for url"""
+    new_engine = create_async_engine(url, **engine_options(url))
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        if read_only:
+            event.listen(new_engine.sync_engine, "connect", _sqlite_query_only)
+    return new_engine
+
+
+def _read_urls() -> List[str]:
+    """Replica URLs, or the primary SQLite file for a separate reader pool"""
+    if settings.DATABASE_READ_URLS:
+        return list(settings.DATABASE_READ_URLS)
+    url = make_url(settings.DATABASE_URL)
+    if (
+        settings.SQLITE_READ_POOL
+        and url.get_backend_name() == "sqlite"
+        and url.database not in (None, "", ":memory:")
+    ):
+        # In WAL mode readers on their own connections never wait for writers
+        return [settings.DATABASE_URL]
+    return []
+
+
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=True,  # Log SQL queries (set to False in production)
-    future=True,
-)
+engine = create_engine(settings.DATABASE_URL)
+read_engines = [create_engine(url, read_only=True) for url in _read_urls()]
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(
@@ -18,13 +95,61 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# Read-only session factories, used round-robin; the primary when none
+_read_factories = [
+    async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+    for read_engine in read_engines
+] or [AsyncSessionLocal]
+_next_read_factory = itertools.cycle(_read_factories).__next__
+
+# Clients that wrote recently read from the primary until this cookie expires
+PRIMARY_COOKIE = "db_primary_until"
+
 # Base class for models
 Base = declarative_base()
 
+# Schema steps of other modules run by init_db, see register_init_hook
+_init_hooks: List[Callable[[Any], Any]] = []
+
+
+def register_init_hook(hook: Callable[[Any], Any]) -> None:
+    """Have init_db run hook(sync_connection) after creating tables and columns"""
+    if hook not in _init_hooks:
+        _init_hooks.append(hook)
+
+
+def dialect_insert(db: AsyncSession, table):
+    """INSERT construct with ON CONFLICT support for the session's dialect"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
+def ReadSessionLocal() -> AsyncSession:
+    """Session on the next read engine (replica or SQLite reader pool)"""
+    return _next_read_factory()()
+
+
+def _sticky_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
 
 # Dependency for getting DB session
-async def get_db():
-    """Get database session dependency"""
+async def get_db(request: Request, response: Response):
+    """Get database session dependency (primary, commits on success)"""
+    if settings.READ_YOUR_WRITES_SECONDS > 0 and request.method not in ("GET", "HEAD", "OPTIONS"):
+        response.set_cookie(
+            PRIMARY_COOKIE,
+            str(int(time.time() + settings.READ_YOUR_WRITES_SECONDS) + 1),
+            max_age=int(settings.READ_YOUR_WRITES_SECONDS) + 1,
+            httponly=True,
+            samesite="lax",
+        )
     async with AsyncSessionLocal() as session:
         try:
             yield session
@@ -36,7 +161,54 @@ async def get_db():
             await session.close()
 
 
+async def get_read_db(request: Request):
+    """
+    Read-only session dependency: routed to a read engine and never committed.
+    Clients holding a fresh PRIMARY_COOKIE read from the primary instead.
+    """
+    factory = AsyncSessionLocal if _sticky_to_primary(request) else _next_read_factory()
+    async with factory() as session:
+        yield session
+
+
+async def dispose_engines():
+    """Close the primary and read engine pools"""
+    for each in [engine, *read_engines]:
+        await each.dispose()
+
+
+def _add_missing_columns(conn) -> List[str]:
+    """
+    ALTER existing tables (and their day partitions, named <table>_pYYYYMMDD)
+    to add nullable model columns they predate; returns "table.column" names.
+    """
+    inspector = inspect(conn)
+    existing = inspector.get_table_names()
+    added = []
+    for table in Base.metadata.sorted_tables:
+        prefix = f"{table.name}_p"
+        for name in existing:
+            if name != table.name and not (name.startswith(prefix) and name[len(prefix):].isdigit()):
+                continue
+            present = {column["name"] for column in inspector.get_columns(name)}
+            for column in table.columns:
+                if column.name in present or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE "{name}" ADD COLUMN "{column.name}" {column_type}')
+                added.append(f"{name}.{column.name}")
+    return added
+
+
 async def init_db():
-    """Initialize database - create all tables"""
+    """Initialize database - create all tables, newer nullable columns and registered hooks' objects"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        for hook in _init_hooks:
+            await conn.run_sync(hook)
+        if conn.dialect.name == "sqlite":
+            # Sampled index statistics let the planner choose between the
+            # single-column and composite indexes for each filter combination
+            await conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+            await conn.exec_driver_sql("ANALYZE")
@@ -0,0 +1,335 @@
+"""
+In-process metrics in the Prometheus text format.
+
+Counters, gauges and histograms are plain dicts keyed by label-value
+tuples and updated from the event loop thread, so recording costs a dict
+lookup and an add. Histogram buckets are kept per bucket and made
+cumulative when /metrics is scraped. Values that services already count
+themselves (alert engine, caches, queues) are read by collectors at
+scrape time instead of being recorded on the hot path.
+
+Besides the primitives this module provides:
+
+- MetricsMiddleware: per-route request latency histograms, status counts
+  and the number of requests in flight (raw ASGI, no response wrapping);
+- instrument_engine(s): SQLAlchemy hooks timing every statement, plus a
+  slow-query log that samples statements over SLOW_QUERY_SECONDS with
+  their parameters and query plan.
+
+Metrics are per process; with several workers each one is scraped
+separately (or behind a multiprocess-aware proxy).
+"""
+import logging
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.database import engine, read_engines
+
+logger = logging.getLogger("app.slow_query")
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name, type, help, [(labels, value)]) as produced by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label-value tuple"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Unlabelled metrics are exported as 0 before the first update
+        self.values: Dict[Tuple, float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, labels: Tuple = ()) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, labels)))} {_format_value(value)}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    """Value that goes up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, labels: Tuple = ()) -> None:
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, labels: Tuple = ()) -> None:
+        self.values[labels] = value
+
+
+class Histogram:
+    """Observation counts per bucket plus sum and count, per label-value tuple"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.series: Dict[Tuple, List[Any]] = {}
+
+    def observe(self, value: float, labels: Tuple = ()) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = []
+        bounds = [*map(_format_value, self.buckets), "+Inf"]
+        for labels, (counts, total) in self.series.items():
+            base = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**base, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(base)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(base)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Metrics recorded directly plus collectors sampled at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def _add(self, metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                logging.getLogger(__name__).exception("Metrics collector %r failed", collector)
+                continue
+            for name, kind, help, samples in families:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response is complete", ("method", "route"),
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being handled")
+db_duration = registry.histogram(
+    "db_statement_duration_seconds", "SQL statement execution time", ("engine", "operation"),
+)
+db_checkout = registry.histogram(
+    "db_pool_checkout_seconds", "Time to obtain a pooled database connection", ("engine",),
+)
+db_slow = registry.counter("db_slow_statements_total", "Statements slower than SLOW_QUERY_SECONDS", ("engine",))
+ingest_rows = registry.counter("ingest_rows_total", "Log rows committed by the ingestion path")
+ingest_chunks = registry.counter("ingest_chunks_total", "Ingestion transactions committed")
+
+
+# ----------------------------------------------------------------------
+# ASGI middleware
+# ----------------------------------------------------------------------
+
+
+class MetricsMiddleware:
+    """Records latency, status and in-flight count of every HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            # The route template keeps label cardinality bounded (/logs/{log_id})
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_duration.observe(elapsed, (method, path))
+            http_requests.inc(1, (method, path, str(status[0])))
+
+
+# ----------------------------------------------------------------------
+# SQL timing and slow-query log
+# ----------------------------------------------------------------------
+
+# Most recent sampled slow statements, newest last
+slow_queries: Deque[Dict[str, Any]] = deque(maxlen=max(settings.SLOW_QUERY_LOG_SIZE, 1))
+_slow_budget = {"minute": 0, "captured": 0}
+
+
+def _operation(statement: str) -> str:
+    head = statement.lstrip()[:12].split(None, 1)
+    return head[0].upper() if head else "OTHER"
+
+
+def _should_capture() -> bool:
+    """Sampling plus a per-minute cap, so a slow database is not made slower"""
+    if random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+        return False
+    minute = int(time.monotonic() // 60)
+    if _slow_budget["minute"] != minute:
+        _slow_budget["minute"] = minute
+        _slow_budget["captured"] = 0
+    if _slow_budget["captured"] >= settings.SLOW_QUERY_MAX_PER_MINUTE:
+        return False
+    _slow_budget["captured"] += 1
+    return True
+
+
+def _explain(conn, statement: str, parameters) -> Optional[List[str]]:
+    """Query plan of a SELECT on the same connection; None when unavailable"""
+    if _operation(statement) not in ("SELECT", "WITH"):
+        return None
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return None
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return [" | ".join(str(value) for value in row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+    except Exception as exc:
+        return [f"EXPLAIN failed: {exc}"]
+
+
+def _truncate(value: Any, limit: int = 2000) -> str:
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def instrument_engines() -> None:
+    """Instrument the primary and read engines when SQL timing is enabled"""
+    if not (settings.METRICS_ENABLED and settings.METRICS_SQL_TIMING):
+        return
+    instrument_engine(engine.sync_engine, "primary")
+    for read_engine in read_engines:
+        instrument_engine(read_engine.sync_engine, "read")
+
+
+def instrument_engine(sync_engine, name: str) -> None:
+    """Time statements and connection checkouts of an engine"""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._metrics_started
+        db_duration.observe(elapsed, (name, _operation(statement)))
+        threshold = settings.SLOW_QUERY_SECONDS
+        if threshold <= 0 or elapsed < threshold:
+            return
+        db_slow.inc(1, (name,))
+        if not _should_capture():
+            return
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "engine": name,
+            "seconds": round(elapsed, 4),
+            "statement": statement,
+            "parameters": _truncate(parameters),
+            "executemany": executemany,
+            "plan": None if executemany or not settings.SLOW_QUERY_EXPLAIN else _explain(conn, statement, parameters),
+        }
+        slow_queries.append(entry)
+        logger.warning("Slow SQL (%.3fs on %s): %s params=%s plan=%s",
+                       elapsed, name, statement, entry["parameters"], entry["plan"])
+
+    pool = sync_engine.pool
+    do_get = getattr(pool, "_do_get", None)
+    if do_get is None:
+        return
+
+    def timed_get():
+        started = time.perf_counter()
+        try:
+            return do_get()
+        finally:
+            db_checkout.observe(time.perf_counter() - started, (name,))
+
+    # No pool event fires before a checkout starts waiting, so time the getter
+    pool._do_get = timed_get
@@ -0,0 +1,62 @@
+"""
+Packed, order-preserving address keys for indexed IP and CIDR search.
+
+An address is stored as one family byte (4 or 6) followed by its 4 or 16
+network-order bytes. Byte-wise comparison then sorts all IPv4 addresses
+before all IPv6 ones and numerically within each family, so a CIDR block
+is one contiguous key range, and an IPv4 key takes 5 bytes instead of up
+to 15 characters of dotted-quad text.
+"""
+import ipaddress
+import socket
+from typing import Optional, Tuple, Union
+
+FAMILY_V4 = b"\x04"
+FAMILY_V6 = b"\x06"
+PACKED_LENGTH = 17
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def pack_address(value: Optional[str]) -> Optional[bytes]:
+    """Packed key of an address, None for anything that is not one"""
+    if not value:
+        return None
+    try:
+        return FAMILY_V4 + socket.inet_pton(socket.AF_INET, value)
+    except (OSError, ValueError):
+        pass
+    try:
+        return FAMILY_V6 + socket.inet_pton(socket.AF_INET6, value)
+    except (OSError, ValueError):
+        return None
+
+
+def unpack_address(packed: bytes) -> str:
+    if packed[:1] == FAMILY_V4:
+        return socket.inet_ntop(socket.AF_INET, packed[1:])
+    return socket.inet_ntop(socket.AF_INET6, packed[1:])
+
+
+def network_bounds(network: Network) -> Tuple[bytes, bytes]:
+    """Inclusive packed key range covering a network"""
+    family = FAMILY_V4 if network.version == 4 else FAMILY_V6
+    return family + network.network_address.packed, family + network.broadcast_address.packed
+
+
+def prefix_range(value: str) -> Optional[Tuple[int, int, int, int]]:
+    """(version, prefix length, first, last) of an address or CIDR as integers; None if invalid"""
+    address, _, length = value.partition("/")
+    packed = pack_address(address)
+    if packed is None:
+        return None
+    bits = 32 if packed[:1] == FAMILY_V4 else 128
+    try:
+        prefix_length = int(length) if length else bits
+    except ValueError:
+        return None
+    if not 0 <= prefix_length <= bits:
+        return None
+    host = (1 << (bits - prefix_length)) - 1
+    first = int.from_bytes(packed[1:], "big") & ~host
+    return (4 if bits == 32 else 6), prefix_length, first, first | host
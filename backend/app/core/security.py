@@ -1,11 +1,24 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
 
-# Password hashing context
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing context; hashes with a different cost are flagged for rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event loop
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_hash_pending = 0
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when the hashing pool queue is full"""
 
 
 def get_password_hash(password: str) -> str:
@@ -18,6 +31,65 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+async def _run_hasher(func, *args):
+    """Run a bcrypt call on the pool, refusing work beyond the queue limit"""
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_LIMIT:
+        raise PasswordHasherBusy("Too many concurrent password operations")
+    _hash_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await _run_hasher(pwd_context.hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password on the hashing pool.
+    Returns (valid, new_hash); new_hash is set when the stored hash
+    uses outdated settings (e.g. BCRYPT_ROUNDS changed) and should be replaced.
+    """
+    return await _run_hasher(pwd_context.verify_and_update, plain_password, hashed_password)
+
+
+class LoginThrottle:
+    """Fixed-window count of failed logins per client address"""
+
+    def __init__(self, limit: int, window: float):
+        self.limit = limit
+        self.window = window
+        self._windows: Dict[str, Tuple[float, int]] = {}
+
+    def _current(self, key: str, now: float) -> int:
+        started, failures = self._windows.get(key, (now, 0))
+        return failures if now - started < self.window else 0
+
+    def blocked(self, key: str) -> bool:
+        return self.limit > 0 and self._current(key, time.monotonic()) >= self.limit
+
+    def record_failure(self, key: str) -> None:
+        now = time.monotonic()
+        failures = self._current(key, now)
+        started = self._windows[key][0] if failures else now
+        self._windows[key] = (started, failures + 1)
+        if len(self._windows) > 10000:
+            # Drop expired windows so scanning clients cannot grow the map
+            self._windows = {
+                k: v for k, v in self._windows.items() if now - v[0] < self.window
+            }
+
+    def reset(self, key: str) -> None:
+        self._windows.pop(key, None)
+
+
+login_throttle = LoginThrottle(settings.LOGIN_IP_MAX_FAILURES, settings.LOGIN_IP_WINDOW_SECONDS)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create JWT access token"""
     to_encode = data.copy()
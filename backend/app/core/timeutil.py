@@ -0,0 +1,17 @@
+"""
+Naive-UTC datetimes.
+
+Timestamps are stored and compared as naive UTC datetimes throughout
+(columns, partitions, rollup buckets, cache buckets, sketch windows).
+Values arriving with an offset ("...Z", "+09:00") are converted once at
+the edge, in request schemas and query parameters.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """value converted to UTC without tzinfo; naive values are taken as UTC already"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
@@ -1,10 +1,69 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
 
+from app.api.deps import require_roles
+from app.core import metrics
 from app.core.config import settings
-from app.core.database import init_db
+from app.core.database import init_db, dispose_engines, AsyncSessionLocal
 from app.api.v1 import api_router
+from app.models.user import UserRole
+from app.services import archive, partitions, service_metrics, syslog_server
+from app.services.alert_delivery import alert_dispatcher
+from app.services.alert_engine import alert_engine
+from app.services.flow_aggregator import flow_aggregator
+from app.services.sketches import sketch_store
+from app.services.threat_intel import threat_intel
+from app.services.write_coalescer import write_coalescer
+
+logger = logging.getLogger(__name__)
+
+
+async def refresh_alert_rules():
+    """Pick up rule changes made by other processes"""
+    while True:
+        await asyncio.sleep(settings.ALERT_RULE_REFRESH_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await alert_engine.refresh(db)
+        except Exception:
+            logger.exception("Alert rule refresh failed")
+
+
+async def maintain_partitions():
+    """Close finished days, archive old ones and apply the retention policy"""
+    while True:
+        await asyncio.sleep(settings.PARTITION_MAINTENANCE_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await partitions.maintain_partitions(db)
+                await archive.archive_partitions(db)
+        except Exception:
+            logger.exception("Partition maintenance failed")
+
+
+async def refresh_threat_intel():
+    """Rebuild the threat-intel index when feeds change and map new index files"""
+    while True:
+        await asyncio.sleep(settings.THREAT_INTEL_REFRESH_INTERVAL)
+        try:
+            await threat_intel.refresh()
+        except Exception:
+            logger.exception("Threat-intel refresh failed")
+
+
+async def flush_sketches():
+    """Persist sketch windows once they close"""
+    while True:
+        await asyncio.sleep(settings.SKETCH_FLUSH_INTERVAL)
+        try:
+            async with AsyncSessionLocal() as db:
+                await sketch_store.flush(db)
+        except Exception:
+            logger.exception("Sketch flush failed")
 
 
 @asynccontextmanager
@@ -13,8 +72,41 @@ async def lifespan(app: FastAPI):
     # Startup: Initialize database
     await init_db()
     print("Database initialized")
+
+    async with AsyncSessionLocal() as db:
+        await alert_engine.reload(db)
+    try:
+        await threat_intel.refresh()
+    except Exception:
+        logger.exception("Threat-intel index could not be loaded")
+    rule_refresher = asyncio.create_task(refresh_alert_rules())
+    intel_refresher = asyncio.create_task(refresh_threat_intel())
+    sketch_flusher = asyncio.create_task(flush_sketches())
+    partition_maintainer = asyncio.create_task(maintain_partitions())
+    if settings.ALERT_DELIVERY_ENABLED:
+        alert_dispatcher.start()
+
+    if settings.SYSLOG_ENABLED:
+        syslog_server.active_ingestor = syslog_server.SyslogIngestor()
+        await syslog_server.active_ingestor.start(tail_paths=settings.SYSLOG_TAIL_PATHS)
+        print("Syslog listener started")
+
     yield
-    # Shutdown: cleanup if needed
+
+    # Shutdown: flush buffered syslog lines, coalesced writes and open flows
+    await write_coalescer.stop()
+    rule_refresher.cancel()
+    intel_refresher.cancel()
+    partition_maintainer.cancel()
+    if syslog_server.active_ingestor is not None:
+        await syslog_server.active_ingestor.stop()
+        syslog_server.active_ingestor = None
+    await flow_aggregator.stop()
+    sketch_flusher.cancel()
+    async with AsyncSessionLocal() as db:
+        await sketch_store.flush(db, force=True)
+    await alert_dispatcher.stop()
+    await dispose_engines()
     print("Application shutting down")
 
 
@@ -34,8 +126,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engines()
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -57,3 +154,17 @@ async def health_check():
         "status": "healthy",
         "version": settings.VERSION
     }
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics of this worker process"""
+    if not settings.METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/metrics/slow-queries", dependencies=[Depends(require_roles(UserRole.ADMIN))])
+async def get_slow_queries():
+    """Sampled slow statements of this worker with their parameters and plans (admin only)"""
+    return {"threshold_seconds": settings.SLOW_QUERY_SECONDS, "queries": list(reversed(metrics.slow_queries))}
@@ -1,5 +1,9 @@
 from app.models.firewall_log import FirewallLog
 from app.models.user import User
 from app.models.alert_rule import AlertRule
+from app.models.alert_delivery import AlertDelivery
+from app.models.log_rollup import LogRollup
+from app.models.log_sketch import LogSketch
+from app.models.log_partition import LogPartition
 
-__all__ = ["FirewallLog", "User", "AlertRule"]
+__all__ = ["FirewallLog", "User", "AlertRule", "AlertDelivery", "LogRollup", "LogSketch", "LogPartition"]
@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class AlertDelivery(Base):
+    """Queued notification for one alert firing"""
+
+    __tablename__ = "alert_deliveries"
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Firing
+    rule_id = Column(Integer, nullable=False, index=True)
+    alert_type = Column(String(20), nullable=False)  # email/webhook/sms
+    alert_target = Column(String(255), nullable=False)
+    payload = Column(JSON, nullable=False)  # rule, counts and the triggering event
+
+    # Delivery state
+    status = Column(String(20), nullable=False, default="pending")  # pending/sending/sent/failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=func.now())
+    claim_token = Column(String(32), nullable=True)  # dispatcher holding a "sending" row
+    lease_until = Column(DateTime, nullable=True)  # "sending" rows past this are retried
+    last_error = Column(Text, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime, nullable=False, default=func.now())
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('ix_alert_deliveries_due', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f"<AlertDelivery(id={self.id}, rule_id={self.rule_id}, status={self.status})>"
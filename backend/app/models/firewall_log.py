@@ -1,6 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Text, Index
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, Text, Index, LargeBinary
 from sqlalchemy.sql import func
 from app.core.database import Base
+from app.core.netaddr import PACKED_LENGTH, pack_address
+
+
+def _packed(name: str):
+    """Column default deriving the packed key from the text address"""
+    def default(context):
+        return pack_address(context.get_current_parameters().get(name))
+    return default
 
 
 class FirewallLog(Base):
@@ -15,14 +23,20 @@ class FirewallLog(Base):
     timestamp = Column(DateTime, nullable=False, index=True, default=func.now())
 
     # Network information
-    source_ip = Column(String(45), nullable=False, index=True)  # IPv6 support
+    source_ip = Column(String(45), nullable=False)  # IPv6 support
     source_port = Column(Integer, nullable=True)
-    destination_ip = Column(String(45), nullable=False, index=True)
+    destination_ip = Column(String(45), nullable=False)
     destination_port = Column(Integer, nullable=True)
 
+    # Packed address keys (app.core.netaddr) serving address and CIDR filters;
+    # NULL when the text is not an address. source_ip_bin lookups use the
+    # leading column of idx_source_dest_ip_bin.
+    source_ip_bin = Column(LargeBinary(PACKED_LENGTH), nullable=True, default=_packed("source_ip"))
+    destination_ip_bin = Column(LargeBinary(PACKED_LENGTH), nullable=True, index=True, default=_packed("destination_ip"))
+
     # Protocol information
     protocol = Column(String(10), nullable=False, index=True)  # TCP/UDP/ICMP/etc
-    action = Column(String(10), nullable=False, index=True)  # ALLOW/DENY/DROP
+    action = Column(String(10), nullable=False, index=True)  # ALLOW/DENY/DROP/UNKNOWN
 
     # Direction
     direction = Column(String(10), nullable=False)  # INBOUND/OUTBOUND
@@ -36,6 +50,12 @@ class FirewallLog(Base):
     bytes_received = Column(BigInteger, nullable=True, default=0)
     packet_count = Column(Integer, nullable=True, default=0)
 
+    # Flow records (app.services.flow_aggregator): events folded into this
+    # row and the time span they cover; NULL for a single event
+    event_count = Column(Integer, nullable=True)
+    first_seen = Column(DateTime, nullable=True)
+    last_seen = Column(DateTime, nullable=True)
+
     # Metadata
     log_source = Column(String(100), nullable=True)  # firewall device identifier
     raw_log = Column(Text, nullable=True)  # original log entry
@@ -43,7 +63,7 @@ class FirewallLog(Base):
 
     # Composite indexes for common queries
     __table_args__ = (
-        Index('idx_source_dest_ip', 'source_ip', 'destination_ip'),
+        Index('idx_source_dest_ip_bin', 'source_ip_bin', 'destination_ip_bin'),
         Index('idx_timestamp_action', 'timestamp', 'action'),
         Index('idx_timestamp_severity', 'timestamp', 'severity'),
     )
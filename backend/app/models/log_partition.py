@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, BigInteger
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LogPartition(Base):
+    """Registry of per-day firewall log partition tables"""
+
+    __tablename__ = "log_partitions"
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Partition
+    day = Column(Date, nullable=False, unique=True)
+    table_name = Column(String(64), nullable=False)
+    state = Column(String(20), nullable=False, default="hot")  # hot/closed/archived
+
+    # Statistics, filled in when the partition is closed
+    row_count = Column(BigInteger, nullable=True)
+    min_timestamp = Column(DateTime, nullable=True)
+    max_timestamp = Column(DateTime, nullable=True)
+    max_id = Column(BigInteger, nullable=True)  # Highest archived id; a reopened day continues after it
+
+    # Timestamps
+    created_at = Column(DateTime, server_default=func.now())
+    closed_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<LogPartition(day={self.day}, table={self.table_name}, state={self.state})>"
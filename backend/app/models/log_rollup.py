@@ -0,0 +1,36 @@
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, UniqueConstraint
+from app.core.database import Base
+
+
+class LogRollup(Base):
+    """Pre-aggregated firewall log counters per time bucket and dimension"""
+
+    __tablename__ = "log_rollups"
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Bucket
+    granularity = Column(String(10), nullable=False)  # minute/hour/day
+    bucket_start = Column(DateTime, nullable=False)
+
+    # Dimension, e.g. ("action", "DENY"); ("total", "") holds the bucket totals
+    dimension = Column(String(20), nullable=False)
+    value = Column(String(100), nullable=False, default="")
+
+    # Counters
+    event_count = Column(BigInteger, nullable=False, default=0)
+    bytes_sent = Column(BigInteger, nullable=False, default=0)
+    bytes_received = Column(BigInteger, nullable=False, default=0)
+    packet_count = Column(BigInteger, nullable=False, default=0)
+
+    # Serves both the upsert conflict target and range scans per dimension
+    __table_args__ = (
+        UniqueConstraint('granularity', 'dimension', 'bucket_start', 'value', name='uq_rollup_bucket'),
+    )
+
+    def __repr__(self):
+        return (
+            f"<LogRollup({self.granularity} {self.bucket_start}, "
+            f"{self.dimension}={self.value}, events={self.event_count})>"
+        )
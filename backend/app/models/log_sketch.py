@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index
+from app.core.database import Base
+
+
+class LogSketch(Base):
+    """Serialized approximate-counting sketches for one time window"""
+
+    __tablename__ = "log_sketches"
+
+    # Primary key
+    id = Column(Integer, primary_key=True)
+
+    # Window and group; several rows per key are merged at read time
+    window_start = Column(DateTime, nullable=False)
+    window_seconds = Column(Integer, nullable=False)
+    log_source = Column(String(100), nullable=False, default="")
+    action = Column(String(10), nullable=False)
+
+    # zlib-compressed Count-Min / HyperLogLog / Space-Saving state
+    payload = Column(LargeBinary, nullable=False)
+
+    __table_args__ = (
+        Index('ix_log_sketches_window', 'window_start', 'log_source', 'action'),
+    )
+
+    def __repr__(self):
+        return f"<LogSketch({self.window_start}, {self.log_source}/{self.action}, {len(self.payload or b'')} bytes)>"
@@ -35,6 +35,7 @@ class User(Base):
     last_login = Column(DateTime, nullable=True)
     login_count = Column(Integer, default=0, nullable=False)
     failed_login_attempts = Column(Integer, default=0, nullable=False)
+    locked_until = Column(DateTime, nullable=True)  # Set when failures reach LOGIN_MAX_FAILED_ATTEMPTS
 
     # Timestamps
     created_at = Column(DateTime, nullable=False, default=func.now())
@@ -1,4 +1,11 @@
-from app.schemas.firewall_log import FirewallLogBase, FirewallLogCreate, FirewallLogUpdate, FirewallLogResponse
+from app.schemas.firewall_log import (
+    FirewallLogBase,
+    FirewallLogCreate,
+    FirewallLogUpdate,
+    FirewallLogResponse,
+    FirewallLogBulkError,
+    FirewallLogBulkResponse,
+)
 from app.schemas.user import UserBase, UserCreate, UserUpdate, UserResponse, Token, TokenData
 from app.schemas.alert_rule import AlertRuleBase, AlertRuleCreate, AlertRuleUpdate, AlertRuleResponse
 
@@ -7,6 +14,8 @@ __all__ = [
     "FirewallLogCreate",
     "FirewallLogUpdate",
     "FirewallLogResponse",
+    "FirewallLogBulkError",
+    "FirewallLogBulkResponse",
     "UserBase",
     "UserCreate",
     "UserUpdate",
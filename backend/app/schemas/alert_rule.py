@@ -45,3 +45,21 @@ class AlertRuleResponse(AlertRuleBase):
 
     class Config:
         from_attributes = True
+
+
+class AlertDeliveryResponse(BaseModel):
+    """Schema for a queued alert notification"""
+    id: int
+    rule_id: int
+    alert_type: str
+    alert_target: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
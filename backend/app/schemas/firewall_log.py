@@ -1,6 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List, Dict, Any
+
+from app.core.timeutil import naive_utc
 
 
 class FirewallLogBase(BaseModel):
@@ -22,6 +24,12 @@ class FirewallLogBase(BaseModel):
     raw_log: Optional[str] = None
     description: Optional[str] = None
 
+    @field_validator("timestamp")
+    @classmethod
+    def _timestamp_utc(cls, value: datetime) -> datetime:
+        # Stored, partitioned and bucketed as naive UTC
+        return naive_utc(value)
+
 
 class FirewallLogCreate(FirewallLogBase):
     """Schema for creating a firewall log"""
@@ -38,6 +46,24 @@ class FirewallLogUpdate(BaseModel):
 class FirewallLogResponse(FirewallLogBase):
     """Schema for firewall log response"""
     id: int
+    # Set by flow aggregation only; clients cannot submit them
+    event_count: Optional[int] = None
+    first_seen: Optional[datetime] = None
+    last_seen: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+class FirewallLogBulkError(BaseModel):
+    """Validation errors for a single record of a bulk request"""
+    index: int
+    errors: List[Dict[str, Any]]
+
+
+class FirewallLogBulkResponse(BaseModel):
+    """Schema for bulk log ingestion result"""
+    accepted: int
+    rejected: int
+    ids: Optional[List[int]] = None
+    errors: List[FirewallLogBulkError] = []
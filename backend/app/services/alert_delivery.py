@@ -0,0 +1,538 @@
+"""
+Asynchronous delivery of alert notifications (email, webhook, SMS).
+
+Firings are queued in alert_deliveries in the same transaction that
+records AlertRule.last_triggered, so ingestion only ever pays for one
+INSERT per firing. A dispatcher polls the queue (and is woken right away
+by firings of its own process), claims due rows with a lease, and groups
+them by (alert_type, alert_target) into digest messages of up to
+ALERT_DELIVERY_DIGEST_MAX firings.
+
+Each digest is sent in its own task, at most ALERT_DELIVERY_PER_TARGET
+at a time per target and ALERT_DELIVERY_MAX_IN_FLIGHT overall, so a slow
+or dead endpoint only holds back its own messages. A poll claims no more
+rows than the free send slots can take as full digests. Webhooks and the SMS
+gateway share one pooled HTTP client; email goes through a small pool of
+reused SMTP connections. Failures are retried with jittered exponential
+backoff until ALERT_DELIVERY_MAX_ATTEMPTS; errors that cannot succeed on
+retry (4xx responses, refused recipients, missing configuration,
+disallowed webhook targets) fail the delivery at once. Rows left
+"sending" by a crashed dispatcher are picked up again when their lease
+expires.
+"""
+import asyncio
+import ipaddress
+import logging
+import random
+import smtplib
+import threading
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import httpx
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.alert_delivery import AlertDelivery
+from app.services.alert_engine import AlertFiring
+
+logger = logging.getLogger(__name__)
+
+ALERT_TYPES = ("email", "webhook", "sms")
+# Event fields carried in a delivery payload
+EVENT_FIELDS = (
+    "id", "timestamp", "source_ip", "source_port", "destination_ip", "destination_port",
+    "protocol", "action", "severity", "threat_type", "log_source",
+)
+
+_table = AlertDelivery.__table__
+
+
+class DeliveryError(Exception):
+    """A failed send; permanent errors are not retried"""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def delivery_payload(firing: AlertFiring) -> Dict[str, Any]:
+    return {
+        "rule_id": firing.rule_id,
+        "rule_name": firing.rule_name,
+        "priority": firing.priority,
+        "triggered_at": _json_value(firing.triggered_at),
+        "match_count": firing.match_count,
+        "threshold_period": firing.threshold_period,
+        "log_id": firing.log_id,
+        "event": {name: _json_value(firing.event.get(name)) for name in EVENT_FIELDS if name in firing.event},
+    }
+
+
+async def enqueue_deliveries(db: AsyncSession, firings: List[AlertFiring]) -> int:
+    """Queue one delivery per firing; the caller commits"""
+    now = datetime.utcnow()
+    rows = [
+        {
+            "rule_id": firing.rule_id,
+            "alert_type": (firing.alert_type or "").lower(),
+            "alert_target": firing.alert_target,
+            "payload": delivery_payload(firing),
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for firing in firings
+        if firing.alert_target
+    ]
+    if rows:
+        await db.execute(_table.insert(), rows)
+    return len(rows)
+
+
+def format_digest(payloads: List[Dict[str, Any]]) -> Tuple[str, str]:
+    """Subject and plain-text body for a group of firings"""
+    rules = sorted({payload["rule_name"] for payload in payloads})
+    subject = f"[Firewall alert] {len(payloads)} firing(s): {', '.join(rules)}"
+    lines = []
+    for payload in payloads:
+        event = payload.get("event", {})
+        lines.append(
+            f"{payload['triggered_at']}  {payload['rule_name']} (priority {payload['priority']}): "
+            f"{payload['match_count']} matches within {payload['threshold_period']}s"
+        )
+        if event:
+            lines.append(
+                f"    {event.get('action')} {event.get('protocol')} "
+                f"{event.get('source_ip')}:{event.get('source_port')} -> "
+                f"{event.get('destination_ip')}:{event.get('destination_port')} "
+                f"severity={event.get('severity')} threat={event.get('threat_type')}"
+            )
+    return subject, "\n".join(lines)
+
+
+def webhook_target_error(url: str) -> Optional[str]:
+    """
+    Why url may not be a webhook target, None if it may.
+
+    With ALERT_WEBHOOK_ALLOWED_HOSTS set only those hosts are accepted;
+    otherwise any host except loopback, private, link-local and other
+    non-public addresses (unless ALERT_WEBHOOK_ALLOW_PRIVATE).
+    """
+    try:
+        parsed = httpx.URL(url)
+    except Exception:
+        return "not a valid URL"
+    if parsed.scheme not in ("http", "https"):
+        return "must be an http or https URL"
+    host = (parsed.host or "").lower().rstrip(".")
+    if not host:
+        return "has no host"
+
+    allowed = [entry.lower() for entry in settings.ALERT_WEBHOOK_ALLOWED_HOSTS]
+    if allowed:
+        if any(host == entry or (entry.startswith(".") and host.endswith(entry)) for entry in allowed):
+            return None
+        return f"host {host} is not in ALERT_WEBHOOK_ALLOWED_HOSTS"
+    if settings.ALERT_WEBHOOK_ALLOW_PRIVATE:
+        return None
+    if host == "localhost" or host.endswith(".localhost"):
+        return f"host {host} is not a public address"
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None  # names are checked again after resolution, when sending
+    if not address.is_global:
+        return f"host {host} is not a public address"
+    return None
+
+
+async def _check_resolved_webhook(url: str) -> None:
+    """Refuse hostnames that resolve to non-public addresses"""
+    if settings.ALERT_WEBHOOK_ALLOWED_HOSTS or settings.ALERT_WEBHOOK_ALLOW_PRIVATE:
+        return
+    parsed = httpx.URL(url)
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.host, parsed.port or None)
+    except OSError as exc:
+        raise DeliveryError(f"Cannot resolve {parsed.host}: {exc}")
+    for info in infos:
+        if not ipaddress.ip_address(info[4][0].split("%")[0]).is_global:
+            raise DeliveryError(f"Webhook host {parsed.host} resolves to a non-public address", permanent=True)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts`, with +/-25% jitter"""
+    delay = min(settings.ALERT_DELIVERY_BACKOFF_BASE * 2 ** max(attempts - 1, 0), settings.ALERT_DELIVERY_BACKOFF_MAX)
+    return delay * random.uniform(0.75, 1.25)
+
+
+# ----------------------------------------------------------------------
+# Transports
+# ----------------------------------------------------------------------
+
+
+def _check_response(response: httpx.Response) -> None:
+    if response.is_success:
+        return
+    message = f"HTTP {response.status_code} from {response.request.url}"
+    # Client errors other than timeouts/throttling will fail the same way again
+    permanent = 400 <= response.status_code < 500 and response.status_code not in (408, 429)
+    raise DeliveryError(message, permanent=permanent)
+
+
+class SMTPPool:
+    """Reusable SMTP connections, used from worker threads"""
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._idle: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        connection = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.ALERT_DELIVERY_TIMEOUT)
+        if settings.SMTP_STARTTLS:
+            connection.starttls()
+        if settings.SMTP_USERNAME:
+            connection.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+        return connection
+
+    def _take(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return self._connect()
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(connection)
+
+    @staticmethod
+    def _discard(connection: smtplib.SMTP) -> None:
+        try:
+            connection.close()
+        except OSError:
+            pass
+
+    def send(self, message: EmailMessage) -> None:
+        with self._slots:
+            try:
+                connection = self._take()
+            except (smtplib.SMTPException, OSError) as exc:
+                raise DeliveryError(f"SMTP connect failed: {exc}")
+            try:
+                connection.send_message(message)
+            except smtplib.SMTPRecipientsRefused as exc:
+                self._release(connection)
+                raise DeliveryError(f"Recipients refused: {exc.recipients}", permanent=True)
+            except smtplib.SMTPResponseException as exc:
+                self._release(connection)
+                raise DeliveryError(f"SMTP {exc.smtp_code}: {exc.smtp_error!r}", permanent=exc.smtp_code >= 500)
+            except (smtplib.SMTPException, OSError) as exc:
+                self._discard(connection)
+                raise DeliveryError(f"SMTP send failed: {exc}")
+            self._release(connection)
+
+    def _release(self, connection: smtplib.SMTP) -> None:
+        try:
+            connection.rset()
+        except (smtplib.SMTPException, OSError):
+            self._discard(connection)
+            return
+        with self._lock:
+            self._idle.append(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            try:
+                connection.quit()
+            except (smtplib.SMTPException, OSError):
+                self._discard(connection)
+
+
+class Transports:
+    """Shared HTTP client and SMTP pool"""
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self._smtp: Optional[SMTPPool] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            size = settings.ALERT_WEBHOOK_POOL_SIZE
+            self._client = httpx.AsyncClient(
+                timeout=settings.ALERT_DELIVERY_TIMEOUT,
+                limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+            )
+        return self._client
+
+    @property
+    def smtp(self) -> SMTPPool:
+        if self._smtp is None:
+            self._smtp = SMTPPool(settings.SMTP_POOL_SIZE)
+        return self._smtp
+
+    async def send(self, alert_type: str, target: str, payloads: List[Dict[str, Any]]) -> None:
+        subject, body = format_digest(payloads)
+        try:
+            if alert_type == "webhook":
+                reason = webhook_target_error(target)
+                if reason is not None:
+                    raise DeliveryError(f"Webhook target {reason}", permanent=True)
+                await _check_resolved_webhook(target)
+                response = await self.client.post(
+                    target,
+                    json={"type": "firewall_alerts", "count": len(payloads), "alerts": payloads},
+                )
+                _check_response(response)
+            elif alert_type == "sms":
+                if not settings.SMS_GATEWAY_URL:
+                    raise DeliveryError("SMS_GATEWAY_URL is not configured", permanent=True)
+                response = await self.client.post(
+                    settings.SMS_GATEWAY_URL,
+                    json={"to": target, "message": f"{subject}\n{body}"[:480]},
+                )
+                _check_response(response)
+            elif alert_type == "email":
+                if not settings.SMTP_HOST:
+                    raise DeliveryError("SMTP_HOST is not configured", permanent=True)
+                message = EmailMessage()
+                message["From"] = settings.SMTP_FROM
+                message["To"] = target
+                message["Subject"] = subject
+                message.set_content(body)
+                await asyncio.to_thread(self.smtp.send, message)
+            else:
+                raise DeliveryError(f"Unknown alert type {alert_type!r}", permanent=True)
+        except httpx.HTTPError as exc:
+            raise DeliveryError(f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._smtp is not None:
+            await asyncio.to_thread(self._smtp.close)
+            self._smtp = None
+
+
+# ----------------------------------------------------------------------
+# Dispatcher
+# ----------------------------------------------------------------------
+
+
+@dataclass
+class _Claimed:
+    id: int
+    alert_type: str
+    alert_target: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class AlertDispatcher:
+    """Claims due deliveries and sends them as per-target digests"""
+
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+        self.transports = Transports()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._send_slots = asyncio.Semaphore(max(settings.ALERT_DELIVERY_MAX_IN_FLIGHT, 1))
+        # Per-target slots and the number of sends holding or awaiting them
+        self._target_slots: Dict[Tuple[str, str], asyncio.Semaphore] = {}
+        self._target_users: Dict[Tuple[str, str], int] = {}
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.messages = 0
+
+    def notify(self) -> None:
+        """Wake the dispatcher for newly queued deliveries"""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._in_flight:
+            # Let running sends finish their exchange (bounded by the timeout)
+            await asyncio.wait(self._in_flight, timeout=settings.ALERT_DELIVERY_TIMEOUT)
+        await self.transports.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.dispatch_once()
+            except Exception:
+                logger.exception("Alert delivery poll failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.ALERT_DELIVERY_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def claim(self, db: AsyncSession, limit: int) -> List[_Claimed]:
+        """Lease up to limit due deliveries to this dispatcher"""
+        now = datetime.utcnow()
+        c = _table.c
+        await db.execute(
+            update(_table)
+            .where(c.status == "sending", c.lease_until < now)
+            .values(status="pending", claim_token=None)
+        )
+        token = uuid.uuid4().hex
+        due = (
+            select(c.id)
+            .where(c.status == "pending", c.next_attempt_at <= now)
+            .order_by(c.next_attempt_at)
+            .limit(limit)
+        )
+        await db.execute(
+            update(_table)
+            .where(c.id.in_(due.scalar_subquery()), c.status == "pending")
+            .values(
+                status="sending",
+                claim_token=token,
+                lease_until=now + timedelta(seconds=settings.ALERT_DELIVERY_LEASE_SECONDS),
+            )
+        )
+        await db.commit()
+        result = await db.execute(
+            select(c.id, c.alert_type, c.alert_target, c.payload, c.attempts)
+            .where(c.claim_token == token, c.status == "sending")
+            .order_by(c.id)
+        )
+        return [_Claimed(*row) for row in result.all()]
+
+    async def dispatch_once(self) -> int:
+        """Claim due deliveries and start their sends; returns how many were claimed"""
+        capacity = settings.ALERT_DELIVERY_MAX_IN_FLIGHT - len(self._in_flight)
+        if capacity <= 0:
+            return 0
+        digest_max = max(settings.ALERT_DELIVERY_DIGEST_MAX, 1)
+        async with self.session_factory() as db:
+            claimed = await self.claim(db, min(settings.ALERT_DELIVERY_BATCH_SIZE, capacity * digest_max))
+
+        groups: Dict[Tuple[str, str], List[_Claimed]] = {}
+        for delivery in claimed:
+            groups.setdefault((delivery.alert_type, delivery.alert_target), []).append(delivery)
+        for key, deliveries in groups.items():
+            for start in range(0, len(deliveries), digest_max):
+                task = asyncio.create_task(self._deliver(key, deliveries[start:start + digest_max]))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+        return len(claimed)
+
+    async def drain(self) -> None:
+        """Wait until every started send has finished (for tests and shutdown)"""
+        while self._in_flight:
+            await asyncio.wait(set(self._in_flight))
+
+    async def _deliver(self, key: Tuple[str, str], deliveries: List[_Claimed]) -> None:
+        slots = self._target_slots.get(key)
+        if slots is None:
+            slots = self._target_slots[key] = asyncio.Semaphore(max(settings.ALERT_DELIVERY_PER_TARGET, 1))
+        self._target_users[key] = self._target_users.get(key, 0) + 1
+        error: Optional[DeliveryError] = None
+        try:
+            # Target first, so a send waiting on a busy target holds no global slot
+            async with slots, self._send_slots:
+                try:
+                    await self.transports.send(key[0], key[1], [delivery.payload for delivery in deliveries])
+                except DeliveryError as exc:
+                    error = exc
+                except Exception as exc:
+                    logger.exception("Unexpected alert delivery failure for %s %s", *key)
+                    error = DeliveryError(f"{type(exc).__name__}: {exc}")
+        finally:
+            self._target_users[key] -= 1
+            if not self._target_users[key]:
+                del self._target_users[key]
+                del self._target_slots[key]
+
+        self.messages += 1
+        try:
+            await self._record(deliveries, error)
+        except Exception:
+            # The lease expires and the deliveries are sent again
+            logger.exception("Recording alert delivery results failed")
+
+    async def _record(self, deliveries: List[_Claimed], error: Optional[DeliveryError]) -> None:
+        now = datetime.utcnow()
+        c = _table.c
+        params = []
+        for delivery in deliveries:
+            attempts = delivery.attempts + 1
+            if error is None:
+                status, next_attempt_at = "sent", now
+                self.sent += 1
+            elif error.permanent or attempts >= settings.ALERT_DELIVERY_MAX_ATTEMPTS:
+                status, next_attempt_at = "failed", now
+                self.failed += 1
+            else:
+                status, next_attempt_at = "pending", now + timedelta(seconds=backoff_delay(attempts))
+                self.retried += 1
+            params.append({
+                "delivery_id": delivery.id,
+                "new_status": status,
+                "new_attempts": attempts,
+                "new_next_attempt_at": next_attempt_at,
+                "new_error": str(error) if error is not None else None,
+                "new_sent_at": now if error is None else None,
+            })
+        if error is not None:
+            logger.warning(
+                "Alert delivery to %s %s failed (%s): %s",
+                deliveries[0].alert_type, deliveries[0].alert_target,
+                "permanent" if error.permanent else "will retry", error,
+            )
+        statement = (
+            update(_table)
+            .where(c.id == bindparam("delivery_id"))
+            .values(
+                status=bindparam("new_status"),
+                attempts=bindparam("new_attempts"),
+                next_attempt_at=bindparam("new_next_attempt_at"),
+                last_error=bindparam("new_error"),
+                sent_at=bindparam("new_sent_at"),
+                claim_token=None,
+                lease_until=None,
+            )
+        )
+        async with self.session_factory() as db:
+            await db.execute(statement, params)
+            await db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "in_flight": len(self._in_flight),
+            "messages": self.messages,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+
+# Process-wide dispatcher started by the API lifespan
+alert_dispatcher = AlertDispatcher()
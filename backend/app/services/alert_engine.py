@@ -0,0 +1,238 @@
+"""
+In-process evaluation of AlertRule conditions against ingested logs.
+
+Enabled rules are compiled once into a ConditionIndex, so an event is only
+tested against rules whose anchor field matches it. Each rule keeps the
+timestamps of its last `threshold_count` matches in a bounded deque: the
+rule fires when that many matches fall inside `threshold_period` seconds
+and the rule is outside its `cooldown_period`. Nothing here touches the
+database per event; callers persist `last_triggered` in batches.
+"""
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.alert_rule import AlertRule
+from app.services.conditions import ConditionError, ConditionIndex, compile_conditions
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    """Seconds since the epoch for a naive UTC datetime"""
+    if value is None:
+        return None
+    return (value - _EPOCH).total_seconds()
+
+
+@dataclass
+class AlertFiring:
+    """A rule crossing its threshold"""
+    rule_id: int
+    rule_name: str
+    priority: int
+    alert_type: str
+    alert_target: str
+    triggered_at: datetime
+    match_count: int
+    threshold_period: int
+    log_id: Optional[int] = None
+    event: Dict[str, Any] = field(default_factory=dict)
+
+
+class _RuleState:
+    """Compiled settings plus sliding-window state of one rule"""
+
+    __slots__ = (
+        "rule_id", "name", "priority", "alert_type", "alert_target",
+        "threshold_count", "threshold_period", "cooldown_period",
+        "window", "last_triggered",
+    )
+
+    def __init__(self, rule: AlertRule, previous: Optional["_RuleState"] = None):
+        self.rule_id = rule.id
+        self.name = rule.name
+        self.priority = rule.priority
+        self.alert_type = rule.alert_type
+        self.alert_target = rule.alert_target
+        self.threshold_count = max(rule.threshold_count or 1, 1)
+        self.threshold_period = rule.threshold_period or 0
+        self.cooldown_period = rule.cooldown_period or 0
+
+        # Keep recent matches across edits so a PATCH doesn't reset windows
+        recent = previous.window if previous is not None else ()
+        self.window: Deque[float] = deque(recent, maxlen=self.threshold_count)
+        self.last_triggered = _epoch(rule.last_triggered)
+        if previous is not None and previous.last_triggered is not None:
+            if self.last_triggered is None or previous.last_triggered > self.last_triggered:
+                self.last_triggered = previous.last_triggered
+
+    def observe(self, ts: float, count: int = 1, first: Optional[float] = None) -> bool:
+        """
+        Record count matches ending at ts; True when the rule should fire.
+
+        A flow record's events are taken as evenly spread over [first, ts];
+        only the last threshold_count of them can matter to the window.
+        """
+        window = self.window
+        if count > 1 and first is not None and first < ts:
+            step = (ts - first) / (count - 1)
+            for back in range(min(count, self.threshold_count) - 1, 0, -1):
+                window.append(ts - back * step)
+        elif count > 1:
+            window.extend([ts] * (min(count, self.threshold_count) - 1))
+        window.append(ts)
+        if len(window) < self.threshold_count or ts - window[0] > self.threshold_period:
+            return False
+        if self.last_triggered is not None and ts - self.last_triggered < self.cooldown_period:
+            return False
+        self.last_triggered = ts
+        window.clear()
+        return True
+
+
+class AlertEngine:
+    """Evaluates ingested events against all enabled alert rules"""
+
+    def __init__(self):
+        self._index = ConditionIndex()
+        self._states: Dict[int, _RuleState] = {}
+        self._listeners: List[Callable[[List[AlertFiring]], Any]] = []
+        # Highest AlertRule.updated_at seen, for incremental refreshes
+        self._watermark: Optional[datetime] = None
+        self.events_evaluated = 0
+        self.alerts_fired = 0
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def add_listener(self, callback: Callable[[List[AlertFiring]], Any]) -> None:
+        """Register a callable receiving every non-empty list of firings"""
+        self._listeners.append(callback)
+
+    # ------------------------------------------------------------------
+    # Rule management
+    # ------------------------------------------------------------------
+
+    def upsert_rule(self, rule: AlertRule) -> None:
+        """Add, replace or (when disabled) drop one rule"""
+        if rule.updated_at is not None and (self._watermark is None or rule.updated_at > self._watermark):
+            self._watermark = rule.updated_at
+
+        if not rule.is_enabled:
+            self.remove_rule(rule.id)
+            return
+        try:
+            compiled = compile_conditions(rule.conditions)
+        except ConditionError as e:
+            logger.warning("Skipping alert rule %s (%s): %s", rule.id, rule.name, e)
+            self.remove_rule(rule.id)
+            return
+
+        self._states[rule.id] = _RuleState(rule, self._states.get(rule.id))
+        self._index.add(rule.id, compiled)
+
+    def remove_rule(self, rule_id: int) -> None:
+        self._index.remove(rule_id)
+        self._states.pop(rule_id, None)
+
+    def load(self, rules: Iterable[AlertRule]) -> None:
+        """Replace the rule set, keeping window state of unchanged rules"""
+        rules = list(rules)
+        keep = {rule.id for rule in rules if rule.is_enabled}
+        for rule_id in list(self._states):
+            if rule_id not in keep:
+                self.remove_rule(rule_id)
+        for rule in rules:
+            self.upsert_rule(rule)
+
+    async def reload(self, db: AsyncSession) -> None:
+        """Load every enabled rule from the database"""
+        result = await db.execute(select(AlertRule).where(AlertRule.is_enabled == True))
+        self.load(result.scalars().all())
+        logger.info("Alert engine loaded %d rules", len(self))
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """Apply rules changed since the last load or refresh; returns how many"""
+        if self._watermark is None:
+            await self.reload(db)
+            return len(self)
+        # updated_at has second resolution on SQLite; re-applying a rule is harmless
+        result = await db.execute(select(AlertRule).where(AlertRule.updated_at >= self._watermark))
+        rules = result.scalars().all()
+        for rule in rules:
+            self.upsert_rule(rule)
+        return len(rules)
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+
+    def evaluate(self, event: Dict[str, Any]) -> List[AlertFiring]:
+        """Evaluate a single event (a FirewallLog row dict)"""
+        return self.evaluate_many((event,), notify=False)
+
+    def evaluate_many(self, events: Iterable[Dict[str, Any]], notify: bool = True) -> List[AlertFiring]:
+        """Evaluate a batch of events in order and notify listeners of firings"""
+        firings: List[AlertFiring] = []
+        if not self._states:
+            return firings
+
+        match = self._index.match
+        states = self._states
+        count = 0
+        for event in events:
+            count += 1
+            rule_ids = match(event)
+            if not rule_ids:
+                continue
+            n_events = event.get("event_count") or 1
+            timestamp = event.get("last_seen") or event.get("timestamp") or datetime.utcnow()
+            ts = _epoch(timestamp)
+            first = _epoch(event.get("first_seen")) if n_events > 1 else None
+            for rule_id in rule_ids:
+                state = states[rule_id]
+                if state.observe(ts, n_events, first):
+                    firings.append(AlertFiring(
+                        rule_id=state.rule_id,
+                        rule_name=state.name,
+                        priority=state.priority,
+                        alert_type=state.alert_type,
+                        alert_target=state.alert_target,
+                        triggered_at=timestamp,
+                        match_count=state.threshold_count,
+                        threshold_period=state.threshold_period,
+                        log_id=event.get("id"),
+                        event=event,
+                    ))
+
+        self.events_evaluated += count
+        if firings:
+            self.alerts_fired += len(firings)
+            if notify:
+                for listener in self._listeners:
+                    try:
+                        listener(firings)
+                    except Exception:
+                        logger.exception("Alert listener %r failed", listener)
+        return firings
+
+
+def _log_firings(firings: List[AlertFiring]) -> None:
+    for firing in firings:
+        logger.warning(
+            "Alert rule %s (%s) fired: %d matches within %ds",
+            firing.rule_id, firing.rule_name, firing.match_count, firing.threshold_period,
+        )
+
+
+# Process-wide engine fed by the ingestion path
+alert_engine = AlertEngine()
+alert_engine.add_listener(_log_firings)
@@ -0,0 +1,466 @@
+"""
+Vectorized analytics over a columnar in-memory window of firewall logs.
+
+A window is loaded once per (time range, filters): only the analysed
+columns are selected, timestamps arrive as epoch seconds computed by the
+database (no datetime parsing), addresses and enum columns are
+dictionary-coded to integers, and archive files are decoded straight from
+Arrow. Group-bys, histograms, percentiles and rates then run as NumPy
+bincount/unique/lexsort passes, and recently used windows are cached for
+ANALYTICS_CACHE_TTL seconds so repeated anomaly views skip the load.
+Event counts weigh flow records by their event_count; histograms and
+percentiles describe stored rows.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import BigInteger, Integer, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import register_cache
+from app.core.config import settings
+from app.services import archive, partitions
+from app.services.log_query import LogFilters, filter_conditions
+
+CODED_COLUMNS = ("source_ip", "destination_ip", "protocol", "action", "severity")
+METRICS = ("bytes_sent", "bytes_received", "packet_count")
+GROUP_COLUMNS = CODED_COLUMNS + ("destination_port",)
+
+_EPOCH = datetime(1970, 1, 1)
+_LOAD_BATCH = 100000
+
+
+class AnalyticsError(ValueError):
+    """Raised for windows or parameters the engine cannot serve"""
+
+
+class _Encoder:
+    """Assigns dense integer codes to string values"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def encode(self, values: Sequence[Optional[str]]) -> np.ndarray:
+        # Deduplicate and look up at C speed; only distinct values loop in Python
+        uniques = list(dict.fromkeys(values))
+        local = {value: position for position, value in enumerate(uniques)}
+        codes = np.fromiter(map(local.__getitem__, values), dtype=np.int32, count=len(values))
+        return self.codes(uniques)[codes]
+
+    def codes(self, uniques: Sequence[Optional[str]]) -> np.ndarray:
+        """Global codes of distinct values, assigning new ones as needed"""
+        index, known = self.index, self.values
+        result = np.empty(len(uniques), dtype=np.int32)
+        for position, value in enumerate(uniques):
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(known)
+                known.append(value)
+            result[position] = code
+        return result
+
+
+@dataclass
+class LogWindow:
+    """Columnar copy of the logs in [start, end) matching some filters"""
+    start: int  # epoch seconds
+    end: int
+    timestamp: np.ndarray  # int64 epoch seconds
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+    categories: Dict[str, List[Optional[str]]] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def decode(self, name: str, codes: np.ndarray) -> List[Any]:
+        if name in self.categories:
+            values = self.categories[name]
+            return [values[code] for code in codes.tolist()]
+        return [None if code < 0 else code for code in codes.tolist()]
+
+
+# ----------------------------------------------------------------------
+# Loading
+# ----------------------------------------------------------------------
+
+
+def _epoch_seconds(column, dialect: str):
+    if dialect == "postgresql":
+        return cast(func.extract("epoch", column), BigInteger)
+    return cast(func.strftime("%s", column), Integer)
+
+
+class _WindowBuilder:
+    def __init__(self):
+        self.encoders = {name: _Encoder() for name in CODED_COLUMNS}
+        self.chunks: Dict[str, List[np.ndarray]] = {
+            name: [] for name in ("timestamp", "destination_port", "event_count") + CODED_COLUMNS + METRICS
+        }
+        self.rows = 0
+
+    def _grow(self, count: int) -> None:
+        self.rows += count
+        if self.rows > settings.ANALYTICS_MAX_ROWS:
+            raise AnalyticsError(
+                f"More than {settings.ANALYTICS_MAX_ROWS} rows in range; narrow the time range or filters"
+            )
+
+    def add_rows(self, rows: List[tuple]) -> None:
+        """Rows of (epoch, source_ip, destination_ip, protocol, action, severity, port, *metrics, events)"""
+        if not rows:
+            return
+        self._grow(len(rows))
+        columns = list(zip(*rows))
+        self.chunks["timestamp"].append(np.array(columns[0], dtype=np.int64))
+        for offset, name in enumerate(CODED_COLUMNS, start=1):
+            self.chunks[name].append(self.encoders[name].encode(columns[offset]))
+        self.chunks["destination_port"].append(np.array(columns[6], dtype=np.int32))
+        for offset, name in enumerate(METRICS, start=7):
+            self.chunks[name].append(np.array(columns[offset], dtype=np.int64))
+        self.chunks["event_count"].append(np.array(columns[7 + len(METRICS)], dtype=np.int64))
+
+    def add_arrow(self, table) -> None:
+        """A filtered archive row group"""
+        if not table.num_rows:
+            return
+        self._grow(table.num_rows)
+        pa, pc = archive.pa, archive.pc
+        micros = pc.cast(table["timestamp"], pa.int64()).to_numpy(zero_copy_only=False)
+        self.chunks["timestamp"].append(micros // 1000000)
+
+        for name in CODED_COLUMNS:
+            if name in archive.IP_COLUMNS:
+                column = table[name].combine_chunks()
+                coded = column.dictionary_encode()
+                values = [None if v is None else archive.unpack_ip(v) for v in coded.dictionary.to_pylist()]
+                codes = self._remap(name, values, coded.indices)
+                text = table[f"{name}_text"].combine_chunks()
+                if text.null_count < len(text):
+                    positions = np.flatnonzero(text.is_valid().to_numpy(zero_copy_only=False))
+                    overrides = text.take(pa.array(positions)).to_pylist()
+                    codes[positions] = self.encoders[name].encode(overrides)
+            else:
+                column = table[name].unify_dictionaries().combine_chunks()
+                codes = self._remap(name, column.dictionary.to_pylist(), column.indices)
+            self.chunks[name].append(codes)
+
+        ports = pc.fill_null(table["destination_port"], -1).to_numpy(zero_copy_only=False)
+        self.chunks["destination_port"].append(ports.astype(np.int32))
+        for name in METRICS:
+            values = pc.fill_null(table[name], 0).to_numpy(zero_copy_only=False)
+            self.chunks[name].append(values.astype(np.int64))
+        if "event_count" in table.column_names:
+            events = pc.fill_null(table["event_count"], 1).to_numpy(zero_copy_only=False).astype(np.int64)
+        else:
+            events = np.ones(table.num_rows, dtype=np.int64)  # archived before flow records
+        self.chunks["event_count"].append(events)
+
+    def _remap(self, name: str, dictionary: List[Optional[str]], indices) -> np.ndarray:
+        mapping = self.encoders[name].codes(dictionary + [None])
+        local = archive.pc.fill_null(indices, len(dictionary)).to_numpy(zero_copy_only=False)
+        return mapping[local]
+
+    def build(self, start: int, end: int) -> LogWindow:
+        def join(name, dtype):
+            parts = self.chunks[name]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+        window = LogWindow(start=start, end=end, timestamp=join("timestamp", np.int64))
+        for name in CODED_COLUMNS:
+            window.columns[name] = join(name, np.int32)
+            window.categories[name] = self.encoders[name].values
+        window.columns["destination_port"] = join("destination_port", np.int32)
+        window.columns["event_count"] = join("event_count", np.int64)
+        for name in METRICS:
+            window.columns[name] = join(name, np.int64)
+        return window
+
+
+async def load_window(db: AsyncSession, filters: LogFilters) -> LogWindow:
+    """Load the rows matching filters (start_time and end_time required)"""
+    if filters.start_time is None or filters.end_time is None:
+        raise AnalyticsError("start_time and end_time are required")
+    if filters.start_time >= filters.end_time:
+        raise AnalyticsError("start_time must be before end_time")
+
+    builder = _WindowBuilder()
+    dialect = db.get_bind().dialect.name
+    for table in await partitions.log_tables(db, filters.start_time, filters.end_time):
+        c = table.c
+        query = select(
+            _epoch_seconds(c.timestamp, dialect),
+            c.source_ip, c.destination_ip, c.protocol, c.action, c.severity,
+            func.coalesce(c.destination_port, -1),
+            *[func.coalesce(c[name], 0) for name in METRICS],
+            func.coalesce(c.event_count, 1),
+        ).where(*filter_conditions(filters, table)).execution_options(yield_per=_LOAD_BATCH)
+        stream = await db.stream(query)
+        async for batch in stream.partitions(_LOAD_BATCH):
+            builder.add_rows(batch)
+
+    for partition in await partitions.list_partitions(db, filters.start_time, filters.end_time):
+        path = partitions.archive_path(partition.day)
+        if path.exists():
+            await asyncio.to_thread(_load_archive, builder, path, filters)
+
+    return builder.build(
+        int((filters.start_time - _EPOCH).total_seconds()),
+        int((filters.end_time - _EPOCH).total_seconds()),
+    )
+
+
+def _load_archive(builder: _WindowBuilder, path, filters: LogFilters) -> None:
+    parquet = archive.pq.ParquetFile(path)
+    metadata = parquet.metadata
+    positions = {metadata.schema.column(i).name: i for i in range(metadata.num_columns)}
+    expression = archive.filter_expression(filters, None)
+    for index in range(parquet.num_row_groups):
+        if not archive.row_group_may_match(metadata.row_group(index), positions, filters, None):
+            continue
+        table = parquet.read_row_group(index)
+        if expression is not None:
+            table = table.filter(expression)
+        builder.add_arrow(table)
+
+
+class WindowCache:
+    """Small TTL/LRU cache of loaded windows"""
+
+    def __init__(self):
+        self._entries: "OrderedDict[Tuple, Tuple[float, LogWindow]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, db: AsyncSession, filters: LogFilters) -> LogWindow:
+        key = tuple(
+            tuple(value) if isinstance(value, list) else value
+            for value in vars(filters).values()
+        )
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < settings.ANALYTICS_CACHE_TTL:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            self.misses += 1
+            window = await load_window(db, filters)
+            self._entries[key] = (time.monotonic(), window)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.ANALYTICS_CACHE_SIZE:
+                self._entries.popitem(last=False)
+            return window
+
+
+window_cache = WindowCache()
+register_cache("analytics_windows", window_cache)
+
+
+# ----------------------------------------------------------------------
+# Aggregations
+# ----------------------------------------------------------------------
+
+
+def _key_size(window: LogWindow, name: str) -> int:
+    if name == "destination_port":
+        return 65537  # ports shifted by one so "no port" (-1) becomes 0
+    return max(len(window.categories[name]), 1)
+
+
+def _group_codes(window: LogWindow, by: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Dense group index per row plus the sorted unique combined keys"""
+    if np.prod([float(_key_size(window, name)) for name in by]) >= 2.0 ** 62:
+        raise AnalyticsError("Too many distinct key combinations; group by fewer columns")
+    combined = np.zeros(len(window), dtype=np.int64)
+    for name in by:
+        codes = window.columns[name].astype(np.int64)
+        if name == "destination_port":
+            codes = codes + 1
+        combined = combined * _key_size(window, name) + codes
+    keys, inverse = np.unique(combined, return_inverse=True)
+    return keys, inverse
+
+
+def _split_keys(window: LogWindow, by: Sequence[str], keys: np.ndarray) -> Dict[str, List[Any]]:
+    """Decode combined keys back into per-column values"""
+    decoded: Dict[str, List[Any]] = {}
+    remaining = keys.copy()
+    for name in reversed(by):
+        size = _key_size(window, name)
+        codes = remaining % size
+        remaining //= size
+        if name == "destination_port":
+            decoded[name] = [None if code == 0 else int(code - 1) for code in codes.tolist()]
+        else:
+            decoded[name] = window.decode(name, codes)
+    return decoded
+
+
+def _sums(window: LogWindow, inverse: np.ndarray, size: int, rows: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    events = window.columns["event_count"] if rows is None else window.columns["event_count"][rows]
+    sums = {"events": np.bincount(inverse, weights=events, minlength=size)}
+    for name in METRICS:
+        weights = window.columns[name] if rows is None else window.columns[name][rows]
+        sums[name] = np.bincount(inverse, weights=weights, minlength=size)
+    return sums
+
+
+def _bucket_index(window: LogWindow, interval: int) -> Tuple[np.ndarray, int]:
+    buckets = -(-(window.end - window.start) // interval)
+    return (window.timestamp - window.start) // interval, max(buckets, 1)
+
+
+def _bucket_start(window: LogWindow, index: int, interval: int) -> datetime:
+    return _EPOCH + timedelta(seconds=window.start + index * interval)
+
+
+def group_by(
+    window: LogWindow,
+    by: Sequence[str],
+    order_by: str = "events",
+    top: int = 20,
+    interval: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Per-group event/byte/packet totals, largest first, with optional per-bucket series"""
+    if not len(window):
+        return []
+    keys, inverse = _group_codes(window, by)
+    sums = _sums(window, inverse, len(keys))
+    order = np.argsort(-sums[order_by], kind="stable")[:top]
+    decoded = _split_keys(window, by, keys[order])
+
+    groups = []
+    for rank, group in enumerate(order.tolist()):
+        entry = {name: decoded[name][rank] for name in by}
+        entry.update({name: int(values[group]) for name, values in sums.items()})
+        groups.append(entry)
+
+    if interval:
+        bucket, buckets = _bucket_index(window, interval)
+        rank_of = np.full(len(keys), -1, dtype=np.int64)
+        rank_of[order] = np.arange(len(order))
+        ranks = rank_of[inverse]
+        rows = np.flatnonzero(ranks >= 0)
+        cell = ranks[rows] * buckets + bucket[rows]
+        cells = _sums(window, cell, len(order) * buckets, rows)
+        for rank, entry in enumerate(groups):
+            lo = rank * buckets
+            events = cells["events"][lo:lo + buckets]
+            entry["series"] = [
+                {
+                    "bucket_start": _bucket_start(window, index, interval),
+                    **{name: int(values[lo + index]) for name, values in cells.items()},
+                }
+                for index in np.flatnonzero(events).tolist()
+            ]
+    return groups
+
+
+def histogram(window: LogWindow, metric: str, bins: int = 20, log_scale: bool = False) -> Dict[str, Any]:
+    values = window.columns[metric]
+    if not len(values):
+        return {"edges": [], "counts": []}
+    if log_scale:
+        counts, edges = np.histogram(np.log10(values + 1.0), bins=bins)
+        edges = np.power(10.0, edges) - 1.0
+    else:
+        counts, edges = np.histogram(values, bins=bins)
+    return {"edges": [round(float(edge), 3) for edge in edges], "counts": counts.tolist()}
+
+
+def percentiles(
+    window: LogWindow,
+    metric: str,
+    quantiles: Sequence[float],
+    by: Optional[str] = None,
+    top: int = 20,
+) -> Dict[str, Any]:
+    """Overall percentiles, and per group for the top groups by event count"""
+    values = window.columns[metric]
+    result: Dict[str, Any] = {"overall": {}, "groups": []}
+    if not len(values):
+        return result
+    q = np.asarray(quantiles, dtype=np.float64)
+    result["overall"] = dict(zip(map(_label, quantiles), np.percentile(values, q).tolist()))
+    if by is None:
+        return result
+
+    keys, inverse = _group_codes(window, (by,))
+    counts = np.bincount(inverse, minlength=len(keys))
+    events = np.bincount(inverse, weights=window.columns["event_count"], minlength=len(keys))
+    chosen = np.argsort(-events, kind="stable")[:top]
+
+    # Sort once by (group, value); each group's percentiles are then
+    # linear interpolations at fixed offsets inside its slice
+    order = np.lexsort((values, inverse))
+    ordered = values[order].astype(np.float64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sizes = counts[chosen]
+    positions = starts[chosen][:, None] + (sizes[:, None] - 1) * (q[None, :] / 100.0)
+    low = np.floor(positions).astype(np.int64)
+    high = np.minimum(low + 1, (starts[chosen] + sizes - 1)[:, None])
+    fraction = positions - low
+    estimates = ordered[low] * (1 - fraction) + ordered[high] * fraction
+
+    names = _split_keys(window, (by,), keys[chosen])[by]
+    for rank, name in enumerate(names):
+        result["groups"].append({
+            by: name,
+            "events": int(events[chosen[rank]]),
+            **dict(zip(map(_label, quantiles), estimates[rank].tolist())),
+        })
+    return result
+
+
+def _label(quantile: float) -> str:
+    return f"p{quantile:g}"
+
+
+def rates(window: LogWindow, interval: int, by: Optional[str] = None, top: int = 20) -> Dict[str, Any]:
+    """Per-bucket event/byte rates, and the groups with the highest peak rate"""
+    result: Dict[str, Any] = {"interval": interval, "series": [], "peaks": []}
+    if not len(window):
+        return result
+    bucket, buckets = _bucket_index(window, interval)
+    totals = _sums(window, bucket, buckets)
+    result["series"] = [
+        {
+            "bucket_start": _bucket_start(window, index, interval),
+            "events_per_second": float(totals["events"][index]) / interval,
+            "bytes_per_second": float(totals["bytes_sent"][index] + totals["bytes_received"][index]) / interval,
+        }
+        for index in range(buckets)
+    ]
+    if by is None:
+        return result
+
+    keys, inverse = _group_codes(window, (by,))
+    cells, cell_index = np.unique(inverse.astype(np.int64) * buckets + bucket, return_inverse=True)
+    cell_counts = np.bincount(cell_index, weights=window.columns["event_count"], minlength=len(cells))
+    groups, cell_buckets = cells // buckets, cells % buckets
+    # Within each group the last cell after sorting by count is its peak
+    order = np.lexsort((cell_counts, groups))
+    last = np.flatnonzero(np.append(groups[order][1:] != groups[order][:-1], True))
+    peak_cells = order[last]
+    ranking = np.argsort(-cell_counts[peak_cells], kind="stable")[:top]
+    chosen = peak_cells[ranking]
+
+    names = _split_keys(window, (by,), keys[groups[chosen]])[by]
+    for rank, name in enumerate(names):
+        cell = chosen[rank]
+        result["peaks"].append({
+            by: name,
+            "peak_bucket_start": _bucket_start(window, int(cell_buckets[cell]), interval),
+            "peak_events_per_second": float(cell_counts[cell]) / interval,
+        })
+    return result
@@ -0,0 +1,447 @@
+"""
+Columnar Parquet archive tier for closed log partitions.
+
+Once a closed day is older than ARCHIVE_AFTER_DAYS its partition table is
+compacted into ARCHIVE_DIR/firewall_logs_pYYYYMMDD.parquet and dropped.
+Files are sorted newest first like the listing order. protocol, action,
+direction, severity, threat_type and log_source are dictionary-encoded.
+Addresses are stored as 16-byte big-endian integers (IPv4 mapped into
+::ffff:0:0/96), with the original text kept only when it does not
+round-trip.
+
+Readers prune row groups with the Parquet min/max statistics (timestamp,
+addresses, ports, id) before decoding anything, apply the remaining
+filters as Arrow expressions, and stop at the first row group that
+completes a page. pyarrow is optional; without it nothing is archived.
+"""
+import asyncio
+import ipaddress
+import logging
+import os
+from datetime import date, datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, DateTime, Integer, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.log_partition import LogPartition
+from app.services import fulltext, partitions
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = pc = pq = None
+
+if TYPE_CHECKING:
+    from app.services.log_query import LogFilters
+
+logger = logging.getLogger(__name__)
+
+DICTIONARY_COLUMNS = ("protocol", "action", "direction", "severity", "threat_type", "log_source")
+IP_COLUMNS = ("source_ip", "destination_ip")
+
+_V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+Keyset = Tuple[datetime, int]
+
+
+class ArchiveUnavailable(RuntimeError):
+    """Raised when archive files must be read or written without pyarrow"""
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _require() -> None:
+    if pa is None:
+        raise ArchiveUnavailable("pyarrow is required for the Parquet log archive")
+
+
+# ----------------------------------------------------------------------
+# Encoding
+# ----------------------------------------------------------------------
+
+
+def pack_ip(value: str) -> Optional[bytes]:
+    """16-byte form of an address, None if value is not one"""
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 4:
+        return _V4_MAPPED + address.packed
+    return address.packed
+
+
+def unpack_ip(packed: bytes) -> str:
+    if packed[:12] == _V4_MAPPED:
+        return str(ipaddress.IPv4Address(packed[12:]))
+    return str(ipaddress.IPv6Address(packed))
+
+
+def ip_bounds(value: str) -> Tuple[bytes, bytes]:
+    """Inclusive packed range of an address or CIDR"""
+    network = ipaddress.ip_network(value, strict=False)
+    low, high = network.network_address.packed, network.broadcast_address.packed
+    if network.version == 4:
+        return _V4_MAPPED + low, _V4_MAPPED + high
+    return low, high
+
+
+@lru_cache(maxsize=None)
+def arrow_schema():
+    _require()
+    fields = []
+    for column in partitions.legacy_table.columns:
+        name = column.name
+        if name.endswith("_bin"):
+            continue  # index keys; archive files carry their own packed addresses
+        if name in IP_COLUMNS:
+            fields.append(pa.field(name, pa.binary(16)))
+            fields.append(pa.field(f"{name}_text", pa.string()))
+        elif name in DICTIONARY_COLUMNS:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        elif isinstance(column.type, DateTime):
+            fields.append(pa.field(name, pa.timestamp("us"), nullable=column.nullable))
+        elif isinstance(column.type, (Integer, BigInteger)):
+            fields.append(pa.field(name, pa.int64(), nullable=column.name != "id"))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def rows_to_table(rows: List[Dict[str, Any]], schema):
+    """Arrow table for log row dicts"""
+    columns = {}
+    for field in schema:
+        name = field.name
+        if name.endswith("_text"):
+            continue
+        values = [row[name] for row in rows]
+        if name in IP_COLUMNS:
+            packed = [pack_ip(value) for value in values]
+            text = [
+                None if p is not None and unpack_ip(p) == value else value
+                for value, p in zip(values, packed)
+            ]
+            columns[name] = pa.array(packed, pa.binary(16))
+            columns[f"{name}_text"] = pa.array(text, pa.string())
+        elif name in DICTIONARY_COLUMNS:
+            columns[name] = pa.array(values, pa.string()).dictionary_encode()
+        else:
+            columns[name] = pa.array(values, field.type)
+    return pa.table({field.name: columns[field.name] for field in schema}, schema=schema)
+
+
+def conform(table):
+    """Arrow table with the current schema; columns newer than the file are null"""
+    schema = arrow_schema()
+    if table.column_names == schema.names:
+        return table
+    present = set(table.column_names)
+    return pa.Table.from_arrays(
+        [table[field.name] if field.name in present else pa.nulls(table.num_rows, field.type) for field in schema],
+        schema=schema,
+    )
+
+
+def table_to_rows(table) -> List[Dict[str, Any]]:
+    """Log row dicts (FirewallLog columns) for an archive Arrow table"""
+    rows = table.to_pylist()
+    names = [name for name in IP_COLUMNS if name in table.column_names]
+    for row in rows:
+        for name in names:
+            text = row.pop(f"{name}_text")
+            packed = row[name]
+            row[name] = text if text is not None or packed is None else unpack_ip(packed)
+    return rows
+
+
+# ----------------------------------------------------------------------
+# Reading
+# ----------------------------------------------------------------------
+
+
+def filter_expression(filters: "LogFilters", after: Optional[Keyset]):
+    conditions = []
+    if filters.start_time is not None:
+        conditions.append(pc.field("timestamp") >= pa.scalar(filters.start_time, pa.timestamp("us")))
+    if filters.end_time is not None:
+        conditions.append(pc.field("timestamp") < pa.scalar(filters.end_time, pa.timestamp("us")))
+    for name in IP_COLUMNS:
+        value = getattr(filters, name)
+        if value:
+            if "/" not in value and pack_ip(value) is None:
+                conditions.append(pc.field(f"{name}_text") == value)
+            else:
+                low, high = ip_bounds(value)
+                conditions.append(
+                    (pc.field(name) >= pa.scalar(low, pa.binary(16)))
+                    & (pc.field(name) <= pa.scalar(high, pa.binary(16)))
+                )
+    for name in ("source_port", "destination_port"):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(pc.field(name) == value)
+    for name in DICTIONARY_COLUMNS:
+        values = getattr(filters, name, None)
+        if values:
+            conditions.append(pc.field(name).isin(values))
+    if filters.q:
+        # No text index in the files: every term as a case-insensitive substring
+        for term in fulltext.parse_query(filters.q):
+            conditions.append(
+                pc.match_substring(pc.field("raw_log"), term.text, ignore_case=True)
+                | pc.match_substring(pc.field("description"), term.text, ignore_case=True)
+            )
+    if after is not None:
+        timestamp, log_id = after
+        ts = pa.scalar(timestamp, pa.timestamp("us"))
+        conditions.append(
+            (pc.field("timestamp") < ts) | ((pc.field("timestamp") == ts) & (pc.field("id") < log_id))
+        )
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def row_group_may_match(metadata, positions: Dict[str, int], filters: "LogFilters", after: Optional[Keyset]) -> bool:
+    """False when min/max statistics rule the row group out"""
+
+    def bounds(name):
+        statistics = metadata.column(positions[name]).statistics
+        if statistics is None or not statistics.has_min_max:
+            return None
+        return statistics.min, statistics.max
+
+    ts = bounds("timestamp")
+    if ts is not None:
+        low, high = ts
+        if filters.start_time is not None and high < filters.start_time:
+            return False
+        if filters.end_time is not None and low >= filters.end_time:
+            return False
+        if after is not None and low > after[0]:
+            return False
+
+    for name in IP_COLUMNS:
+        value = getattr(filters, name)
+        stats = bounds(name)
+        if value and stats is not None and ("/" in value or pack_ip(value) is not None):
+            low, high = ip_bounds(value)
+            if stats[1] < low or stats[0] > high:
+                return False
+
+    for name in ("source_port", "destination_port"):
+        value = getattr(filters, name)
+        stats = bounds(name)
+        if value is not None and stats is not None and not stats[0] <= value <= stats[1]:
+            return False
+    return True
+
+
+def archive_columns(columns: Sequence[str]) -> List[str]:
+    """File columns backing the given FirewallLog columns"""
+    names = []
+    for name in columns:
+        names.append(name)
+        if name in IP_COLUMNS:
+            names.append(f"{name}_text")
+    return names
+
+
+def read_rows(
+    path: Path,
+    filters: "LogFilters",
+    after: Optional[Keyset],
+    limit: int,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Up to limit matching rows of one archive file, newest first"""
+    _require()
+    parquet = pq.ParquetFile(path)
+    positions = {parquet.metadata.schema.column(i).name: i for i in range(parquet.metadata.num_columns)}
+    expression = filter_expression(filters, after)
+
+    rows: List[Dict[str, Any]] = []
+    for index in range(parquet.num_row_groups):
+        if not row_group_may_match(parquet.metadata.row_group(index), positions, filters, after):
+            continue
+        table = conform(parquet.read_row_group(index))
+        if expression is not None:
+            table = table.filter(expression)
+        if table.num_rows:
+            table = table.slice(0, limit - len(rows))
+            if columns:
+                table = table.select(archive_columns(columns))
+            rows.extend(table_to_rows(table))
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def find_row(path: Path, log_id: int) -> Optional[Dict[str, Any]]:
+    _require()
+    parquet = pq.ParquetFile(path)
+    position = parquet.schema_arrow.get_field_index("id")
+    for index in range(parquet.num_row_groups):
+        statistics = parquet.metadata.row_group(index).column(position).statistics
+        if statistics is not None and statistics.has_min_max and not statistics.min <= log_id <= statistics.max:
+            continue
+        table = conform(parquet.read_row_group(index)).filter(pc.field("id") == log_id)
+        if table.num_rows:
+            return table_to_rows(table)[0]
+    return None
+
+
+def iter_row_batches(path: Path) -> Iterator[List[Dict[str, Any]]]:
+    _require()
+    parquet = pq.ParquetFile(path)
+    for index in range(parquet.num_row_groups):
+        yield table_to_rows(conform(parquet.read_row_group(index)))
+
+
+def iter_matching_rows(
+    path: Path,
+    filters: "LogFilters",
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = 10000,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Every matching row of one archive file in batches, newest first"""
+    _require()
+    parquet = pq.ParquetFile(path)
+    positions = {parquet.metadata.schema.column(i).name: i for i in range(parquet.metadata.num_columns)}
+    expression = filter_expression(filters, None)
+    for index in range(parquet.num_row_groups):
+        if not row_group_may_match(parquet.metadata.row_group(index), positions, filters, None):
+            continue
+        table = conform(parquet.read_row_group(index))
+        if expression is not None:
+            table = table.filter(expression)
+        if columns:
+            table = table.select(archive_columns(columns))
+        for offset in range(0, table.num_rows, batch_size):
+            yield table_to_rows(table.slice(offset, batch_size))
+
+
+async def read_page(
+    day: date,
+    filters: "LogFilters",
+    after: Optional[Keyset],
+    limit: int,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """Matching rows of a day's archive file, if it has one"""
+    path = partitions.archive_path(day)
+    if not path.exists():
+        return []
+    return await asyncio.to_thread(read_rows, path, filters, after, limit, columns)
+
+
+def count_rows(day: date) -> int:
+    """Rows in a day's archive file (read from the footer only)"""
+    path = partitions.archive_path(day)
+    if not path.exists():
+        return 0
+    _require()
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+async def get_row(day: date, log_id: int) -> Optional[Dict[str, Any]]:
+    path = partitions.archive_path(day)
+    if not path.exists():
+        return None
+    return await asyncio.to_thread(find_row, path, log_id)
+
+
+# ----------------------------------------------------------------------
+# Compaction
+# ----------------------------------------------------------------------
+
+
+async def archive_partition(db: AsyncSession, partition: LogPartition) -> Optional[int]:
+    """
+    Compact one partition into its Parquet file and drop the table.
+
+    Returns None, leaving the table and any earlier file untouched, when
+    rows were inserted while the day was being read.
+    """
+    _require()
+    table = partitions.partition_table(partition.day)
+    path = partitions.archive_path(partition.day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_name(path.name + ".tmp")
+    schema = arrow_schema()
+    group_size = max(settings.ARCHIVE_ROW_GROUP_SIZE, 1)
+
+    query = (
+        select(table)
+        .order_by(table.c.timestamp.desc(), table.c.id.desc())
+        .execution_options(yield_per=group_size)
+    )
+    writer = pq.ParquetWriter(
+        temp,
+        schema,
+        compression=settings.ARCHIVE_COMPRESSION,
+        use_dictionary=list(DICTIONARY_COLUMNS),
+        write_statistics=True,
+    )
+    total = 0
+    try:
+        stream = await db.stream(query)
+        if path.exists():
+            # Late rows arrived after an earlier compaction: rewrite the day
+            previous = conform(await asyncio.to_thread(pq.read_table, path))
+            late = rows_to_table([dict(row._mapping) async for row in stream], schema)
+            # Rows already in the file (an earlier run that failed to drop) are replaced
+            previous = previous.filter(pc.invert(pc.is_in(previous["id"], value_set=late["id"])))
+            merged = pa.concat_tables([previous, late]).sort_by([("timestamp", "descending"), ("id", "descending")])
+            await asyncio.to_thread(writer.write_table, merged, group_size)
+            total = merged.num_rows
+            read = late.num_rows
+        else:
+            async for batch in stream.partitions(group_size):
+                arrow_table = rows_to_table([dict(row._mapping) for row in batch], schema)
+                await asyncio.to_thread(writer.write_table, arrow_table, group_size)
+                total += arrow_table.num_rows
+            read = total
+    except BaseException:
+        writer.close()
+        temp.unlink(missing_ok=True)
+        raise
+    writer.close()
+
+    if not await partitions.lock_partition(db, partition, row_count=total, expected_rows=read):
+        temp.unlink(missing_ok=True)
+        logger.warning("Rows arrived while archiving %s; will retry on the next run", table.name)
+        return None
+    try:
+        os.replace(temp, path)
+    except BaseException:
+        await db.rollback()
+        temp.unlink(missing_ok=True)
+        raise
+    await partitions.retire_partition(db, partition)
+    logger.info("Archived log partition %s (%d rows) to %s", table.name, total, path)
+    return total
+
+
+async def archive_partitions(db: AsyncSession, now: Optional[datetime] = None) -> List[date]:
+    """Archive closed partitions older than ARCHIVE_AFTER_DAYS"""
+    if settings.ARCHIVE_AFTER_DAYS <= 0 or not available():
+        return []
+    cutoff = partitions.days_ago(settings.ARCHIVE_AFTER_DAYS, now)
+    archived = []
+    for partition in reversed(await partitions.list_partitions(db)):
+        if partition.state == "closed" and partition.day < cutoff:
+            if await archive_partition(db, partition) is not None:
+                archived.append(partition.day)
+    return archived
@@ -0,0 +1,305 @@
+"""
+Compiler and index for JSON conditions over FirewallLog fields.
+
+A condition document maps field names to a spec:
+
+    {"action": "DENY"}                          equality
+    {"severity": ["HIGH", "CRITICAL"]}          membership
+    {"source_ip": "10.0.0.0/8"}                 CIDR match on IP fields
+    {"destination_port": {"gte": 1, "lt": 1024}} operators: eq, ne, in,
+                                                not_in, gt, gte, lt, lte,
+                                                cidr, contains
+
+Every equality/membership condition can serve as an index anchor, so a
+ConditionIndex only runs the remaining checks for entries whose anchor
+value equals the event's value; entries without an anchor are scanned.
+
+Operands are checked against the field's type when compiling: integer
+fields take integers (or numeric strings), timestamp fields ISO 8601
+strings, every other field strings; null is allowed for eq, ne and in.
+"""
+import ipaddress
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import DateTime
+
+from app.core.timeutil import naive_utc
+from app.models.firewall_log import FirewallLog
+
+logger = logging.getLogger(__name__)
+
+IP_FIELDS = {"source_ip", "destination_ip"}
+INT_FIELDS = {"source_port", "destination_port", "bytes_sent", "bytes_received", "packet_count", "event_count"}
+DATETIME_FIELDS = {column.name for column in FirewallLog.__table__.columns if isinstance(column.type, DateTime)}
+FIELDS = {column.name for column in FirewallLog.__table__.columns if not column.name.endswith("_bin")}
+
+# Preferred anchor fields, most selective first
+_ANCHOR_PREFERENCE = (
+    "source_ip", "destination_ip", "destination_port", "source_port", "threat_type",
+    "log_source", "protocol", "severity", "action", "direction",
+)
+
+Test = Callable[[Any], bool]
+
+
+class ConditionError(ValueError):
+    """Raised when a conditions document cannot be compiled"""
+
+
+def _coerce(field: str, value: Any, nullable: bool = True) -> Any:
+    """Operand converted to the field's type; ConditionError if it cannot be"""
+    if value is None:
+        if not nullable:
+            raise ConditionError(f"{field}: null is only allowed with eq, ne and in")
+        return None
+    if isinstance(value, (list, dict)):
+        raise ConditionError(f"{field}: expected a single value, got {value!r}")
+    if field in INT_FIELDS:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            try:
+                return int(value)
+            except ValueError:
+                pass
+        raise ConditionError(f"{field}: expected an integer, got {value!r}")
+    if field in DATETIME_FIELDS:
+        if isinstance(value, str):
+            try:
+                return naive_utc(datetime.fromisoformat(value))
+            except ValueError:
+                pass
+        raise ConditionError(f"{field}: expected an ISO 8601 timestamp, got {value!r}")
+    if not isinstance(value, str):
+        raise ConditionError(f"{field}: expected a string, got {value!r}")
+    return value
+
+
+def _value_set(field: str, items: Iterable[Any]) -> frozenset:
+    return frozenset(_coerce(field, item) for item in items)
+
+
+def _network(field: str, value: Any):
+    try:
+        return ipaddress.ip_network(str(value), strict=False)
+    except ValueError:
+        raise ConditionError(f"{field}: invalid CIDR {value!r}")
+
+
+def _cidr_test(networks) -> Test:
+    def test(value):
+        if value is None:
+            return False
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return False
+        return any(address in network for network in networks)
+    return test
+
+
+def _operator_test(field: str, operator: str, operand: Any) -> Test:
+    if operator == "eq":
+        operand = _coerce(field, operand)
+        return lambda value: value == operand
+    if operator == "ne":
+        operand = _coerce(field, operand)
+        return lambda value: value != operand
+    if operator in ("in", "not_in"):
+        if not isinstance(operand, list):
+            raise ConditionError(f"{field}.{operator}: expected a list")
+        members = _value_set(field, operand)
+        if operator == "in":
+            return lambda value: value in members
+        return lambda value: value not in members
+    if operator in ("gt", "gte", "lt", "lte"):
+        operand = _coerce(field, operand, nullable=False)
+        if operator == "gt":
+            return lambda value: value is not None and value > operand
+        if operator == "gte":
+            return lambda value: value is not None and value >= operand
+        if operator == "lt":
+            return lambda value: value is not None and value < operand
+        return lambda value: value is not None and value <= operand
+    if operator == "cidr":
+        if field not in IP_FIELDS:
+            raise ConditionError(f"{field}.cidr: only valid on IP fields")
+        items = operand if isinstance(operand, list) else [operand]
+        return _cidr_test([_network(field, _coerce(field, item, nullable=False)) for item in items])
+    if operator == "contains":
+        if field in INT_FIELDS or field in DATETIME_FIELDS:
+            raise ConditionError(f"{field}.contains: only valid on text fields")
+        needle = _coerce(field, operand, nullable=False)
+        return lambda value: value is not None and needle in value
+    raise ConditionError(f"{field}: unknown operator {operator!r}")
+
+
+class CompiledConditions:
+    """Conditions compiled to an optional index anchor plus residual tests"""
+
+    __slots__ = ("fields", "anchor_field", "anchor_values", "residual")
+
+    def __init__(
+        self,
+        fields: Tuple[str, ...],
+        anchor_field: Optional[str],
+        anchor_values: frozenset,
+        residual: List[Tuple[str, Test]],
+    ):
+        self.fields = fields
+        self.anchor_field = anchor_field
+        self.anchor_values = anchor_values
+        self.residual = residual
+
+    def matches_residual(self, event: Dict[str, Any]) -> bool:
+        for field, test in self.residual:
+            if not test(event.get(field)):
+                return False
+        return True
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.anchor_field is not None and event.get(self.anchor_field) not in self.anchor_values:
+            return False
+        return self.matches_residual(event)
+
+
+def compile_conditions(conditions: Dict[str, Any]) -> CompiledConditions:
+    """Compile a conditions document, raising ConditionError on bad input"""
+    if not isinstance(conditions, dict):
+        raise ConditionError("Conditions must be a JSON object")
+
+    # Equality/membership candidates for the anchor: field -> allowed values
+    exact: Dict[str, frozenset] = {}
+    residual: List[Tuple[str, Test]] = []
+
+    for field, spec in conditions.items():
+        if field not in FIELDS:
+            raise ConditionError(f"Unknown field {field!r}")
+
+        if isinstance(spec, dict):
+            if not spec:
+                raise ConditionError(f"{field}: empty operator object")
+            for operator, operand in spec.items():
+                if operator in ("eq", "in") and field in IP_FIELDS and _has_cidr(operand):
+                    residual.append((field, _operator_test(field, "cidr", operand)))
+                elif operator in ("eq", "in"):
+                    values = operand if operator == "in" else [operand]
+                    if not isinstance(values, list):
+                        raise ConditionError(f"{field}.in: expected a list")
+                    allowed = _value_set(field, values)
+                    if field in exact:
+                        # eq and in on one field must both hold
+                        allowed = exact[field] & allowed
+                        if not allowed:
+                            raise ConditionError(f"{field}: eq and in conditions can never both match")
+                    exact[field] = allowed
+                else:
+                    residual.append((field, _operator_test(field, operator, operand)))
+        elif isinstance(spec, list):
+            if field in IP_FIELDS and _has_cidr(spec):
+                residual.append((field, _cidr_test([_network(field, _coerce(field, item, nullable=False)) for item in spec])))
+            else:
+                exact[field] = _value_set(field, spec)
+        elif field in IP_FIELDS and _has_cidr(spec):
+            residual.append((field, _cidr_test([_network(field, spec)])))
+        else:
+            exact[field] = _value_set(field, [spec])
+
+    anchor_field = None
+    for field in _ANCHOR_PREFERENCE:
+        if field in exact:
+            anchor_field = field
+            break
+    if anchor_field is None and exact:
+        anchor_field = next(iter(exact))
+
+    anchor_values = exact.pop(anchor_field) if anchor_field is not None else frozenset()
+    for field, values in exact.items():
+        residual.append((field, values.__contains__))
+
+    return CompiledConditions(tuple(conditions), anchor_field, anchor_values, residual)
+
+
+def _has_cidr(spec: Any) -> bool:
+    items = spec if isinstance(spec, list) else [spec]
+    return any(isinstance(item, str) and "/" in item for item in items)
+
+
+class ConditionIndex:
+    """Finds the entries whose conditions match an event without testing them all"""
+
+    def __init__(self):
+        self._entries: Dict[Hashable, CompiledConditions] = {}
+        # anchor field -> anchor value -> keys
+        self._anchored: Dict[str, Dict[Any, List[Hashable]]] = {}
+        self._scan: List[Hashable] = []
+        # Entries whose tests raised; logged once each and treated as not matching
+        self._failing: Set[Hashable] = set()
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def add(self, key: Hashable, compiled: CompiledConditions) -> None:
+        if key in self._entries:
+            self.remove(key)
+        self._entries[key] = compiled
+        if compiled.anchor_field is None:
+            self._scan.append(key)
+            return
+        by_value = self._anchored.setdefault(compiled.anchor_field, {})
+        for value in compiled.anchor_values:
+            by_value.setdefault(value, []).append(key)
+
+    def remove(self, key: Hashable) -> None:
+        compiled = self._entries.pop(key, None)
+        if compiled is None:
+            return
+        self._failing.discard(key)
+        if compiled.anchor_field is None:
+            self._scan.remove(key)
+            return
+        by_value = self._anchored[compiled.anchor_field]
+        for value in compiled.anchor_values:
+            keys = by_value[value]
+            keys.remove(key)
+            if not keys:
+                del by_value[value]
+        if not by_value:
+            del self._anchored[compiled.anchor_field]
+
+    def match(self, event: Dict[str, Any]) -> List[Hashable]:
+        """Keys of all entries whose conditions hold for event"""
+        entries = self._entries
+        matched = []
+        for field, by_value in self._anchored.items():
+            keys = by_value.get(event.get(field))
+            if keys:
+                for key in keys:
+                    if self._test(key, entries[key], event):
+                        matched.append(key)
+        for key in self._scan:
+            if self._test(key, entries[key], event):
+                matched.append(key)
+        return matched
+
+    def _test(self, key: Hashable, compiled: CompiledConditions, event: Dict[str, Any]) -> bool:
+        # One entry failing on an unexpected value must not stop the others
+        try:
+            return compiled.matches_residual(event)
+        except Exception:
+            self.errors += 1
+            if key not in self._failing:
+                self._failing.add(key)
+                logger.exception("Conditions of %r failed on an event; treated as not matching", key)
+            return False
+
+    def keys(self) -> Iterable[Hashable]:
+        return self._entries.keys()
@@ -0,0 +1,263 @@
+"""
+Streaming export of firewall logs as CSV, NDJSON or Parquet.
+
+Rows are read with server-side cursors (AsyncSession.stream with
+yield_per) and archive files one row group at a time, encoded chunk by
+chunk and handed on as bytes, so memory stays bounded by
+EXPORT_CHUNK_ROWS however many rows match.
+
+Days are exported newest first, each in (timestamp DESC, id DESC) order
+per source: a day's archive file, then rows that arrived for it after
+archiving, and finally the legacy table. CSV and NDJSON can be wrapped
+in gzip or zstd (the zstandard package); Parquet uses the codec inside
+the file instead.
+"""
+import asyncio
+import csv
+import io
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.firewall_log import FirewallLog
+from app.services import archive, partitions
+from app.services.log_query import LOG_FIELDS, LogFilters, apply_log_filters, filter_conditions
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+FORMATS = ("csv", "ndjson", "parquet")
+COMPRESSIONS = ("none", "gzip", "zstd")
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+
+class ExportError(ValueError):
+    """Raised for export options that cannot be served"""
+
+
+def export_filename(fmt: str, compression: str, now: Optional[datetime] = None) -> str:
+    stamp = (now or datetime.utcnow()).strftime("%Y%m%dT%H%M%S")
+    suffix = "" if fmt == "parquet" else _SUFFIXES.get(compression, "")
+    return f"firewall_logs_{stamp}.{fmt}{suffix}"
+
+
+def validate_options(fmt: str, compression: str) -> None:
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    if compression not in COMPRESSIONS:
+        raise ExportError(f"compression must be one of {', '.join(COMPRESSIONS)}")
+    if fmt == "parquet" and not archive.available():
+        raise ExportError("Parquet export requires pyarrow")
+    if compression == "zstd" and fmt != "parquet" and zstandard is None:
+        raise ExportError("zstd compression requires the zstandard package")
+
+
+# ----------------------------------------------------------------------
+# Row source
+# ----------------------------------------------------------------------
+
+
+async def iter_log_batches(
+    db: AsyncSession,
+    filters: LogFilters,
+    columns: Optional[Sequence[str]] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Batches of matching row dicts from every partition, archive file and the legacy table"""
+    filter_conditions(filters)  # reject bad filters before streaming anything
+    batch_size = batch_size or settings.EXPORT_CHUNK_ROWS
+
+    async def stream_table(table):
+        selection = select(*[table.c[name] for name in columns or LOG_FIELDS])
+        query = (
+            apply_log_filters(selection, filters, table)
+            .order_by(table.c.timestamp.desc(), table.c.id.desc())
+            .execution_options(yield_per=batch_size)
+        )
+        result = await db.stream(query)
+        keys = [str(key) for key in result.keys()]
+        async for chunk in result.partitions():
+            yield [dict(zip(keys, row)) for row in chunk]
+
+    for partition in await partitions.list_partitions(db, filters.start_time, filters.end_time):
+        path = partitions.archive_path(partition.day)
+        if path.exists():
+            batches = archive.iter_matching_rows(path, filters, columns, batch_size)
+            while True:
+                rows = await asyncio.to_thread(next, batches, None)
+                if rows is None:
+                    break
+                if rows:
+                    yield rows
+        if partition.state != "archived":
+            async for rows in stream_table(partitions.partition_table(partition.day)):
+                yield rows
+
+    async for rows in stream_table(partitions.legacy_table):
+        yield rows
+
+
+# ----------------------------------------------------------------------
+# Encoders
+# ----------------------------------------------------------------------
+
+
+class _Buffer:
+    """Write-only file object whose contents are taken chunk by chunk"""
+
+    closed = False
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _Compressor:
+    def __init__(self, compression: str):
+        if compression == "gzip":
+            self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        elif compression == "zstd":
+            self._compressor = zstandard.ZstdCompressor().compressobj()
+        else:
+            self._compressor = None
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) if self._compressor else data
+
+    def finish(self) -> bytes:
+        return self._compressor.flush() if self._compressor else b""
+
+
+def _csv_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return "" if value is None else value
+
+
+class _TextEncoder:
+    """CSV or NDJSON, optionally compressed"""
+
+    def __init__(self, fmt: str, compression: str, columns: Sequence[str]):
+        self.fmt = fmt
+        self.columns = list(columns)
+        self._compressor = _Compressor(compression)
+        self._header = fmt == "csv"
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if self.fmt == "ndjson":
+            data = b"".join(orjson.dumps({name: row[name] for name in self.columns}) + b"\n" for row in rows)
+        else:
+            text = io.StringIO()
+            writer = csv.writer(text, lineterminator="\n")
+            if self._header:
+                writer.writerow(self.columns)
+                self._header = False
+            writer.writerows([_csv_value(row[name]) for name in self.columns] for row in rows)
+            data = text.getvalue().encode()
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        if self._header:  # no rows: still emit the CSV header
+            return self.encode([]) + self._compressor.finish()
+        return self._compressor.finish()
+
+
+def _arrow_type(column):
+    pa = archive.pa
+    python_type = column.type.python_type
+    if python_type is int:
+        return pa.int64()
+    if python_type is datetime:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+class _ParquetEncoder:
+    """One row group per batch, written into an in-memory buffer that is drained per chunk"""
+
+    def __init__(self, compression: str, columns: Sequence[str]):
+        pa = archive.pa
+        table_columns = FirewallLog.__table__.columns
+        self.columns = list(columns)
+        self.schema = pa.schema([pa.field(name, _arrow_type(table_columns[name])) for name in self.columns])
+        self._buffer = _Buffer()
+        self._writer = archive.pq.ParquetWriter(
+            self._buffer,
+            self.schema,
+            compression=compression,
+            write_statistics=True,
+        )
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        table = archive.pa.Table.from_pylist(rows, schema=self.schema)
+        self._writer.write_table(table)
+        return self._buffer.take()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._buffer.take()
+
+
+def _encoder(fmt: str, compression: str, columns: Sequence[str]):
+    if fmt == "parquet":
+        return _ParquetEncoder(compression, columns)
+    return _TextEncoder(fmt, compression, columns)
+
+
+async def iter_export(
+    db: AsyncSession,
+    filters: LogFilters,
+    fmt: str = "csv",
+    compression: str = "none",
+    columns: Optional[Sequence[str]] = None,
+    counter: Optional[List[int]] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Encoded export bytes, one chunk per batch of rows. counter, when
+    given, accumulates the number of exported rows in counter[0].
+    """
+    validate_options(fmt, compression)
+    columns = list(columns or LOG_FIELDS)
+    encoder = _encoder(fmt, compression, columns)
+    async for rows in iter_log_batches(db, filters, columns):
+        if counter is not None:
+            counter[0] += len(rows)
+        data = encoder.encode(rows)
+        if data:
+            yield data
+    data = encoder.finish()
+    if data:
+        yield data
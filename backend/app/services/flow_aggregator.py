@@ -0,0 +1,245 @@
+"""
+Flow aggregation: repeated events collapsed into counted flow records.
+
+Scans and floods repeat the same connection thousands of times a minute.
+With FLOW_AGGREGATION on, syslog and bulk ingestion hand their rows to the
+aggregator instead of writing them. Events sharing the 5-tuple, action,
+severity (plus direction, threat type and log source, so no filterable
+value is lost) inside one FLOW_WINDOW_SECONDS window of event time are
+folded into one open flow: bytes and packets are summed, event_count
+counts the events, first_seen/last_seen bound them, and the first event's
+raw_log and description are kept as a sample.
+
+A background task writes the flows of a window with bulk_insert_logs once
+the window has ended FLOW_FLUSH_GRACE seconds ago; past FLOW_MAX_OPEN_FLOWS
+open flows every open flow is written at once. Rows replayed with old
+timestamps are therefore aggregated per flush interval rather than per
+window. A failed write is bisected (insert_isolating) so only the flows
+that cannot be written fail; those are retried with the next flushes and
+dropped after WRITE_ATTEMPTS attempts.
+
+Rollups, sketches, analytics and alert rules weigh a flow by its
+event_count, so event statistics stay exact (at minute resolution as long
+as the window divides 60 seconds). Row counts (GET /logs/count/total,
+partition row_count) count stored rows.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.firewall_log import FirewallLog
+from app.services.ingest import insert_isolating
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = (
+    "source_ip", "destination_ip", "source_port", "destination_port", "protocol",
+    "action", "severity", "direction", "threat_type", "log_source",
+)
+SUMMED_FIELDS = ("bytes_sent", "bytes_received", "packet_count")
+# Written columns; ids and packed address keys come from the table defaults
+ROW_FIELDS = tuple(
+    column.name for column in FirewallLog.__table__.columns
+    if not column.primary_key and not column.name.endswith("_bin")
+)
+
+# Attempts to write a flow before it is dropped
+WRITE_ATTEMPTS = 3
+
+_EPOCH = datetime(1970, 1, 1)
+
+FlowKey = Tuple[Any, ...]
+
+
+class FlowAggregator:
+    """Folds ingested rows into open flows and writes them when their window closes"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        window_seconds: int = settings.FLOW_WINDOW_SECONDS,
+        grace: float = settings.FLOW_FLUSH_GRACE,
+        flush_interval: float = settings.FLOW_FLUSH_INTERVAL,
+        max_open_flows: int = settings.FLOW_MAX_OPEN_FLOWS,
+    ):
+        self.session_factory = session_factory
+        self.window_seconds = max(window_seconds, 1)
+        self.grace = grace
+        self.flush_interval = flush_interval
+        self.max_open_flows = max(max_open_flows, 1)
+
+        # Insertion order follows arrival, so older windows come first
+        self._flows: Dict[FlowKey, Dict[str, Any]] = {}
+        # (failed attempts, flow) waiting for the next write
+        self._retry: List[Tuple[int, Dict[str, Any]]] = []
+        self._flusher_task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._running = False
+
+        self.events_received = 0
+        self.events_written = 0
+        self.flows_written = 0
+        self.flushes = 0
+        self.early_flushes = 0
+        self.write_errors = 0
+        self.dropped_flows = 0
+        self.dropped_events = 0
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    # ------------------------------------------------------------------
+    # Folding
+    # ------------------------------------------------------------------
+
+    def _window(self, ts: datetime) -> int:
+        return int((ts - _EPOCH).total_seconds()) // self.window_seconds
+
+    def add(self, rows: List[Dict[str, Any]]) -> None:
+        """Fold rows into the open flows of their windows"""
+        flows = self._flows
+        window_of = self._window
+        for row in rows:
+            ts = row["timestamp"]
+            self.events_received += 1
+
+            key = (window_of(ts), *[row.get(name) for name in KEY_FIELDS])
+            flow = flows.get(key)
+            if flow is None:
+                # The flow columns are only ever set here, never taken from input
+                flow = flows[key] = {name: row.get(name) for name in ROW_FIELDS}
+                flow["event_count"] = 1
+                flow["first_seen"] = ts
+                flow["last_seen"] = ts
+                continue
+
+            flow["event_count"] += 1
+            for name in SUMMED_FIELDS:
+                flow[name] = (flow[name] or 0) + (row.get(name) or 0)
+            if ts < flow["first_seen"]:
+                flow["timestamp"] = flow["first_seen"] = ts
+            if ts > flow["last_seen"]:
+                flow["last_seen"] = ts
+            # Keep a sample of the original text even if the first event had none
+            if flow["raw_log"] is None:
+                flow["raw_log"] = row.get("raw_log")
+            if flow["description"] is None:
+                flow["description"] = row.get("description")
+
+    async def submit(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Fold rows in; they are written when their window closes.
+
+        Past FLOW_MAX_OPEN_FLOWS open flows the caller writes all of them
+        before returning, which also slows producers down to the database.
+        """
+        if not self._running:
+            self.start()
+        self.add(rows)
+        if len(self._flows) >= self.max_open_flows:
+            self.early_flushes += 1
+            await self._write(self._take(None))
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def _take(self, before_window: Optional[int]) -> List[Dict[str, Any]]:
+        """Remove and return the flows of windows before before_window (None: all)"""
+        if before_window is None:
+            rows = list(self._flows.values())
+            self._flows = {}
+            return rows
+        closed = [key for key in self._flows if key[0] < before_window]
+        return [self._flows.pop(key) for key in closed]
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Write flows plus earlier failed ones; failures are kept for the next write"""
+        batch = [(0, row) for row in rows] + self._retry
+        self._retry = []
+        if not batch:
+            return
+        failures, _ = await insert_isolating(self.session_factory, [row for _, row in batch])
+        failed = {id(row) for row, _ in failures}
+
+        self.flushes += 1
+        for attempts, row in batch:
+            if id(row) not in failed:
+                self.flows_written += 1
+                self.events_written += row["event_count"]
+            elif attempts + 1 < WRITE_ATTEMPTS:
+                self._retry.append((attempts + 1, row))
+            else:
+                self.dropped_flows += 1
+                self.dropped_events += row["event_count"]
+        if failures:
+            self.write_errors += 1
+            logger.warning(
+                "%d of %d flow records failed to write; %d will be retried",
+                len(failures), len(batch), len(self._retry),
+            )
+
+    async def flush(self, now: Optional[datetime] = None) -> int:
+        """Write the flows of windows that closed FLOW_FLUSH_GRACE seconds ago; returns rows written"""
+        now = now or datetime.utcnow()
+        open_window = int((now - _EPOCH).total_seconds() - self.grace) // self.window_seconds
+        rows = self._take(open_window)
+        await self._write(rows)
+        return len(rows)
+
+    async def _flusher(self) -> None:
+        while self._running:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Flow flush failed")
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._flusher_task is None or self._flusher_task.done():
+            self._running = True
+            self._stopping.clear()
+            self._flusher_task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write every open flow"""
+        self._running = False
+        self._stopping.set()
+        if self._flusher_task is not None:
+            # Lets a write in progress finish rather than cancelling it
+            await self._flusher_task
+            self._flusher_task = None
+        await self._write(self._take(None))
+        while self._retry:
+            await self._write([])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open_flows": len(self._flows),
+            "retry_flows": len(self._retry),
+            "window_seconds": self.window_seconds,
+            "events_received": self.events_received,
+            "events_written": self.events_written,
+            "flows_written": self.flows_written,
+            "reduction": round(self.events_written / self.flows_written, 1) if self.flows_written else 0,
+            "flushes": self.flushes,
+            "early_flushes": self.early_flushes,
+            "write_errors": self.write_errors,
+            "dropped_flows": self.dropped_flows,
+            "dropped_events": self.dropped_events,
+        }
+
+
+# Process-wide aggregator behind syslog and bulk ingestion when FLOW_AGGREGATION is on
+flow_aggregator = FlowAggregator()
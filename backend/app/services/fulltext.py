@@ -0,0 +1,329 @@
+"""
+Full-text search over the raw_log and description columns.
+
+SQLite: every log table (the legacy firewall_logs table and each day
+partition) gets an external-content FTS5 table named <table>_fts. AFTER
+INSERT/UPDATE/DELETE triggers keep it current, so the ingestion path runs
+no extra statements. Dropping a partition drops its index as well.
+PostgreSQL: a GIN expression index over
+to_tsvector('simple', raw_log || ' ' || description) is maintained by the
+database itself. Other engines, or LOG_FULLTEXT_INDEX=false, fall back
+to LIKE scans.
+
+Query syntax (q=): whitespace-separated terms that must all match,
+"double quoted" phrases and a trailing * for prefix terms. Terms and
+phrases are split into tokens by the index tokenizer, so "evil.com"
+matches the token sequence evil, com. Archive files have no text index:
+their row groups are filtered with case-insensitive substring matches.
+
+SQLite indexes created for tables that already hold rows start out
+empty; scripts/build_fulltext_index.py indexes the existing rows.
+PostgreSQL builds a new index over the existing rows as it creates it.
+"""
+import logging
+import re
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from sqlalchemy import Float, Integer, and_, bindparam, column, func, inspect, literal_column, or_, select
+from sqlalchemy import table as table_clause
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from sqlalchemy.types import NullType
+
+from app.core.config import settings
+from app.core.database import register_init_hook
+
+logger = logging.getLogger(__name__)
+
+TEXT_COLUMNS = ("raw_log", "description")
+MAX_TERMS = 16
+# One tokenizer for indexing and querying; diacritics folded, case-insensitive
+FTS5_TOKENIZE = "unicode61 remove_diacritics 2"
+
+_TERM_PATTERN = re.compile(r'"([^"]*)"?|(\S+)')
+_PARTITION_NAME = re.compile(r"^firewall_logs_p\d{8}$")
+
+
+class FulltextQueryError(ValueError):
+    """Raised for search strings without anything to search for"""
+
+
+@dataclass(frozen=True)
+class Term:
+    text: str
+    prefix: bool = False
+
+
+def parse_query(q: str) -> List[Term]:
+    """Terms of a search string; phrases keep their inner whitespace"""
+    terms = []
+    for match in _TERM_PATTERN.finditer(q):
+        phrase, word = match.groups()
+        value = phrase if phrase is not None else word
+        prefix = False
+        if phrase is None and value.endswith("*"):
+            value, prefix = value.rstrip("*"), True
+        value = " ".join(value.split())
+        if re.search(r"\w", value):
+            terms.append(Term(value, prefix))
+    if not terms:
+        raise FulltextQueryError("Search query has no searchable terms")
+    if len(terms) > MAX_TERMS:
+        raise FulltextQueryError(f"Search query has more than {MAX_TERMS} terms")
+    return terms
+
+
+def fts5_query(terms: Sequence[Term]) -> str:
+    """FTS5 MATCH expression: every term as a quoted phrase, ANDed"""
+    return " ".join(
+        '"' + term.text.replace('"', '""') + '"' + ("*" if term.prefix else "")
+        for term in terms
+    )
+
+
+def fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def _like_pattern(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _pg_document(raw_log: str, description: str) -> str:
+    # Must stay textually identical to the indexed expression (see _pg_index_ddl)
+    return f"to_tsvector('simple', coalesce({raw_log}, '') || ' ' || coalesce({description}, ''))"
+
+
+def _pg_tsquery_argument(term: Term) -> str:
+    if not term.prefix:
+        return term.text
+    words = re.findall(r"\w+", term.text)
+    return " <-> ".join([*words[:-1], f"{words[-1]}:*"])
+
+
+# ----------------------------------------------------------------------
+# Filter condition
+# ----------------------------------------------------------------------
+
+
+class text_match(ColumnElement):
+    """raw_log/description match all terms; compiled per dialect"""
+
+    inherit_cache = True
+    type = NullType()  # plain predicate: no "= 1" wrapping on engines without native booleans
+    _traverse_internals = [
+        ("id_column", InternalTraversal.dp_clauseelement),
+        ("raw_log", InternalTraversal.dp_clauseelement),
+        ("description", InternalTraversal.dp_clauseelement),
+        ("match", InternalTraversal.dp_clauseelement),
+        ("term_params", InternalTraversal.dp_clauseelement_list),
+        ("prefixes", InternalTraversal.dp_plain_obj),
+        ("fallback", InternalTraversal.dp_clauseelement),
+        ("indexed", InternalTraversal.dp_boolean),
+    ]
+
+    def __init__(self, table_columns, terms: Sequence[Term]):
+        self.id_column = table_columns.id
+        self.raw_log = table_columns.raw_log
+        self.description = table_columns.description
+        self.match = bindparam("fts_match", fts5_query(terms), unique=True)
+        self.term_params = [
+            bindparam("fts_term", _pg_tsquery_argument(term), unique=True) for term in terms
+        ]
+        self.prefixes = tuple(term.prefix for term in terms)
+        self.fallback = and_(*[
+            or_(
+                self.raw_log.ilike(_like_pattern(term.text), escape="\\"),
+                self.description.ilike(_like_pattern(term.text), escape="\\"),
+            )
+            for term in terms
+        ])
+        self.indexed = settings.LOG_FULLTEXT_INDEX
+
+
+@compiles(text_match)
+def _compile_text_match(element, compiler, **kw):
+    return f"({compiler.process(element.fallback, **kw)})"
+
+
+@compiles(text_match, "sqlite")
+def _compile_text_match_sqlite(element, compiler, **kw):
+    if not element.indexed:
+        return _compile_text_match(element, compiler, **kw)
+    fts = compiler.preparer.quote(fts_table_name(element.id_column.table.name))
+    # Unary plus: probe the match list while walking the timestamp index
+    # (which stops at a full page) rather than sorting every matching row
+    return (
+        f"+{compiler.process(element.id_column, **kw)} IN "
+        f"(SELECT rowid FROM {fts} WHERE {fts} MATCH {compiler.process(element.match, **kw)})"
+    )
+
+
+@compiles(text_match, "postgresql")
+def _compile_text_match_postgresql(element, compiler, **kw):
+    document = _pg_document(compiler.process(element.raw_log, **kw), compiler.process(element.description, **kw))
+    return f"{document} @@ ({_pg_tsquery(element, compiler, **kw)})"
+
+
+def _pg_tsquery(element, compiler, **kw) -> str:
+    return " && ".join(
+        f"{'to_tsquery' if prefix else 'phraseto_tsquery'}('simple', {compiler.process(param, **kw)})"
+        for param, prefix in zip(element.term_params, element.prefixes)
+    )
+
+
+def match_condition(table_columns, q: str):
+    """WHERE clause for a search string against a log table's columns"""
+    return text_match(table_columns, parse_query(q))
+
+
+# ----------------------------------------------------------------------
+# Relevance ranking
+# ----------------------------------------------------------------------
+
+
+class pg_rank(ColumnElement):
+    """Negated ts_rank_cd of a text_match, so lower sorts first like bm25"""
+
+    inherit_cache = True
+    type = Float()
+    _traverse_internals = [("condition", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, condition: text_match):
+        self.condition = condition
+
+
+@compiles(pg_rank)
+def _compile_pg_rank(element, compiler, **kw):
+    condition = element.condition
+    document = _pg_document(compiler.process(condition.raw_log, **kw), compiler.process(condition.description, **kw))
+    return f"-ts_rank_cd({document}, {_pg_tsquery(condition, compiler, **kw)})"
+
+
+def ranked_select(table, terms: Sequence[Term], dialect: str, columns: Sequence[str]):
+    """
+    SELECT of the given columns plus a "score" (lower is better) for rows
+    of table matching terms, best first. Further WHERE clauses added by
+    the caller are applied before scoring, so only surviving rows are
+    ranked. Without an index every match scores 0 and the caller's time
+    ordering decides.
+    """
+    selected = [table.c[name] for name in columns]
+    if dialect == "sqlite" and settings.LOG_FULLTEXT_INDEX:
+        name = fts_table_name(table.name)
+        fts = table_clause(name, column("rowid", Integer))
+        quoted = literal_column(f'"{name}"')
+        score = func.bm25(quoted, type_=Float)
+        return (
+            select(*selected, score.label("score"))
+            .select_from(table.join(fts, fts.c.rowid == table.c.id))
+            .where(quoted.op("MATCH")(bindparam("fts_match", fts5_query(terms), unique=True)))
+            .order_by(score, table.c.timestamp.desc(), table.c.id.desc())
+        )
+
+    condition = text_match(table.c, terms)
+    score = pg_rank(condition) if dialect == "postgresql" else literal_column("0.0", Float)
+    return (
+        select(*selected, score.label("score"))
+        .where(condition)
+        .order_by(score, table.c.timestamp.desc(), table.c.id.desc())
+    )
+
+
+# ----------------------------------------------------------------------
+# Index maintenance
+# ----------------------------------------------------------------------
+
+
+def _sqlite_index_ddl(table_name: str) -> List[str]:
+    fts = fts_table_name(table_name)
+    columns = ", ".join(TEXT_COLUMNS)
+    new_values = ", ".join(f"new.{name}" for name in TEXT_COLUMNS)
+    old_values = ", ".join(f"old.{name}" for name in TEXT_COLUMNS)
+    delete_old = f"INSERT INTO \"{fts}\"(\"{fts}\", rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f'INSERT INTO "{fts}"(rowid, {columns}) VALUES (new.id, {new_values});'
+    return [
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS "{fts}" USING fts5('
+        f"{columns}, content='{table_name}', content_rowid='id', tokenize='{FTS5_TOKENIZE}')",
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_ai" AFTER INSERT ON "{table_name}" BEGIN {insert_new} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_ad" AFTER DELETE ON "{table_name}" BEGIN {delete_old} END',
+        f'CREATE TRIGGER IF NOT EXISTS "{fts}_au" AFTER UPDATE OF {columns} ON "{table_name}" '
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def _pg_index_ddl(table_name: str) -> str:
+    return (
+        f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_fulltext" ON "{table_name}" '
+        f"USING gin ({_pg_document('raw_log', 'description')})"
+    )
+
+
+def index_ddl(dialect: str, table_name: str) -> List[str]:
+    """Statements creating the text index of a log table (idempotent)"""
+    if not settings.LOG_FULLTEXT_INDEX:
+        return []
+    if dialect == "sqlite":
+        return _sqlite_index_ddl(table_name)
+    if dialect == "postgresql":
+        return [_pg_index_ddl(table_name)]
+    return []
+
+
+def drop_ddl(dialect: str, table_name: str) -> List[str]:
+    """Statements dropping what DROP TABLE leaves behind"""
+    if dialect == "sqlite":
+        return [f'DROP TABLE IF EXISTS "{fts_table_name(table_name)}"']
+    return []
+
+
+def rebuild_ddl(dialect: str, table_name: str) -> List[str]:
+    """Statements (re)indexing every existing row of a log table"""
+    if dialect == "sqlite":
+        fts = fts_table_name(table_name)
+        return [*index_ddl(dialect, table_name), f"INSERT INTO \"{fts}\"(\"{fts}\") VALUES ('rebuild')"]
+    if dialect == "postgresql":
+        return [f'DROP INDEX IF EXISTS "ix_{table_name}_fulltext"', *index_ddl(dialect, table_name)]
+    return []
+
+
+def create_missing_indexes(conn) -> List[str]:
+    """
+    Create the text indexes that log tables lack (an init_db hook, run on
+    a sync connection): SQLite FTS tables and triggers, or PostgreSQL GIN
+    indexes. Returns the SQLite tables that already held rows and still
+    need scripts/build_fulltext_index.py.
+    """
+    dialect = conn.dialect.name
+    if dialect not in ("sqlite", "postgresql") or not settings.LOG_FULLTEXT_INDEX:
+        return []
+    existing = set(inspect(conn).get_table_names())
+    log_tables = sorted(
+        name for name in existing if name == "firewall_logs" or _PARTITION_NAME.match(name)
+    )
+    if dialect == "postgresql":
+        # IF NOT EXISTS: only tables predating the index (firewall_logs) build one
+        for name in log_tables:
+            conn.exec_driver_sql(_pg_index_ddl(name))
+        return []
+
+    unindexed = []
+    for name in log_tables:
+        if fts_table_name(name) in existing:
+            continue
+        for statement in index_ddl("sqlite", name):
+            conn.exec_driver_sql(statement)
+        if conn.exec_driver_sql(f'SELECT 1 FROM "{name}" LIMIT 1').first() is not None:
+            unindexed.append(name)
+    if unindexed:
+        logger.warning(
+            "Full-text index created empty for %s; run scripts/build_fulltext_index.py to index existing rows",
+            ", ".join(unindexed),
+        )
+    return unindexed
+
+
+register_init_hook(create_missing_indexes)
@@ -0,0 +1,208 @@
+import json
+import logging
+from typing import Any, Dict, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import ingest_chunks, ingest_rows
+from app.models.alert_rule import AlertRule
+from app.schemas.firewall_log import FirewallLogCreate
+from app.services.alert_delivery import alert_dispatcher, enqueue_deliveries
+from app.services.alert_engine import AlertFiring, alert_engine
+from app.services.partitions import route_rows
+from app.services.response_cache import ALERT_RULES, response_cache
+from app.services.rollups import apply_rollups
+from app.services.sketches import sketch_store
+from app.services.stream_hub import stream_hub
+from app.services.threat_intel import threat_intel
+
+logger = logging.getLogger(__name__)
+
+
+class BulkPayloadError(ValueError):
+    """Raised when a bulk request body cannot be decoded at all"""
+
+
+def _error_details(exc: ValidationError) -> List[Dict[str, Any]]:
+    """Reduce pydantic errors to JSON-safe location/message pairs"""
+    return [
+        {"loc": list(err["loc"]), "msg": err["msg"], "type": err["type"]}
+        for err in exc.errors(include_url=False)
+    ]
+
+
+def load_bulk_records(body: bytes, ndjson: bool = False) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Decode and validate a bulk payload in one pass.
+
+    Accepts a JSON array or newline-delimited JSON. Returns the valid rows as
+    plain dicts ready for insertion plus a list of per-record errors, so one
+    bad record never rejects the rest of the batch.
+    """
+    rows: List[Dict[str, Any]] = []
+    errors: List[Dict[str, Any]] = []
+
+    if ndjson:
+        # Each line is parsed and validated by pydantic-core in one step
+        index = 0
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            if index >= settings.BULK_INGEST_MAX_ROWS:
+                raise BulkPayloadError(f"More than {settings.BULK_INGEST_MAX_ROWS} records")
+            try:
+                rows.append(FirewallLogCreate.model_validate_json(line).model_dump())
+            except ValidationError as exc:
+                errors.append({"index": index, "errors": _error_details(exc)})
+            index += 1
+        return rows, errors
+
+    try:
+        records = json.loads(body)
+    except ValueError as exc:
+        raise BulkPayloadError(f"Invalid JSON: {exc}") from exc
+    if not isinstance(records, list):
+        raise BulkPayloadError("Expected a JSON array of log records")
+    if len(records) > settings.BULK_INGEST_MAX_ROWS:
+        raise BulkPayloadError(f"More than {settings.BULK_INGEST_MAX_ROWS} records")
+
+    for index, record in enumerate(records):
+        try:
+            rows.append(FirewallLogCreate.model_validate(record).model_dump())
+        except ValidationError as exc:
+            errors.append({"index": index, "errors": _error_details(exc)})
+    return rows, errors
+
+
+async def bulk_insert_logs(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Write log rows with multi-row INSERT ... RETURNING statements.
+
+    Rows are written in chunks of INGEST_CHUNK_SIZE, each chunk in its own
+    transaction. Within a chunk rows are grouped by destination partition and
+    SQLAlchemy's insertmanyvalues batching packs every group into as few
+    VALUES statements as the driver's parameter limit allows; the rollup
+    counters for the chunk are upserted in the same transaction.
+    Rows are enriched from the threat-intel index before they are written.
+    Each row dict gets its new "id" as soon as its chunk commits, so after
+    a failure the rows without one are exactly those not written; committed
+    chunks are handed to the post-commit stages (cache invalidation,
+    sketches, alert evaluation), which never raise. Returns the ids in
+    input order.
+    """
+    chunk_size = max(settings.INGEST_CHUNK_SIZE, 1)
+
+    ids: List[int] = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            threat_intel.enrich(chunk)
+        except Exception:
+            logger.exception("Threat-intel enrichment failed for %d rows", len(chunk))
+        chunk_ids = await _insert_chunk(db, chunk)
+        await apply_rollups(db, chunk)
+        await db.commit()
+        # From here on the chunk is durable: nothing below may raise
+        for row, log_id in zip(chunk, chunk_ids):
+            row["id"] = log_id
+        ids.extend(chunk_ids)
+        ingest_rows.inc(len(chunk))
+        ingest_chunks.inc()
+        await _after_commit(db, chunk)
+    return ids
+
+
+async def insert_isolating(session_factory, rows: List[Dict[str, Any]]) -> Tuple[List[Tuple[Dict[str, Any], Exception]], int]:
+    """
+    bulk_insert_logs in a session of its own, isolating the rows that cannot be written.
+
+    When a write fails, the rows that did not commit (those without an
+    "id") are split in halves and written again, so one bad row or a
+    transient error fails at most that row. Rows already committed are
+    never written twice. Returns the failed rows with their errors and the
+    number of splits.
+    """
+    try:
+        async with session_factory() as db:
+            await bulk_insert_logs(db, rows)
+        return [], 0
+    except Exception as exc:
+        pending = [row for row in rows if "id" not in row]
+        if not pending:
+            logger.exception("Log rows were written but a later stage failed")
+            return [], 0
+        if len(pending) == 1:
+            logger.exception("Failed to write log row")
+            return [(pending[0], exc)], 0
+        middle = len(pending) // 2
+        failed, splits = await insert_isolating(session_factory, pending[:middle])
+        more, more_splits = await insert_isolating(session_factory, pending[middle:])
+        return failed + more, splits + more_splits + 1
+
+
+async def _insert_chunk(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[int]:
+    """Insert rows into their partitions; returns ids in row order"""
+    ids = [0] * len(rows)
+    for table, positions in (await route_rows(db, rows)).items():
+        # sort_by_parameter_order would make SQLite fall back to one statement
+        # per row; ids come from an increasing sequence inside a single
+        # transaction, so sorting them restores input order instead.
+        result = await db.execute(insert(table).returning(table.c.id), [rows[i] for i in positions])
+        for position, log_id in zip(positions, sorted(result.scalars().all())):
+            ids[position] = log_id
+    return ids
+
+
+async def _after_commit(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Stages that run on durable rows; failures never fail the ingest"""
+    try:
+        await response_cache.invalidate_rows(rows)
+    except Exception:
+        logger.exception("Response cache invalidation failed for %d rows", len(rows))
+
+    try:
+        sketch_store.update(rows)
+    except Exception:
+        logger.exception("Sketch update failed for %d rows", len(rows))
+
+    try:
+        stream_hub.publish(rows)
+    except Exception:
+        logger.exception("Stream publish failed for %d rows", len(rows))
+
+    try:
+        firings = alert_engine.evaluate_many(rows)
+        if firings:
+            await _record_triggers(db, firings)
+    except Exception:
+        logger.exception("Alert evaluation failed for %d rows", len(rows))
+        try:
+            await db.rollback()
+        except Exception:
+            logger.exception("Rollback after failed alert evaluation failed")
+
+
+async def _record_triggers(db: AsyncSession, firings: List[AlertFiring]) -> None:
+    """Persist AlertRule.last_triggered and queue notifications for rules that fired"""
+    latest: Dict[int, Any] = {}
+    for firing in firings:
+        current = latest.get(firing.rule_id)
+        if current is None or firing.triggered_at > current:
+            latest[firing.rule_id] = firing.triggered_at
+
+    table = AlertRule.__table__
+    for rule_id, triggered_at in latest.items():
+        # Keep updated_at untouched: it tracks edits, not firings
+        await db.execute(
+            update(table)
+            .where(table.c.id == rule_id)
+            .values(last_triggered=triggered_at, updated_at=table.c.updated_at)
+        )
+    queued = await enqueue_deliveries(db, firings)
+    await db.commit()
+    await response_cache.invalidate_scope(ALERT_RULES)
+    if queued:
+        alert_dispatcher.notify()
@@ -0,0 +1,324 @@
+"""
+Parsers turning raw firewall log lines into FirewallLog column dicts.
+
+Supported inputs are RFC 3164 / RFC 5424 syslog envelopes wrapping CEF,
+iptables/ufw key=value messages or OpenBSD pf (tcpdump style) lines. All
+regular expressions are compiled once at import time and every parsed row
+starts from a shallow copy of a template dict, so the hot path does a
+handful of slices and dict stores per line.
+"""
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from app.core.netaddr import pack_address
+
+# Every parsed row carries the full column set so batches can be written
+# with a single executemany/insertmanyvalues statement.
+ROW_TEMPLATE: Dict[str, Any] = {
+    "timestamp": None,
+    "source_ip": None,
+    "source_port": None,
+    "destination_ip": None,
+    "destination_port": None,
+    "protocol": None,
+    "action": None,
+    "direction": "INBOUND",
+    "severity": "INFO",
+    "threat_type": None,
+    "bytes_sent": 0,
+    "bytes_received": 0,
+    "packet_count": 0,
+    "log_source": None,
+    "raw_log": None,
+    "description": None,
+}
+
+_RFC5424_RE = re.compile(
+    r"<(\d{1,3})>\d{1,2} (\S+) (\S+) \S+ \S+ \S+ (?:-|(?:\[(?:[^\]\\]|\\.)*\])+) ?(.*)",
+    re.DOTALL,
+)
+_RFC3164_RE = re.compile(
+    r"(?:<(\d{1,3})>)?([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d|\d{4}-\d\d-\d\dT\S+) (\S+) (.*)",
+    re.DOTALL,
+)
+# CEF extension values may contain spaces; a new key starts at " key="
+_CEF_EXT_SPLIT_RE = re.compile(r"\s+(?=\w+=)")
+_IPTABLES_RE = re.compile(r"\b(IN|OUT|SRC|DST|LEN|PROTO|SPT|DPT)=(\S*)")
+_PF_RE = re.compile(
+    r"(block|pass|match) (in|out) on \S+: (?:\(.*?\) )?([0-9A-Fa-f:.]+) > ([0-9A-Fa-f:.]+): ?(\S*)"
+)
+
+_MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+# Syslog PRI severity (0-7) -> FirewallLog severity
+_PRI_SEVERITY = ("CRITICAL", "CRITICAL", "CRITICAL", "HIGH", "MEDIUM", "LOW", "INFO", "INFO")
+
+_ACTION_WORDS = {
+    "allow": "ALLOW", "allowed": "ALLOW", "accept": "ALLOW", "accepted": "ALLOW",
+    "permit": "ALLOW", "permitted": "ALLOW", "pass": "ALLOW", "passed": "ALLOW",
+    "deny": "DENY", "denied": "DENY", "block": "DENY", "blocked": "DENY",
+    "reject": "DENY", "rejected": "DENY",
+    "drop": "DROP", "dropped": "DROP",
+}
+
+# Stored for CEF events that name neither act nor a known outcome
+UNKNOWN_ACTION = "UNKNOWN"
+
+_IP_PROTOCOLS = {"1": "ICMP", "6": "TCP", "17": "UDP", "58": "ICMPV6"}
+
+# iptables LOG targets usually sit right before a DROP rule
+IPTABLES_DEFAULT_ACTION = "DROP"
+
+# Lines from one sender mostly share a timestamp, so cache conversions
+_timestamp_cache: Dict[str, datetime] = {}
+_TIMESTAMP_CACHE_SIZE = 4096
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """Parse a syslog timestamp into a naive UTC datetime"""
+    cached = _timestamp_cache.get(value)
+    if cached is not None:
+        return cached
+
+    parsed: Optional[datetime]
+    month = _MONTHS.get(value[:3])
+    if month is not None and len(value) == 15:
+        # RFC 3164 carries no year; assume the current one unless that
+        # would put the event more than a day in the future.
+        now = datetime.utcnow()
+        try:
+            parsed = datetime(
+                now.year, month, int(value[4:6]),
+                int(value[7:9]), int(value[10:12]), int(value[13:15]),
+            )
+        except ValueError:
+            return None
+        if (parsed - now).days >= 1:
+            parsed = parsed.replace(year=now.year - 1)
+    else:
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+    if len(_timestamp_cache) >= _TIMESTAMP_CACHE_SIZE:
+        _timestamp_cache.clear()
+    _timestamp_cache[value] = parsed
+    return parsed
+
+
+def _to_int(value: Optional[str]) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _cef_severity(value: str) -> str:
+    """Map CEF severity (0-10 or Low/Medium/High/Very-High) to FirewallLog severity"""
+    number = _to_int(value)
+    if number is None:
+        return {
+            "low": "LOW", "medium": "MEDIUM", "high": "HIGH", "very-high": "CRITICAL",
+        }.get(value.strip().lower(), "INFO")
+    if number <= 0:
+        return "INFO"
+    if number <= 3:
+        return "LOW"
+    if number <= 6:
+        return "MEDIUM"
+    if number <= 8:
+        return "HIGH"
+    return "CRITICAL"
+
+
+def _cef_unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    return value.replace("\\=", "=").replace("\\n", "\n").replace("\\\\", "\\")
+
+
+def parse_cef(message: str, row: Dict[str, Any]) -> bool:
+    """Fill row from a CEF:0|vendor|product|version|id|name|severity|ext message"""
+    start = message.find("CEF:")
+    parts = message[start:].split("|", 7)
+    if len(parts) < 8:
+        return False
+
+    row["description"] = parts[5] or None
+    row["severity"] = _cef_severity(parts[6])
+
+    ext = {}
+    for pair in _CEF_EXT_SPLIT_RE.split(parts[7].strip()):
+        key, _, value = pair.partition("=")
+        ext[key] = _cef_unescape(value)
+    row["source_ip"] = ext.get("src") or ext.get("sourceTranslatedAddress")
+    row["destination_ip"] = ext.get("dst") or ext.get("destinationTranslatedAddress")
+    row["source_port"] = _to_int(ext.get("spt"))
+    row["destination_port"] = _to_int(ext.get("dpt"))
+
+    proto = ext.get("proto")
+    if proto:
+        row["protocol"] = _IP_PROTOCOLS.get(proto, proto.upper()[:10])
+
+    # Without act, an outcome such as "blocked" still names the action;
+    # anything else is left for parse_line to record as UNKNOWN
+    act = ext.get("act")
+    outcome = ext.get("outcome")
+    if act:
+        row["action"] = _ACTION_WORDS.get(act.lower(), act.upper()[:10])
+    elif outcome:
+        row["action"] = _ACTION_WORDS.get(outcome.lower())
+
+    direction = ext.get("deviceDirection")
+    if direction is not None:
+        row["direction"] = "OUTBOUND" if direction == "1" else "INBOUND"
+
+    # CEF "in"/"out" are bytes received/sent by the device
+    row["bytes_received"] = _to_int(ext.get("in")) or 0
+    row["bytes_sent"] = _to_int(ext.get("out")) or 0
+    row["packet_count"] = _to_int(ext.get("cnt")) or 0
+
+    category = ext.get("cat")
+    if category:
+        row["threat_type"] = category[:50]
+
+    host = ext.get("dvchost")
+    if host:
+        row["log_source"] = host
+
+    receipt = ext.get("rt")
+    if receipt and receipt.isdigit():
+        row["timestamp"] = datetime.utcfromtimestamp(int(receipt) / 1000)
+
+    return True
+
+
+def parse_iptables(message: str, row: Dict[str, Any]) -> bool:
+    """Fill row from an iptables/ufw LOG line (IN= OUT= SRC= DST= PROTO= ...)"""
+    marker = message.find("IN=")
+    if marker < 0:
+        return False
+
+    # The free text before IN= is the log prefix, e.g. "[UFW BLOCK]"
+    action = IPTABLES_DEFAULT_ACTION
+    for word in message[:marker].replace("[", " ").replace("]", " ").split():
+        mapped = _ACTION_WORDS.get(word.lower())
+        if mapped:
+            action = mapped
+            break
+    row["action"] = action
+
+    fields = dict(_IPTABLES_RE.findall(message, marker))
+
+    row["source_ip"] = fields.get("SRC")
+    row["destination_ip"] = fields.get("DST")
+    row["source_port"] = _to_int(fields.get("SPT"))
+    row["destination_port"] = _to_int(fields.get("DPT"))
+    proto = fields.get("PROTO")
+    if proto:
+        row["protocol"] = _IP_PROTOCOLS.get(proto, proto.upper()[:10])
+    row["direction"] = "OUTBOUND" if fields.get("OUT") and not fields.get("IN") else "INBOUND"
+    row["bytes_received"] = _to_int(fields.get("LEN")) or 0
+    row["packet_count"] = 1
+    return True
+
+
+def _split_pf_endpoint(endpoint: str):
+    """Split tcpdump's 'addr.port' notation; ports are absent for ICMP"""
+    if ":" in endpoint:
+        # IPv6 addresses never contain dots, except in the port suffix
+        address, _, port = endpoint.rpartition(".")
+        return (address, _to_int(port)) if address else (endpoint, None)
+    if endpoint.count(".") == 4:
+        address, _, port = endpoint.rpartition(".")
+        return address, _to_int(port)
+    return endpoint, None
+
+
+def parse_pf(message: str, row: Dict[str, Any]) -> bool:
+    """Fill row from a pflog line: 'block in on em0: 1.2.3.4.5555 > 5.6.7.8.22: S ...'"""
+    match = _PF_RE.search(message)
+    if match is None:
+        return False
+    verb, direction, src, dst, proto = match.groups()
+    src, sport = _split_pf_endpoint(src)
+    dst, dport = _split_pf_endpoint(dst)
+
+    row["action"] = "ALLOW" if verb == "pass" else "DENY"
+    row["direction"] = "INBOUND" if direction == "in" else "OUTBOUND"
+    row["source_ip"] = src
+    row["source_port"] = sport
+    row["destination_ip"] = dst
+    row["destination_port"] = dport
+
+    proto = proto.rstrip(":").lower()
+    if proto.startswith("icmp"):
+        row["protocol"] = "ICMP"
+    elif proto == "udp":
+        row["protocol"] = "UDP"
+    else:
+        # tcpdump prints TCP flags rather than the protocol name
+        row["protocol"] = "TCP" if sport else "IP"
+    row["packet_count"] = 1
+    return True
+
+
+def parse_line(line: str, sender: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Parse one raw log line into a FirewallLog row dict.
+
+    log_source is the hostname from the syslog header when present (it
+    survives relays), otherwise the sender address. Returns None when the
+    line is not a recognised firewall event, lacks required fields or its
+    source/destination is not an IP address (CEF allows hostnames there).
+    """
+    line = line.rstrip("\r\n")
+    if not line:
+        return None
+
+    row = ROW_TEMPLATE.copy()
+    row["raw_log"] = line
+    hostname = None
+    message = line
+
+    if line.startswith("<") and (match := _RFC5424_RE.match(line)) is not None:
+        pri, timestamp, hostname, message = match.groups()
+        row["timestamp"] = _parse_timestamp(timestamp)
+        row["severity"] = _PRI_SEVERITY[int(pri) & 7]
+    elif (match := _RFC3164_RE.match(line)) is not None:
+        pri, timestamp, hostname, message = match.groups()
+        row["timestamp"] = _parse_timestamp(timestamp)
+        if pri is not None:
+            row["severity"] = _PRI_SEVERITY[int(pri) & 7]
+
+    if hostname == "-":
+        hostname = None
+    row["log_source"] = (hostname or sender or None)
+
+    if "CEF:" in message:
+        parsed = parse_cef(message, row)
+    elif "SRC=" in message:
+        parsed = parse_iptables(message, row)
+    else:
+        parsed = parse_pf(message, row)
+
+    if not parsed or pack_address(row["source_ip"]) is None or pack_address(row["destination_ip"]) is None:
+        return None
+    if row["protocol"] is None:
+        row["protocol"] = "IP"
+    if row["action"] is None:
+        row["action"] = UNKNOWN_ACTION
+    if row["timestamp"] is None:
+        row["timestamp"] = datetime.utcnow()
+    if row["log_source"] is not None:
+        row["log_source"] = row["log_source"][:100]
+    return row
@@ -0,0 +1,322 @@
+"""
+Filtering and keyset pagination for firewall log queries.
+
+Listing is ordered by (timestamp DESC, id DESC) and paged with an opaque
+cursor holding the last row's (timestamp, id), so every page is an index
+range scan starting where the previous one stopped instead of an OFFSET
+that re-reads all skipped rows.
+
+Low-cardinality filters (protocol, action, severity) are wrapped in
+`unindexed` so SQLite drives the scan from the timestamp or the
+(timestamp, action) / (timestamp, severity) composite indexes rather than
+collecting every DENY row through ix_firewall_logs_action and sorting them.
+Selective filters (addresses, CIDR ranges) stay indexable.
+
+With day partitions a page is filled from the newest day in range
+backwards (live table and/or Parquet archive file) and stops as soon as
+it is full, then merged with the legacy table.
+
+q= adds a full-text condition (app.services.fulltext) that the SQLite
+planner answers from the table's FTS5 index before checking the other
+filters; fetch_ranked_page orders matches by relevance instead of time.
+
+Pages can be projected to a subset of columns; rows are plain dicts keyed
+by column name and are never re-validated, so callers can encode them
+directly.
+"""
+import base64
+import ipaddress
+from dataclasses import dataclass, fields, replace
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+
+from app.core.netaddr import network_bounds, pack_address
+from app.models.firewall_log import FirewallLog
+from app.models.log_partition import LogPartition
+from app.services import archive, fulltext, partitions
+
+# Filters that should never choose the driving index of a listing query
+_LOW_CARDINALITY = ("protocol", "action", "severity")
+
+# Columns returned by the API; the packed *_bin address keys stay internal
+LOG_FIELDS = tuple(
+    column.name for column in FirewallLog.__table__.columns if not column.name.endswith("_bin")
+)
+# Columns every page carries for merging and cursors
+KEY_FIELDS = ("timestamp", "id")
+legacy_columns = FirewallLog.__table__.c
+
+
+class LogQueryError(ValueError):
+    """Raised for filter values or cursors that cannot be applied"""
+
+
+@dataclass
+class LogFilters:
+    """Structured filters shared by the log listing, stats and export APIs"""
+    start_time: Optional[datetime] = None  # inclusive
+    end_time: Optional[datetime] = None  # exclusive
+    source_ip: Optional[str] = None  # address or CIDR
+    destination_ip: Optional[str] = None  # address or CIDR
+    source_port: Optional[int] = None
+    destination_port: Optional[int] = None
+    protocol: Optional[List[str]] = None
+    action: Optional[List[str]] = None
+    severity: Optional[List[str]] = None
+    threat_type: Optional[List[str]] = None
+    log_source: Optional[List[str]] = None
+    q: Optional[str] = None  # full-text search over raw_log and description
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) in (None, []) for f in fields(self))
+
+
+class unindexed(ColumnElement):
+    """A column reference the SQLite planner will not use for index lookups"""
+
+    inherit_cache = True
+    _traverse_internals = [("column", InternalTraversal.dp_clauseelement)]
+
+    def __init__(self, column):
+        self.column = column
+        self.type = column.type
+
+
+@compiles(unindexed)
+def _compile_unindexed(element, compiler, **kw):
+    return compiler.process(element.column, **kw)
+
+
+@compiles(unindexed, "sqlite")
+def _compile_unindexed_sqlite(element, compiler, **kw):
+    # Unary plus turns the term into an expression SQLite cannot index
+    return "+" + compiler.process(element.column, **kw)
+
+
+def encode_cursor(timestamp: datetime, log_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{log_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, log_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise LogQueryError("Invalid cursor")
+
+
+def ip_condition(column, packed_column, value: str):
+    """Packed-key equality for an address, one key range for a CIDR"""
+    if "/" not in value:
+        packed = pack_address(value)
+        # Values that are not addresses can only match the text itself
+        return packed_column == packed if packed is not None else column == value
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        raise LogQueryError(f"Invalid CIDR {value!r}")
+    low, high = network_bounds(network)
+    return and_(packed_column >= low, packed_column <= high)
+
+
+def filter_conditions(filters: LogFilters, table: Any = None) -> List[Any]:
+    """WHERE clauses for filters against FirewallLog (or a same-shaped table)"""
+    c = table.c if table is not None else FirewallLog
+    conditions = []
+
+    if filters.start_time is not None:
+        conditions.append(c.timestamp >= filters.start_time)
+    if filters.end_time is not None:
+        conditions.append(c.timestamp < filters.end_time)
+
+    for name in ("source_ip", "destination_ip"):
+        value = getattr(filters, name)
+        if value:
+            conditions.append(ip_condition(getattr(c, name), getattr(c, f"{name}_bin"), value))
+
+    for name in ("source_port", "destination_port"):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(getattr(c, name) == value)
+
+    for name in ("protocol", "action", "severity", "threat_type", "log_source"):
+        values = getattr(filters, name)
+        if values:
+            column = getattr(c, name)
+            if name in _LOW_CARDINALITY:
+                column = unindexed(column)
+            conditions.append(column == values[0] if len(values) == 1 else column.in_(values))
+
+    if filters.q:
+        try:
+            conditions.append(fulltext.match_condition(table.c if table is not None else legacy_columns, filters.q))
+        except fulltext.FulltextQueryError as e:
+            raise LogQueryError(str(e))
+
+    return conditions
+
+
+def apply_log_filters(query, filters: LogFilters, table: Any = None):
+    conditions = filter_conditions(filters, table)
+    return query.where(*conditions) if conditions else query
+
+
+def apply_keyset(query, cursor: Optional[str], table: Any = None):
+    """Order newest first and continue after the cursor row, if any"""
+    c = table.c if table is not None else FirewallLog
+    query = query.order_by(c.timestamp.desc(), c.id.desc())
+    if cursor:
+        timestamp, log_id = decode_cursor(cursor)
+        # The leading "timestamp <=" keeps the predicate an index range
+        query = query.where(
+            c.timestamp <= timestamp,
+            or_(c.timestamp < timestamp, c.id < log_id),
+        )
+    return query
+
+
+async def fetch_log_page(
+    db: AsyncSession,
+    filters: LogFilters,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    skip: int = 0,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Up to skip + limit + 1 rows after the cursor, newest first, across all
+    tables and archive files; the extra row tells the caller whether
+    another page exists. With columns, rows hold only those columns plus
+    KEY_FIELDS.
+    """
+    filter_conditions(filters)  # reject bad filters before touching archive files
+    if columns:
+        columns = list(dict.fromkeys([*columns, *KEY_FIELDS]))
+    want = skip + limit + 1
+    after = decode_cursor(cursor) if cursor else None
+    end_time = filters.end_time
+    if after is not None and (end_time is None or after[0] < end_time):
+        end_time = after[0] + timedelta(microseconds=1)
+
+    def page_query(table, size):
+        selection = select(*[table.c[name] for name in columns or LOG_FIELDS])
+        query = apply_keyset(apply_log_filters(selection, filters, table), cursor, table)
+        return query.limit(size)
+
+    # Partition days are disjoint, so once the newest days yield a full
+    # page nothing in older ones can displace those rows
+    rows: List[Dict[str, Any]] = []
+    for partition in await partitions.list_partitions(db, filters.start_time, end_time):
+        size = want - len(rows)
+        day_rows = await archive.read_page(partition.day, filters, after, size, columns)
+        if partition.state != "archived":
+            result = await db.execute(page_query(partitions.partition_table(partition.day), size))
+            live = result_rows(result)
+            if day_rows:
+                day_rows = sorted(day_rows + live, key=_row_key, reverse=True)[:size]
+            else:
+                day_rows = live
+        rows.extend(day_rows)
+        if len(rows) >= want:
+            break
+
+    result = await db.execute(page_query(partitions.legacy_table, want))
+    legacy = result_rows(result)
+    if legacy:
+        rows = sorted(rows + legacy, key=_row_key, reverse=True)[:want]
+    return rows[skip:]
+
+
+async def fetch_ranked_page(
+    db: AsyncSession,
+    filters: LogFilters,
+    limit: int = 100,
+    skip: int = 0,
+    columns: Optional[Sequence[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Up to limit rows matching filters.q, most relevant first, after
+    skipping skip. Every database table in range is ranked by its text
+    index and the per-table top rows are merged by score; archived days
+    have no text index and are not part of ranked results.
+    """
+    if not filters.q:
+        raise LogQueryError("Relevance order requires q")
+    try:
+        terms = fulltext.parse_query(filters.q)
+    except fulltext.FulltextQueryError as e:
+        raise LogQueryError(str(e))
+    structured = replace(filters, q=None)
+    filter_conditions(structured)
+    names = list(dict.fromkeys([*(columns or LOG_FIELDS), *KEY_FIELDS]))
+    want = skip + limit
+    dialect = db.get_bind().dialect.name
+
+    # Rank keys only (a narrow sort), then load the winning rows
+    ranked: List[Dict[str, Any]] = []
+    for table in await partitions.log_tables(db, filters.start_time, filters.end_time):
+        query = apply_log_filters(fulltext.ranked_select(table, terms, dialect, KEY_FIELDS), structured, table)
+        for row in result_rows(await db.execute(query.limit(want))):
+            row["table"] = table
+            ranked.append(row)
+    ranked.sort(key=_row_key, reverse=True)
+    ranked.sort(key=lambda row: row["score"])  # stable: newest first among equal scores
+    ranked = ranked[skip:want]
+
+    loaded: Dict[int, Dict[str, Any]] = {}
+    by_table: Dict[Any, List[int]] = {}
+    for row in ranked:
+        by_table.setdefault(row["table"], []).append(row["id"])
+    for table, ids in by_table.items():
+        result = await db.execute(select(*[table.c[name] for name in names]).where(table.c.id.in_(ids)))
+        loaded.update((row["id"], row) for row in result_rows(result))
+    return [loaded[row["id"]] for row in ranked if row["id"] in loaded]
+
+
+def result_rows(result) -> List[Dict[str, Any]]:
+    """Row dicts with plain str keys (JSON encoders reject quoted_name)"""
+    keys = [str(key) for key in result.keys()]
+    return [dict(zip(keys, row)) for row in result.all()]
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple[datetime, int]:
+    return row["timestamp"], row["id"]
+
+
+async def get_log_row(db: AsyncSession, log_id: int) -> Optional[Dict[str, Any]]:
+    """One log by id from its partition, archive file or the legacy table"""
+    day = partitions.partition_day(log_id)
+    table = partitions.legacy_table
+    if day is not None:
+        result = await db.execute(select(LogPartition.state).where(LogPartition.day == day))
+        state = result.scalar_one_or_none()
+        if state is None:
+            return None
+        row = await archive.get_row(day, log_id)
+        if row is not None or state == "archived":
+            return row
+        table = partitions.partition_table(day)
+
+    result = await db.execute(select(*[table.c[name] for name in LOG_FIELDS]).where(table.c.id == log_id))
+    row = result.first()
+    return dict(row._mapping) if row is not None else None
+
+
+async def count_logs(db: AsyncSession) -> int:
+    """Exact row count over live tables and archive files"""
+    total = 0
+    for partition in await partitions.list_partitions(db):
+        total += archive.count_rows(partition.day)
+        if partition.state != "archived":
+            table = partitions.partition_table(partition.day)
+            total += (await db.execute(select(func.count()).select_from(table))).scalar() or 0
+    total += (await db.execute(select(func.count()).select_from(partitions.legacy_table))).scalar() or 0
+    return total
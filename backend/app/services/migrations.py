@@ -0,0 +1,127 @@
+"""
+Data migrations that cannot run as part of init_db.
+
+init_db only adds missing nullable columns. Rows written before the
+packed address keys existed (see app.core.netaddr) have NULL
+source_ip_bin / destination_ip_bin until backfill_packed_ips has run, and
+address filters do not find them until then. rebuild_ip_indexes replaces
+the old text address indexes with indexes on the packed keys.
+rebuild_fulltext_indexes indexes rows stored before the text indexes
+existed.
+"""
+import logging
+from typing import Dict, List
+
+from sqlalchemy import Table, bindparam, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.netaddr import pack_address
+from app.services import fulltext, partitions
+
+logger = logging.getLogger(__name__)
+
+# Address indexes superseded by the packed-key indexes
+_TEXT_IP_INDEXES = (("source_ip",), ("destination_ip",), ("source_ip", "destination_ip"))
+_LEGACY_TEXT_IP_INDEXES = (
+    "ix_firewall_logs_source_ip",
+    "ix_firewall_logs_destination_ip",
+    "idx_source_dest_ip",
+)
+
+
+async def _live_partitions(db: AsyncSession):
+    return [p for p in await partitions.list_partitions(db) if p.state != "archived"]
+
+
+async def backfill_table(db: AsyncSession, table: Table, batch_size: int = 10000) -> int:
+    """Fill NULL packed keys of one table in id order; returns rows updated"""
+    c = table.c
+    statement = (
+        update(table)
+        .where(c.id == bindparam("row_id"))
+        .values(source_ip_bin=bindparam("source_bin"), destination_ip_bin=bindparam("destination_bin"))
+    )
+    updated = 0
+    last_id = None
+    while True:
+        query = (
+            select(c.id, c.source_ip, c.destination_ip)
+            .where(or_(c.source_ip_bin.is_(None), c.destination_ip_bin.is_(None)))
+            .order_by(c.id)
+            .limit(batch_size)
+        )
+        if last_id is not None:
+            query = query.where(c.id > last_id)
+        rows = (await db.execute(query)).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        params = [
+            {
+                "row_id": row.id,
+                "source_bin": pack_address(row.source_ip),
+                "destination_bin": pack_address(row.destination_ip),
+            }
+            for row in rows
+        ]
+        # Rows whose text is not an address stay NULL; the keyset moves past them
+        params = [p for p in params if p["source_bin"] is not None or p["destination_bin"] is not None]
+        if params:
+            await db.execute(statement, params)
+        await db.commit()
+        updated += len(params)
+    return updated
+
+
+async def backfill_packed_ips(db: AsyncSession, batch_size: int = 10000) -> Dict[str, int]:
+    """Backfill packed address keys in the legacy table and every live partition"""
+    tables = [partitions.partition_table(p.day) for p in await _live_partitions(db)]
+    counts = {}
+    for table in [partitions.legacy_table, *tables]:
+        counts[table.name] = await backfill_table(db, table, batch_size)
+        logger.info("Backfilled packed addresses of %d rows in %s", counts[table.name], table.name)
+    return counts
+
+
+async def rebuild_ip_indexes(db: AsyncSession) -> List[str]:
+    """Drop the text address indexes and create the packed-key ones; returns tables touched"""
+    legacy = partitions.legacy_table
+    for name in _LEGACY_TEXT_IP_INDEXES:
+        await db.execute(text(f'DROP INDEX IF EXISTS "{name}"'))
+    await db.run_sync(
+        lambda session: [index.create(session.connection(), checkfirst=True) for index in legacy.indexes]
+    )
+    touched = [legacy.name]
+
+    packed_specs = [spec for spec in partitions.index_specs() if any(name.endswith("_bin") for name in spec)]
+    for partition in await _live_partitions(db):
+        table_name = partitions.partition_table(partition.day).name
+        for columns in _TEXT_IP_INDEXES:
+            await db.execute(text(f'DROP INDEX IF EXISTS "ix_{table_name}_{"_".join(columns)}"'))
+        # Hot days with deferred indexes get theirs when they are closed
+        if partition.state == "hot" and settings.PARTITION_DEFER_INDEXES:
+            continue
+        for columns in packed_specs:
+            await db.execute(text(partitions._index_ddl(table_name, columns)))
+        touched.append(table_name)
+    await db.commit()
+    return touched
+
+
+async def rebuild_fulltext_indexes(db: AsyncSession) -> List[str]:
+    """(Re)index raw_log/description of the legacy table and every live partition"""
+    dialect = db.get_bind().dialect.name
+    tables = [partitions.legacy_table, *(partitions.partition_table(p.day) for p in await _live_partitions(db))]
+    touched = []
+    for table in tables:
+        statements = fulltext.rebuild_ddl(dialect, table.name)
+        for statement in statements:
+            await db.execute(text(statement))
+        # One table per transaction keeps the write lock short on SQLite
+        await db.commit()
+        if statements:
+            touched.append(table.name)
+            logger.info("Rebuilt full-text index of %s", table.name)
+    return touched
+
@@ -0,0 +1,349 @@
+"""
+Per-day partitioning of firewall log storage.
+
+New rows go to one table per UTC day, firewall_logs_pYYYYMMDD, registered
+in log_partitions. Partition ids encode their day (day_number << 32 | n),
+so any id maps straight to its table; ids below 2**32 belong to the legacy
+firewall_logs table, which stays readable as one more source.
+
+A hot partition only carries the timestamp index that listing needs. The
+remaining secondary indexes of FirewallLog are built when the day is
+closed, keeping write amplification on the hot table low. Closed days may
+later be moved to the Parquet archive (state "archived", see
+app.services.archive); rows arriving for an archived day re-create its
+table next to the archive file. The retention policy drops whole
+partitions and their archive files instead of running large DELETEs.
+Rollups and sketches are kept, so long-range stats outlive the raw rows.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import (
+    BigInteger, Column, Identity, Integer, MetaData, Table, delete, func, select, text, update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.schema import CreateTable
+
+from app.core.config import settings
+from app.core.database import dialect_insert
+from app.models.firewall_log import FirewallLog
+from app.models.log_partition import LogPartition
+from app.services import fulltext
+from app.services.response_cache import LOGS, response_cache
+
+logger = logging.getLogger(__name__)
+
+ID_SHIFT = 32
+HOT_INDEXES = (("timestamp",),)
+
+_EPOCH_DAY = date(1970, 1, 1)
+_metadata = MetaData()
+# Days whose partition is known to exist; see ensure_partitions
+_ensured: Set[date] = set()
+
+legacy_table = FirewallLog.__table__
+
+
+def partition_name(day: date) -> str:
+    return f"firewall_logs_p{day:%Y%m%d}"
+
+
+def archive_path(day: date) -> Path:
+    return Path(settings.ARCHIVE_DIR) / f"{partition_name(day)}.parquet"
+
+
+def days_ago(days: int, now: Optional[datetime] = None) -> date:
+    return ((now or datetime.utcnow()) - timedelta(days=days)).date()
+
+
+def id_base(day: date) -> int:
+    return (day - _EPOCH_DAY).days << ID_SHIFT
+
+
+def partition_day(log_id: int) -> Optional[date]:
+    """Day a log id was allocated in, None for legacy ids"""
+    if log_id < 1 << ID_SHIFT:
+        return None
+    return _EPOCH_DAY + timedelta(days=log_id >> ID_SHIFT)
+
+
+def partition_table(day: date) -> Table:
+    """Table object for a day's partition (does not create it)"""
+    name = partition_name(day)
+    table = _metadata.tables.get(name)
+    if table is not None:
+        return table
+
+    columns = []
+    for column in legacy_table.columns:
+        if column.primary_key:
+            columns.append(Column(
+                column.name,
+                BigInteger().with_variant(Integer, "sqlite"),
+                Identity(start=id_base(day) + 1),
+                primary_key=True,
+            ))
+        else:
+            copy = column._copy()
+            copy.index = None
+            columns.append(copy)
+    return Table(name, _metadata, *columns, sqlite_autoincrement=True)
+
+
+def index_specs() -> List[tuple]:
+    """Column tuples of FirewallLog's secondary indexes"""
+    specs = {
+        tuple(column.name for column in index.columns)
+        for index in legacy_table.indexes
+    }
+    specs.discard(("id",))
+    return sorted(specs)
+
+
+def _index_ddl(table_name: str, columns: tuple) -> str:
+    name = f"ix_{table_name}_{'_'.join(columns)}"
+    return f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table_name}" ({", ".join(columns)})'
+
+
+def retention_cutoff(now: Optional[datetime] = None) -> Optional[date]:
+    """Days before this one are past retention; None keeps everything"""
+    if settings.LOG_RETENTION_DAYS <= 0:
+        return None
+    return days_ago(settings.LOG_RETENTION_DAYS, now)
+
+
+async def _create_partition(db: AsyncSession, day: date) -> None:
+    table = partition_table(day)
+    # An archived day that is reopened must not reuse the ids in its file
+    max_id = await db.scalar(select(LogPartition.max_id).where(LogPartition.day == day))
+    await db.execute(CreateTable(table, if_not_exists=True))
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        # AUTOINCREMENT continues from sqlite_sequence, seeding the day's id range
+        await db.execute(
+            text(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT :name, :seq "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+            ),
+            {"name": table.name, "seq": max(id_base(day), max_id or 0)},
+        )
+    elif dialect == "postgresql" and max_id:
+        # The next id is max_id + 1, unless the table is already past it
+        await db.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f'GREATEST(:next, (SELECT COALESCE(MAX(id), 0) + 1 FROM "{table.name}")), false)'
+            ),
+            {"next": max_id + 1},
+        )
+    specs = HOT_INDEXES if settings.PARTITION_DEFER_INDEXES else index_specs()
+    for columns in specs:
+        await db.execute(text(_index_ddl(table.name, columns)))
+    # The text index is needed while the day is hot, so it is never deferred
+    for statement in fulltext.index_ddl(db.get_bind().dialect.name, table.name):
+        await db.execute(text(statement))
+    await db.execute(
+        dialect_insert(db, LogPartition.__table__)
+        .values(day=day, table_name=table.name, state="hot")
+        .on_conflict_do_nothing(index_elements=["day"])
+    )
+    await db.execute(
+        update(LogPartition.__table__)
+        .where(LogPartition.day == day, LogPartition.state == "archived")
+        .values(state="hot", closed_at=None)
+    )
+
+
+async def ensure_partitions(db: AsyncSession, days: Iterable[date]) -> Dict[date, Table]:
+    """Create (idempotently) and return the partitions for days"""
+    tables = {day: partition_table(day) for day in set(days)}
+    missing = sorted(day for day in tables if day not in _ensured)
+    if not missing:
+        return tables
+
+    for day in missing:
+        await _create_partition(db, day)
+    await db.commit()
+
+    # Older days may be archived or dropped by another process at any
+    # time, so only today and yesterday skip the idempotent re-check
+    recent = days_ago(1)
+    _ensured.update(day for day in missing if day >= recent)
+    return tables
+
+
+async def route_rows(db: AsyncSession, rows: List[Dict[str, Any]]) -> Dict[Table, List[int]]:
+    """Group row positions by the table they are written to"""
+    if not settings.LOG_PARTITIONING:
+        return {legacy_table: list(range(len(rows)))}
+
+    by_day: Dict[date, List[int]] = {}
+    for position, row in enumerate(rows):
+        by_day.setdefault(row["timestamp"].date(), []).append(position)
+    tables = await ensure_partitions(db, by_day)
+    return {tables[day]: positions for day, positions in by_day.items()}
+
+
+async def list_partitions(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[LogPartition]:
+    """Registered partitions overlapping [start, end), newest first"""
+    query = select(LogPartition).order_by(LogPartition.day.desc())
+    if start is not None:
+        query = query.where(LogPartition.day >= start.date())
+    if end is not None:
+        query = query.where(LogPartition.day <= (end - timedelta(microseconds=1)).date())
+    result = await db.execute(query)
+    return list(result.scalars().all())
+
+
+async def partition_tables(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Table]:
+    """Live partition tables overlapping [start, end), newest first"""
+    return [
+        partition_table(p.day)
+        for p in await list_partitions(db, start, end)
+        if p.state != "archived"
+    ]
+
+
+async def log_tables(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[Table]:
+    """Every table that may hold rows in [start, end): partitions, then legacy"""
+    return await partition_tables(db, start, end) + [legacy_table]
+
+
+# ----------------------------------------------------------------------
+# Maintenance
+# ----------------------------------------------------------------------
+
+
+async def close_partition(db: AsyncSession, partition: LogPartition) -> None:
+    """Build deferred indexes, refresh planner statistics and record row stats"""
+    table = partition_table(partition.day)
+    for columns in index_specs():
+        await db.execute(text(_index_ddl(table.name, columns)))
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        await db.execute(text("PRAGMA analysis_limit=1000"))
+        await db.execute(text(f'ANALYZE "{table.name}"'))
+    elif dialect == "postgresql":
+        await db.execute(text(f'ANALYZE "{table.name}"'))
+
+    result = await db.execute(
+        select(func.count(), func.min(table.c.timestamp), func.max(table.c.timestamp)).select_from(table)
+    )
+    row_count, min_timestamp, max_timestamp = result.one()
+    partition.state = "closed"
+    partition.row_count = row_count
+    partition.min_timestamp = min_timestamp
+    partition.max_timestamp = max_timestamp
+    partition.closed_at = datetime.utcnow()
+    await db.commit()
+    logger.info("Closed log partition %s (%d rows)", table.name, row_count)
+
+
+async def drop_partition(db: AsyncSession, partition: LogPartition) -> None:
+    table = partition_table(partition.day)
+    await _drop_table(db, table)
+    await db.delete(partition)
+    await db.commit()
+    _forget(partition.day)
+    archive_path(partition.day).unlink(missing_ok=True)
+    day_start = datetime.combine(partition.day, time())
+    await response_cache.invalidate_range(day_start, day_start + timedelta(days=1))
+    logger.info("Dropped log partition %s", table.name)
+
+
+async def lock_partition(db: AsyncSession, partition: LogPartition, row_count: int, expected_rows: int) -> bool:
+    """
+    Mark a partition archived and block further inserts into its table.
+
+    The table is re-counted under the lock; when it no longer holds
+    expected_rows (rows arrived after the caller read it) the transaction
+    is undone and False is returned so nothing is dropped.
+    """
+    table = partition_table(partition.day)
+    previous = (partition.state, partition.row_count, partition.max_id)
+    partition.state = "archived"
+    partition.row_count = row_count
+    # On SQLite this first write takes the database write lock
+    await db.flush()
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(text(f'LOCK TABLE "{table.name}" IN SHARE ROW EXCLUSIVE MODE'))
+    current, max_id = (await db.execute(select(func.count(), func.max(table.c.id)).select_from(table))).one()
+    if max_id is not None and max_id > (partition.max_id or 0):
+        partition.max_id = max_id
+    if current != expected_rows:
+        # Restored and committed rather than rolled back so loaded rows stay usable
+        partition.state, partition.row_count, partition.max_id = previous
+        await db.commit()
+        return False
+    return True
+
+
+async def retire_partition(db: AsyncSession, partition: LogPartition) -> None:
+    """Drop a partition locked by lock_partition and commit"""
+    await _drop_table(db, partition_table(partition.day))
+    await db.commit()
+    _forget(partition.day)
+
+
+async def _drop_table(db: AsyncSession, table: Table) -> None:
+    await db.execute(text(f'DROP TABLE IF EXISTS "{table.name}"'))
+    for statement in fulltext.drop_ddl(db.get_bind().dialect.name, table.name):
+        await db.execute(text(statement))
+
+
+def _forget(day: date) -> None:
+    _ensured.discard(day)
+    table = _metadata.tables.get(partition_name(day))
+    if table is not None:
+        _metadata.remove(table)
+
+
+async def purge_legacy(db: AsyncSession, before: datetime, batch_size: int = 10000) -> int:
+    """Delete legacy rows older than before in short transactions"""
+    purged = 0
+    while True:
+        batch = select(legacy_table.c.id).where(legacy_table.c.timestamp < before).limit(batch_size)
+        result = await db.execute(delete(legacy_table).where(legacy_table.c.id.in_(batch.scalar_subquery())))
+        await db.commit()
+        purged += result.rowcount or 0
+        if (result.rowcount or 0) < batch_size:
+            if purged:
+                await response_cache.invalidate_scope(LOGS)
+            return purged
+
+
+async def maintain_partitions(db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Close finished days and apply the retention policy"""
+    now = now or datetime.utcnow()
+    close_before = (now - timedelta(seconds=settings.PARTITION_CLOSE_DELAY)).date()
+    cutoff = retention_cutoff(now)
+
+    closed: List[date] = []
+    dropped: List[date] = []
+    for partition in reversed(await list_partitions(db)):
+        if cutoff is not None and partition.day < cutoff:
+            await drop_partition(db, partition)
+            dropped.append(partition.day)
+        elif partition.state == "hot" and partition.day < close_before:
+            await close_partition(db, partition)
+            closed.append(partition.day)
+
+    purged = 0
+    if cutoff is not None:
+        purged = await purge_legacy(db, datetime.combine(cutoff, time()))
+    return {"closed": closed, "dropped": dropped, "legacy_purged": purged}
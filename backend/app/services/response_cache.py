@@ -0,0 +1,408 @@
+"""
+Response cache for repeated dashboard queries (log pages, counts, stats, rules).
+
+Entries are keyed on the endpoint and its normalized parameters and hold
+the encoded response body, its ETag and the headers to replay. Each
+entry remembers the sequence number current when it was computed and the
+time range its result depends on. Writers bump generations:
+
+- ingestion bumps every RESPONSE_CACHE_BUCKET_SECONDS bucket its rows
+  fall into (see invalidate_rows);
+- dropping a partition bumps that day's buckets;
+- scopes without a time range (alert rules) are bumped as a whole.
+
+An entry is valid while no bucket of its range (and not its scope as a
+whole) has been bumped after it was computed, while anything touching
+the hour being ingested is recomputed. Entries over live ranges, or
+without a range, also expire after RESPONSE_CACHE_TTL, which bounds
+staleness from writes this process does not see (other workers without
+the shared backend, replica lag).
+
+With the local backend, bumps from other processes (other uvicorn
+workers, scripts/syslog_ingest.py, retention drops and rollup rebuilds
+by the scripts) never arrive, so entries over closed ranges expire after
+RESPONSE_CACHE_CLOSED_TTL. With the shared backend every writing
+process that sets RESPONSE_CACHE_REDIS_URL bumps the same generations,
+and those entries stay cached until evicted.
+
+Clients sending If-None-Match with the current ETag get 304 without a
+database query. With RESPONSE_CACHE_REDIS_URL (requires redis) entries
+and generations live in Redis and are shared by every worker.
+"""
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+
+from app.core.cache import register_cache
+from app.core.config import settings
+from app.core.timeutil import naive_utc
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional shared backend
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+# Scope of everything derived from firewall_logs (listing, counts, rollup stats)
+LOGS = "logs"
+ALERT_RULES = "alert_rules"
+# Bucket ranges wider than this are checked against every bumped bucket instead
+_MAX_RANGE_BUCKETS = 4096
+
+Range = Tuple[Optional[int], Optional[int]]  # inclusive bucket bounds; None is open
+
+
+@dataclass
+class CacheEntry:
+    body: bytes
+    etag: str
+    seq: int  # generation sequence when computed
+    scope: str
+    range: Range
+    headers: Dict[str, str] = field(default_factory=dict)
+    media_type: str = "application/json"
+    expires_at: Optional[float] = None  # wall clock; None never expires
+
+    def size(self) -> int:
+        return len(self.body) + 256
+
+
+def bucket_of(timestamp: datetime) -> int:
+    return int((naive_utc(timestamp) - _EPOCH).total_seconds()) // settings.RESPONSE_CACHE_BUCKET_SECONDS
+
+
+def bucket_range(start: Optional[datetime], end: Optional[datetime]) -> Range:
+    """Buckets covering [start, end]; open ends stay None"""
+    return (
+        bucket_of(start) if start is not None else None,
+        bucket_of(end) if end is not None else None,
+    )
+
+
+def cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Stable key for an endpoint and its normalized parameters"""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == []:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = sorted(str(item) for item in value)
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        normalized[name] = value
+    raw = orjson.dumps([endpoint, normalized], option=orjson.OPT_SORT_KEYS)
+    return f"{endpoint}:{hashlib.blake2b(raw, digest_size=16).hexdigest()}"
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+# ----------------------------------------------------------------------
+# Backends
+# ----------------------------------------------------------------------
+
+
+class LocalBackend:
+    """Per-process LRU of entries bounded by count and bytes, with local generations"""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._seq = 0
+        self._scopes: Dict[str, int] = {}
+        self._buckets: Dict[str, Dict[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        if entry.size() > self.max_bytes:
+            return
+        await self.delete(key)
+        self._entries[key] = entry
+        self._bytes += entry.size()
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size()
+
+    async def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size()
+
+    async def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    async def current_seq(self) -> int:
+        return self._seq
+
+    async def bump(self, scope: str, buckets: Optional[Iterable[int]] = None) -> None:
+        """Advance the generation of some buckets of a scope, or of the whole scope"""
+        self._seq += 1
+        if buckets is None:
+            self._scopes[scope] = self._seq
+            return
+        generations = self._buckets.setdefault(scope, {})
+        for bucket in buckets:
+            generations[bucket] = self._seq
+
+    async def max_seq(self, scope: str, bucket_bounds: Range) -> int:
+        """Latest generation of the scope as a whole or of any bucket in range"""
+        latest = self._scopes.get(scope, 0)
+        generations = self._buckets.get(scope)
+        if not generations:
+            return latest
+        low, high = bucket_bounds
+        if low is not None and high is not None and high - low < min(_MAX_RANGE_BUCKETS, len(generations)):
+            get = generations.get
+            return max(latest, max((get(bucket, 0) for bucket in range(low, high + 1)), default=0))
+        for bucket, seq in generations.items():
+            if seq > latest and (low is None or bucket >= low) and (high is None or bucket <= high):
+                latest = seq
+        return latest
+
+
+class RedisBackend:
+    """Entries and generations in Redis, shared by every worker"""
+
+    def __init__(self, url: str, prefix: str = "fwcache"):
+        self._redis = redis_asyncio.from_url(url)
+        self.prefix = prefix
+
+    def __len__(self) -> int:
+        return 0  # not tracked locally
+
+    @property
+    def bytes(self) -> int:
+        return 0
+
+    def _entry_key(self, key: str) -> str:
+        return f"{self.prefix}:entry:{key}"
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self._redis.get(self._entry_key(key))
+        if raw is None:
+            return None
+        data = orjson.loads(raw)
+        return CacheEntry(
+            body=data["body"].encode(),
+            etag=data["etag"],
+            seq=data["seq"],
+            scope=data["scope"],
+            range=tuple(data["range"]),
+            headers=data["headers"],
+            media_type=data["media_type"],
+            expires_at=data["expires_at"],
+        )
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        payload = orjson.dumps({
+            "body": entry.body.decode(),
+            "etag": entry.etag,
+            "seq": entry.seq,
+            "scope": entry.scope,
+            "range": list(entry.range),
+            "headers": entry.headers,
+            "media_type": entry.media_type,
+            "expires_at": entry.expires_at,
+        })
+        ttl = None if entry.expires_at is None else max(int(entry.expires_at - time.time()) + 1, 1)
+        await self._redis.set(self._entry_key(key), payload, ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._entry_key(key))
+
+    async def clear(self) -> None:
+        async for key in self._redis.scan_iter(f"{self.prefix}:*"):
+            await self._redis.delete(key)
+
+    async def current_seq(self) -> int:
+        return int(await self._redis.get(f"{self.prefix}:seq") or 0)
+
+    async def bump(self, scope: str, buckets: Optional[Iterable[int]] = None) -> None:
+        seq = await self._redis.incr(f"{self.prefix}:seq")
+        if buckets is None:
+            await self._redis.hset(f"{self.prefix}:scopes", scope, seq)
+            return
+        mapping = {str(bucket): seq for bucket in buckets}
+        if mapping:
+            await self._redis.hset(f"{self.prefix}:buckets:{scope}", mapping=mapping)
+
+    async def max_seq(self, scope: str, bucket_bounds: Range) -> int:
+        latest = int(await self._redis.hget(f"{self.prefix}:scopes", scope) or 0)
+        name = f"{self.prefix}:buckets:{scope}"
+        low, high = bucket_bounds
+        if low is not None and high is not None and high - low < _MAX_RANGE_BUCKETS:
+            values = await self._redis.hmget(name, [str(bucket) for bucket in range(low, high + 1)])
+            return max([latest, *(int(value) for value in values if value is not None)])
+        for bucket, seq in (await self._redis.hgetall(name)).items():
+            bucket = int(bucket)
+            if (low is None or bucket >= low) and (high is None or bucket <= high):
+                latest = max(latest, int(seq))
+        return latest
+
+
+# ----------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------
+
+# compute() returns the body, extra headers and the time range the result depends on
+Computed = Tuple[bytes, Dict[str, str], Tuple[Optional[datetime], Optional[datetime]]]
+
+
+class ResponseCache:
+    """Serves endpoint responses from the backend while their generations are unchanged"""
+
+    def __init__(self):
+        if settings.RESPONSE_CACHE_REDIS_URL and redis_asyncio is not None:
+            self.backend = RedisBackend(settings.RESPONSE_CACHE_REDIS_URL)
+        else:
+            if settings.RESPONSE_CACHE_REDIS_URL:
+                logger.warning("RESPONSE_CACHE_REDIS_URL is set but redis is not installed; using a local cache")
+            self.backend = LocalBackend(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_MAX_BYTES)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def __len__(self) -> int:
+        return len(self.backend)
+
+    async def _valid(self, entry: CacheEntry) -> bool:
+        if entry.expires_at is not None and entry.expires_at <= time.time():
+            return False
+        return await self.backend.max_seq(entry.scope, entry.range) <= entry.seq
+
+    def _expiry(self, bucket_bounds: Range) -> Optional[float]:
+        """Entries reaching into the current bucket (or unbounded) are live and get the TTL"""
+        high = bucket_bounds[1]
+        if high is None or high >= bucket_of(datetime.utcnow()) - 1:
+            return time.time() + settings.RESPONSE_CACHE_TTL
+        if isinstance(self.backend, LocalBackend):
+            # Other processes' writes never bump local generations
+            return time.time() + settings.RESPONSE_CACHE_CLOSED_TTL
+        return None
+
+    def _respond(self, request: Request, entry: CacheEntry, status: str) -> Response:
+        headers = {
+            **entry.headers,
+            "ETag": entry.etag,
+            "Cache-Control": "private, no-cache",
+            "X-Cache": status,
+        }
+        if _matches(request.headers.get("if-none-match"), entry.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type=entry.media_type, headers=headers)
+
+    async def respond(
+        self,
+        request: Request,
+        endpoint: str,
+        params: Dict[str, Any],
+        compute: Callable[[], Awaitable[Computed]],
+        scope: str = LOGS,
+        media_type: str = "application/json",
+    ) -> Response:
+        """Cached response for endpoint(params), computing and storing it on a miss"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            body, headers, _ = await compute()
+            return Response(body, media_type=media_type, headers=headers)
+
+        key = cache_key(endpoint, params)
+        try:
+            entry = await self.backend.get(key)
+            if entry is not None and await self._valid(entry):
+                self.hits += 1
+                return self._respond(request, entry, "HIT")
+            # Read before querying: a write committed meanwhile leaves the entry stale, never wrong
+            seq = await self.backend.current_seq()
+        except Exception:
+            logger.exception("Response cache lookup failed")
+            body, headers, _ = await compute()
+            return Response(body, media_type=media_type, headers=headers)
+
+        self.misses += 1
+        body, headers, (start, end) = await compute()
+        bounds = bucket_range(start, end) if scope == LOGS else (None, None)
+        entry = CacheEntry(
+            body=body,
+            etag=_etag(body),
+            seq=seq,
+            scope=scope,
+            range=bounds,
+            headers=headers,
+            media_type=media_type,
+            expires_at=self._expiry(bounds) if scope == LOGS else time.time() + settings.RESPONSE_CACHE_TTL,
+        )
+        try:
+            await self.backend.set(key, entry)
+        except Exception:
+            logger.exception("Response cache store failed")
+        return self._respond(request, entry, "MISS")
+
+    # ------------------------------------------------------------------
+    # Invalidation
+    # ------------------------------------------------------------------
+
+    async def invalidate_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """Bump the buckets of newly written log rows"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return
+        buckets = {bucket_of(row["timestamp"]) for row in rows if isinstance(row.get("timestamp"), datetime)}
+        await self.backend.bump(LOGS, buckets)
+
+    async def invalidate_range(self, start: datetime, end: datetime) -> None:
+        """Bump every bucket overlapping [start, end)"""
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return
+        low, high = bucket_of(start), bucket_of(end - timedelta(microseconds=1))
+        await self.backend.bump(LOGS, range(low, high + 1))
+
+    async def invalidate_scope(self, scope: str) -> None:
+        if settings.RESPONSE_CACHE_ENABLED:
+            await self.backend.bump(scope)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "bytes": self.backend.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+        }
+
+
+# Process-wide cache used by the read endpoints
+response_cache = ResponseCache()
+register_cache("responses", response_cache)
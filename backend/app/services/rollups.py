@@ -0,0 +1,317 @@
+"""
+Incrementally maintained time-bucket rollups of firewall logs.
+
+Every ingested chunk is folded into per-minute, per-hour and per-day
+counters (events, bytes, packets; a flow record counts its event_count
+events) for the totals and for each value of
+action, severity and protocol, upserted in the same transaction as the log
+rows. Source/destination IP counters are kept only at hour and day
+granularity to keep the table small.
+
+A query range is answered from the coarsest buckets that fit entirely
+inside it plus finer buckets at the edges, so a 30-day range reads about
+30 day buckets and a few hundred hour/minute buckets regardless of how
+many raw rows it covers.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, delete, desc, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import dialect_insert
+from app.models.log_rollup import LogRollup
+from app.services import archive, partitions
+from app.services.response_cache import response_cache
+
+GRANULARITIES = ("day", "hour", "minute")  # coarsest first
+GRANULARITY_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+CATEGORY_DIMENSIONS = ("action", "severity", "protocol")
+IP_DIMENSIONS = ("source_ip", "destination_ip")
+IP_GRANULARITIES = ("day", "hour")
+
+_table = LogRollup.__table__
+_COUNTERS = ("event_count", "bytes_sent", "bytes_received", "packet_count")
+
+RollupKey = Tuple[str, datetime, str, str]
+
+
+def floor_bucket(ts: datetime, granularity: str) -> datetime:
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_bucket(ts: datetime, granularity: str) -> datetime:
+    floor = floor_bucket(ts, granularity)
+    if floor == ts:
+        return ts
+    return floor + timedelta(seconds=GRANULARITY_SECONDS[granularity])
+
+
+def aggregate(rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, List[int]]:
+    """Fold log rows into rollup counters keyed by (granularity, bucket, dimension, value)"""
+    counters: Dict[RollupKey, List[int]] = {}
+
+    def add(key, events, sent, received, packets):
+        entry = counters.get(key)
+        if entry is None:
+            counters[key] = [events, sent, received, packets]
+        else:
+            entry[0] += events
+            entry[1] += sent
+            entry[2] += received
+            entry[3] += packets
+
+    for row in rows:
+        ts = row["timestamp"]
+        events = row.get("event_count") or 1
+        sent = row.get("bytes_sent") or 0
+        received = row.get("bytes_received") or 0
+        packets = row.get("packet_count") or 0
+        buckets = (
+            ("minute", ts.replace(second=0, microsecond=0)),
+            ("hour", ts.replace(minute=0, second=0, microsecond=0)),
+            ("day", ts.replace(hour=0, minute=0, second=0, microsecond=0)),
+        )
+        for granularity, bucket in buckets:
+            add((granularity, bucket, "total", ""), events, sent, received, packets)
+            for dimension in CATEGORY_DIMENSIONS:
+                add((granularity, bucket, dimension, row.get(dimension) or ""), events, sent, received, packets)
+            if granularity != "minute":
+                for dimension in IP_DIMENSIONS:
+                    add((granularity, bucket, dimension, row.get(dimension) or ""), events, sent, received, packets)
+    return counters
+
+
+async def apply_rollups(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Upsert rollup counters for rows inside the caller's transaction"""
+    counters = aggregate(rows)
+    if not counters:
+        return
+
+    insert = dialect_insert(db, _table)
+    stmt = insert.on_conflict_do_update(
+        index_elements=["granularity", "dimension", "bucket_start", "value"],
+        set_={name: getattr(_table.c, name) + getattr(insert.excluded, name) for name in _COUNTERS},
+    )
+    # A stable key order keeps concurrent writers from deadlocking
+    params = [
+        {
+            "granularity": granularity,
+            "bucket_start": bucket,
+            "dimension": dimension,
+            "value": value,
+            "event_count": values[0],
+            "bytes_sent": values[1],
+            "bytes_received": values[2],
+            "packet_count": values[3],
+        }
+        for (granularity, bucket, dimension, value), values in sorted(counters.items())
+    ]
+    await db.execute(stmt, params)
+
+
+def plan_buckets(
+    start: datetime, end: datetime, granularities: Tuple[str, ...] = GRANULARITIES
+) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Cover [start, end) with (granularity, lo, hi) bucket_start ranges.
+
+    Uses the coarsest granularity for the aligned middle of the range and
+    recurses into the finer ones for the ragged edges. start and end must
+    already be aligned to the finest granularity.
+    """
+    if start >= end:
+        return []
+    coarse, finer = granularities[0], granularities[1:]
+    if not finer:
+        return [(coarse, start, end)]
+
+    lo, hi = ceil_bucket(start, coarse), floor_bucket(end, coarse)
+    if lo >= hi:
+        return plan_buckets(start, end, finer)
+    return plan_buckets(start, lo, finer) + [(coarse, lo, hi)] + plan_buckets(hi, end, finer)
+
+
+def _range_condition(plan: List[Tuple[str, datetime, datetime]]):
+    return or_(*[
+        and_(
+            LogRollup.granularity == granularity,
+            LogRollup.bucket_start >= lo,
+            LogRollup.bucket_start < hi,
+        )
+        for granularity, lo, hi in plan
+    ])
+
+
+def _counter_dict(row) -> Dict[str, int]:
+    return {
+        "events": int(row.event_count or 0),
+        "bytes_sent": int(row.bytes_sent or 0),
+        "bytes_received": int(row.bytes_received or 0),
+        "packet_count": int(row.packet_count or 0),
+    }
+
+
+_SUMS = (
+    func.sum(LogRollup.event_count).label("event_count"),
+    func.sum(LogRollup.bytes_sent).label("bytes_sent"),
+    func.sum(LogRollup.bytes_received).label("bytes_received"),
+    func.sum(LogRollup.packet_count).label("packet_count"),
+)
+
+
+async def query_stats(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    top: int = 10,
+    interval: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Totals, per-category counts, top IPs and an optional series for [start, end)"""
+    start, end = floor_bucket(start, "minute"), ceil_bucket(end, "minute")
+    plan = plan_buckets(start, end)
+
+    stats: Dict[str, Any] = {
+        "start_time": start,
+        "end_time": end,
+        "total": {"events": 0, "bytes_sent": 0, "bytes_received": 0, "packet_count": 0},
+    }
+    for dimension in CATEGORY_DIMENSIONS:
+        stats[f"by_{dimension}"] = {}
+
+    if plan:
+        result = await db.execute(
+            select(LogRollup.dimension, LogRollup.value, *_SUMS)
+            .where(LogRollup.dimension.in_(("total",) + CATEGORY_DIMENSIONS), _range_condition(plan))
+            .group_by(LogRollup.dimension, LogRollup.value)
+        )
+        for row in result:
+            if row.dimension == "total":
+                stats["total"] = _counter_dict(row)
+            else:
+                stats[f"by_{row.dimension}"][row.value] = int(row.event_count or 0)
+
+    # IP counters stop at hour resolution, so widen the range to whole hours
+    ip_start, ip_end = floor_bucket(start, "hour"), ceil_bucket(end, "hour")
+    ip_plan = plan_buckets(ip_start, ip_end, IP_GRANULARITIES)
+    stats["ip_window"] = {"start_time": ip_start, "end_time": ip_end}
+    for dimension in IP_DIMENSIONS:
+        key = "top_source_ips" if dimension == "source_ip" else "top_destination_ips"
+        stats[key] = []
+        if not ip_plan or top <= 0:
+            continue
+        result = await db.execute(
+            select(LogRollup.value, *_SUMS)
+            .where(LogRollup.dimension == dimension, _range_condition(ip_plan))
+            .group_by(LogRollup.value)
+            .order_by(desc("event_count"))
+            .limit(top)
+        )
+        stats[key] = [{"ip": row.value, **_counter_dict(row)} for row in result]
+
+    if interval is not None:
+        lo, hi = floor_bucket(start, interval), ceil_bucket(end, interval)
+        result = await db.execute(
+            select(LogRollup.bucket_start, *_SUMS)
+            .where(
+                LogRollup.granularity == interval,
+                LogRollup.dimension == "total",
+                LogRollup.bucket_start >= lo,
+                LogRollup.bucket_start < hi,
+            )
+            .group_by(LogRollup.bucket_start)
+            .order_by(LogRollup.bucket_start)
+        )
+        stats["series"] = [{"bucket_start": row.bucket_start, **_counter_dict(row)} for row in result]
+
+    return stats
+
+
+async def rebuild_rollups(
+    db: AsyncSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = 10000,
+) -> int:
+    """
+    Recompute rollups from the raw table for whole days in [start, end).
+
+    Used to backfill rows that were written without going through the
+    ingestion path. Only days that still have raw rows or an archive file
+    are recomputed; rollups of days dropped by retention are kept, as they
+    are the only record left of those days. Returns the number of log
+    rows folded in.
+    """
+    day_lo = floor_bucket(start, "day") if start else None
+    day_hi = ceil_bucket(end, "day") if end else None
+
+    ranges = _day_ranges(await _source_days(db, day_lo, day_hi))
+    for lo, hi in ranges:
+        await db.execute(delete(LogRollup).where(LogRollup.bucket_start >= lo, LogRollup.bucket_start < hi))
+
+    names = (
+        "timestamp", "source_ip", "destination_ip", "protocol", "action", "severity",
+        "bytes_sent", "bytes_received", "packet_count", "event_count",
+    )
+
+    total = 0
+    for table in await partitions.log_tables(db, day_lo, day_hi):
+        query = select(*[table.c[name] for name in names]).execution_options(yield_per=chunk_size)
+        if day_lo is not None:
+            query = query.where(table.c.timestamp >= day_lo)
+        if day_hi is not None:
+            query = query.where(table.c.timestamp < day_hi)
+
+        stream = await db.stream(query)
+        async for batch in stream.mappings().partitions(chunk_size):
+            rows = [dict(row) for row in batch]
+            await apply_rollups(db, rows)
+            total += len(rows)
+
+    for partition in await partitions.list_partitions(db, day_lo, day_hi):
+        path = partitions.archive_path(partition.day)
+        if path.exists():
+            for rows in archive.iter_row_batches(path):
+                await apply_rollups(db, rows)
+                total += len(rows)
+    await db.commit()
+    for lo, hi in ranges:
+        await response_cache.invalidate_range(lo, hi)
+    return total
+
+
+async def _source_days(db: AsyncSession, day_lo: Optional[datetime], day_hi: Optional[datetime]) -> Set[date]:
+    """Days in [day_lo, day_hi) with rows in a live partition, an archive file or the legacy table"""
+    days = {
+        partition.day
+        for partition in await partitions.list_partitions(db, day_lo, day_hi)
+        if partition.state != "archived" or partitions.archive_path(partition.day).exists()
+    }
+    legacy = partitions.legacy_table
+    query = select(func.date(legacy.c.timestamp)).distinct()
+    if day_lo is not None:
+        query = query.where(legacy.c.timestamp >= day_lo)
+    if day_hi is not None:
+        query = query.where(legacy.c.timestamp < day_hi)
+    for value in (await db.execute(query)).scalars():
+        # SQLite returns 'YYYY-MM-DD' text, PostgreSQL a date
+        days.add(date.fromisoformat(value) if isinstance(value, str) else value)
+    return days
+
+
+def _day_ranges(days: Set[date]) -> List[Tuple[datetime, datetime]]:
+    """Consecutive days merged into [start, end) datetime ranges"""
+    ranges: List[Tuple[datetime, datetime]] = []
+    for day in sorted(days):
+        start = datetime.combine(day, time())
+        end = start + timedelta(days=1)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
@@ -0,0 +1,83 @@
+"""
+Scrape-time metrics read from the counters services already keep.
+
+Nothing here runs on the request or ingestion path: the collector is
+called by /metrics and turns the alert engine, cache, queue and stream
+counters into Prometheus families.
+"""
+from typing import Iterable
+
+from app.core.cache import caches
+from app.core.metrics import Family, registry
+from app.services import syslog_server
+from app.services.alert_delivery import alert_dispatcher
+from app.services.alert_engine import alert_engine
+from app.services.flow_aggregator import flow_aggregator
+from app.services.response_cache import response_cache
+from app.services.stream_hub import stream_hub
+from app.services.threat_intel import threat_intel
+from app.services.write_coalescer import write_coalescer
+
+
+def _single(name: str, kind: str, help: str, value: float) -> Family:
+    return name, kind, help, [({}, value)]
+
+
+def collect() -> Iterable[Family]:
+    yield _single("alert_events_evaluated_total", "counter", "Events evaluated against alert rules",
+                  alert_engine.events_evaluated)
+    yield _single("alert_firings_total", "counter", "Alert rule firings", alert_engine.alerts_fired)
+    yield _single("alert_rules_loaded", "gauge", "Enabled alert rules in the engine", len(alert_engine))
+
+    delivery = alert_dispatcher.stats()
+    yield "alert_deliveries_total", "counter", "Alert deliveries by outcome", [
+        ({"outcome": outcome}, delivery[outcome]) for outcome in ("sent", "retried", "failed")
+    ]
+
+    yield "cache_hits_total", "counter", "Cache lookups answered from memory", [
+        ({"cache": name}, cache.hits) for name, cache in caches.items()
+    ]
+    yield "cache_misses_total", "counter", "Cache lookups that had to be computed", [
+        ({"cache": name}, cache.misses) for name, cache in caches.items()
+    ]
+    yield "cache_entries", "gauge", "Entries held per cache", [
+        ({"cache": name}, len(cache)) for name, cache in caches.items()
+    ]
+
+    responses = response_cache.stats()
+    yield _single("response_cache_bytes", "gauge", "Encoded response bodies held in memory", responses["bytes"])
+    yield _single("response_cache_not_modified_total", "counter", "Requests answered 304 from a cached ETag",
+                  responses["not_modified"])
+
+    coalescer = write_coalescer.stats()
+    yield _single("write_coalescer_queue_depth", "gauge", "Single-row writes waiting for a group commit",
+                  coalescer["queue_depth"])
+    yield _single("write_coalescer_groups_total", "counter", "Group commits of single-row writes",
+                  coalescer["groups"])
+
+    flows = flow_aggregator.stats()
+    yield _single("flow_open", "gauge", "Open flow records waiting for their window to close",
+                  flows["open_flows"])
+    yield "flow_aggregated_total", "counter", "Events and flow records written by the flow aggregator", [
+        ({"kind": "events"}, flows["events_written"]),
+        ({"kind": "flows"}, flows["flows_written"]),
+    ]
+
+    yield _single("threat_intel_enriched_total", "counter", "Rows tagged from the threat-intel index",
+                  threat_intel.enriched)
+
+    stream = stream_hub.stats()
+    yield _single("stream_subscribers", "gauge", "Live stream subscribers", stream["subscribers"])
+    yield _single("stream_dropped_total", "counter", "Stream events dropped for slow subscribers",
+                  stream["dropped"])
+
+    ingestor = syslog_server.active_ingestor
+    if ingestor is not None:
+        syslog = ingestor.stats()
+        yield _single("syslog_queue_depth", "gauge", "Buffered syslog lines", syslog["queue_depth"])
+        yield "syslog_lines_total", "counter", "Syslog lines by outcome", [
+            ({"outcome": outcome}, syslog[outcome]) for outcome in ("received", "dropped", "parse_errors")
+        ]
+
+
+registry.add_collector(collect)
@@ -0,0 +1,399 @@
+"""
+Approximate IP/port analytics with mergeable sketches.
+
+For every time window of SKETCH_WINDOW_SECONDS and every (log_source,
+action) pair the ingestion path maintains, per field (source_ip,
+destination_ip, destination_port):
+
+* a Count-Min sketch for point frequency queries,
+* a HyperLogLog for distinct counts,
+* a Space-Saving summary for the top-K heavy hitters,
+
+plus small per-source HyperLogLogs of destination ports for the sources
+currently tracked as heavy hitters (port fan-out, i.e. scan detection).
+
+Closed windows are serialized, compressed and stored in log_sketches.
+Queries merge the stored windows (and any still in memory) for a time
+range, so their cost depends on the number of windows, not on the number
+of log rows. All sketches are mergeable, so partial windows written by
+several workers simply add up.
+"""
+import heapq
+import json
+import logging
+import math
+import struct
+import zlib
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.log_sketch import LogSketch
+
+logger = logging.getLogger(__name__)
+
+SKETCH_FIELDS = ("source_ip", "destination_ip", "destination_port")
+
+_MASK64 = (1 << 64) - 1
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash(value: str) -> Tuple[int, int]:
+    """Two independent, process-stable 64-bit hashes of value"""
+    digest = blake2b(value.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+class CountMinSketch:
+    """Frequency estimates that never undercount: f <= est <= f + eps * N w.p. 1 - delta"""
+
+    def __init__(self, width: int, depth: int, table: Optional[array] = None, total: int = 0):
+        self.width = width
+        self.depth = depth
+        self.table = table if table is not None else array("I", bytes(4 * width * depth))
+        self.total = total
+
+    def _cells(self, value: str) -> List[int]:
+        h1, h2 = _hash(value)
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, value: str, count: int = 1) -> None:
+        table = self.table
+        for cell in self._cells(value):
+            table[cell] += count
+        self.total += count
+
+    def estimate(self, value: str) -> int:
+        table = self.table
+        return min(table[cell] for cell in self._cells(value))
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    @staticmethod
+    def estimate_across(sketches: List["CountMinSketch"], value: str) -> int:
+        """Estimate on the merge of sketches without materializing it"""
+        if not sketches:
+            return 0
+        cells = sketches[0]._cells(value)
+        return min(sum(sketch.table[cell] for sketch in sketches) for cell in cells)
+
+
+class HyperLogLog:
+    """Distinct count estimate with relative standard error 1.04 / sqrt(2^precision)"""
+
+    def __init__(self, precision: int, registers: Optional[bytearray] = None):
+        self.precision = precision
+        self.registers = registers if registers is not None else bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        h1, _ = _hash(value)
+        p = self.precision
+        index = h1 >> (64 - p)
+        rest = h1 & ((1 << (64 - p)) - 1)
+        rank = (64 - p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class SpaceSaving:
+    """
+    Top-K heavy hitters. Each tracked item's true count lies in
+    [count - error, count]; any untracked item occurred at most min_count times.
+    """
+
+    def __init__(self, capacity: int, counters: Optional[Dict[str, List[int]]] = None):
+        self.capacity = capacity
+        self.counters: Dict[str, List[int]] = counters if counters is not None else {}
+
+    def min_count(self) -> int:
+        if not self.counters or len(self.counters) < self.capacity:
+            return 0
+        return min(entry[0] for entry in self.counters.values())
+
+    def update(self, counts: Dict[str, int]) -> None:
+        """Fold a batch of exact counts in (merge with an error-free summary)"""
+        self.merge(SpaceSaving(len(counts), {item: [count, 0] for item, count in counts.items()}))
+
+    def merge(self, other: "SpaceSaving") -> None:
+        """Mergeable-summaries combine: absent items are charged the other side's minimum"""
+        own_min, other_min = self.min_count(), other.min_count()
+        merged: Dict[str, List[int]] = {}
+        for item, (count, error) in self.counters.items():
+            extra = other.counters.get(item)
+            if extra is None:
+                merged[item] = [count + other_min, error + other_min]
+            else:
+                merged[item] = [count + extra[0], error + extra[1]]
+        for item, (count, error) in other.counters.items():
+            if item not in merged:
+                merged[item] = [count + own_min, error + own_min]
+        if len(merged) > self.capacity:
+            merged = dict(heapq.nlargest(self.capacity, merged.items(), key=lambda kv: kv[1][0]))
+        self.counters = merged
+
+    def top(self, k: int) -> List[Tuple[str, int, int]]:
+        items = heapq.nlargest(k, self.counters.items(), key=lambda kv: kv[1][0])
+        return [(item, count, error) for item, (count, error) in items]
+
+
+class WindowSketch:
+    """All sketches for one (window, log_source, action) group"""
+
+    def __init__(self, events: int = 0):
+        self.events = events
+        self.cms = {
+            field: CountMinSketch(settings.SKETCH_CMS_WIDTH, settings.SKETCH_CMS_DEPTH)
+            for field in SKETCH_FIELDS
+        }
+        self.hll = {field: HyperLogLog(settings.SKETCH_HLL_PRECISION) for field in SKETCH_FIELDS}
+        self.top = {field: SpaceSaving(settings.SKETCH_TOPK_CAPACITY) for field in SKETCH_FIELDS}
+        # source_ip -> HyperLogLog of destination ports, for tracked heavy hitters only
+        self.fanout: Dict[str, HyperLogLog] = {}
+
+    def update(self, rows: List[Dict[str, Any]]) -> None:
+        # A flow record stands for event_count events
+        weights = [row.get("event_count") or 1 for row in rows]
+        self.events += sum(weights)
+        # Exact per-batch counts first: skewed traffic hashes each value once
+        for field in SKETCH_FIELDS:
+            counts: Counter = Counter()
+            for row, weight in zip(rows, weights):
+                value = row.get(field)
+                if value is not None:
+                    counts[str(value)] += weight
+            cms, hll = self.cms[field], self.hll[field]
+            for value, count in counts.items():
+                cms.add(value, count)
+                hll.add(value)
+            self.top[field].update(counts)
+
+        tracked = self.top["source_ip"].counters
+        for row in rows:
+            source, port = row.get("source_ip"), row.get("destination_port")
+            if port is None or source not in tracked:
+                continue
+            sketch = self.fanout.get(source)
+            if sketch is None:
+                sketch = self.fanout[source] = HyperLogLog(settings.SKETCH_FANOUT_PRECISION)
+            sketch.add(str(port))
+        for source in [source for source in self.fanout if source not in tracked]:
+            del self.fanout[source]
+
+    def to_bytes(self) -> bytes:
+        """Compact serialization: JSON header + raw sketch arrays, zlib-compressed"""
+        blobs: List[bytes] = []
+        header: Dict[str, Any] = {
+            "events": self.events,
+            "cms": [settings.SKETCH_CMS_WIDTH, settings.SKETCH_CMS_DEPTH],
+            "hll": settings.SKETCH_HLL_PRECISION,
+            "fanout_hll": settings.SKETCH_FANOUT_PRECISION,
+            "totals": {field: self.cms[field].total for field in SKETCH_FIELDS},
+            "top": {field: self.top[field].counters for field in SKETCH_FIELDS},
+            "top_capacity": settings.SKETCH_TOPK_CAPACITY,
+            "fanout": list(self.fanout),
+        }
+        for field in SKETCH_FIELDS:
+            blobs.append(self.cms[field].table.tobytes())
+            blobs.append(bytes(self.hll[field].registers))
+        for source in header["fanout"]:
+            blobs.append(bytes(self.fanout[source].registers))
+        encoded = json.dumps(header, separators=(",", ":")).encode()
+        return zlib.compress(struct.pack("<I", len(encoded)) + encoded + b"".join(blobs))
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "WindowSketch":
+        data = zlib.decompress(payload)
+        (size,) = struct.unpack_from("<I", data)
+        header = json.loads(data[4:4 + size])
+        offset = 4 + size
+
+        sketch = cls.__new__(cls)
+        sketch.events = header["events"]
+        width, depth = header["cms"]
+        cms_size = 4 * width * depth
+        hll_size = 1 << header["hll"]
+        fanout_size = 1 << header["fanout_hll"]
+        sketch.cms, sketch.hll = {}, {}
+        for field in SKETCH_FIELDS:
+            table = array("I")
+            table.frombytes(data[offset:offset + cms_size])
+            offset += cms_size
+            sketch.cms[field] = CountMinSketch(width, depth, table, header["totals"][field])
+            sketch.hll[field] = HyperLogLog(header["hll"], bytearray(data[offset:offset + hll_size]))
+            offset += hll_size
+        sketch.top = {
+            field: SpaceSaving(header["top_capacity"], header["top"][field]) for field in SKETCH_FIELDS
+        }
+        sketch.fanout = {}
+        for source in header["fanout"]:
+            sketch.fanout[source] = HyperLogLog(header["fanout_hll"], bytearray(data[offset:offset + fanout_size]))
+            offset += fanout_size
+        return sketch
+
+
+WindowKey = Tuple[datetime, str, str]
+
+
+class SketchStore:
+    """Open windows in memory, closed windows in the log_sketches table"""
+
+    def __init__(self, window_seconds: int = settings.SKETCH_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._windows: Dict[WindowKey, WindowSketch] = {}
+
+    def window_start(self, ts: datetime) -> datetime:
+        epoch = int((ts - datetime(1970, 1, 1)).total_seconds())
+        return datetime.utcfromtimestamp(epoch - epoch % self.window_seconds)
+
+    def update(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Fold ingested rows into the sketches of their windows"""
+        groups: Dict[WindowKey, List[Dict[str, Any]]] = {}
+        window_start = self.window_start
+        starts: Dict[datetime, datetime] = {}
+        for row in rows:
+            ts = row["timestamp"]
+            minute = ts.replace(second=0, microsecond=0)
+            start = starts.get(minute)
+            if start is None:
+                start = starts[minute] = window_start(minute)
+            key = (start, row.get("log_source") or "", row["action"])
+            groups.setdefault(key, []).append(row)
+
+        for key, group in groups.items():
+            sketch = self._windows.get(key)
+            if sketch is None:
+                sketch = self._windows[key] = WindowSketch()
+            sketch.update(group)
+
+    async def flush(self, db: AsyncSession, force: bool = False) -> int:
+        """Persist windows that closed more than SKETCH_FLUSH_GRACE seconds ago"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.window_seconds + settings.SKETCH_FLUSH_GRACE)
+        closed = [key for key in self._windows if force or key[0] <= cutoff]
+        if not closed:
+            return 0
+        params = [
+            {
+                "window_start": start,
+                "window_seconds": self.window_seconds,
+                "log_source": log_source,
+                "action": action,
+                "payload": self._windows[(start, log_source, action)].to_bytes(),
+            }
+            for start, log_source, action in closed
+        ]
+        await db.execute(insert(LogSketch.__table__), params)
+        await db.commit()
+        for key in closed:
+            del self._windows[key]
+        return len(closed)
+
+    async def collect(
+        self,
+        db: AsyncSession,
+        start: datetime,
+        end: datetime,
+        log_source: Optional[str] = None,
+        action: Optional[str] = None,
+    ) -> List[WindowSketch]:
+        """Stored and in-memory window sketches overlapping [start, end)"""
+        query = select(LogSketch.payload).where(
+            LogSketch.window_start > start - timedelta(seconds=self.window_seconds),
+            LogSketch.window_start < end,
+        )
+        if log_source is not None:
+            query = query.where(LogSketch.log_source == log_source)
+        if action is not None:
+            query = query.where(LogSketch.action == action)
+        result = await db.execute(query)
+        sketches = [WindowSketch.from_bytes(payload) for payload in result.scalars()]
+
+        lower = start - timedelta(seconds=self.window_seconds)
+        for (window_start, source, window_action), sketch in self._windows.items():
+            if not (lower < window_start < end):
+                continue
+            if log_source is not None and source != log_source:
+                continue
+            if action is not None and window_action != action:
+                continue
+            sketches.append(sketch)
+        return sketches
+
+
+def top_k(sketches: List[WindowSketch], field: str, k: int) -> Dict[str, Any]:
+    summary = SpaceSaving(settings.SKETCH_TOPK_CAPACITY)
+    for sketch in sketches:
+        summary.merge(sketch.top[field])
+    return {
+        "items": [
+            {"value": value, "count": count, "error": error, "min_count": count - error}
+            for value, count, error in summary.top(k)
+        ],
+        # Any value not listed occurred at most this many times
+        "untracked_max_count": summary.min_count(),
+    }
+
+
+def distinct_count(sketches: List[WindowSketch], field: str) -> Dict[str, Any]:
+    merged = HyperLogLog(settings.SKETCH_HLL_PRECISION)
+    for sketch in sketches:
+        merged.merge(sketch.hll[field])
+    return {"estimate": merged.estimate(), "relative_error": round(merged.relative_error, 4)}
+
+
+def frequency(sketches: List[WindowSketch], field: str, value: str) -> Dict[str, Any]:
+    cms = [sketch.cms[field] for sketch in sketches]
+    total = sum(sketch.total for sketch in cms)
+    epsilon = cms[0].epsilon if cms else math.e / settings.SKETCH_CMS_WIDTH
+    delta = cms[0].delta if cms else math.exp(-settings.SKETCH_CMS_DEPTH)
+    return {
+        "estimate": CountMinSketch.estimate_across(cms, value),
+        # estimate - true count <= max_overcount with probability confidence
+        "max_overcount": math.ceil(epsilon * total),
+        "confidence": round(1 - delta, 4),
+    }
+
+
+def port_fanout(sketches: List[WindowSketch], k: int) -> List[Dict[str, Any]]:
+    merged: Dict[str, HyperLogLog] = {}
+    for sketch in sketches:
+        for source, hll in sketch.fanout.items():
+            if source in merged:
+                merged[source].merge(hll)
+            else:
+                merged[source] = HyperLogLog(hll.precision, bytearray(hll.registers))
+    ranked = sorted(((hll.estimate(), source) for source, hll in merged.items()), reverse=True)[:k]
+    return [{"source_ip": source, "distinct_destination_ports": estimate} for estimate, source in ranked]
+
+
+# Process-wide store fed by the ingestion path
+sketch_store = SketchStore()
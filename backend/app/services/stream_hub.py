@@ -0,0 +1,187 @@
+"""
+In-process fan-out of newly ingested logs to live subscribers.
+
+Subscribers register a conditions document (the alert rule syntax, see
+app.services.conditions). Identical documents share one entry in a
+ConditionIndex, so each published event is evaluated once against all
+distinct filters and serialized at most once, however many clients
+receive it.
+
+Every subscriber owns a bounded queue of encoded events. Its sender is
+woken at most once per published batch and lingers STREAM_COALESCE_INTERVAL
+before sending, so bursts go out as one message. When a consumer falls
+behind, the "drop" policy discards new events once the queue is full,
+and the "sample" policy starts keeping only every 2nd and then every 4th
+event as the queue fills. Either way the next message reports how many
+events were skipped, and memory stays bounded.
+
+Only logs ingested by this process (API requests and an in-process
+syslog listener) are published.
+"""
+import asyncio
+import json
+from collections import deque
+from datetime import date, datetime
+from itertools import count
+from typing import Any, Deque, Dict, Iterable, Optional, Set
+
+from app.core.config import settings
+from app.services.conditions import ConditionIndex, compile_conditions
+
+POLICIES = ("drop", "sample")
+
+
+class HubFull(RuntimeError):
+    """Raised when STREAM_MAX_SUBSCRIBERS is reached"""
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    return json.dumps(event, default=_json_default, separators=(",", ":"))
+
+
+class Subscriber:
+    """One client's filter key, bounded queue and delivery counters"""
+
+    def __init__(self, subscriber_id: int, filter_key: str, policy: str, capacity: int):
+        self.id = subscriber_id
+        self.filter_key = filter_key
+        self.policy = policy
+        self.capacity = max(capacity, 1)
+        self.queue: Deque[str] = deque()
+        self.wakeup = asyncio.Event()
+        self.delivered = 0
+        self.dropped = 0
+        self.sampled = 0
+        self._pending_skipped = 0
+        self._tick = 0
+
+    def offer(self, encoded: str) -> None:
+        size = len(self.queue)
+        if size >= self.capacity:
+            self.dropped += 1
+            self._pending_skipped += 1
+            return
+        if self.policy == "sample" and size * 2 >= self.capacity:
+            stride = 2 if size * 4 < self.capacity * 3 else 4
+            self._tick += 1
+            if self._tick % stride:
+                self.sampled += 1
+                self._pending_skipped += 1
+                return
+        self.queue.append(encoded)
+
+    async def next_message(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Wait for events and return one JSON message with up to
+        STREAM_MAX_BATCH of them; None if timeout passes first.
+        """
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if settings.STREAM_COALESCE_INTERVAL > 0:
+            await asyncio.sleep(settings.STREAM_COALESCE_INTERVAL)
+
+        queue = self.queue
+        batch = [queue.popleft() for _ in range(min(len(queue), settings.STREAM_MAX_BATCH))]
+        if not queue:
+            self.wakeup.clear()
+        skipped, self._pending_skipped = self._pending_skipped, 0
+        self.delivered += len(batch)
+        return f'{{"type":"logs","skipped":{skipped},"events":[{",".join(batch)}]}}'
+
+
+class StreamHub:
+    """Evaluates published events against all subscriber filters once"""
+
+    def __init__(self):
+        self._index = ConditionIndex()
+        # filter key -> subscribers sharing that filter
+        self._groups: Dict[str, Set[Subscriber]] = {}
+        self._subscribers: Dict[int, Subscriber] = {}
+        self._ids = count(1)
+        self.published = 0
+        self.matched = 0
+        # Counters of subscribers that have left
+        self._retired = {"delivered": 0, "dropped": 0, "sampled": 0}
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, conditions: Optional[Dict[str, Any]] = None, policy: str = "drop") -> Subscriber:
+        """Register a subscriber; raises ConditionError, ValueError or HubFull"""
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        if len(self._subscribers) >= settings.STREAM_MAX_SUBSCRIBERS:
+            raise HubFull("Too many stream subscribers")
+        conditions = conditions or {}
+        filter_key = json.dumps(conditions, sort_keys=True, separators=(",", ":"))
+        if filter_key not in self._groups:
+            compiled = compile_conditions(conditions)
+            self._index.add(filter_key, compiled)
+            self._groups[filter_key] = set()
+
+        subscriber = Subscriber(next(self._ids), filter_key, policy, settings.STREAM_QUEUE_SIZE)
+        self._groups[filter_key].add(subscriber)
+        self._subscribers[subscriber.id] = subscriber
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        if self._subscribers.pop(subscriber.id, None) is None:
+            return
+        self._retired["delivered"] += subscriber.delivered
+        self._retired["dropped"] += subscriber.dropped
+        self._retired["sampled"] += subscriber.sampled
+        group = self._groups.get(subscriber.filter_key)
+        if group is not None:
+            group.discard(subscriber)
+            if not group:
+                del self._groups[subscriber.filter_key]
+                self._index.remove(subscriber.filter_key)
+
+    def publish(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Queue matching events for their subscribers and wake them once"""
+        if not self._subscribers:
+            return
+        match = self._index.match
+        groups = self._groups
+        woken: Set[Subscriber] = set()
+        published = 0
+        for event in events:
+            published += 1
+            keys = match(event)
+            if not keys:
+                continue
+            encoded = encode_event(event)
+            self.matched += 1
+            for key in keys:
+                group = groups[key]
+                for subscriber in group:
+                    subscriber.offer(encoded)
+                woken.update(group)
+        self.published += published
+        for subscriber in woken:
+            subscriber.wakeup.set()
+
+    def stats(self) -> Dict[str, Any]:
+        subscribers = self._subscribers.values()
+        return {
+            "subscribers": len(self._subscribers),
+            "distinct_filters": len(self._groups),
+            "published": self.published,
+            "matched": self.matched,
+            "delivered": self._retired["delivered"] + sum(s.delivered for s in subscribers),
+            "dropped": self._retired["dropped"] + sum(s.dropped for s in subscribers),
+            "sampled": self._retired["sampled"] + sum(s.sampled for s in subscribers),
+            "queued": sum(len(s.queue) for s in subscribers),
+        }
+
+
+# Process-wide hub fed by the ingestion path
+stream_hub = StreamHub()
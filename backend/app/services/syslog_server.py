@@ -0,0 +1,307 @@
+"""
+Asyncio syslog listener (UDP/TCP) and file tailer feeding firewall_logs.
+
+Raw lines are appended to a bounded in-memory buffer and a single writer
+task drains it in micro-batches bounded by SYSLOG_BATCH_SIZE rows or
+SYSLOG_FLUSH_INTERVAL seconds, whichever comes first. When the buffer is
+full UDP datagrams are dropped (and counted), TCP connections stop being
+read until the writer catches up, and the file tailer simply waits.
+With FLOW_AGGREGATION on, batches go to the flow aggregator instead of
+straight to the database.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.flow_aggregator import flow_aggregator
+from app.services.ingest import insert_isolating
+from app.services.log_parser import parse_line
+
+logger = logging.getLogger(__name__)
+
+# Ingestor started by the API lifespan when SYSLOG_ENABLED is set
+active_ingestor: Optional["SyslogIngestor"] = None
+
+
+class SyslogIngestor:
+    """Buffers raw lines from any number of sources and writes them in batches"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        queue_size: int = settings.SYSLOG_QUEUE_SIZE,
+        batch_size: int = settings.SYSLOG_BATCH_SIZE,
+        flush_interval: float = settings.SYSLOG_FLUSH_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer: Deque[Tuple[str, Optional[str]]] = deque()
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+        self._space_ready.set()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._servers: List[Any] = []
+        self._tail_tasks: List[asyncio.Task] = []
+        self._running = False
+
+        self.received = 0
+        self.dropped = 0
+        self.parse_errors = 0
+        self.written = 0
+        self.write_errors = 0
+        self.batches = 0
+        self.last_flush_at: Optional[float] = None
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._buffer)
+
+    def is_full(self) -> bool:
+        return len(self._buffer) >= self.queue_size
+
+    def submit(self, line: str, sender: Optional[str] = None, force: bool = False) -> bool:
+        """
+        Queue one raw line; returns False (and counts a drop) when full.
+
+        force lets stream producers that pause themselves right after a
+        read overshoot the capacity by that one read instead of losing it.
+        """
+        self.received += 1
+        if len(self._buffer) >= self.queue_size and not force:
+            self.dropped += 1
+            self._space_ready.clear()
+            return False
+        self._buffer.append((line, sender))
+        if len(self._buffer) >= self.batch_size:
+            self._data_ready.set()
+        return True
+
+    async def wait_for_space(self) -> None:
+        if self.is_full():
+            self._space_ready.clear()
+            await self._space_ready.wait()
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        rows = []
+        buffer = self._buffer
+        for _ in range(min(self.batch_size, len(buffer))):
+            line, sender = buffer.popleft()
+            row = parse_line(line, sender)
+            if row is None:
+                self.parse_errors += 1
+            else:
+                rows.append(row)
+        # Resume paused producers once the buffer is below half capacity
+        if len(buffer) < self.queue_size // 2:
+            self._space_ready.set()
+        return rows
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        """Write a batch; a failed write is bisected so only unwritable rows are dropped"""
+        failed = 0
+        try:
+            if settings.FLOW_AGGREGATION:
+                await flow_aggregator.submit(rows)
+            else:
+                failures, _ = await insert_isolating(self.session_factory, rows)
+                failed = len(failures)
+        except Exception:
+            logger.exception("Failed to write %d syslog rows", len(rows))
+            failed = len(rows)
+        if failed:
+            self.write_errors += 1
+            self.dropped += failed
+            if failed == len(rows):
+                return
+        self.written += len(rows) - failed
+        self.batches += 1
+        self.last_flush_at = time.time()
+
+    async def _writer(self) -> None:
+        while self._running or self._buffer:
+            if len(self._buffer) < self.batch_size and self._running:
+                try:
+                    await asyncio.wait_for(self._data_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._data_ready.clear()
+
+            while self._buffer:
+                rows = self._take_batch()
+                if rows:
+                    await self._write(rows)
+                if len(self._buffer) < self.batch_size and self._running:
+                    break
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def start(
+        self,
+        host: str = settings.SYSLOG_HOST,
+        udp_port: Optional[int] = settings.SYSLOG_UDP_PORT,
+        tcp_port: Optional[int] = settings.SYSLOG_TCP_PORT,
+        tail_paths: Optional[List[str]] = None,
+        tail_from_start: bool = False,
+    ) -> None:
+        """Start the writer plus any configured listeners and file tailers"""
+        loop = asyncio.get_running_loop()
+        self._running = True
+        self._writer_task = asyncio.create_task(self._writer())
+
+        if udp_port:
+            transport, _ = await loop.create_datagram_endpoint(
+                lambda: _SyslogUDPProtocol(self), local_addr=(host, udp_port)
+            )
+            self._servers.append(transport)
+            logger.info("Syslog UDP listener on %s:%d", host, udp_port)
+
+        if tcp_port:
+            server = await loop.create_server(lambda: _SyslogTCPProtocol(self), host, tcp_port)
+            self._servers.append(server)
+            logger.info("Syslog TCP listener on %s:%d", host, tcp_port)
+
+        for path in tail_paths or []:
+            self._tail_tasks.append(asyncio.create_task(self.tail_file(path, tail_from_start)))
+
+    async def stop(self) -> None:
+        """Stop listeners and flush everything still buffered"""
+        for server in self._servers:
+            server.close()
+        self._servers.clear()
+        for task in self._tail_tasks:
+            task.cancel()
+        await asyncio.gather(*self._tail_tasks, return_exceptions=True)
+        self._tail_tasks.clear()
+
+        self._running = False
+        self._data_ready.set()
+        self._space_ready.set()
+        if self._writer_task is not None:
+            await self._writer_task
+            self._writer_task = None
+
+    async def tail_file(self, path: str, from_start: bool = False, poll_interval: float = 0.25) -> None:
+        """Follow a log file like `tail -F`, reopening it after rotation"""
+        sender = os.path.basename(path)
+        handle = None
+        inode = None
+        try:
+            while True:
+                if handle is None:
+                    try:
+                        handle = open(path, "r", encoding="utf-8", errors="replace")
+                    except FileNotFoundError:
+                        await asyncio.sleep(poll_interval)
+                        continue
+                    inode = os.fstat(handle.fileno()).st_ino
+                    if not from_start:
+                        handle.seek(0, os.SEEK_END)
+                    from_start = True  # rotated files are read from the top
+
+                lines = handle.readlines(1 << 20)
+                if lines:
+                    for line in lines:
+                        if self.is_full():
+                            await self.wait_for_space()
+                        self.submit(line, sender)
+                    continue
+
+                await asyncio.sleep(poll_interval)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if stat.st_ino != inode or stat.st_size < handle.tell():
+                    handle.close()
+                    handle = None
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters exposed by /api/v1/ingest/stats and the CLI"""
+        return {
+            "queue_depth": len(self._buffer),
+            "queue_capacity": self.queue_size,
+            "received": self.received,
+            "dropped": self.dropped,
+            "parse_errors": self.parse_errors,
+            "written": self.written,
+            "write_errors": self.write_errors,
+            "batches": self.batches,
+            "last_flush_at": self.last_flush_at,
+        }
+
+
+class _SyslogUDPProtocol(asyncio.DatagramProtocol):
+    """One datagram carries one (occasionally several) syslog messages"""
+
+    def __init__(self, ingestor: SyslogIngestor):
+        self.ingestor = ingestor
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        sender = addr[0]
+        text = data.decode("utf-8", "replace")
+        if "\n" in text.rstrip("\n"):
+            for line in text.splitlines():
+                self.ingestor.submit(line, sender)
+        else:
+            self.ingestor.submit(text, sender)
+
+
+class _SyslogTCPProtocol(asyncio.Protocol):
+    """Newline-framed syslog over TCP; stops reading while the buffer is full"""
+
+    def __init__(self, ingestor: SyslogIngestor):
+        self.ingestor = ingestor
+        self.transport = None
+        self.sender = None
+        self._partial = b""
+        self._resume_task: Optional[asyncio.Task] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        peer = transport.get_extra_info("peername")
+        self.sender = peer[0] if peer else None
+
+    def data_received(self, data: bytes) -> None:
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.ingestor.submit(line.decode("utf-8", "replace"), self.sender, force=True)
+
+        if self.ingestor.is_full() and self._resume_task is None:
+            self.transport.pause_reading()
+            self._resume_task = asyncio.create_task(self._resume_when_drained())
+
+    async def _resume_when_drained(self) -> None:
+        await self.ingestor.wait_for_space()
+        self._resume_task = None
+        if not self.transport.is_closing():
+            self.transport.resume_reading()
+
+    def connection_lost(self, exc) -> None:
+        if self._partial:
+            self.ingestor.submit(self._partial.decode("utf-8", "replace"), self.sender)
+            self._partial = b""
+        if self._resume_task is not None:
+            self._resume_task.cancel()
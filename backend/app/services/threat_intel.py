@@ -0,0 +1,414 @@
+"""
+Threat-intel enrichment of ingested logs by longest-prefix match.
+
+Feed files (THREAT_INTEL_FEEDS) list IPv4/IPv6 prefixes, one
+"prefix[,threat_type[,severity]]" per line, '#' starting a comment;
+threat_type defaults to the file name and severity to
+THREAT_INTEL_DEFAULT_SEVERITY. Allowlist prefixes (THREAT_INTEL_ALLOWLISTS)
+win over every feed.
+
+The prefixes are compiled into one index file holding, per family, sorted
+disjoint [start, end] address ranges, each labelled with the entry that
+wins there: an allowlist entry first, then the longest prefix, then the
+later line. A lookup is one binary search, and a batch of rows is matched
+with a single vectorized searchsorted per family.
+
+Workers memory-map the index, so the page cache holds one copy for all of
+them. A rebuild writes a new file and renames it over the old one; each
+worker sees the new inode on its next refresh and swaps in the new
+mapping with a single reference assignment, while lookups already running
+finish on the old one.
+"""
+import asyncio
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import struct
+import time
+from dataclasses import dataclass
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappop, heappush
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.netaddr import FAMILY_V4, pack_address, prefix_range
+
+logger = logging.getLogger(__name__)
+
+SEVERITIES = ("INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+_SEVERITY_RANK = {name: rank for rank, name in enumerate(SEVERITIES)}
+
+_MAGIC = b"FWTI0001"
+# magic, IPv4 ranges, IPv6 ranges, metadata bytes
+_HEADER = struct.Struct("<8sQQQ")
+# Native byte order, so the arrays can be bisected through memoryviews;
+# index files are rebuilt per host rather than copied between architectures
+_V4 = np.dtype("=u4")
+_V6 = np.dtype("S16")  # big-endian bytes; NumPy compares them lexicographically
+_LABEL = np.dtype("=u4")
+# A build lock older than this is left over from a crashed builder
+_LOCK_TIMEOUT = 600.0
+
+Ranges = Tuple[List[int], List[int], List[int]]
+
+
+class ThreatIntelError(ValueError):
+    """Raised for unreadable index files"""
+
+
+@dataclass(frozen=True)
+class ThreatEntry:
+    threat_type: str
+    severity: str
+    allow: bool = False
+
+
+_ALLOW = ("allowlist", "INFO", True)
+
+
+# ----------------------------------------------------------------------
+# Building
+# ----------------------------------------------------------------------
+
+
+def parse_feed(path: str, allow: bool = False) -> Iterator[Tuple[Tuple[int, int, int, int], tuple]]:
+    """
+    (prefix_range, (threat_type, severity, allow)) pairs of one feed file;
+    malformed lines are skipped
+    """
+    default_type = Path(path).stem
+    skipped = 0
+    with open(path, encoding="utf-8", errors="replace") as handle:
+        for line in handle:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            parts = [part.strip() for part in (line.split(",") if "," in line else line.split())]
+            network = prefix_range(parts[0])
+            if network is None:
+                skipped += 1
+                continue
+            if allow:
+                yield network, _ALLOW
+                continue
+            threat_type = parts[1] if len(parts) > 1 and parts[1] else default_type
+            severity = parts[2].upper() if len(parts) > 2 and parts[2] else settings.THREAT_INTEL_DEFAULT_SEVERITY
+            if severity not in _SEVERITY_RANK:
+                severity = settings.THREAT_INTEL_DEFAULT_SEVERITY
+            yield network, (threat_type[:50], severity, False)
+    if skipped:
+        logger.warning("Skipped %d malformed lines in %s", skipped, path)
+
+
+def _flatten(prefixes: List[Tuple[int, int, tuple, int]]) -> Ranges:
+    """
+    Disjoint sorted ranges labelled with the highest-priority covering
+    prefix. prefixes are (start, end, priority, label) with the smallest
+    priority winning; adjacent ranges with the same label are merged.
+    """
+    prefixes.sort(key=lambda prefix: prefix[0])
+    starts: List[int] = []
+    ends: List[int] = []
+    labels: List[int] = []
+    active: List[Tuple[tuple, int, int]] = []
+    position, count = 0, len(prefixes)
+    current = 0
+    while position < count or active:
+        if not active:
+            current = prefixes[position][0]
+        while position < count and prefixes[position][0] <= current:
+            start, end, priority, label = prefixes[position]
+            heappush(active, (priority, end, label))
+            position += 1
+        # Expired prefixes are only removed once they reach the top
+        while active and active[0][1] < current:
+            heappop(active)
+        if not active:
+            continue
+        _, end, label = active[0]
+        if position < count:
+            end = min(end, prefixes[position][0] - 1)
+        if labels and labels[-1] == label and ends[-1] + 1 == current:
+            ends[-1] = end
+        else:
+            starts.append(current)
+            ends.append(end)
+            labels.append(label)
+        current = end + 1
+    return starts, ends, labels
+
+
+def source_signature(feeds: Sequence[str], allowlists: Sequence[str]) -> Dict[str, List[Any]]:
+    """Paths with modification time and size, to tell whether an index is stale"""
+
+    def stamp(path: str) -> List[Any]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return [path, None, None]
+        return [path, stat.st_mtime_ns, stat.st_size]
+
+    return {"feeds": [stamp(path) for path in feeds], "allowlists": [stamp(path) for path in allowlists]}
+
+
+def build_index(feeds: Sequence[str], allowlists: Sequence[str], path: str) -> Dict[str, int]:
+    """Compile feed and allowlist files into an index file, replacing path atomically"""
+    signature = source_signature(feeds, allowlists)
+    labels: Dict[tuple, int] = {}
+    families: Dict[int, List[Tuple[int, int, tuple, int]]] = {4: [], 6: []}
+    sequence = 0
+    for allow, paths in ((False, feeds), (True, allowlists)):
+        for feed in paths:
+            if not os.path.exists(feed):
+                logger.warning("Threat-intel file %s does not exist", feed)
+                continue
+            for (version, prefix_length, first, last), entry in parse_feed(feed, allow):
+                sequence += 1
+                label = labels.setdefault(entry, len(labels))
+                families[version].append((first, last, (-int(allow), -prefix_length, -sequence), label))
+
+    v4_starts, v4_ends, v4_labels = _flatten(families[4])
+    v6_starts, v6_ends, v6_labels = _flatten(families[6])
+    metadata = json.dumps({
+        "entries": list(labels),
+        "sources": signature,
+        "prefixes": sequence,
+        "built_at": time.time(),
+    }).encode()
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(_HEADER.pack(_MAGIC, len(v4_starts), len(v6_starts), len(metadata)))
+        out.write(np.array(v4_starts, dtype=_V4).tobytes())
+        out.write(np.array(v4_ends, dtype=_V4).tobytes())
+        out.write(np.array([value.to_bytes(16, "big") for value in v6_starts], dtype=_V6).tobytes())
+        out.write(np.array([value.to_bytes(16, "big") for value in v6_ends], dtype=_V6).tobytes())
+        out.write(np.array(v4_labels, dtype=_LABEL).tobytes())
+        out.write(np.array(v6_labels, dtype=_LABEL).tobytes())
+        out.write(metadata)
+    os.replace(temporary, path)
+    return {"prefixes": sequence, "ipv4_ranges": len(v4_starts), "ipv6_ranges": len(v6_starts)}
+
+
+def rebuild_index(feeds: Sequence[str], allowlists: Sequence[str], path: str) -> Optional[Dict[str, int]]:
+    """build_index unless another process holds the build lock; None when skipped"""
+    lock = f"{path}.lock"
+    Path(lock).parent.mkdir(parents=True, exist_ok=True)
+    try:
+        descriptor = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            if time.time() - os.stat(lock).st_mtime > _LOCK_TIMEOUT:
+                os.unlink(lock)
+        except OSError:
+            pass
+        return None
+    try:
+        return build_index(feeds, allowlists, path)
+    finally:
+        os.close(descriptor)
+        os.unlink(lock)
+
+
+# ----------------------------------------------------------------------
+# Lookup
+# ----------------------------------------------------------------------
+
+
+class _PackedKeys:
+    """Sequence of the 16-byte keys stored at offset, for bisect"""
+
+    def __init__(self, buffer, offset: int, count: int):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, position: int) -> bytes:
+        start = self.offset + 16 * position
+        return self.buffer[start:start + 16]
+
+
+class PrefixIndex:
+    """Read-only view of a memory-mapped index file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            stat = os.fstat(handle.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise ThreatIntelError(f"{path} is not a threat-intel index")
+        magic, v4_count, v6_count, metadata_size = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ThreatIntelError(f"{path} is not a threat-intel index")
+
+        offset = _HEADER.size
+
+        def array(dtype, count):
+            nonlocal offset
+            values = np.frombuffer(self._map, dtype=dtype, count=count, offset=offset)
+            offset += dtype.itemsize * count
+            return values
+
+        v4_starts, v4_ends = array(_V4, v4_count), array(_V4, v4_count)
+        v6_offset = offset
+        v6_starts, v6_ends = array(_V6, v6_count), array(_V6, v6_count)
+        # (starts, ends, labels) per family, as arrays for batches...
+        self.v4 = (v4_starts, v4_ends, array(_LABEL, v4_count))
+        self.v6 = (v6_starts, v6_ends, array(_LABEL, v6_count))
+        # ... and as plain sequences for single lookups with bisect
+        self._v4_scalar = tuple(memoryview(values) for values in self.v4)
+        self._v6_scalar = (
+            _PackedKeys(self._map, v6_offset, v6_count),
+            _PackedKeys(self._map, v6_offset + 16 * v6_count, v6_count),
+            memoryview(self.v6[2]),
+        )
+        self.metadata = json.loads(self._map[offset:offset + metadata_size])
+        self.entries = [ThreatEntry(*entry) for entry in self.metadata["entries"]]
+
+    def __len__(self) -> int:
+        return len(self.v4[0]) + len(self.v6[0])
+
+    def _search(self, ranges, keys, positions: List[int], result: List[Optional[ThreatEntry]]) -> None:
+        starts, ends, labels = ranges
+        if not positions or not len(starts):
+            return
+        index = np.searchsorted(starts, keys, side="right") - 1
+        index = np.maximum(index, 0)
+        hit = (starts[index] <= keys) & (ends[index] >= keys)
+        entries = self.entries
+        for position, label in zip(np.asarray(positions)[hit].tolist(), labels[index[hit]].tolist()):
+            result[position] = entries[label]
+
+    def lookup_many(self, addresses: Sequence[Optional[str]]) -> List[Optional[ThreatEntry]]:
+        """Winning entry per address, None where nothing matches"""
+        result: List[Optional[ThreatEntry]] = [None] * len(addresses)
+        v4_positions, v4_keys, v6_positions, v6_keys = [], [], [], []
+        for position, value in enumerate(addresses):
+            packed = pack_address(value)
+            if packed is None:
+                continue
+            if packed[:1] == FAMILY_V4:
+                v4_positions.append(position)
+                v4_keys.append(int.from_bytes(packed[1:], "big"))
+            else:
+                v6_positions.append(position)
+                v6_keys.append(packed[1:])
+        self._search(self.v4, np.array(v4_keys, dtype=_V4), v4_positions, result)
+        self._search(self.v6, np.array(v6_keys, dtype=_V6), v6_positions, result)
+        return result
+
+    def lookup(self, address: Optional[str]) -> Optional[ThreatEntry]:
+        packed = pack_address(address)
+        if packed is None:
+            return None
+        if packed[:1] == FAMILY_V4:
+            starts, ends, labels = self._v4_scalar
+            key = int.from_bytes(packed[1:], "big")
+        else:
+            starts, ends, labels = self._v6_scalar
+            key = packed[1:]
+        position = bisect_right(starts, key) - 1
+        if position < 0 or ends[position] < key:
+            return None
+        return self.entries[labels[position]]
+
+
+class ThreatIntel:
+    """The worker's current index plus rebuild and enrichment logic"""
+
+    def __init__(self):
+        self.index: Optional[PrefixIndex] = None
+        self.enriched = 0
+
+    @staticmethod
+    def configured() -> bool:
+        return bool(settings.THREAT_INTEL_FEEDS or settings.THREAT_INTEL_ALLOWLISTS)
+
+    def load(self) -> bool:
+        """Map the index file if it changed since the last load; True when swapped"""
+        try:
+            stat = os.stat(settings.THREAT_INTEL_INDEX_PATH)
+        except FileNotFoundError:
+            return False
+        identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if self.index is not None and self.index.identity == identity:
+            return False
+        self.index = PrefixIndex(settings.THREAT_INTEL_INDEX_PATH)
+        logger.info("Loaded threat-intel index with %d ranges", len(self.index))
+        return True
+
+    def is_stale(self) -> bool:
+        if self.index is None:
+            return True
+        signature = source_signature(settings.THREAT_INTEL_FEEDS, settings.THREAT_INTEL_ALLOWLISTS)
+        return self.index.metadata.get("sources") != signature
+
+    async def refresh(self) -> None:
+        """Pick up a newer index file, rebuilding it first when the feeds changed"""
+        if not self.configured():
+            self.index = None
+            return
+        self.load()
+        if self.is_stale():
+            # A separate process keeps the build off this worker's GIL
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                built = await asyncio.get_running_loop().run_in_executor(
+                    pool,
+                    rebuild_index,
+                    settings.THREAT_INTEL_FEEDS,
+                    settings.THREAT_INTEL_ALLOWLISTS,
+                    settings.THREAT_INTEL_INDEX_PATH,
+                )
+            if built is not None:
+                logger.info("Rebuilt threat-intel index: %s", built)
+            self.load()
+
+    def enrich(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Set threat_type (when empty) and raise severity on rows whose source
+        or destination is listed; returns the number of rows flagged.
+        """
+        index = self.index
+        if index is None or not rows:
+            return 0
+        matches = index.lookup_many(
+            [row.get("source_ip") for row in rows] + [row.get("destination_ip") for row in rows]
+        )
+        flagged = 0
+        for row, source, destination in zip(rows, matches, matches[len(rows):]):
+            hit = False
+            for entry in (source, destination):
+                if entry is None or entry.allow:
+                    continue
+                if not row.get("threat_type"):
+                    row["threat_type"] = entry.threat_type
+                if _SEVERITY_RANK[entry.severity] > _SEVERITY_RANK.get(row.get("severity"), 0):
+                    row["severity"] = entry.severity
+                hit = True
+            flagged += hit
+        self.enriched += flagged
+        return flagged
+
+    def stats(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "loaded": index is not None,
+            "prefixes": index.metadata.get("prefixes", 0) if index is not None else 0,
+            "ranges": len(index) if index is not None else 0,
+            "enriched": self.enriched,
+        }
+
+
+# Process-wide index used by the ingestion path
+threat_intel = ThreatIntel()
@@ -0,0 +1,161 @@
+"""
+Group commit for single-row log writes.
+
+POST /logs creates one row per request. Committing each one on its own
+serializes concurrent requests on the database write lock and pays one
+fsync per row. Instead, requests append their row to a buffer and wait;
+a single writer task takes up to LOG_WRITE_COALESCE_MAX_ROWS buffered
+rows (after lingering LOG_WRITE_COALESCE_DELAY seconds for more to
+arrive) and writes them with bulk_insert_logs in one transaction. Each
+request is answered with its id once that transaction has committed.
+
+Rows arriving while a group is being written form the next group, so
+the group size adapts to the load. If a group fails before its commit,
+it is split in halves and retried (insert_isolating), so only the rows
+that cannot be written fail their requests. Once the commit succeeded
+every request is answered with its id, whatever happens afterwards.
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.ingest import insert_isolating
+
+_Entry = Tuple[Dict[str, Any], asyncio.Future]
+
+
+class WriteCoalescer:
+    """Buffers single-row writes from concurrent requests and commits them in groups"""
+
+    def __init__(
+        self,
+        session_factory=AsyncSessionLocal,
+        max_rows: int = settings.LOG_WRITE_COALESCE_MAX_ROWS,
+        delay: float = settings.LOG_WRITE_COALESCE_DELAY,
+        queue_size: int = settings.LOG_WRITE_QUEUE_SIZE,
+    ):
+        self.session_factory = session_factory
+        # One group is one bulk_insert_logs chunk, i.e. one transaction
+        self.max_rows = max(min(max_rows, settings.INGEST_CHUNK_SIZE), 1)
+        self.delay = delay
+        self.queue_size = queue_size
+
+        self._buffer: Deque[_Entry] = deque()
+        self._data_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+        self._space_ready.set()
+        self._writer_task: Optional[asyncio.Task] = None
+        self._running = False
+
+        self.submitted = 0
+        self.written = 0
+        self.failed = 0
+        self.groups = 0
+        self.retried_groups = 0
+        self.largest_group = 0
+
+    async def submit(self, row: Dict[str, Any]) -> int:
+        """Queue one row and wait until it is committed; returns its id"""
+        while len(self._buffer) >= self.queue_size:
+            self._space_ready.clear()
+            await self._space_ready.wait()
+        if not self._running:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._buffer.append((row, future))
+        self.submitted += 1
+        if len(self._buffer) >= self.max_rows or len(self._buffer) == 1:
+            self._data_ready.set()
+        # shield: a disconnecting client must not cancel a row already queued
+        return await asyncio.shield(future)
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+
+    def _take_group(self) -> List[_Entry]:
+        buffer = self._buffer
+        group = [buffer.popleft() for _ in range(min(self.max_rows, len(buffer)))]
+        if len(buffer) < self.queue_size:
+            self._space_ready.set()
+        return group
+
+    async def _write(self, group: List[_Entry]) -> None:
+        """Write a group in one transaction, bisecting the uncommitted rows on failure"""
+        failures, splits = await insert_isolating(self.session_factory, [row for row, _ in group])
+        self.retried_groups += splits
+        errors = {id(row): exc for row, exc in failures}
+        for row, future in group:
+            exc = errors.get(id(row))
+            if exc is not None:
+                self.failed += 1
+                _resolve(future, exception=exc)
+            else:
+                self.written += 1
+                _resolve(future, result=row["id"])
+
+    async def _writer(self) -> None:
+        while self._running or self._buffer:
+            if not self._buffer:
+                self._data_ready.clear()
+                if not self._running:
+                    break
+                await self._data_ready.wait()
+                continue
+            if len(self._buffer) < self.max_rows and self.delay > 0 and self._running:
+                # Linger briefly so concurrent requests join this group
+                self._data_ready.clear()
+                try:
+                    await asyncio.wait_for(self._data_ready.wait(), self.delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            group = self._take_group()
+            self.groups += 1
+            self.largest_group = max(self.largest_group, len(group))
+            await self._write(group)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._writer_task is None or self._writer_task.done():
+            self._running = True
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        """Write everything still buffered, then stop the writer"""
+        self._running = False
+        self._data_ready.set()
+        if self._writer_task is not None:
+            await self._writer_task
+            self._writer_task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._buffer),
+            "submitted": self.submitted,
+            "written": self.written,
+            "failed": self.failed,
+            "groups": self.groups,
+            "retried_groups": self.retried_groups,
+            "largest_group": self.largest_group,
+            "average_group": round(self.written / self.groups, 1) if self.groups else 0,
+        }
+
+
+def _resolve(future: asyncio.Future, result: Any = None, exception: Optional[BaseException] = None) -> None:
+    if future.done():
+        return
+    if exception is not None:
+        future.set_exception(exception)
+    else:
+        future.set_result(result)
+
+
+# Process-wide coalescer behind POST /api/v1/logs
+write_coalescer = WriteCoalescer()
@@ -0,0 +1,8 @@
+"""
+Load-test and benchmark suite for ingestion, querying and alerting.
+
+traffic generates skewed, bursty synthetic logs; scenarios drives the
+API (in-process or over HTTP) and the alert engine at controlled
+concurrency; measure reports rows/sec, latency percentiles and memory.
+Run with `python -m benchmarks --help` from the backend directory.
+"""
@@ -0,0 +1,180 @@
+"""
+Run the benchmark suite and save the results as JSON.
+
+    cd backend
+    python -m benchmarks --rows 1000000                     # in-process, every scenario
+    python -m benchmarks --url http://localhost:8000 --token <operator token> --scenarios ingest,list,filter,stats
+    python -m benchmarks --scenarios rules --compare results-old.json
+
+The load scenario writes through this process' DATABASE_URL; point it at
+the same database as the server when benchmarking over HTTP. Memory
+figures are this process' RSS, so over HTTP they cover the client only.
+The API needs an operator token: --token (or BENCHMARK_TOKEN) over HTTP;
+in-process runs sign one for a "benchmark" operator account.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import subprocess
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import httpx
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, dispose_engines, engine, init_db
+from app.core.security import create_access_token, get_password_hash
+from app.models.user import User, UserRole
+from benchmarks.scenarios import SCENARIOS, BenchmarkContext
+from benchmarks.traffic import TrafficProfile
+
+# Order matters: queries run against the rows written by load/ingest
+DEFAULT_SCENARIOS = "load,ingest,list,filter,stats,rules"
+BENCHMARK_USER = "benchmark"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, querying and alert evaluation")
+    parser.add_argument("--url", help="Benchmark a running server instead of the app in-process")
+    parser.add_argument("--token", default=os.environ.get("BENCHMARK_TOKEN"), help="Operator bearer token for --url")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help=f"Comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--rows", type=int, default=100000, help="Rows written by load and by ingest")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per query scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent query requests")
+    parser.add_argument("--write-concurrency", type=int, default=2, help="Concurrent load/ingest batches")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--rule-count", type=int, default=200)
+    parser.add_argument("--hosts", type=int, default=TrafficProfile.hosts, help="Distinct source addresses")
+    parser.add_argument("--zipf", type=float, default=TrafficProfile.zipf, help="Source address skew")
+    parser.add_argument("--attack-fraction", type=float, default=TrafficProfile.attack_fraction)
+    parser.add_argument("--days", type=float, default=TrafficProfile.days, help="Span of generated timestamps")
+    parser.add_argument("--seed", type=int, default=TrafficProfile.seed)
+    parser.add_argument("--output", help="Result file (default benchmark-<version>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    return parser.parse_args()
+
+
+async def _local_token() -> str:
+    """Token of the benchmark operator account, created on first use"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id).where(User.username == BENCHMARK_USER))
+        if result.scalar_one_or_none() is None:
+            db.add(User(
+                username=BENCHMARK_USER,
+                email=f"{BENCHMARK_USER}@localhost",
+                hashed_password=get_password_hash(secrets.token_urlsafe(16)),
+                role=UserRole.OPERATOR,
+            ))
+            await db.commit()
+    return create_access_token({"sub": BENCHMARK_USER, "role": UserRole.OPERATOR.value})
+
+
+@asynccontextmanager
+async def api_client(url: Optional[str], token: Optional[str]):
+    """httpx client for a running server, or for the app through its ASGI interface"""
+    timeout = httpx.Timeout(300.0)
+    if url:
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        async with httpx.AsyncClient(base_url=url, timeout=timeout, headers=headers) as client:
+            yield client
+        return
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        headers = {"Authorization": f"Bearer {token or await _local_token()}"}
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=timeout, headers=headers,
+        ) as client:
+            yield client
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> None:
+    """Print throughput and tail-latency changes per scenario"""
+    print(f"\nCompared with {previous.get('version')} ({previous.get('git_commit')}, {previous.get('created_at')}):")
+    for name, result in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before:
+            continue
+        changes = []
+        for key in ("rows_per_sec", "ops_per_sec", "p95_ms", "p99_ms"):
+            old, new = before.get(key), result.get(key)
+            if old and new is not None:
+                changes.append(f"{key} {old} -> {new} ({(new - old) / old * 100:+.1f}%)")
+        print(f"  {name:<8} " + "; ".join(changes))
+
+
+async def main():
+    args = parse_args()
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"[ERROR] Unknown scenarios: {', '.join(unknown)}")
+        sys.exit(2)
+
+    profile = TrafficProfile(
+        hosts=args.hosts, zipf=args.zipf, attack_fraction=args.attack_fraction, days=args.days, seed=args.seed,
+    )
+    report: Dict[str, Any] = {
+        "version": settings.VERSION,
+        "git_commit": _git_commit(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "target": args.url or "in-process",
+        "database": engine.url.render_as_string(hide_password=True),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "results": {},
+    }
+
+    await init_db()
+    try:
+        async with api_client(args.url, args.token) as client:
+            ctx = BenchmarkContext(
+                client=client,
+                profile=profile,
+                rows=args.rows,
+                batch_size=args.batch_size,
+                requests=args.requests,
+                concurrency=args.concurrency,
+                write_concurrency=args.write_concurrency,
+                page_size=args.page_size,
+                rule_count=args.rule_count,
+            )
+            for name in names:
+                print(f"Running {name}...")
+                result = await SCENARIOS[name](ctx)
+                report["results"][name] = result
+                print(f"[OK] {name}: " + ", ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        await dispose_engines()
+
+    output = Path(args.output or f"benchmark-{settings.VERSION}-{datetime.utcnow():%Y%m%d-%H%M%S}.json")
+    output.write_text(json.dumps(report, indent=2))
+    print(f"[OK] Results written to {output}")
+
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), report)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
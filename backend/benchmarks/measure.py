@@ -0,0 +1,115 @@
+"""
+Latency, throughput and memory measurement for benchmark scenarios.
+"""
+import asyncio
+import os
+import resource
+import sys
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Recorder:
+    """Collects per-operation latencies and row counts for one scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.rows = 0
+        self.errors = 0
+        self.first_error: Optional[str] = None
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.rss_start = rss_bytes()
+        self.rss_max = self.rss_start
+
+    def record(self, seconds: float, rows: int = 0) -> None:
+        self.latencies.append(seconds)
+        self.rows += rows
+        if len(self.latencies) % 64 == 0:
+            self.sample_memory()
+
+    def sample_memory(self) -> None:
+        self.rss_max = max(self.rss_max, rss_bytes())
+
+    def stop(self) -> None:
+        self.sample_memory()
+        self.finished = time.perf_counter()
+
+    def summary(self) -> Dict[str, Any]:
+        if self.finished is None:
+            self.stop()
+        elapsed = self.finished - self.started
+        latencies = np.asarray(self.latencies) * 1000.0
+        summary = {
+            "operations": len(self.latencies),
+            "errors": self.errors,
+            "first_error": self.first_error,
+            "rows": self.rows,
+            "seconds": round(elapsed, 3),
+            "ops_per_sec": round(len(self.latencies) / elapsed, 1) if elapsed else None,
+            "rows_per_sec": round(self.rows / elapsed, 1) if elapsed and self.rows else None,
+            "rss_start_mb": round(self.rss_start / 2**20, 1),
+            "rss_max_mb": round(self.rss_max / 2**20, 1),
+        }
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            summary.update(
+                p50_ms=round(float(p50), 3),
+                p95_ms=round(float(p95), 3),
+                p99_ms=round(float(p99), 3),
+                max_ms=round(float(latencies.max()), 3),
+            )
+        return summary
+
+
+async def run_concurrent(
+    recorder: Recorder,
+    jobs: AsyncIterator[Any],
+    operation: Callable[[Any], Awaitable[int]],
+    concurrency: int,
+) -> None:
+    """
+    Run operation(job) for every job with at most `concurrency` in flight.
+
+    operation returns the number of rows it handled; exceptions count as
+    errors and do not stop the other workers.
+    """
+    lock = asyncio.Lock()
+
+    async def worker():
+        while True:
+            async with lock:
+                try:
+                    job = await jobs.__anext__()
+                except StopAsyncIteration:
+                    return
+            started = time.perf_counter()
+            try:
+                rows = await operation(job)
+            except Exception as exc:
+                recorder.errors += 1
+                if recorder.first_error is None:
+                    recorder.first_error = f"{type(exc).__name__}: {exc}"[:500]
+                continue
+            recorder.record(time.perf_counter() - started, rows)
+
+    await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+    recorder.stop()
@@ -0,0 +1,179 @@
+"""
+Benchmark scenarios.
+
+Each scenario takes a BenchmarkContext and returns a Recorder summary.
+API scenarios go through an httpx client, either in-process (ASGI
+transport, no network) or against a running server; `load` and `rules`
+call the services directly.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+import orjson
+
+from app.core.database import AsyncSessionLocal
+from app.models.alert_rule import AlertRule
+from app.services.alert_engine import AlertEngine
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import encode_cursor
+from benchmarks.measure import Recorder, run_concurrent
+from benchmarks.traffic import ATTACKS, TrafficGenerator, TrafficProfile
+
+API = "/api/v1/logs"
+# Rows evaluated by the rules scenario are generated up front, so cap them
+RULE_ROWS_MAX = 1000000
+
+
+@dataclass
+class BenchmarkContext:
+    client: httpx.AsyncClient
+    profile: TrafficProfile
+    rows: int = 100000  # Rows written by load/ingest and evaluated by rules
+    batch_size: int = 5000
+    requests: int = 500  # Requests per query scenario
+    concurrency: int = 8
+    write_concurrency: int = 2  # SQLite has a single writer; raise for PostgreSQL
+    page_size: int = 100
+    rule_count: int = 200
+
+    def generator(self, rows: Optional[int] = None, seed_offset: int = 0) -> TrafficGenerator:
+        profile = TrafficProfile(**{**self.profile.__dict__, "seed": self.profile.seed + seed_offset})
+        return TrafficGenerator(self.rows if rows is None else rows, profile)
+
+
+async def _iterate(items) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
+
+
+async def _get(client: httpx.AsyncClient, path: str, params: Dict[str, Any]) -> int:
+    response = await client.get(path, params=params)
+    response.raise_for_status()
+    body = response.json()
+    return len(body) if isinstance(body, list) else 1
+
+
+async def load(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """Write rows through bulk_insert_logs (service layer, no HTTP)"""
+    recorder = Recorder("load")
+
+    async def write(rows: List[Dict[str, Any]]) -> int:
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, rows)
+        return len(rows)
+
+    await run_concurrent(recorder, _iterate(ctx.generator().batches(ctx.batch_size)), write, ctx.write_concurrency)
+    return recorder.summary()
+
+
+async def ingest(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """POST /logs/bulk with JSON array bodies"""
+    recorder = Recorder("ingest")
+    # Small requests: the API caps a body at BULK_INGEST_MAX_ROWS anyway
+    batch_size = min(ctx.batch_size, 5000)
+
+    async def post(rows: List[Dict[str, Any]]) -> int:
+        response = await ctx.client.post(
+            f"{API}/bulk", content=orjson.dumps(rows), headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        return response.json()["accepted"]
+
+    await run_concurrent(recorder, _iterate(ctx.generator(seed_offset=1).batches(batch_size)), post, ctx.write_concurrency)
+    return recorder.summary()
+
+
+async def list_pages(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """GET /logs pages: the first page and pages resumed at random cursors"""
+    recorder = Recorder("list")
+    traffic = ctx.generator(rows=1)
+
+    def jobs():
+        for i in range(ctx.requests):
+            params = {"limit": ctx.page_size}
+            if i % 4:
+                params["cursor"] = encode_cursor(traffic.random_time(), 2**62)
+            yield params
+
+    await run_concurrent(recorder, _iterate(jobs()), lambda params: _get(ctx.client, f"{API}/", params), ctx.concurrency)
+    return recorder.summary()
+
+
+async def filter_logs(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """GET /logs with address, CIDR, attribute and time-range filters"""
+    recorder = Recorder("filter")
+    traffic = ctx.generator(rows=1)
+
+    def jobs():
+        for _ in range(ctx.requests):
+            yield {"limit": ctx.page_size, **traffic.filter_params()}
+
+    await run_concurrent(recorder, _iterate(jobs()), lambda params: _get(ctx.client, f"{API}/", params), ctx.concurrency)
+    return recorder.summary()
+
+
+async def stats(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """GET /logs/stats over dashboard windows from one hour to one week"""
+    recorder = Recorder("stats")
+    traffic = ctx.generator(rows=1)
+
+    def jobs():
+        for _ in range(ctx.requests):
+            yield traffic.stats_params()
+
+    await run_concurrent(recorder, _iterate(jobs()), lambda params: _get(ctx.client, f"{API}/stats", params), ctx.concurrency)
+    return recorder.summary()
+
+
+def synthetic_rules(traffic: TrafficGenerator, count: int) -> List[AlertRule]:
+    """A mix of the rule shapes users write: attribute, address, CIDR and port rules"""
+    now = datetime.utcnow()
+    rules = []
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            conditions = {"threat_type": ATTACKS[i % len(ATTACKS)][0], "action": ["DENY", "DROP"]}
+        elif kind == 1:
+            conditions = {"source_ip": traffic.hot_host()}
+        elif kind == 2:
+            conditions = {"destination_ip": f"{traffic.servers[i % len(traffic.servers)]}/24", "severity": ["HIGH", "CRITICAL"]}
+        else:
+            conditions = {"destination_port": {"lt": 1024}, "protocol": "TCP", "action": "DENY"}
+        rules.append(AlertRule(
+            id=i + 1, name=f"bench-{i}", is_enabled=True, conditions=conditions,
+            alert_type="webhook", alert_target="http://localhost/bench",
+            threshold_count=20, threshold_period=60, cooldown_period=300, priority=5,
+            last_triggered=None, updated_at=now,
+        ))
+    return rules
+
+
+async def rules(ctx: BenchmarkContext) -> Dict[str, Any]:
+    """AlertEngine.evaluate_many over generated batches with rule_count rules"""
+    traffic = ctx.generator(rows=min(ctx.rows, RULE_ROWS_MAX), seed_offset=2)
+    engine = AlertEngine()
+    engine.load(synthetic_rules(traffic, ctx.rule_count))
+
+    async def evaluate(rows: List[Dict[str, Any]]) -> int:
+        engine.evaluate_many(rows, notify=False)
+        return len(rows)
+
+    # Generation is excluded from the timings: evaluate pre-built batches
+    batches = list(traffic.batches(ctx.batch_size))
+    recorder = Recorder("rules")
+    await run_concurrent(recorder, _iterate(batches), evaluate, 1)
+    summary = recorder.summary()
+    summary.update(rules=len(engine), alerts_fired=engine.alerts_fired)
+    return summary
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkContext], Any]] = {
+    "load": load,
+    "ingest": ingest,
+    "list": list_pages,
+    "filter": filter_logs,
+    "stats": stats,
+    "rules": rules,
+}
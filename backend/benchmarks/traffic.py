@@ -0,0 +1,204 @@
+"""
+Synthetic firewall traffic with realistic skew.
+
+Sources follow a Zipf distribution over a fixed host pool (a few hosts
+produce most of the traffic), destinations over a smaller server pool,
+and ports/protocols/actions use fixed weights. On top of that background,
+attack bursts replace runs of consecutive rows with one attacker hitting
+one server (brute force on 22, port scans, floods on 80/443), so alert
+rules and top-K queries see the bursty shape of real incidents.
+
+Rows are generated per batch with numpy and returned as the same dicts
+the ingestion path writes, so 10M+ rows stream in constant memory.
+Timestamps rise evenly over the configured span, oldest first.
+"""
+import ipaddress
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+PROTOCOLS = ("TCP", "UDP", "HTTPS", "HTTP", "ICMP")
+PROTOCOL_WEIGHTS = (0.45, 0.25, 0.18, 0.08, 0.04)
+SERVICE_PORTS = (443, 80, 53, 22, 3389, 25, 3306, 8080, 123, 445)
+SERVICE_PORT_WEIGHTS = (0.38, 0.2, 0.14, 0.06, 0.04, 0.04, 0.04, 0.04, 0.03, 0.03)
+ACTIONS = ("ALLOW", "DENY", "DROP")
+ACTION_WEIGHTS = (0.82, 0.12, 0.06)
+DIRECTIONS = ("INBOUND", "OUTBOUND")
+SEVERITIES = ("INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL")
+SEVERITY_WEIGHTS = (0.7, 0.15, 0.1, 0.04, 0.01)
+# (threat_type, destination port or None for a scan, severity)
+ATTACKS = (
+    ("brute_force", 22, "HIGH"),
+    ("scan", None, "MEDIUM"),
+    ("dos", 443, "CRITICAL"),
+    ("dos", 80, "HIGH"),
+)
+
+
+@dataclass
+class TrafficProfile:
+    """Shape of the generated traffic"""
+    hosts: int = 50000  # Distinct background source addresses
+    servers: int = 2000  # Distinct destination addresses
+    zipf: float = 1.1  # Source skew; higher concentrates traffic on fewer hosts
+    attack_fraction: float = 0.05  # Share of rows that belong to attack bursts
+    burst_rows: int = 2000  # Mean rows per attack burst
+    log_sources: int = 8
+    days: float = 1.0  # Span of the timestamps; every 5 minutes of it opens a sketch window
+    seed: int = 42
+
+
+def _address_pool(rng: np.random.Generator, size: int, private_share: float) -> List[str]:
+    private = rng.random(size) < private_share
+    values = np.where(
+        private,
+        0x0A000000 | rng.integers(0, 1 << 24, size),  # 10.0.0.0/8
+        rng.integers(0x01000000, 0xDF000000, size),  # unicast space below 223.0.0.0
+    )
+    return [str(ipaddress.IPv4Address(int(value))) for value in values]
+
+
+def _zipf_weights(size: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+class TrafficGenerator:
+    """Generates `rows` log rows in batches, ending at `end` (default now)"""
+
+    def __init__(self, rows: int, profile: Optional[TrafficProfile] = None, end: Optional[datetime] = None):
+        self.rows = rows
+        self.profile = profile or TrafficProfile()
+        p = self.profile
+        self.rng = np.random.default_rng(p.seed)
+        self.end = end or datetime.utcnow()
+        self.start = self.end - timedelta(days=p.days)
+        self.step = p.days * 86400.0 / max(rows, 1)
+
+        self.hosts = _address_pool(self.rng, p.hosts, private_share=0.6)
+        self.servers = _address_pool(self.rng, p.servers, private_share=0.3)
+        self.host_weights = _zipf_weights(p.hosts, p.zipf)
+        self.server_weights = _zipf_weights(p.servers, p.zipf)
+        self.sources = [f"fw-{i:02d}" for i in range(1, p.log_sources + 1)]
+        self.generated = 0
+        self.attack_rows = 0
+
+    def batches(self, batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+        while self.generated < self.rows:
+            yield self.batch(min(batch_size, self.rows - self.generated))
+
+    def batch(self, size: int) -> List[Dict[str, Any]]:
+        rng = self.rng
+        p = self.profile
+
+        offsets = self.generated + np.arange(size) + rng.random(size)
+        seconds = offsets * self.step
+        source = rng.choice(p.hosts, size, p=self.host_weights)
+        destination = rng.choice(p.servers, size, p=self.server_weights)
+        source_port = rng.integers(1024, 65536, size)
+        destination_port = np.asarray(SERVICE_PORTS)[rng.choice(len(SERVICE_PORTS), size, p=SERVICE_PORT_WEIGHTS)]
+        protocol = rng.choice(len(PROTOCOLS), size, p=PROTOCOL_WEIGHTS)
+        action = rng.choice(len(ACTIONS), size, p=ACTION_WEIGHTS)
+        direction = rng.integers(0, len(DIRECTIONS), size)
+        severity = rng.choice(len(SEVERITIES), size, p=SEVERITY_WEIGHTS)
+        bytes_sent = rng.lognormal(7.0, 2.0, size).astype(np.int64)
+        bytes_received = rng.lognormal(8.0, 2.2, size).astype(np.int64)
+        packets = np.maximum(bytes_sent // 700, 1)
+        log_source = rng.integers(0, len(self.sources), size)
+
+        rows = [
+            {
+                "timestamp": self.start + timedelta(seconds=float(seconds[i])),
+                "source_ip": self.hosts[source[i]],
+                "source_port": int(source_port[i]),
+                "destination_ip": self.servers[destination[i]],
+                "destination_port": int(destination_port[i]),
+                "protocol": PROTOCOLS[protocol[i]],
+                "action": ACTIONS[action[i]],
+                "direction": DIRECTIONS[direction[i]],
+                "severity": SEVERITIES[severity[i]],
+                "threat_type": None,
+                "bytes_sent": int(bytes_sent[i]),
+                "bytes_received": int(bytes_received[i]),
+                "packet_count": int(packets[i]),
+                "log_source": self.sources[log_source[i]],
+                "raw_log": None,
+                "description": None,
+            }
+            for i in range(size)
+        ]
+        self._add_bursts(rows)
+        self.generated += size
+        return rows
+
+    def _add_bursts(self, rows: List[Dict[str, Any]]) -> None:
+        """Overwrite runs of rows with attack traffic"""
+        rng = self.rng
+        p = self.profile
+        size = len(rows)
+        if p.attack_fraction <= 0 or size == 0:
+            return
+        for _ in range(rng.poisson(p.attack_fraction * size / max(p.burst_rows, 1))):
+            length = min(int(rng.geometric(1.0 / max(p.burst_rows, 1))), size)
+            first = int(rng.integers(0, size - length + 1))
+            threat_type, port, severity = ATTACKS[rng.integers(0, len(ATTACKS))]
+            attacker = str(ipaddress.IPv4Address(int(rng.integers(0x01000000, 0xDF000000))))
+            target = self.servers[int(rng.integers(0, min(p.servers, 50)))]
+            ports = rng.integers(1, 65536, length) if port is None else None
+            for offset, row in enumerate(rows[first:first + length]):
+                row.update(
+                    source_ip=attacker,
+                    destination_ip=target,
+                    destination_port=int(ports[offset]) if ports is not None else port,
+                    protocol="TCP",
+                    action="DENY" if offset % 5 else "DROP",
+                    direction="INBOUND",
+                    severity=severity,
+                    threat_type=threat_type,
+                    bytes_sent=60,
+                    bytes_received=0,
+                    packet_count=1,
+                )
+            self.attack_rows += length
+
+    # ------------------------------------------------------------------
+    # Query parameters drawn from the same distributions
+    # ------------------------------------------------------------------
+
+    def hot_host(self) -> str:
+        return self.hosts[int(self.rng.choice(self.profile.hosts, p=self.host_weights))]
+
+    def random_time(self) -> datetime:
+        return self.start + timedelta(seconds=float(self.rng.random() * self.profile.days * 86400.0))
+
+    def filter_params(self) -> Dict[str, Any]:
+        """One realistic filter combination for GET /logs"""
+        rng = self.rng
+        kind = int(rng.integers(0, 5))
+        if kind == 0:
+            return {"source_ip": self.hot_host()}
+        if kind == 1:
+            network = ipaddress.ip_network(f"{self.hot_host()}/16", strict=False)
+            return {"source_ip": str(network), "action": "DENY"}
+        if kind == 2:
+            return {"severity": ["HIGH", "CRITICAL"], "threat_type": [attack[0] for attack in ATTACKS]}
+        if kind == 3:
+            start = self.random_time()
+            return {"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()}
+        return {
+            "destination_port": int(rng.choice(SERVICE_PORTS)),
+            "protocol": PROTOCOLS[int(rng.integers(0, 2))],
+        }
+
+    def stats_params(self) -> Dict[str, Any]:
+        """A dashboard window for GET /logs/stats"""
+        hours = int(self.rng.choice([1, 6, 24, 24 * 7]))
+        end = self.random_time() + timedelta(hours=hours)
+        end = min(end, self.end)
+        return {
+            "start_time": (end - timedelta(hours=hours)).isoformat(),
+            "end_time": end.isoformat(),
+            "interval": "minute" if hours <= 6 else "hour",
+        }
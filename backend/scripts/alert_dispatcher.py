@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import signal
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import init_db, engine
+from app.services.alert_delivery import alert_dispatcher
+# Import services to register their init_db hooks (full-text indexes)
+from app.services import fulltext
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Send queued alert notifications (run with ALERT_DELIVERY_ENABLED=false on the API)"
+    )
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between stats lines")
+    return parser.parse_args()
+
+
+async def main():
+    """Run the alert delivery dispatcher until interrupted"""
+    args = parse_args()
+    await init_db()
+    alert_dispatcher.start()
+    print("[OK] Alert dispatcher started")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), args.stats_interval)
+            except asyncio.TimeoutError:
+                print(
+                    "[STATS] in_flight={in_flight} messages={messages} sent={sent} "
+                    "retried={retried} failed={failed}".format(**alert_dispatcher.stats())
+                )
+    finally:
+        await alert_dispatcher.stop()
+        await engine.dispose()
+        stats = alert_dispatcher.stats()
+        print(f"[OK] Stopped, {stats['sent']} deliveries sent, {stats['failed']} failed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
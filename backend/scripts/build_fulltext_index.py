@@ -0,0 +1,32 @@
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.services.migrations import rebuild_fulltext_indexes
+
+
+async def main():
+    """Index raw_log/description of logs stored before the full-text index existed"""
+    if not settings.LOG_FULLTEXT_INDEX:
+        print("[ERROR] LOG_FULLTEXT_INDEX is disabled")
+        return
+    await init_db()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            tables = await rebuild_fulltext_indexes(db)
+            print(f"[OK] Rebuilt full-text indexes of {len(tables)} tables")
+        except Exception as e:
+            print(f"[ERROR] Full-text index build failed: {e}")
+            raise
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
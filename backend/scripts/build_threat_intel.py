@@ -0,0 +1,43 @@
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.services.threat_intel import PrefixIndex, build_index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compile threat-intel prefix feeds into the shared lookup index")
+    parser.add_argument("--feed", action="append", metavar="PATH", help="Feed file (default: THREAT_INTEL_FEEDS)")
+    parser.add_argument("--allowlist", action="append", metavar="PATH", help="Allowlist file (default: THREAT_INTEL_ALLOWLISTS)")
+    parser.add_argument("--output", default=settings.THREAT_INTEL_INDEX_PATH, help="Index file to write")
+    parser.add_argument("--lookup", action="append", default=[], metavar="IP", help="Look up an address afterwards")
+    return parser.parse_args()
+
+
+def main():
+    """Build the index; running workers map it on their next refresh"""
+    args = parse_args()
+    feeds = args.feed if args.feed is not None else settings.THREAT_INTEL_FEEDS
+    allowlists = args.allowlist if args.allowlist is not None else settings.THREAT_INTEL_ALLOWLISTS
+    try:
+        result = build_index(feeds, allowlists, args.output)
+    except Exception as e:
+        print(f"[ERROR] Building threat-intel index failed: {e}")
+        raise
+    print(
+        f"[OK] Indexed {result['prefixes']} prefixes into {result['ipv4_ranges']} IPv4 "
+        f"and {result['ipv6_ranges']} IPv6 ranges at {args.output}"
+    )
+
+    index = PrefixIndex(args.output)
+    for address in args.lookup:
+        entry = index.lookup(address)
+        print(f"{address}: {entry or 'no match'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import ReadSessionLocal, dispose_engines
+from app.services.export import COMPRESSIONS, FORMATS, ExportError, export_filename, iter_export
+from app.services.log_query import LOG_FIELDS, LogFilters, LogQueryError
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export firewall logs as CSV, NDJSON or Parquet")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none")
+    parser.add_argument("--output", "-o", help="Output file ('-' for stdout); defaults to a timestamped name")
+    parser.add_argument("--fields", help=f"Comma-separated columns out of: {','.join(LOG_FIELDS)}")
+    parser.add_argument("--start-time", type=datetime.fromisoformat, help="Inclusive, UTC (ISO 8601)")
+    parser.add_argument("--end-time", type=datetime.fromisoformat, help="Exclusive, UTC (ISO 8601)")
+    parser.add_argument("--source-ip", help="Address or CIDR")
+    parser.add_argument("--destination-ip", help="Address or CIDR")
+    parser.add_argument("--source-port", type=int)
+    parser.add_argument("--destination-port", type=int)
+    for name in ("protocol", "action", "severity", "threat-type", "log-source"):
+        parser.add_argument(f"--{name}", action="append", help="May be repeated")
+    parser.add_argument("--q", help='Full-text search in raw_log/description: terms, "phrases", prefix*')
+    return parser.parse_args()
+
+
+async def main():
+    """Stream matching logs to a file in constant memory"""
+    args = parse_args()
+    filters = LogFilters(
+        start_time=args.start_time,
+        end_time=args.end_time,
+        source_ip=args.source_ip,
+        destination_ip=args.destination_ip,
+        source_port=args.source_port,
+        destination_port=args.destination_port,
+        protocol=args.protocol,
+        action=args.action,
+        severity=args.severity,
+        threat_type=args.threat_type,
+        log_source=args.log_source,
+        q=args.q,
+    )
+    fields = [name.strip() for name in args.fields.split(",")] if args.fields else None
+    unknown = [name for name in fields or [] if name not in LOG_FIELDS]
+    if unknown:
+        print(f"[ERROR] Unknown fields: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(2)
+
+    output = args.output or export_filename(args.format, args.compression)
+    counter = [0]
+    try:
+        async with ReadSessionLocal() as db:
+            chunks = iter_export(db, filters, args.format, args.compression, fields, counter=counter)
+            if output == "-":
+                async for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+            else:
+                with open(output, "wb") as f:
+                    async for chunk in chunks:
+                        f.write(chunk)
+        print(f"[OK] Exported {counter[0]} logs to {output}", file=sys.stderr)
+    except (ExportError, LogQueryError) as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,7 +7,9 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.core.database import init_db, engine
 # Import models to register them with Base.metadata
-from app.models import FirewallLog, User, AlertRule
+from app.models import FirewallLog, User, AlertRule, AlertDelivery, LogRollup, LogSketch, LogPartition
+# Import services to register their init_db hooks (full-text indexes)
+from app.services import fulltext
 
 
 async def main():
@@ -0,0 +1,53 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.services import archive, partitions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="List, close, archive and expire firewall log partitions")
+    parser.add_argument("--maintain", action="store_true", help="Close finished days and apply retention")
+    parser.add_argument("--retention-days", type=int, help="Override LOG_RETENTION_DAYS for this run")
+    parser.add_argument("--archive-after-days", type=int, help="Override ARCHIVE_AFTER_DAYS for this run")
+    return parser.parse_args()
+
+
+async def main():
+    """Run partition maintenance and print the partition list"""
+    args = parse_args()
+    if args.retention_days is not None:
+        settings.LOG_RETENTION_DAYS = args.retention_days
+    if args.archive_after_days is not None:
+        settings.ARCHIVE_AFTER_DAYS = args.archive_after_days
+    await init_db()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            if args.maintain:
+                result = await partitions.maintain_partitions(db, datetime.utcnow())
+                print(
+                    f"[OK] Closed {len(result['closed'])}, dropped {len(result['dropped'])} partitions, "
+                    f"purged {result['legacy_purged']} legacy rows"
+                )
+                archived = await archive.archive_partitions(db)
+                print(f"[OK] Archived {len(archived)} partitions to {settings.ARCHIVE_DIR}")
+            for partition in await partitions.list_partitions(db):
+                rows = partition.row_count if partition.row_count is not None else "-"
+                print(f"{partition.day}  {partition.table_name}  {partition.state:<8} rows={rows}")
+        except Exception as e:
+            print(f"[ERROR] Partition maintenance failed: {e}")
+            raise
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.core.database import AsyncSessionLocal, engine, init_db
+from app.services.migrations import backfill_packed_ips, rebuild_ip_indexes
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Backfill packed address keys and rebuild address indexes")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows updated per transaction")
+    parser.add_argument("--skip-indexes", action="store_true", help="Only backfill, keep the current indexes")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to return freed pages (SQLite)")
+    return parser.parse_args()
+
+
+async def main():
+    """Migrate stored logs to packed address keys"""
+    args = parse_args()
+    await init_db()
+
+    async with AsyncSessionLocal() as db:
+        try:
+            counts = await backfill_packed_ips(db, args.batch_size)
+            print(f"[OK] Backfilled {sum(counts.values())} rows in {len(counts)} tables")
+            if not args.skip_indexes:
+                tables = await rebuild_ip_indexes(db)
+                print(f"[OK] Rebuilt address indexes on {len(tables)} tables")
+        except Exception as e:
+            print(f"[ERROR] IP column migration failed: {e}")
+            raise
+
+    try:
+        if args.vacuum and engine.dialect.name == "sqlite":
+            async with engine.connect() as conn:
+                await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text("VACUUM"))
+            print("[OK] Vacuumed database")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
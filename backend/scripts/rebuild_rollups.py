@@ -0,0 +1,38 @@
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.database import AsyncSessionLocal, engine
+from app.services.rollups import rebuild_rollups
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Recompute log rollups from firewall_logs")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="First day to rebuild (UTC)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Rebuild up to this time (UTC)")
+    return parser.parse_args()
+
+
+async def main():
+    """Rebuild rollups for the given range (everything by default)"""
+    args = parse_args()
+    print("Rebuilding rollups...")
+
+    async with AsyncSessionLocal() as db:
+        try:
+            count = await rebuild_rollups(db, args.start, args.end)
+            print(f"[OK] Aggregated {count} firewall logs")
+        except Exception as e:
+            print(f"[ERROR] Error rebuilding rollups: {e}")
+            raise
+        finally:
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -11,8 +11,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import AsyncSessionLocal, engine
 from app.core.security import get_password_hash
 from app.models.user import User, UserRole
-from app.models.firewall_log import FirewallLog
 from app.models.alert_rule import AlertRule
+from app.services.ingest import bulk_insert_logs
 
 
 async def create_users(db: AsyncSession):
@@ -68,27 +68,27 @@ async def create_firewall_logs(db: AsyncSession):
     base_time = datetime.utcnow() - timedelta(days=7)
 
     for i in range(500):
-        log = FirewallLog(
-            timestamp=base_time + timedelta(minutes=random.randint(0, 10080)),  # 7 days
-            source_ip=random_ip(),
-            source_port=random.randint(1024, 65535),
-            destination_ip=random_ip(),
-            destination_port=random.choice([80, 443, 22, 21, 3306, 8080, random.randint(1024, 65535)]),
-            protocol=random.choice(protocols),
-            action=random.choice(actions),
-            direction=random.choice(directions),
-            severity=random.choice(severities),
-            threat_type=random.choice(threat_types),
-            bytes_sent=random.randint(0, 1000000),
-            bytes_received=random.randint(0, 1000000),
-            packet_count=random.randint(1, 1000),
-            log_source=f"firewall-{random.randint(1, 5)}",
-            description=f"Firewall log entry {i+1}",
-        )
-        logs.append(log)
-
-    db.add_all(logs)
-    await db.commit()
+        logs.append({
+            "timestamp": base_time + timedelta(minutes=random.randint(0, 10080)),  # 7 days
+            "source_ip": random_ip(),
+            "source_port": random.randint(1024, 65535),
+            "destination_ip": random_ip(),
+            "destination_port": random.choice([80, 443, 22, 21, 3306, 8080, random.randint(1024, 65535)]),
+            "protocol": random.choice(protocols),
+            "action": random.choice(actions),
+            "direction": random.choice(directions),
+            "severity": random.choice(severities),
+            "threat_type": random.choice(threat_types),
+            "bytes_sent": random.randint(0, 1000000),
+            "bytes_received": random.randint(0, 1000000),
+            "packet_count": random.randint(1, 1000),
+            "log_source": f"firewall-{random.randint(1, 5)}",
+            "raw_log": None,
+            "description": f"Firewall log entry {i+1}",
+        })
+
+    # Use the ingestion path so rollups and other derived data stay in sync
+    await bulk_insert_logs(db, logs)
     print(f"[OK] Created {len(logs)} firewall logs")
 
 
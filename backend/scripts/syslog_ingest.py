@@ -0,0 +1,82 @@
+import argparse
+import asyncio
+import signal
+import sys
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+from app.core.database import init_db, engine, AsyncSessionLocal
+from app.services.alert_engine import alert_engine
+from app.services.sketches import sketch_store
+from app.services.syslog_server import SyslogIngestor
+from app.services.threat_intel import threat_intel
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest syslog/CEF/iptables/pf firewall logs")
+    parser.add_argument("--host", default=settings.SYSLOG_HOST)
+    parser.add_argument("--udp-port", type=int, default=settings.SYSLOG_UDP_PORT, help="0 disables UDP")
+    parser.add_argument("--tcp-port", type=int, default=settings.SYSLOG_TCP_PORT, help="0 disables TCP")
+    parser.add_argument("--tail", action="append", default=[], metavar="PATH", help="Follow a log file")
+    parser.add_argument("--from-start", action="store_true", help="Read tailed files from the beginning")
+    parser.add_argument("--stats-interval", type=float, default=10.0, help="Seconds between stats lines")
+    return parser.parse_args()
+
+
+async def main():
+    """Run the syslog listener until interrupted"""
+    args = parse_args()
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        await alert_engine.reload(db)
+    print(f"[OK] Loaded {len(alert_engine)} alert rules")
+    await threat_intel.refresh()
+    if threat_intel.index is not None:
+        print(f"[OK] Loaded threat-intel index ({len(threat_intel.index)} ranges)")
+
+    ingestor = SyslogIngestor()
+    await ingestor.start(
+        host=args.host,
+        udp_port=args.udp_port,
+        tcp_port=args.tcp_port,
+        tail_paths=args.tail,
+        tail_from_start=args.from_start,
+    )
+    print(f"[OK] Listening on {args.host} (udp={args.udp_port}, tcp={args.tcp_port})")
+    for path in args.tail:
+        print(f"[OK] Tailing {path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), args.stats_interval)
+            except asyncio.TimeoutError:
+                async with AsyncSessionLocal() as db:
+                    await alert_engine.refresh(db)
+                    await sketch_store.flush(db)
+                await threat_intel.refresh()
+                stats = ingestor.stats()
+                print(
+                    "[STATS] queue={queue_depth}/{queue_capacity} received={received} "
+                    "written={written} dropped={dropped} parse_errors={parse_errors} "
+                    "write_errors={write_errors}".format(**stats)
+                )
+    finally:
+        print("Flushing buffered lines...")
+        await ingestor.stop()
+        async with AsyncSessionLocal() as db:
+            await sketch_store.flush(db, force=True)
+        await engine.dispose()
+        print(f"[OK] Stopped, {ingestor.written} rows written")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
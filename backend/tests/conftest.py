@@ -0,0 +1,104 @@
+"""
+Test setup: a throwaway SQLite database configured before app is imported.
+
+Settings are read at import time, so the environment is set at module
+level. Tests are plain functions driving coroutines through run(), which
+disposes the engines afterwards so no pooled connection outlives its
+event loop.
+"""
+import asyncio
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict
+
+import pytest
+
+_TMP = tempfile.mkdtemp(prefix="firewall-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_TMP}/test.db"
+os.environ["ARCHIVE_DIR"] = os.path.join(_TMP, "archive")
+os.environ["THREAT_INTEL_INDEX_PATH"] = os.path.join(_TMP, "threat_intel.idx")
+os.environ["ALERT_DELIVERY_ENABLED"] = "false"
+os.environ["SYSLOG_ENABLED"] = "false"
+os.environ["FLOW_AGGREGATION"] = "false"
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+from app.core.database import dispose_engines, init_db
+# Import models and services to register their tables and init_db hooks
+from app import models
+from app.services import fulltext
+
+
+def _run(coroutine):
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await dispose_engines()
+    return asyncio.run(main())
+
+
+@pytest.fixture(scope="session")
+def database():
+    _run(init_db())
+
+
+@pytest.fixture(scope="session")
+def run(database):
+    """Run a coroutine to completion on a fresh event loop"""
+    return _run
+
+
+@pytest.fixture
+def client(database):
+    """TestClient for the app, with its lifespan running"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+async def _bearer_for(username: str, role) -> dict:
+    from app.core.database import AsyncSessionLocal
+    from app.core.security import create_access_token
+    from app.models.user import User
+
+    async with AsyncSessionLocal() as db:
+        db.add(User(username=username, email=f"{username}@example.com", hashed_password="!", role=role))
+        await db.commit()
+    return {"Authorization": f"Bearer {create_access_token({'sub': username, 'role': role.value})}"}
+
+
+@pytest.fixture(scope="session")
+def viewer_headers(database):
+    """Authorization header of a VIEWER account"""
+    from app.models.user import UserRole
+    return _run(_bearer_for("test-viewer", UserRole.VIEWER))
+
+
+@pytest.fixture
+def log_row():
+    """Factory for firewall_logs row dicts as ingestion produces them"""
+    def make(**overrides: Any) -> Dict[str, Any]:
+        row = {
+            "timestamp": datetime.utcnow().replace(microsecond=0),
+            "source_ip": "10.0.0.1",
+            "source_port": 40000,
+            "destination_ip": "192.0.2.10",
+            "destination_port": 443,
+            "protocol": "TCP",
+            "action": "DENY",
+            "direction": "INBOUND",
+            "severity": "INFO",
+            "threat_type": None,
+            "bytes_sent": 100,
+            "bytes_received": 0,
+            "packet_count": 1,
+            "log_source": "tests",
+            "raw_log": None,
+            "description": None,
+        }
+        row.update(overrides)
+        return row
+    return make
@@ -0,0 +1,250 @@
+"""Alert delivery queue: digests, retries, concurrency caps and transports."""
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import delete, select, update
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.alert_delivery import AlertDelivery
+from app.services import alert_delivery
+from app.services.alert_delivery import AlertDispatcher, DeliveryError, Transports, webhook_target_error
+from app.services.alert_engine import AlertFiring
+
+
+class FakeTransports:
+    """Records digests; fails targets listed in errors; holds sends while gate is closed"""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.active = 0
+        self.peak = 0
+
+    async def send(self, alert_type, target, payloads):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await self.gate.wait()
+            if target in self.errors:
+                raise self.errors[target]
+            self.sent.append((target, [payload["log_id"] for payload in payloads]))
+        finally:
+            self.active -= 1
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def empty_queue(run):
+    async def clear():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AlertDelivery))
+            await db.commit()
+
+    run(clear())
+
+
+def _firing(target: str, log_id: int, alert_type: str = "webhook") -> AlertFiring:
+    return AlertFiring(
+        rule_id=1, rule_name="ssh brute force", priority=2, alert_type=alert_type, alert_target=target,
+        triggered_at=datetime(2026, 5, 1, 12), match_count=10, threshold_period=60, log_id=log_id,
+        event={"id": log_id, "timestamp": datetime(2026, 5, 1, 12), "action": "DENY", "raw_log": "not copied"},
+    )
+
+
+def _payload():
+    return alert_delivery.delivery_payload(_firing("https://hooks.example.com/x", 1))
+
+
+async def _enqueue(firings):
+    async with AsyncSessionLocal() as db:
+        queued = await alert_delivery.enqueue_deliveries(db, firings)
+        await db.commit()
+    return queued
+
+
+async def _deliveries():
+    async with AsyncSessionLocal() as db:
+        return (await db.scalars(select(AlertDelivery).order_by(AlertDelivery.id))).all()
+
+
+def _dispatcher(transports) -> AlertDispatcher:
+    dispatcher = AlertDispatcher()
+    dispatcher.transports = transports
+    return dispatcher
+
+
+def test_firings_are_grouped_into_per_target_digests(run, monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_DELIVERY_DIGEST_MAX", 2)
+    transports = FakeTransports()
+
+    async def scenario():
+        firings = [_firing("https://a.example/hook", n) for n in range(5)]
+        firings += [_firing("https://b.example/hook", n) for n in range(10, 12)]
+        firings.append(_firing("", 99))  # rules without a target queue nothing
+        assert await _enqueue(firings) == 7
+        dispatcher = _dispatcher(transports)
+        assert await dispatcher.dispatch_once() == 7
+        await dispatcher.drain()
+        return dispatcher, await _deliveries()
+
+    dispatcher, deliveries = run(scenario())
+    assert sorted(transports.sent) == [
+        ("https://a.example/hook", [0, 1]),
+        ("https://a.example/hook", [2, 3]),
+        ("https://a.example/hook", [4]),
+        ("https://b.example/hook", [10, 11]),
+    ]
+    assert {d.status for d in deliveries} == {"sent"}
+    assert all(d.attempts == 1 and d.sent_at is not None and d.claim_token is None for d in deliveries)
+    assert deliveries[0].payload["event"] == {"id": 0, "timestamp": "2026-05-01T12:00:00", "action": "DENY"}
+    assert dispatcher.stats()["messages"] == 4
+
+
+def test_transient_failures_are_retried_after_a_backoff(run, monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_DELIVERY_MAX_ATTEMPTS", 2)
+    transports = FakeTransports({
+        "https://flaky.example": DeliveryError("HTTP 503"),
+        "https://gone.example": DeliveryError("HTTP 404", permanent=True),
+    })
+
+    async def retry_now():
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(AlertDelivery).values(next_attempt_at=datetime.utcnow()))
+            await db.commit()
+
+    async def scenario():
+        await _enqueue([_firing("https://flaky.example", 1), _firing("https://gone.example", 2)])
+        dispatcher = _dispatcher(transports)
+        started = datetime.utcnow()
+        await dispatcher.dispatch_once()
+        await dispatcher.drain()
+        first = await _deliveries()
+        # Nothing is due until the backoff has passed
+        assert await dispatcher.dispatch_once() == 0
+
+        await retry_now()
+        assert await dispatcher.dispatch_once() == 1
+        await dispatcher.drain()
+        return started, first, await _deliveries(), dispatcher.stats()
+
+    started, (flaky, gone), (flaky_after, _), stats = run(scenario())
+    assert (flaky.status, flaky.attempts, flaky.last_error) == ("pending", 1, "HTTP 503")
+    assert flaky.next_attempt_at >= started + timedelta(seconds=settings.ALERT_DELIVERY_BACKOFF_BASE * 0.75)
+    assert (gone.status, gone.attempts) == ("failed", 1)
+    assert (flaky_after.status, flaky_after.attempts) == ("failed", 2)
+    assert (stats["retried"], stats["failed"], stats["sent"]) == (1, 2, 0)
+
+
+def test_sends_stay_within_the_in_flight_and_per_target_caps(run, monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_DELIVERY_MAX_IN_FLIGHT", 3)
+    monkeypatch.setattr(settings, "ALERT_DELIVERY_PER_TARGET", 1)
+    monkeypatch.setattr(settings, "ALERT_DELIVERY_DIGEST_MAX", 1)
+    transports = FakeTransports()
+    transports.gate.clear()
+
+    async def scenario():
+        await _enqueue([_firing(f"https://t{n % 2}.example", n) for n in range(8)])
+        dispatcher = _dispatcher(transports)
+        # One poll claims no more than the free slots can send
+        assert await dispatcher.dispatch_once() == 3
+        await asyncio.sleep(0.01)
+        assert transports.active == 2  # the third send waits for its target
+        assert await dispatcher.dispatch_once() == 0
+
+        transports.gate.set()
+        claimed = 3
+        while claimed < 8:
+            await dispatcher.drain()
+            claimed += await dispatcher.dispatch_once()
+        await dispatcher.drain()
+        return dispatcher
+
+    dispatcher = run(scenario())
+    assert transports.peak <= 2
+    assert len(transports.sent) == 8
+    assert not dispatcher._target_slots
+
+
+def test_expired_leases_are_claimed_again(run):
+    async def scenario():
+        await _enqueue([_firing("https://a.example/hook", 1)])
+        dispatcher = _dispatcher(FakeTransports())
+        async with AsyncSessionLocal() as db:
+            assert len(await dispatcher.claim(db, 10)) == 1
+            assert await dispatcher.claim(db, 10) == []
+            await db.execute(update(AlertDelivery).values(lease_until=datetime.utcnow() - timedelta(seconds=1)))
+            await db.commit()
+            return await dispatcher.claim(db, 10)
+
+    assert [delivery.payload["log_id"] for delivery in run(scenario())] == [1]
+
+
+def test_backoff_doubles_up_to_the_cap():
+    for attempts in range(1, 20):
+        expected = min(settings.ALERT_DELIVERY_BACKOFF_BASE * 2 ** (attempts - 1), settings.ALERT_DELIVERY_BACKOFF_MAX)
+        assert expected * 0.75 <= alert_delivery.backoff_delay(attempts) <= expected * 1.25
+
+
+@pytest.mark.parametrize(
+    "url, allowed",
+    [
+        ("https://hooks.example.com/x", True),
+        ("https://8.8.8.8/x", True),
+        ("ftp://hooks.example.com/x", False),
+        ("https://127.0.0.1/x", False),
+        ("https://10.0.0.5/x", False),
+        ("http://[::1]:8080/x", False),
+        ("https://169.254.169.254/latest", False),
+        ("http://localhost/x", False),
+        ("https://", False),
+    ],
+)
+def test_webhook_targets_must_be_public(url, allowed):
+    assert (webhook_target_error(url) is None) is allowed
+
+
+def test_webhook_allow_list(monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_WEBHOOK_ALLOWED_HOSTS", [".example.com"])
+    assert webhook_target_error("https://hooks.example.com/x") is None
+    assert webhook_target_error("https://8.8.8.8/x") is not None
+
+
+@pytest.mark.parametrize("status, permanent", [(200, None), (404, True), (408, False), (429, False), (503, False)])
+def test_webhook_responses(run, monkeypatch, status, permanent):
+    monkeypatch.setattr(settings, "ALERT_WEBHOOK_ALLOWED_HOSTS", ["hooks.example.com"])
+    received = []
+
+    def handler(request):
+        received.append(request)
+        return httpx.Response(status)
+
+    async def send():
+        transports = Transports()
+        transports._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            await transports.send("webhook", "https://hooks.example.com/x", [_payload()])
+        except DeliveryError as exc:
+            return exc.permanent
+        finally:
+            await transports.close()
+
+    assert run(send()) is permanent
+    assert len(received) == 1
+
+
+def test_refused_targets_are_never_contacted(run):
+    async def send(alert_type, target):
+        try:
+            await Transports().send(alert_type, target, [_payload()])
+        except DeliveryError as exc:
+            return exc.permanent
+
+    assert run(send("webhook", "http://127.0.0.1:9/hook")) is True
+    assert run(send("pager", "ops")) is True
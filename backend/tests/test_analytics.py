@@ -0,0 +1,101 @@
+"""Vectorized analytics checked against plain Python over the same rows."""
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.services import analytics
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import LogFilters
+
+START = datetime(2025, 9, 3, 10)
+FILTERS = LogFilters(start_time=START, end_time=START + timedelta(hours=1), log_source=["analytics-test"])
+
+
+def _dataset():
+    rng = random.Random(3)
+    return [
+        {
+            "timestamp": START + timedelta(seconds=rng.randrange(3600)),
+            "source_ip": f"10.9.0.{rng.randrange(6)}",
+            "destination_ip": "192.0.2.90",
+            "destination_port": rng.choice([22, 80, 443, None]),
+            "protocol": "TCP",
+            "action": rng.choice(["ALLOW", "DENY"]),
+            "direction": "INBOUND",
+            "bytes_sent": rng.randrange(5000),
+            "packet_count": 1,
+            "log_source": "analytics-test",
+        }
+        for _ in range(500)
+    ]
+
+
+@pytest.fixture(scope="module")
+def loaded(run):
+    rows = _dataset()
+
+    async def load():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, rows)
+            return await analytics.load_window(db, FILTERS)
+
+    return rows, run(load())
+
+
+def test_group_by_matches_python_totals(loaded):
+    rows, window = loaded
+    expected = defaultdict(lambda: [0, 0])
+    for row in rows:
+        key = (row["action"], row["destination_port"])
+        expected[key][0] += 1
+        expected[key][1] += row["bytes_sent"]
+
+    groups = analytics.group_by(window, ("action", "destination_port"), order_by="bytes_sent", top=100)
+    assert {(g["action"], g["destination_port"]): [g["events"], g["bytes_sent"]] for g in groups} == expected
+    assert [g["bytes_sent"] for g in groups] == sorted((v[1] for v in expected.values()), reverse=True)
+
+
+def test_group_series_add_up_to_the_group(loaded):
+    _, window = loaded
+    for group in analytics.group_by(window, ("source_ip",), top=3, interval=600):
+        assert sum(point["events"] for point in group["series"]) == group["events"]
+        assert all(START <= point["bucket_start"] < START + timedelta(hours=1) for point in group["series"])
+
+
+def test_percentiles_per_group_match_numpy(loaded):
+    rows, window = loaded
+    result = analytics.percentiles(window, "bytes_sent", [50, 95], by="action")
+    values = defaultdict(list)
+    for row in rows:
+        values[row["action"]].append(row["bytes_sent"])
+
+    assert result["overall"]["p50"] == pytest.approx(np.percentile([r["bytes_sent"] for r in rows], 50))
+    for group in result["groups"]:
+        assert group["events"] == len(values[group["action"]])
+        assert group["p95"] == pytest.approx(np.percentile(values[group["action"]], 95))
+
+
+def test_rate_peaks(loaded):
+    rows, window = loaded
+    per_bucket = defaultdict(int)
+    for row in rows:
+        per_bucket[(row["source_ip"], (row["timestamp"] - START).seconds // 300)] += 1
+    peak = max(per_bucket.values())
+
+    result = analytics.rates(window, 300, by="source_ip", top=1)
+    assert len(result["series"]) == 12
+    assert sum(point["events_per_second"] for point in result["series"]) * 300 == pytest.approx(len(rows))
+    assert result["peaks"][0]["peak_events_per_second"] == pytest.approx(peak / 300)
+
+
+def test_window_requires_a_time_range(run):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            await analytics.load_window(db, LogFilters(start_time=START))
+
+    with pytest.raises(analytics.AnalyticsError):
+        run(load())
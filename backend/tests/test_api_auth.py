@@ -0,0 +1,136 @@
+"""Bearer-token dependency, its caches and role checks on the routers."""
+import time
+
+import pytest
+from fastapi import HTTPException
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import deps
+from app.core.cache import TTLCache
+from app.core.database import AsyncSessionLocal
+from app.core.security import create_access_token
+from app.models.user import User, UserRole
+
+RECORD = {
+    "timestamp": "2026-04-01T12:00:00Z",
+    "source_ip": "10.12.0.1",
+    "destination_ip": "192.0.2.12",
+    "protocol": "TCP",
+    "action": "DENY",
+    "direction": "INBOUND",
+}
+
+
+def _user(run, username: str, role: UserRole, is_active: bool = True) -> str:
+    """Create a user and return a bearer token for it"""
+    async def create():
+        async with AsyncSessionLocal() as db:
+            db.add(User(
+                username=username, email=f"{username}@example.com", hashed_password="x",
+                role=role, is_active=is_active,
+            ))
+            await db.commit()
+
+    run(create())
+    return create_access_token({"sub": username, "role": role.value})
+
+
+def _bearer(token: str):
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    deps._token_cache.clear()
+    deps._user_cache.clear()
+
+
+def test_ttl_cache_evicts_least_recently_used_and_expired_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    cache.set("short", 4, ttl=1)
+    cache.set("long", 5, ttl=60)  # never longer than the cache's own ttl
+    now[0] += 2
+    assert cache.get("short") is None
+    now[0] += 9
+    assert cache.get("long") is None
+
+
+def test_cached_user_needs_no_database_query(run, monkeypatch):
+    token = _user(run, "cached-viewer", UserRole.VIEWER)
+    loads = []
+    load_user = deps._load_user
+
+    async def counting_load(username):
+        loads.append(username)
+        return await load_user(username)
+
+    monkeypatch.setattr(deps, "_load_user", counting_load)
+
+    async def resolve_twice():
+        return [await deps.user_for_token(token) for _ in range(2)]
+
+    first, second = run(resolve_twice())
+    assert first is second
+    assert loads == ["cached-viewer"]
+
+    deps.invalidate_user("cached-viewer")
+    run(deps.user_for_token(token))
+    assert loads == ["cached-viewer", "cached-viewer"]
+
+
+def test_cached_payload_is_not_served_after_it_expires(run):
+    token = _user(run, "expiring", UserRole.VIEWER)
+    run(deps.user_for_token(token))
+    deps._token_cache.set(token, {"sub": "expiring", "exp": time.time() - 1})
+
+    with pytest.raises(HTTPException) as error:
+        run(deps.user_for_token(token))
+    assert error.value.status_code == 401
+
+
+@pytest.mark.parametrize("token", [None, "not-a-jwt", create_access_token({"sub": "ghost"})])
+def test_unusable_tokens_are_rejected(run, token):
+    with pytest.raises(HTTPException) as error:
+        run(deps.user_for_token(token))
+    assert error.value.status_code == 401
+
+
+def test_inactive_user_is_forbidden(run):
+    token = _user(run, "disabled", UserRole.ADMIN, is_active=False)
+    with pytest.raises(HTTPException) as error:
+        run(deps.user_for_token(token))
+    assert error.value.status_code == 403
+
+
+def test_data_endpoints_need_a_token_and_writes_need_operator(run, client):
+    viewer = _user(run, "api-viewer", UserRole.VIEWER)
+    operator = _user(run, "api-operator", UserRole.OPERATOR)
+
+    for path in ("/api/v1/logs", "/api/v1/logs/stats", "/api/v1/alert-rules", "/api/v1/logs/stream/stats"):
+        assert client.get(path).status_code == 401
+
+    assert client.get("/api/v1/logs", headers=_bearer(viewer)).status_code == 200
+    assert client.post("/api/v1/logs/bulk", json=[RECORD], headers=_bearer(viewer)).status_code == 403
+    assert client.post("/api/v1/logs/bulk", json=[RECORD], headers=_bearer(operator)).status_code == 200
+    assert client.get("/api/v1/alert-rules/deliveries", headers=_bearer(viewer)).status_code == 403
+
+
+def test_websocket_accepts_a_query_token(run, client):
+    viewer = _user(run, "ws-viewer", UserRole.VIEWER)
+
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect("/api/v1/logs/stream/ws") as websocket:
+            websocket.receive_text()
+    assert closed.value.code == 1008
+
+    with client.websocket_connect(f"/api/v1/logs/stream/ws?token={viewer}") as websocket:
+        websocket.send_json({"conditions": {"action": "DENY"}})
+        assert websocket.receive_json()["type"] == "subscribed"
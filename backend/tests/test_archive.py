@@ -0,0 +1,146 @@
+"""Parquet archive compaction of closed partitions."""
+from dataclasses import replace
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.log_partition import LogPartition
+from app.services import archive, ingest, partitions
+from app.services.log_query import LogFilters, encode_cursor, fetch_log_page, get_log_row
+
+pytestmark = pytest.mark.skipif(not archive.available(), reason="pyarrow is not installed")
+
+
+def _rows(day: date, count: int, start: int = 0, source: str = "archive-test"):
+    return [
+        {
+            "timestamp": datetime.combine(day, time(12)) + timedelta(seconds=start + n),
+            "source_ip": f"10.8.0.{n % 250 + 1}",
+            "source_port": 40000 + n,
+            "destination_ip": "192.0.2.80",
+            "destination_port": 443,
+            "protocol": "TCP",
+            "action": "DENY",
+            "direction": "INBOUND",
+            "severity": "INFO",
+            "bytes_sent": 60,
+            "bytes_received": 0,
+            "packet_count": 1,
+            "log_source": source,
+        }
+        for n in range(count)
+    ]
+
+
+async def _closed_partition(db, day: date, count: int) -> LogPartition:
+    await ingest.bulk_insert_logs(db, _rows(day, count))
+    partition = await db.scalar(select(LogPartition).where(LogPartition.day == day))
+    await partitions.close_partition(db, partition)
+    return partition
+
+
+async def _table_count(db, day: date) -> int:
+    return await db.scalar(select(func.count()).select_from(partitions.partition_table(day)))
+
+
+def test_rows_inserted_during_archive_are_not_dropped(run, monkeypatch):
+    day = date.today() - timedelta(days=40)
+    lock_partition = partitions.lock_partition
+
+    async def insert_then_lock(db, partition, **kwargs):
+        # A late row committed by another session after the day was read
+        async with AsyncSessionLocal() as other:
+            await ingest.bulk_insert_logs(other, _rows(day, 1, start=500))
+        return await lock_partition(db, partition, **kwargs)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            partition = await _closed_partition(db, day, 5)
+            monkeypatch.setattr(partitions, "lock_partition", insert_then_lock)
+            assert await archive.archive_partition(db, partition) is None
+            monkeypatch.setattr(partitions, "lock_partition", lock_partition)
+
+            assert partition.state == "closed"
+            assert not partitions.archive_path(day).exists()
+            assert await _table_count(db, day) == 6
+
+            assert await archive.archive_partition(db, partition) == 6
+            assert partition.state == "archived"
+        return archive.count_rows(day)
+
+    assert run(scenario()) == 6
+
+
+@pytest.mark.parametrize(
+    "value, unpacked",
+    [("10.8.0.1", "10.8.0.1"), ("::ffff:10.8.0.1", "10.8.0.1"), ("2001:DB8::1", "2001:db8::1"), ("::", "::")],
+)
+def test_addresses_round_trip(value, unpacked):
+    packed = archive.pack_ip(value)
+    assert len(packed) == 16
+    assert archive.unpack_ip(packed) == unpacked
+
+
+def test_non_addresses_are_not_packed():
+    assert archive.pack_ip("fw01.example") is None
+
+
+def test_cidr_bounds_cover_the_network():
+    low, high = archive.ip_bounds("10.8.0.0/24")
+    assert low <= archive.pack_ip("10.8.0.255") <= high
+    assert not low <= archive.pack_ip("10.8.1.0") <= high
+
+
+def test_archived_day_is_still_queryable(run, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_ROW_GROUP_SIZE", 4)
+    day = date.today() - timedelta(days=50)
+    rows = _rows(day, 10, source="archive-query")
+    # Text that does not round-trip through the packed form is kept verbatim
+    rows[3]["destination_ip"] = "2001:DB8::50"
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            ids = await ingest.bulk_insert_logs(db, rows)
+            partition = await db.scalar(select(LogPartition).where(LogPartition.day == day))
+            await partitions.close_partition(db, partition)
+            assert await archive.archive_partition(db, partition) == 10
+
+            source = LogFilters(log_source=["archive-query"])
+            page = await fetch_log_page(db, source, limit=4)
+            cursor = encode_cursor(page[3]["timestamp"], page[3]["id"])
+            rest = await fetch_log_page(db, source, cursor=cursor, limit=100)
+            subnet = await fetch_log_page(db, replace(source, source_ip="10.8.0.0/30"), limit=100)
+            single = await get_log_row(db, ids[3])
+        return ids, page, rest, subnet, single
+
+    ids, page, rest, subnet, single = run(scenario())
+    newest_first = ids[::-1]
+    assert [row["id"] for row in page[:4]] + [row["id"] for row in rest] == newest_first
+    assert sorted(row["source_ip"] for row in subnet) == ["10.8.0.1", "10.8.0.2", "10.8.0.3"]
+    assert single["destination_ip"] == "2001:DB8::50"
+    assert single["source_port"] == 40003
+    assert archive.count_rows(day) == 10
+
+
+def test_late_rows_are_merged_into_the_archive(run):
+    day = date.today() - timedelta(days=60)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            partition = await _closed_partition(db, day, 3)
+            await archive.archive_partition(db, partition)
+
+            # A late row reopens the day; the next compaction rewrites the file
+            await ingest.bulk_insert_logs(db, _rows(day, 2, start=100))
+            await db.refresh(partition)
+            assert partition.state == "hot"
+            await partitions.close_partition(db, partition)
+            return await archive.archive_partition(db, partition)
+
+    assert run(scenario()) == 5
+    rows = [row for batch in archive.iter_row_batches(partitions.archive_path(day)) for row in batch]
+    assert [row["source_port"] for row in rows] == [40001, 40000, 40002, 40001, 40000]
+    assert len({row["id"] for row in rows}) == 5
@@ -0,0 +1,104 @@
+"""Login throttling, account lockout and the hashing pool."""
+import pytest
+from passlib.hash import bcrypt
+from sqlalchemy import select
+
+from app.api.v1.endpoints import auth
+from app.core import security
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.security import LoginThrottle, get_password_hash, pwd_context
+from app.models.user import User, UserRole
+
+LOGIN = "/api/v1/auth/login"
+
+
+def _create_user(run, username: str, password: str = "correct horse", **fields):
+    async def create():
+        async with AsyncSessionLocal() as db:
+            db.add(User(
+                username=username,
+                email=f"{username}@example.com",
+                hashed_password=fields.pop("hashed_password", None) or get_password_hash(password),
+                role=UserRole.VIEWER,
+                **fields,
+            ))
+            await db.commit()
+
+    run(create())
+
+
+def _load_user(run, username: str) -> User:
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(User).where(User.username == username))
+
+    return run(load())
+
+
+def _login(client, username: str, password: str):
+    return client.post(LOGIN, data={"username": username, "password": password})
+
+
+@pytest.fixture(autouse=True)
+def fresh_throttle(monkeypatch):
+    monkeypatch.setattr(auth, "login_throttle", LoginThrottle(100, 300))
+
+
+def test_account_locks_after_repeated_failures(run, client, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_MAX_FAILED_ATTEMPTS", 3)
+    _create_user(run, "lockout")
+
+    assert [_login(client, "lockout", "wrong").status_code for _ in range(3)] == [401, 401, 401]
+    locked = _login(client, "lockout", "correct horse")
+    assert locked.status_code == 429
+    assert 0 < int(locked.headers["Retry-After"]) <= settings.LOGIN_LOCKOUT_SECONDS + 1
+    assert _load_user(run, "lockout").locked_until is not None
+
+
+def test_success_clears_earlier_failures(run, client, monkeypatch):
+    monkeypatch.setattr(settings, "LOGIN_MAX_FAILED_ATTEMPTS", 3)
+    _create_user(run, "recovers")
+
+    for _ in range(2):
+        _login(client, "recovers", "wrong")
+    response = _login(client, "recovers", "correct horse")
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+    user = _load_user(run, "recovers")
+    assert (user.failed_login_attempts, user.locked_until, user.login_count) == (0, None, 1)
+
+
+def test_outdated_hash_is_upgraded_at_login(run, client):
+    old_hash = bcrypt.using(rounds=5).hash("correct horse")
+    _create_user(run, "rehash", hashed_password=old_hash)
+
+    assert _login(client, "rehash", "correct horse").status_code == 200
+    stored = _load_user(run, "rehash").hashed_password
+    assert stored != old_hash
+    assert pwd_context.verify("correct horse", stored)
+
+
+def test_full_hashing_pool_answers_503(run, client, monkeypatch):
+    _create_user(run, "busy")
+    monkeypatch.setattr(settings, "PASSWORD_HASH_WORKERS", 0)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_QUEUE_LIMIT", 0)
+    response = _login(client, "busy", "correct horse")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_address_throttle(client, monkeypatch):
+    monkeypatch.setattr(auth, "login_throttle", LoginThrottle(2, 300))
+    assert [_login(client, "nobody", "x").status_code for _ in range(3)] == [401, 401, 429]
+
+
+def test_throttle_window_expires(monkeypatch):
+    clock = iter([0.0, 1.0, 2.0, 400.0])
+    monkeypatch.setattr(security.time, "monotonic", lambda: next(clock))
+    throttle = LoginThrottle(limit=1, window=300)
+    throttle.record_failure("192.0.2.1")
+    assert throttle.blocked("192.0.2.1")
+    assert not throttle.blocked("192.0.2.2")
+    assert not throttle.blocked("192.0.2.1")
@@ -0,0 +1,110 @@
+"""Synthetic traffic, measurement helpers and a small in-process benchmark run."""
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import httpx
+
+from app.main import app
+from benchmarks.measure import Recorder, run_concurrent
+from benchmarks.scenarios import BenchmarkContext, filter_logs, rules
+from benchmarks.traffic import TrafficGenerator, TrafficProfile
+
+END = datetime(2026, 2, 1)
+PROFILE = TrafficProfile(hosts=500, servers=50, burst_rows=50, days=0.5, seed=7)
+
+
+def _generate(rows: int, batch_size: int = 400, profile: TrafficProfile = PROFILE):
+    generator = TrafficGenerator(rows, profile, end=END)
+    return generator, [row for batch in generator.batches(batch_size) for row in batch]
+
+
+def test_generation_is_reproducible_and_batched():
+    generator, rows = _generate(1000)
+    _, again = _generate(1000)
+    assert len(rows) == generator.generated == 1000
+    assert rows == again
+    assert [len(batch) for batch in TrafficGenerator(1000, PROFILE, end=END).batches(400)] == [400, 400, 200]
+    assert [row["timestamp"] for row in rows] == sorted(row["timestamp"] for row in rows)
+    assert END - timedelta(days=PROFILE.days) <= rows[0]["timestamp"] and rows[-1]["timestamp"] < END
+
+
+def test_sources_are_skewed_and_attacks_come_in_bursts():
+    generator, rows = _generate(4000)
+    background = [row for row in rows if row["threat_type"] is None]
+    top = Counter(row["source_ip"] for row in background).most_common(10)
+    # Ten of 500 hosts carry a large share of the background traffic
+    assert sum(count for _, count in top) > 0.25 * len(background)
+
+    attacks = [row for row in rows if row["threat_type"] is not None]
+    assert len(attacks) == generator.attack_rows > 0
+    assert all(row["action"] in ("DENY", "DROP") and row["direction"] == "INBOUND" for row in attacks)
+    runs = sum(1 for before, row in zip(rows, rows[1:]) if row["threat_type"] and not before["threat_type"])
+    assert runs < len(attacks) / 5
+
+
+def test_no_attacks_without_an_attack_fraction():
+    profile = TrafficProfile(hosts=50, servers=5, attack_fraction=0, seed=1)
+    generator, rows = _generate(500, profile=profile)
+    assert generator.attack_rows == 0
+    assert not any(row["threat_type"] for row in rows)
+
+
+def test_recorder_summary():
+    recorder = Recorder("unit")
+    for ms in range(1, 101):
+        recorder.record(ms / 1000, rows=2)
+    summary = recorder.summary()
+    assert (summary["operations"], summary["rows"], summary["errors"]) == (100, 200, 0)
+    assert summary["p50_ms"] == 50.5
+    assert summary["p99_ms"] == 99.01
+    assert summary["max_ms"] == 100.0
+    assert summary["rss_max_mb"] >= summary["rss_start_mb"] > 0
+
+
+def test_run_concurrent_caps_concurrency_and_counts_errors():
+    active = peak = 0
+
+    async def jobs():
+        for n in range(20):
+            yield n
+
+    async def operation(n):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        if n % 7 == 0:
+            raise RuntimeError(f"job {n}")
+        return 1
+
+    recorder = Recorder("concurrent")
+    asyncio.run(run_concurrent(recorder, jobs(), operation, concurrency=3))
+    assert peak == 3
+    assert (len(recorder.latencies), recorder.rows, recorder.errors) == (17, 17, 3)
+    assert recorder.first_error == "RuntimeError: job 0"
+
+
+def test_generated_filters_are_accepted_by_the_api(run, viewer_headers):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=viewer_headers) as client:
+            ctx = BenchmarkContext(client=client, profile=PROFILE, rows=200, requests=40, concurrency=4)
+            return await filter_logs(ctx)
+
+    summary = run(scenario())
+    assert summary["errors"] == 0, summary["first_error"]
+    assert summary["operations"] == 40
+
+
+def test_rules_scenario_fires_on_attack_bursts(run):
+    async def scenario():
+        # A short span packs each burst into the rules' 60 second windows
+        profile = TrafficProfile(**{**PROFILE.__dict__, "days": 0.01})
+        ctx = BenchmarkContext(client=None, profile=profile, rows=2000, batch_size=500, rule_count=20)
+        return await rules(ctx)
+
+    summary = run(scenario())
+    assert (summary["rules"], summary["rows"], summary["errors"]) == (20, 2000, 0)
+    assert summary["alerts_fired"] > 0
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+
+from app.services.conditions import ConditionError, ConditionIndex, compile_conditions
+
+
+@pytest.mark.parametrize("conditions", [
+    {"source_port": {"gt": "abc"}},
+    {"source_port": {"gte": None}},
+    {"source_port": {"contains": "44"}},
+    {"action": {"eq": ["DENY"]}},
+    {"action": {"cidr": ["10.0.0.0/8"]}},
+    {"source_ip": {"cidr": ["10.0.0.0/33"]}},
+    {"timestamp": {"gte": "yesterday"}},
+    {"action": {"in": "DENY"}},
+    {"action": {"eq": "DENY", "in": ["ALLOW", "DROP"]}},
+    {"no_such_field": "x"},
+    ["action", "DENY"],
+])
+def test_invalid_conditions_are_rejected(conditions):
+    with pytest.raises(ConditionError):
+        compile_conditions(conditions)
+
+
+def test_operands_are_coerced_to_the_field_type():
+    compiled = compile_conditions({
+        "destination_port": {"gte": "1024"},
+        "timestamp": {"gte": "2026-10-18T09:00:00+09:00"},
+    })
+    event = {"destination_port": 8080, "timestamp": datetime(2026, 10, 18, 0, 0)}
+    assert compiled.matches(event)
+    assert not compiled.matches(dict(event, timestamp=datetime(2026, 10, 17, 23, 59)))
+    assert not compiled.matches(dict(event, destination_port=80))
+
+
+def test_eq_and_in_on_one_field_must_both_hold():
+    compiled = compile_conditions({"action": {"eq": "DENY", "in": ["DENY", "DROP"]}})
+    assert compiled.matches({"action": "DENY"})
+    assert not compiled.matches({"action": "DROP"})
+
+
+def test_failing_entry_does_not_stop_the_others():
+    index = ConditionIndex()
+    index.add("ports", compile_conditions({"action": "DENY", "source_port": {"gt": 1024}}))
+    index.add("deny", compile_conditions({"action": "DENY"}))
+
+    # A string port makes the comparison raise inside the "ports" entry
+    event = {"action": "DENY", "source_port": "40000"}
+    assert index.match(event) == ["deny"]
+    assert index.match(event) == ["deny"]
+    assert index.errors == 2
+
+    assert sorted(index.match({"action": "DENY", "source_port": 40000})) == ["deny", "ports"]
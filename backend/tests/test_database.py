@@ -0,0 +1,121 @@
+"""Engine profiles, SQLite pragmas and read routing."""
+import asyncio
+import time
+
+import pytest
+from fastapi import Request, Response
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.database import (
+    PRIMARY_COOKIE,
+    ReadSessionLocal,
+    _sticky_to_primary,
+    create_engine,
+    engine,
+    engine_options,
+    get_db,
+    get_read_db,
+    read_engines,
+)
+
+
+def test_postgresql_profile():
+    options = engine_options("postgresql+asyncpg://monitor@db/firewall")
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["pool_recycle"] == settings.DB_POOL_RECYCLE
+    assert options["pool_pre_ping"] is settings.DB_POOL_PRE_PING
+    connect_args = options["connect_args"]
+    assert connect_args["prepared_statement_cache_size"] == settings.DB_STATEMENT_CACHE_SIZE
+    assert connect_args["server_settings"]["application_name"] == settings.PROJECT_NAME
+
+
+def test_other_postgresql_drivers_get_no_asyncpg_arguments():
+    assert "connect_args" not in engine_options("postgresql+psycopg://monitor@db/firewall")
+
+
+@pytest.mark.parametrize(
+    "url, pooled",
+    [("sqlite+aiosqlite:///./firewall.db", True), ("sqlite+aiosqlite://", False), ("sqlite+aiosqlite:///:memory:", False)],
+)
+def test_sqlite_files_keep_a_connection_pool(url, pooled):
+    assert (engine_options(url).get("poolclass") is AsyncAdaptedQueuePool) == pooled
+
+
+def test_sqlite_connections_get_the_pragmas(tmp_path):
+    async def pragmas():
+        probe = create_engine(f"sqlite+aiosqlite:///{tmp_path}/pragmas.db")
+        try:
+            async with probe.connect() as connection:
+                names = ("journal_mode", "synchronous", "busy_timeout", "temp_store")
+                return [(await connection.execute(text(f"PRAGMA {name}"))).scalar() for name in names]
+        finally:
+            await probe.dispose()
+
+    journal_mode, synchronous, busy_timeout, temp_store = asyncio.run(pragmas())
+    assert journal_mode == settings.SQLITE_JOURNAL_MODE.lower()
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == settings.SQLITE_BUSY_TIMEOUT
+    assert temp_store == 2  # MEMORY
+
+
+def _request(method: str = "GET", cookie: str = "") -> Request:
+    headers = [(b"cookie", cookie.encode())] if cookie else []
+    return Request({"type": "http", "method": method, "headers": headers, "path": "/"})
+
+
+def test_read_sessions_cannot_write(run):
+    async def write():
+        async with ReadSessionLocal() as db:
+            await db.execute(text("CREATE TABLE read_pool_probe (id INTEGER)"))
+
+    # The SQLite test database gets a separate, query-only reader pool
+    assert read_engines
+    with pytest.raises(OperationalError, match="readonly"):
+        run(write())
+
+
+def test_writes_pin_the_client_to_the_primary(run, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 5)
+
+    async def scenario():
+        response = Response()
+        generator = get_db(_request("POST"), response)
+        await generator.__anext__()
+        await generator.aclose()
+
+        cookie = response.headers["set-cookie"].split(";")[0]
+        pinned = get_read_db(_request(cookie=cookie))
+        pinned_session = await pinned.__anext__()
+        routed = get_read_db(_request())
+        routed_session = await routed.__anext__()
+        engines = pinned_session.get_bind(), routed_session.get_bind()
+        await pinned.aclose()
+        await routed.aclose()
+        return cookie, engines
+
+    cookie, (pinned, routed) = run(scenario())
+    assert cookie.startswith(f"{PRIMARY_COOKIE}=")
+    assert pinned is engine.sync_engine
+    assert routed is read_engines[0].sync_engine
+
+
+def test_reads_do_not_set_the_cookie(run, monkeypatch):
+    monkeypatch.setattr(settings, "READ_YOUR_WRITES_SECONDS", 5)
+
+    async def scenario():
+        response = Response()
+        generator = get_db(_request("GET"), response)
+        await generator.__anext__()
+        await generator.aclose()
+        return response
+
+    assert "set-cookie" not in run(scenario()).headers
+
+
+@pytest.mark.parametrize("offset, sticky", [(60, True), (-1, False), (None, False)])
+def test_primary_cookie_expiry(offset, sticky):
+    cookie = f"{PRIMARY_COOKIE}={time.time() + offset}" if offset is not None else f"{PRIMARY_COOKIE}=soon"
+    assert _sticky_to_primary(_request(cookie=cookie)) is sticky
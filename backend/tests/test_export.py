@@ -0,0 +1,126 @@
+"""Streaming CSV, NDJSON and Parquet exports."""
+import csv
+import gzip
+import io
+from datetime import date, datetime, time, timedelta
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from app.core.database import AsyncSessionLocal
+from app.models.log_partition import LogPartition
+from app.services import archive, export, partitions
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import LogFilters
+
+SOURCE = "export-test"
+FILTERS = LogFilters(log_source=[SOURCE])
+ARCHIVED_DAY = date.today() - timedelta(days=70)
+LIVE_DAY = date.today() - timedelta(days=69)
+
+
+def _rows(day: date, ports):
+    return [
+        {
+            "timestamp": datetime.combine(day, time(8, minute)),
+            "source_ip": "10.14.0.1",
+            "destination_ip": "192.0.2.14",
+            "destination_port": port,
+            "protocol": "TCP",
+            "action": "DENY",
+            "direction": "INBOUND",
+            "bytes_sent": 100,
+            "packet_count": 1,
+            "log_source": SOURCE,
+        }
+        for minute, port in enumerate(ports)
+    ]
+
+
+@pytest.fixture(scope="module")
+def exported(run):
+    """Ports of the exported rows, newest first: one archived day plus a live one"""
+    async def load():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, _rows(ARCHIVED_DAY, [21, 22, 23]))
+            if archive.available():
+                partition = await db.scalar(select(LogPartition).where(LogPartition.day == ARCHIVED_DAY))
+                await partitions.close_partition(db, partition)
+                await archive.archive_partition(db, partition)
+            await bulk_insert_logs(db, _rows(LIVE_DAY, [80, 443]))
+
+    run(load())
+    return [443, 80, 23, 22, 21]
+
+
+def _export(run, fmt="csv", compression="none", columns=None, filters=FILTERS) -> bytes:
+    async def collect():
+        async with AsyncSessionLocal() as db:
+            return b"".join([chunk async for chunk in export.iter_export(db, filters, fmt, compression, columns)])
+
+    return run(collect())
+
+
+def test_csv_has_a_header_and_rows_newest_first(run, exported):
+    reader = csv.reader(io.StringIO(_export(run, columns=["timestamp", "destination_port"]).decode()))
+    header, *rows = list(reader)
+    assert header == ["timestamp", "destination_port"]
+    assert [int(port) for _, port in rows] == exported
+    assert rows[0][0] == f"{LIVE_DAY.isoformat()}T08:01:00"
+
+
+def test_empty_csv_still_has_its_header(run):
+    data = _export(run, columns=["id", "action"], filters=LogFilters(log_source=["no-such-source"]))
+    assert data == b"id,action\n"
+
+
+def test_gzip_ndjson_decompresses_to_one_object_per_row(run, exported):
+    data = _export(run, "ndjson", "gzip", columns=["destination_port", "action"])
+    lines = gzip.decompress(data).splitlines()
+    assert [orjson.loads(line) for line in lines] == [{"destination_port": port, "action": "DENY"} for port in exported]
+
+
+@pytest.mark.skipif(not archive.available(), reason="pyarrow is not installed")
+def test_parquet_export_reads_back(run, exported):
+    table = archive.pq.read_table(io.BytesIO(_export(run, "parquet", "gzip")))
+    assert table.num_rows == len(exported)
+    assert table.column("destination_port").to_pylist() == exported
+    assert str(table.schema.field("timestamp").type) == "timestamp[us]"
+
+
+@pytest.mark.parametrize(
+    "fmt, compression, message",
+    [("xml", "none", "format"), ("csv", "brotli", "compression")],
+)
+def test_unsupported_options_are_rejected(fmt, compression, message):
+    with pytest.raises(export.ExportError, match=message):
+        export.validate_options(fmt, compression)
+
+
+@pytest.mark.parametrize(
+    "fmt, compression, name",
+    [
+        ("csv", "none", "firewall_logs_20260102T030405.csv"),
+        ("ndjson", "gzip", "firewall_logs_20260102T030405.ndjson.gz"),
+        ("csv", "zstd", "firewall_logs_20260102T030405.csv.zst"),
+        ("parquet", "gzip", "firewall_logs_20260102T030405.parquet"),
+    ],
+)
+def test_export_filename(fmt, compression, name):
+    assert export.export_filename(fmt, compression, datetime(2026, 1, 2, 3, 4, 5)) == name
+
+
+def test_export_endpoint_streams_an_attachment(client, viewer_headers, exported):
+    response = client.get(
+        "/api/v1/logs/export",
+        params={"format": "ndjson", "fields": "destination_port", "log_source": SOURCE},
+        headers=viewer_headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="firewall_logs_' in response.headers["content-disposition"]
+    assert [orjson.loads(line)["destination_port"] for line in response.content.splitlines()] == exported
+
+    bad_filter = client.get("/api/v1/logs/export", params={"source_ip": "10.0.0.0/99"}, headers=viewer_headers)
+    assert bad_filter.status_code == 400
@@ -0,0 +1,69 @@
+from datetime import datetime, timedelta
+
+from app.services import ingest
+from app.services.flow_aggregator import WRITE_ATTEMPTS, FlowAggregator
+
+
+def _failing_rollups(monkeypatch, should_fail):
+    apply_rollups = ingest.apply_rollups
+
+    async def apply(db, rows):
+        if any(should_fail(row) for row in rows):
+            raise RuntimeError("write failed")
+        await apply_rollups(db, rows)
+
+    monkeypatch.setattr(ingest, "apply_rollups", apply)
+
+
+def _events(log_row, count, **overrides):
+    start = datetime.utcnow() - timedelta(hours=1)
+    return [
+        log_row(timestamp=start, source_ip=f"10.1.0.{i % 5}", event_count=999, **overrides)
+        for i in range(count)
+    ]
+
+
+def test_flow_columns_are_not_taken_from_input(log_row):
+    aggregator = FlowAggregator()
+    aggregator.add(_events(log_row, 10))
+    assert sorted(flow["event_count"] for flow in aggregator._flows.values()) == [2] * 5
+
+
+def test_failed_flush_is_retried(run, log_row, monkeypatch):
+    state = {"down": True}
+    _failing_rollups(monkeypatch, lambda row: state["down"])
+    aggregator = FlowAggregator(grace=0)
+    aggregator.add(_events(log_row, 20))
+
+    async def flush():
+        await aggregator.flush()
+        return aggregator.stats()
+
+    stats = run(flush())
+    assert stats["retry_flows"] == 5
+    assert stats["events_written"] == 0
+
+    state["down"] = False
+    stats = run(flush())
+    assert stats["retry_flows"] == 0
+    assert stats["flows_written"] == 5
+    assert stats["events_written"] == 20
+    assert stats["dropped_flows"] == 0
+
+
+def test_unwritable_flow_is_dropped_after_attempts(run, log_row, monkeypatch):
+    _failing_rollups(monkeypatch, lambda row: row["source_ip"] == "10.9.9.9")
+    aggregator = FlowAggregator(grace=0)
+    aggregator.add(_events(log_row, 20))
+    aggregator.add(_events(log_row, 3, destination_ip="192.0.2.99") + [
+        log_row(timestamp=datetime.utcnow() - timedelta(hours=1), source_ip="10.9.9.9")
+    ])
+
+    for _ in range(WRITE_ATTEMPTS):
+        run(aggregator.flush())
+
+    stats = aggregator.stats()
+    assert stats["events_written"] == 23
+    assert stats["dropped_flows"] == 1
+    assert stats["dropped_events"] == 1
+    assert stats["retry_flows"] == 0
@@ -0,0 +1,166 @@
+"""Search strings, FTS5/tsvector matching and relevance order."""
+from datetime import date, datetime, time, timedelta
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql
+
+from app.core.database import AsyncSessionLocal
+from app.models.log_partition import LogPartition
+from app.services import archive, fulltext, partitions
+from app.services.fulltext import FulltextQueryError, Term, fts5_query, parse_query
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import LogFilters, LogQueryError, fetch_log_page, fetch_ranked_page
+
+SOURCE = "fulltext-test"
+DAY = date(2025, 10, 20)
+ARCHIVED_DAY = date.today() - timedelta(days=80)
+
+TEXTS = [
+    ("sshd[811]: Failed password for root from 203.0.113.5", "Brute force on ssh"),
+    ("sshd[812]: Accepted password for admin", None),
+    ("GET http://evil.com/payload.sh", "Download from évil host"),
+    ("kernel: IN=eth0 OUT= admin-portal root root", "root login root"),
+    (None, "Blocked by rule Administrators-Only"),
+]
+
+
+def _rows(day: date, texts):
+    return [
+        {
+            "timestamp": datetime.combine(day, time(6, n)),
+            "source_ip": "10.24.0.1",
+            "destination_ip": "192.0.2.24",
+            "protocol": "TCP",
+            "action": "DENY" if n % 2 else "ALLOW",
+            "direction": "INBOUND",
+            "log_source": SOURCE,
+            "raw_log": raw_log,
+            "description": description,
+        }
+        for n, (raw_log, description) in enumerate(texts)
+    ]
+
+
+@pytest.fixture(scope="module")
+def ids(run):
+    async def load():
+        async with AsyncSessionLocal() as db:
+            ids = await bulk_insert_logs(db, _rows(DAY, TEXTS))
+            if archive.available():
+                await bulk_insert_logs(db, _rows(ARCHIVED_DAY, [("sshd: Failed password for archived", None)]))
+                partition = await db.scalar(select(LogPartition).where(LogPartition.day == ARCHIVED_DAY))
+                await partitions.close_partition(db, partition)
+                await archive.archive_partition(db, partition)
+            return ids
+
+    return run(load())
+
+
+@pytest.mark.parametrize(
+    "q, terms",
+    [
+        ("failed  root", [Term("failed"), Term("root")]),
+        ('"failed   password" ssh*', [Term("failed password"), Term("ssh", prefix=True)]),
+        ('"unterminated phrase', [Term("unterminated phrase")]),
+        ("evil.com -- ***", [Term("evil.com")]),
+    ],
+)
+def test_parse_query(q, terms):
+    assert parse_query(q) == terms
+
+
+@pytest.mark.parametrize("q", ["", "  ", '"" -- *', " ".join(f"t{n}" for n in range(fulltext.MAX_TERMS + 1))])
+def test_unsearchable_queries_are_rejected(q):
+    with pytest.raises(FulltextQueryError):
+        parse_query(q)
+
+
+def test_fts5_query_quotes_every_term():
+    terms = [Term("say"), Term('he said "hi"'), Term("adm", prefix=True)]
+    assert fts5_query(terms) == '"say" "he said ""hi""" "adm"*'
+
+
+def _matches(run, q: str, **filters):
+    async def query():
+        async with AsyncSessionLocal() as db:
+            return await fetch_log_page(db, LogFilters(log_source=[SOURCE], q=q, **filters), limit=100)
+
+    return [row["id"] for row in run(query())]
+
+
+@pytest.mark.parametrize(
+    "q, positions",
+    [
+        ("password", [1, 0]),
+        ('"failed password"', [0]),
+        ('"password failed"', []),
+        ("adm*", [4, 3, 1]),
+        ("root password", [0]),
+        ("evil.com", [2]),
+        ("EVIL", [2]),  # case is folded
+        ("brute", [0]),  # description is searched as well
+    ],
+)
+def test_terms_phrases_and_prefixes(run, ids, q, positions):
+    assert _matches(run, q, start_time=datetime.combine(DAY, time()), end_time=datetime.combine(DAY, time(23))) == [
+        ids[position] for position in positions
+    ]
+
+
+def test_search_combines_with_structured_filters(run, ids):
+    assert _matches(run, "adm*", action=["DENY"]) == [ids[3], ids[1]]
+
+
+@pytest.mark.skipif(not archive.available(), reason="pyarrow is not installed")
+def test_archived_days_are_searched_by_substring(run, ids):
+    archived_day = {"start_time": datetime.combine(ARCHIVED_DAY, time()), "end_time": datetime.combine(ARCHIVED_DAY, time(23))}
+    assert len(_matches(run, '"failed password"', **archived_day)) == 1
+    assert _matches(run, "nothing-like-this", **archived_day) == []
+
+
+def test_index_follows_updates(run, ids):
+    async def rewrite():
+        async with AsyncSessionLocal() as db:
+            table = partitions.partition_table(DAY)
+            await db.execute(update(table).where(table.c.id == ids[2]).values(raw_log="GET http://benign.example/"))
+            await db.commit()
+
+    run(rewrite())
+    assert _matches(run, "benign") == [ids[2]]
+    assert _matches(run, "payload") == []
+
+
+def test_relevance_order(run, ids):
+    async def ranked(q, **kwargs):
+        async with AsyncSessionLocal() as db:
+            return await fetch_ranked_page(db, LogFilters(log_source=[SOURCE], q=q), **kwargs)
+
+    rows = run(ranked("root"))
+    # Four mentions in a short document beat one in a longer one
+    assert [row["id"] for row in rows] == [ids[3], ids[0]]
+    assert [row["id"] for row in run(ranked("root", skip=1, limit=1))] == [ids[0]]
+    with pytest.raises(LogQueryError):
+        run(ranked(None))
+
+
+def test_postgresql_uses_the_indexed_expression():
+    table = partitions.legacy_table
+    condition = fulltext.match_condition(table.c, '"failed password" adm*')
+    sql = str(select(table.c.id).where(condition).compile(dialect=postgresql.dialect()))
+    assert "to_tsvector('simple', coalesce(firewall_logs.raw_log, '') || ' ' || coalesce(firewall_logs.description, ''))" in sql
+    assert "phraseto_tsquery('simple', %(fts_term_1)s) && to_tsquery('simple', %(fts_term_2)s)" in sql
+    assert condition.term_params[1].value == "adm:*"
+
+
+def test_logs_endpoint_accepts_q(client, viewer_headers, ids):
+    day = {"start_time": datetime.combine(DAY, time()).isoformat(), "end_time": datetime.combine(DAY, time(23)).isoformat()}
+    params = {"log_source": SOURCE, "q": "password", **day}
+    response = client.get("/api/v1/logs", params=params, headers=viewer_headers)
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == [ids[1], ids[0]]
+
+    relevance = client.get("/api/v1/logs", params={**params, "q": "root", "order": "relevance"}, headers=viewer_headers)
+    assert [row["id"] for row in relevance.json()] == [ids[3], ids[0]]
+    assert client.get("/api/v1/logs", params={"order": "relevance"}, headers=viewer_headers).status_code == 400
+    assert client.get("/api/v1/logs", params={"q": "--"}, headers=viewer_headers).status_code == 400
@@ -0,0 +1,70 @@
+"""Bulk payload decoding and chunked inserts."""
+import json
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services.ingest import BulkPayloadError, bulk_insert_logs, load_bulk_records
+from app.services.log_query import get_log_row
+
+RECORD = {
+    "timestamp": "2026-03-02T10:00:00+02:00",
+    "source_ip": "10.1.0.1",
+    "destination_ip": "192.0.2.1",
+    "protocol": "TCP",
+    "action": "DENY",
+    "direction": "INBOUND",
+}
+
+
+def test_invalid_records_are_reported_without_rejecting_the_batch():
+    body = json.dumps([RECORD, {**RECORD, "bytes_sent": -1}, {"source_ip": "10.1.0.2"}, RECORD]).encode()
+    rows, errors = load_bulk_records(body)
+
+    assert len(rows) == 2
+    assert [error["index"] for error in errors] == [1, 2]
+    assert errors[0]["errors"][0]["loc"] == ["bytes_sent"]
+    # Timestamps are normalised to naive UTC
+    assert rows[0]["timestamp"] == datetime(2026, 3, 2, 8, 0)
+
+
+def test_ndjson_skips_blank_lines_and_counts_records():
+    body = b"\n".join([json.dumps(RECORD).encode(), b"", b"{not json}", json.dumps(RECORD).encode(), b""])
+    rows, errors = load_bulk_records(body, ndjson=True)
+
+    assert len(rows) == 2
+    assert [error["index"] for error in errors] == [1]
+
+
+@pytest.mark.parametrize("body", [b"{broken", b'{"records": []}', b'"text"'])
+def test_undecodable_payload_is_rejected(body):
+    with pytest.raises(BulkPayloadError):
+        load_bulk_records(body)
+
+
+@pytest.mark.parametrize("ndjson", [False, True])
+def test_row_limit(monkeypatch, ndjson):
+    monkeypatch.setattr(settings, "BULK_INGEST_MAX_ROWS", 2)
+    records = [RECORD] * 3
+    body = b"\n".join(json.dumps(r).encode() for r in records) if ndjson else json.dumps(records).encode()
+    with pytest.raises(BulkPayloadError):
+        load_bulk_records(body, ndjson=ndjson)
+
+
+def test_ids_follow_input_order_across_chunks(run, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_CHUNK_SIZE", 3)
+    body = json.dumps([{**RECORD, "source_port": 1000 + n} for n in range(7)]).encode()
+    rows, _ = load_bulk_records(body)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            ids = await bulk_insert_logs(db, rows)
+            stored = [await get_log_row(db, log_id) for log_id in ids]
+        return ids, stored
+
+    ids, stored = run(scenario())
+    assert len(set(ids)) == 7
+    assert [row["id"] for row in rows] == ids
+    assert [row["source_port"] for row in stored] == list(range(1000, 1007))
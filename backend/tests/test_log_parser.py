@@ -0,0 +1,119 @@
+"""Raw syslog line parsing."""
+from datetime import datetime
+
+import pytest
+
+from app.services import ingest
+from app.services.log_parser import IPTABLES_DEFAULT_ACTION, UNKNOWN_ACTION, parse_line
+from app.services.syslog_server import SyslogIngestor
+
+CEF = "<134>Oct 11 22:14:15 fw01 CEF:0|Vendor|FW|1.0|100|Conn|5|src=10.0.0.1 dst=192.0.2.1 {ext}"
+
+
+@pytest.mark.parametrize(
+    "ext, action",
+    [
+        ("act=blocked", "DENY"),
+        ("act=Quarantine", "QUARANTINE"),
+        ("outcome=allowed", "ALLOW"),
+        ("act=drop outcome=allowed", "DROP"),
+        ("outcome=success", UNKNOWN_ACTION),
+        ("spt=1234", UNKNOWN_ACTION),
+    ],
+)
+def test_cef_action(ext, action):
+    assert parse_line(CEF.format(ext=ext))["action"] == action
+
+
+def test_rfc5424_cef_fields():
+    row = parse_line(
+        "<131>1 2026-03-02T10:00:00.5+02:00 fw01.example app - - - "
+        "CEF:0|Vendor|FW|1.0|100|Port scan|8|src=10.0.0.1 spt=5555 dst=192.0.2.1 dpt=22 "
+        "proto=6 act=deny in=40 out=0 cnt=3 cat=scan deviceDirection=1 msg=a\\=b c",
+        sender="198.51.100.9",
+    )
+    assert row["timestamp"] == datetime(2026, 3, 2, 8, 0, 0, 500000)
+    assert row["log_source"] == "fw01.example"
+    assert (row["source_port"], row["destination_port"], row["protocol"]) == (5555, 22, "TCP")
+    assert (row["action"], row["direction"], row["severity"]) == ("DENY", "OUTBOUND", "HIGH")
+    assert (row["bytes_received"], row["packet_count"], row["threat_type"]) == (40, 3, "scan")
+    assert row["description"] == "Port scan"
+
+
+def test_iptables_prefix_sets_the_action():
+    line = (
+        "Mar  2 10:00:00 gw kernel: [UFW ALLOW] IN=eth0 OUT= SRC=10.0.0.5 DST=192.0.2.7 "
+        "LEN=60 PROTO=TCP SPT=40000 DPT=443"
+    )
+    row = parse_line(line)
+    assert (row["action"], row["protocol"], row["destination_port"]) == ("ALLOW", "TCP", 443)
+    assert row["bytes_received"] == 60
+
+    unlabelled = parse_line(line.replace("[UFW ALLOW] ", ""))
+    assert unlabelled["action"] == IPTABLES_DEFAULT_ACTION
+
+
+@pytest.mark.parametrize(
+    "message, expected",
+    [
+        ("block in on em0: 203.0.113.5.4444 > 192.0.2.9.22: S 1:1(0) win 1024",
+         ("DENY", "INBOUND", "203.0.113.5", 4444, "192.0.2.9", 22, "TCP")),
+        ("pass out on em0: 2001:db8::1.53 > 2001:db8::2.5353: udp 40",
+         ("ALLOW", "OUTBOUND", "2001:db8::1", 53, "2001:db8::2", 5353, "UDP")),
+        ("block in on em0: 203.0.113.5 > 192.0.2.9: icmp: echo request",
+         ("DENY", "INBOUND", "203.0.113.5", None, "192.0.2.9", None, "ICMP")),
+    ],
+)
+def test_pf_lines(message, expected):
+    row = parse_line("Mar  2 10:00:00 pf01 pf: " + message)
+    fields = ("action", "direction", "source_ip", "source_port", "destination_ip", "destination_port", "protocol")
+    assert tuple(row[name] for name in fields) == expected
+
+
+@pytest.mark.parametrize(
+    "line",
+    [
+        "",
+        "Mar  2 10:00:00 host sshd[1]: Accepted publickey for root",
+        CEF.replace("src=10.0.0.1", "src=client.example").format(ext="act=deny"),
+        "CEF:0|Vendor|FW|1.0|100",
+    ],
+)
+def test_unusable_lines_are_rejected(line):
+    assert parse_line(line) is None
+
+
+def test_sender_is_the_source_without_a_hostname():
+    row = parse_line("CEF:0|Vendor|FW|1.0|100|Conn|3|src=10.0.0.1 dst=192.0.2.1", sender="198.51.100.9")
+    assert row["log_source"] == "198.51.100.9"
+    assert row["protocol"] == "IP"
+
+
+def test_ingestor_drops_only_rows_that_cannot_be_written(run, monkeypatch):
+    apply_rollups = ingest.apply_rollups
+
+    async def reject_port(db, rows):
+        if any(row["source_port"] == 6666 for row in rows):
+            raise RuntimeError("cannot write row")
+        await apply_rollups(db, rows)
+
+    monkeypatch.setattr(ingest, "apply_rollups", reject_port)
+
+    async def scenario():
+        ingestor = SyslogIngestor(queue_size=10, batch_size=10)
+        for port in (1001, 6666, 1002, 1003):
+            ingestor.submit(CEF.format(ext=f"spt={port} act=deny"), sender="198.51.100.9")
+        ingestor.submit("not a firewall line")
+        await ingestor._write(ingestor._take_batch())
+        return ingestor
+
+    ingestor = run(scenario())
+    assert (ingestor.received, ingestor.parse_errors) == (5, 1)
+    assert (ingestor.written, ingestor.dropped, ingestor.write_errors) == (3, 1, 1)
+
+
+def test_full_buffer_drops_datagrams():
+    ingestor = SyslogIngestor(queue_size=2, batch_size=10)
+    assert [ingestor.submit("line") for _ in range(3)] == [True, True, False]
+    assert ingestor.submit("line", force=True)
+    assert (ingestor.queue_depth, ingestor.dropped) == (3, 1)
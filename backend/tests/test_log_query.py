@@ -0,0 +1,90 @@
+"""Keyset pagination and filters for the log listing."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.database import AsyncSessionLocal
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import LogFilters, LogQueryError, decode_cursor, encode_cursor, fetch_log_page
+
+# Two days, with several rows sharing each timestamp so ties fall back to id
+STAMPS = [datetime(2026, 2, 10, 23, 59, 59), datetime(2026, 2, 11, 0, 0, 0), datetime(2026, 2, 11, 6, 30)]
+
+
+def _insert(run, source):
+    rows = [
+        {
+            "timestamp": stamp,
+            "source_ip": "10.4.0.1",
+            "destination_ip": "192.0.2.4",
+            "destination_port": port,
+            "protocol": "UDP" if port % 2 else "TCP",
+            "action": "ALLOW" if port % 3 else "DENY",
+            "direction": "INBOUND",
+            "log_source": source,
+        }
+        for stamp in STAMPS
+        for port in range(1, 5)
+    ]
+
+    async def insert():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, rows)
+
+    run(insert())
+    return rows
+
+
+async def _walk(filters, limit):
+    pages, cursor = [], None
+    async with AsyncSessionLocal() as db:
+        while True:
+            rows = await fetch_log_page(db, filters, cursor=cursor, limit=limit)
+            page = rows[:limit]
+            pages.append([row["id"] for row in page])
+            if len(rows) <= limit:
+                return pages
+            cursor = encode_cursor(page[-1]["timestamp"], page[-1]["id"])
+
+
+def test_cursor_round_trip():
+    stamp = datetime(2026, 2, 11, 6, 30, 0, 123456)
+    assert decode_cursor(encode_cursor(stamp, 20260211000042)) == (stamp, 20260211000042)
+
+
+@pytest.mark.parametrize("cursor", ["@@@", "bm90LWEtY3Vyc29y", encode_cursor(datetime(2026, 1, 1), 1)[:-4]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(LogQueryError):
+        decode_cursor(cursor)
+
+
+def test_pages_cover_every_row_once_newest_first(run):
+    dataset = _insert(run, "keyset-pages")
+    pages = run(_walk(LogFilters(log_source=["keyset-pages"]), limit=5))
+    assert [len(page) for page in pages] == [5, 5, 2]
+
+    ids = [log_id for page in pages for log_id in page]
+    expected = sorted(dataset, key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    assert ids == [row["id"] for row in expected]
+
+
+def test_filters_apply_on_every_page(run):
+    dataset = _insert(run, "keyset-filters")
+    filters = LogFilters(log_source=["keyset-filters"], action=["DENY"], protocol=["UDP"])
+    ids = [log_id for page in run(_walk(filters, limit=1)) for log_id in page]
+    expected = [row["id"] for row in dataset if row["action"] == "DENY" and row["protocol"] == "UDP"]
+    assert len(expected) == 3
+    assert ids == sorted(expected, reverse=True)
+
+
+def test_time_range_is_half_open(run):
+    _insert(run, "keyset-range")
+    filters = LogFilters(log_source=["keyset-range"], start_time=STAMPS[0], end_time=STAMPS[1] + timedelta(hours=1))
+
+    async def page():
+        async with AsyncSessionLocal() as db:
+            return await fetch_log_page(db, filters, limit=50, columns=["destination_port"])
+
+    rows = run(page())
+    assert {row["timestamp"] for row in rows} == set(STAMPS[:2])
+    assert set(rows[0]) == {"destination_port", "timestamp", "id"}
@@ -0,0 +1,75 @@
+"""Log listing responses: projection, orjson encoding and NDJSON streaming."""
+from datetime import datetime, timedelta
+
+import orjson
+import pytest
+
+from app.api.v1.endpoints import logs
+from app.core.database import AsyncSessionLocal
+from app.services.ingest import bulk_insert_logs
+
+SOURCE = "listing-test"
+START = datetime(2025, 11, 20, 8)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def listing_rows(run):
+    rows = [
+        {
+            "timestamp": START + timedelta(minutes=n),
+            "source_ip": "10.15.0.1",
+            "destination_ip": "2001:db8::15",
+            "destination_port": 8000 + n,
+            "protocol": "TCP",
+            "action": "DENY",
+            "direction": "INBOUND",
+            "bytes_sent": n,
+            "log_source": SOURCE,
+        }
+        for n in range(7)
+    ]
+
+    async def insert():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, rows)
+
+    run(insert())
+    return rows
+
+
+def _get(client, headers, **params):
+    return client.get("/api/v1/logs/", params={"log_source": SOURCE, **params}, headers=headers)
+
+
+def test_projection_returns_only_requested_columns(client, viewer_headers):
+    response = _get(client, viewer_headers, fields="destination_port,action", limit=3)
+    assert response.status_code == 200
+    assert response.json() == [{"destination_port": port, "action": "DENY"} for port in (8006, 8005, 8004)]
+    # The next cursor still comes from the key columns the page was read with
+    assert response.headers["X-Next-Cursor"]
+
+
+def test_full_rows_are_encoded_with_orjson(client, viewer_headers):
+    rows = _get(client, viewer_headers, limit=1).json()
+    assert rows[0]["timestamp"] == "2025-11-20T08:06:00"
+    assert rows[0]["destination_ip"] == "2001:db8::15"
+    assert set(rows[0]) >= {"id", "source_port", "raw_log", "description"}
+
+
+@pytest.mark.parametrize("params", [{"fields": "timestamp,password"}, {"limit": 1001}])
+def test_invalid_listing_parameters(client, viewer_headers, params):
+    assert _get(client, viewer_headers, **params).status_code == 400
+
+
+def test_ndjson_streams_every_page(client, viewer_headers, monkeypatch):
+    monkeypatch.setattr(logs, "PAGE_SIZE", 2)
+    response = _get(client, viewer_headers, format="ndjson", limit=6, skip=1, fields="bytes_sent")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [orjson.loads(line) for line in response.content.splitlines()]
+    assert lines == [{"bytes_sent": n} for n in (5, 4, 3, 2, 1, 0)]
+
+
+def test_project_keeps_rows_that_already_match():
+    rows = [{"id": 1, "timestamp": START, "action": "DENY"}]
+    assert logs._project(rows, None) is rows
+    assert logs._project(rows, ["action"]) == [{"action": "DENY"}]
@@ -0,0 +1,110 @@
+"""Prometheus primitives, request middleware and SQL timing."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import create_engine
+from app.core.metrics import Histogram, MetricsRegistry
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 0.5))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value, ("/logs",))
+    assert histogram.render() == [
+        'latency_seconds_bucket{route="/logs",le="0.1"} 2',
+        'latency_seconds_bucket{route="/logs",le="0.5"} 3',
+        'latency_seconds_bucket{route="/logs",le="+Inf"} 4',
+        'latency_seconds_sum{route="/logs"} 2.45',
+        'latency_seconds_count{route="/logs"} 4',
+    ]
+
+
+def test_registry_renders_metrics_and_collectors():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("path",))
+    assert registry.counter("requests_total", "Requests", ("path",)) is requests
+    requests.inc(2, ('/a"b\n',))
+    registry.gauge("idle", "Unlabelled gauges start at zero")
+    registry.add_collector(lambda: [("queue_depth", "gauge", "Queued", [({"queue": "syslog"}, 3)])])
+    registry.add_collector(lambda: 1 / 0)  # a failing collector does not break the scrape
+
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requests",
+        "# TYPE requests_total counter",
+        'requests_total{path="/a\\"b\\n"} 2',
+        "# HELP idle Unlabelled gauges start at zero",
+        "# TYPE idle gauge",
+        "idle 0",
+        "# HELP queue_depth Queued",
+        "# TYPE queue_depth gauge",
+        'queue_depth{queue="syslog"} 3',
+    ]
+
+
+def _series(name: str, labels: tuple):
+    return metrics.registry._metrics[name].values.get(labels, 0)
+
+
+def test_requests_are_labelled_by_route_template(client, viewer_headers):
+    labels = ("GET", "/api/v1/logs/{log_id}", "404")
+    before = _series("http_requests_total", labels)
+    for log_id in (987654321, 987654322):
+        assert client.get(f"/api/v1/logs/{log_id}", headers=viewer_headers).status_code == 404
+
+    assert _series("http_requests_total", labels) == before + 2
+    assert metrics.http_in_flight.values[()] == 0
+    scrape = client.get("/metrics")
+    assert scrape.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/logs/{log_id}"}' in scrape.text
+    assert "alert_deliveries_total{outcome=" in scrape.text
+    assert client.get("/metrics/slow-queries", headers=viewer_headers).status_code == 403
+
+
+def test_slow_statements_are_sampled_with_their_plan(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_SECONDS", 1e-9)
+    monkeypatch.setattr(settings, "SLOW_QUERY_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(metrics, "_slow_budget", {"minute": 0, "captured": 0})
+    monkeypatch.setattr(metrics, "slow_queries", type(metrics.slow_queries)(maxlen=10))
+
+    async def query():
+        probe = create_engine(f"sqlite+aiosqlite:///{tmp_path}/slow.db")
+        metrics.instrument_engine(probe.sync_engine, "probe")
+        try:
+            async with probe.connect() as connection:
+                statement = text("SELECT name FROM sqlite_master WHERE name = :name")
+                await connection.execute(statement, {"name": "firewall_logs"})
+        finally:
+            await probe.dispose()
+
+    asyncio.run(query())
+    assert metrics.db_duration.series[("probe", "SELECT")][1] > 0
+    assert metrics.db_slow.values[("probe",)] >= 1
+    assert ("probe",) in metrics.db_checkout.series
+    entry = next(entry for entry in metrics.slow_queries if entry["statement"].startswith("SELECT name"))
+    assert entry["parameters"] == "('firewall_logs',)"
+    assert any("sqlite_master" in line for line in entry["plan"])
+    assert datetime.fromisoformat(entry["at"])
+
+
+def test_capture_budget_per_minute(monkeypatch):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MAX_PER_MINUTE", 2)
+    monkeypatch.setattr(settings, "SLOW_QUERY_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(metrics, "_slow_budget", {"minute": 0, "captured": 0})
+    assert [metrics._should_capture() for _ in range(3)] == [True, True, False]
+
+    monkeypatch.setattr(settings, "SLOW_QUERY_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(metrics, "_slow_budget", {"minute": 0, "captured": 0})
+    assert not metrics._should_capture()
+
+
+@pytest.mark.parametrize(
+    "statement, operation",
+    [("  select 1", "SELECT"), ("INSERT INTO t VALUES (1)", "INSERT"), ("WITH x AS (SELECT 1) SELECT *", "WITH"), ("", "OTHER")],
+)
+def test_statement_operation(statement, operation):
+    assert metrics._operation(statement) == operation
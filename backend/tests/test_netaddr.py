@@ -0,0 +1,123 @@
+"""Packed address keys, CIDR ranges and the backfill of older rows."""
+import ipaddress
+from dataclasses import replace
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from app.core.database import AsyncSessionLocal
+from app.core.netaddr import network_bounds, pack_address, prefix_range, unpack_address
+from app.services import migrations, partitions
+from app.services.ingest import bulk_insert_logs
+from app.services.log_query import LogFilters, LogQueryError, fetch_log_page
+
+SOURCE = "netaddr-test"
+ADDRESSES = ["10.20.0.1", "10.20.255.254", "10.21.0.1", "2001:db8::1", "2001:db8:1::1", "fw01.example"]
+
+
+def test_keys_sort_by_family_then_numerically():
+    values = ["10.0.0.10", "9.255.255.255", "::1", "10.0.0.9", "2001:db8::", "255.255.255.255"]
+    ordered = sorted(values, key=pack_address)
+    assert ordered == sorted(values, key=lambda v: (ipaddress.ip_address(v).version, ipaddress.ip_address(v)))
+    assert len(pack_address("10.0.0.1")) == 5
+    assert len(pack_address("::1")) == 17
+
+
+@pytest.mark.parametrize("value", ["10.1.2.3", "2001:db8::5", "::"])
+def test_keys_unpack_to_the_address(value):
+    assert unpack_address(pack_address(value)) == value
+
+
+@pytest.mark.parametrize("value", [None, "", "fw01.example", "10.0.0.256", "10.0.0.0/8"])
+def test_non_addresses_have_no_key(value):
+    assert pack_address(value) is None
+
+
+def test_network_bounds_are_inclusive():
+    low, high = network_bounds(ipaddress.ip_network("10.20.0.0/16"))
+    assert low == pack_address("10.20.0.0") and high == pack_address("10.20.255.255")
+    # An IPv4 range never reaches into IPv6 keys, even for ::/0-like prefixes
+    assert network_bounds(ipaddress.ip_network("0.0.0.0/0"))[1] < pack_address("::")
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("10.20.30.40/16", (4, 16, 0x0A140000, 0x0A14FFFF)),
+        ("192.0.2.7", (4, 32, 0xC0000207, 0xC0000207)),
+        ("2001:db8::/32", (6, 32, 0x20010DB8 << 96, (0x20010DB8 << 96) | ((1 << 96) - 1))),
+        ("10.0.0.0/33", None),
+        ("10.0.0.0/x", None),
+        ("example.com/8", None),
+    ],
+)
+def test_prefix_range(value, expected):
+    assert prefix_range(value) == expected
+
+
+@pytest.fixture(scope="module")
+def stored(run):
+    """Rows in a day partition plus legacy-table rows written before the packed keys existed"""
+    rows = [
+        {
+            "timestamp": datetime(2025, 11, 3, 9, n),
+            "source_ip": address,
+            "destination_ip": "192.0.2.20",
+            "protocol": "TCP",
+            "action": "DENY",
+            "direction": "INBOUND",
+            "log_source": SOURCE,
+        }
+        for n, address in enumerate(ADDRESSES)
+    ]
+    legacy = [
+        dict(row, timestamp=datetime(2025, 11, 2, 9, n), source_ip_bin=None, destination_ip_bin=None)
+        for n, row in enumerate(rows)
+    ]
+
+    async def load():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, rows)
+            await db.execute(insert(partitions.legacy_table), legacy)
+            await db.commit()
+
+    run(load())
+
+
+def _source_ips(run, value: str):
+    async def query():
+        async with AsyncSessionLocal() as db:
+            filters = LogFilters(log_source=[SOURCE], source_ip=value)
+            return [row["source_ip"] for row in await fetch_log_page(db, filters, limit=100)]
+
+    return sorted(run(query()))
+
+
+def test_cidr_filters_use_the_packed_keys(run, stored):
+    # Legacy rows have no keys yet, so only the partition rows match
+    assert _source_ips(run, "10.20.0.0/16") == ["10.20.0.1", "10.20.255.254"]
+    assert _source_ips(run, "2001:db8::/48") == ["2001:db8::1"]
+    assert _source_ips(run, "2001:db8::/32") == ["2001:db8:1::1", "2001:db8::1"]
+    # Non-addresses only match their own text, in every table
+    assert _source_ips(run, "fw01.example") == ["fw01.example", "fw01.example"]
+
+
+def test_invalid_cidr_is_rejected(run):
+    with pytest.raises(LogQueryError):
+        _source_ips(run, "10.0.0.0/40")
+
+
+def test_backfill_makes_legacy_rows_searchable(run, stored):
+    async def backfill():
+        async with AsyncSessionLocal() as db:
+            await migrations.backfill_table(db, partitions.legacy_table, batch_size=2)
+            c = partitions.legacy_table.c
+            keys = await db.execute(select(c.source_ip, c.source_ip_bin).where(c.log_source == SOURCE))
+            return dict(keys.all())
+
+    keys = run(backfill())
+    assert keys["fw01.example"] is None
+    assert keys["10.20.0.1"] == pack_address("10.20.0.1")
+    assert _source_ips(run, "10.20.0.0/16") == ["10.20.0.1", "10.20.0.1", "10.20.255.254", "10.20.255.254"]
+    assert _source_ips(run, "10.21.0.1") == ["10.21.0.1", "10.21.0.1"]
@@ -0,0 +1,78 @@
+"""Per-day partition id ranges, pruning and retention."""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import inspect
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.services import partitions
+from app.services.ingest import bulk_insert_logs
+
+
+def _row(timestamp: datetime):
+    return {
+        "timestamp": timestamp,
+        "source_ip": "10.7.0.1",
+        "destination_ip": "192.0.2.70",
+        "protocol": "UDP",
+        "action": "ALLOW",
+        "direction": "OUTBOUND",
+        "log_source": "partition-test",
+    }
+
+
+@pytest.mark.parametrize("day", [date(1970, 1, 2), date(2026, 2, 28), date(2099, 12, 31)])
+def test_ids_map_back_to_their_day(day):
+    base = partitions.id_base(day)
+    assert partitions.partition_day(base + 1) == day
+    assert partitions.partition_day(base + (1 << partitions.ID_SHIFT) - 1) == day
+    assert partitions.partition_day(base + (1 << partitions.ID_SHIFT)) != day
+
+
+def test_legacy_ids_have_no_day():
+    assert partitions.partition_day(1) is None
+    assert partitions.partition_day((1 << partitions.ID_SHIFT) - 1) is None
+
+
+def test_rows_get_ids_in_their_days_range(run):
+    days = [datetime(2024, 5, 1, 23, 59), datetime(2024, 5, 2, 0, 1), datetime(2024, 5, 1, 8)]
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            ids = await bulk_insert_logs(db, [_row(ts) for ts in days])
+            listed = await partitions.list_partitions(db, datetime(2024, 5, 2), datetime(2024, 5, 3))
+        return ids, [partition.day for partition in listed]
+
+    ids, listed = run(scenario())
+    assert [partitions.partition_day(log_id) for log_id in ids] == [ts.date() for ts in days]
+    assert ids[2] > ids[0]
+    # Only the partitions overlapping [start, end) are visited
+    assert listed == [date(2024, 5, 2)]
+
+
+def test_maintenance_closes_finished_days_and_drops_expired_ones(run, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_RETENTION_DAYS", 3)
+    now = datetime(2001, 1, 5, 12)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, [_row(datetime(2001, 1, d, 10)) for d in (1, 3, 5)])
+            summary = await partitions.maintain_partitions(db, now)
+            states = {p.day: p for p in await partitions.list_partitions(db, datetime(2001, 1, 1), now)}
+
+            def table_names(connection):
+                return set(inspect(connection).get_table_names())
+
+            tables = await (await db.connection()).run_sync(table_names)
+        return summary, states, tables
+
+    summary, states, tables = run(scenario())
+    assert summary["dropped"] == [date(2001, 1, 1)]
+    assert summary["closed"] == [date(2001, 1, 3)]
+
+    assert date(2001, 1, 1) not in states
+    assert "firewall_logs_p20010101" not in tables
+    assert states[date(2001, 1, 3)].state == "closed"
+    assert states[date(2001, 1, 3)].row_count == 1
+    assert states[date(2001, 1, 5)].state == "hot"
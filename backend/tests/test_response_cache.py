@@ -0,0 +1,62 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.schemas.firewall_log import FirewallLogCreate
+from app.services.ingest import bulk_insert_logs
+from app.services.response_cache import LOGS, ResponseCache, bucket_of, response_cache
+
+
+def test_bucket_of_accepts_aware_timestamps():
+    naive = datetime(2026, 10, 18, 0, 30)
+    aware = datetime(2026, 10, 18, 9, 30, tzinfo=timezone(timedelta(hours=9)))
+    assert bucket_of(aware) == bucket_of(naive)
+
+
+def test_invalidate_rows_bumps_the_utc_bucket(run, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    cache = ResponseCache()
+    aware = datetime(2026, 10, 18, 9, 30, tzinfo=timezone(timedelta(hours=9)))
+    bucket = bucket_of(datetime(2026, 10, 18, 0, 30))
+
+    async def scenario():
+        await cache.invalidate_rows([{"timestamp": aware}])
+        return (
+            await cache.backend.max_seq(LOGS, (bucket, bucket)),
+            await cache.backend.max_seq(LOGS, (bucket + 9, bucket + 9)),
+        )
+
+    hit, other = run(scenario())
+    assert hit > 0
+    assert other == 0
+
+
+def test_ingest_of_aware_timestamps_invalidates_cache(run, log_row, monkeypatch):
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    now = datetime.utcnow().replace(microsecond=0)
+    local = now.replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=-5)))
+    record = log_row(timestamp=local.isoformat())
+    row = FirewallLogCreate.model_validate(record).model_dump()
+    bucket = bucket_of(now)
+
+    async def scenario():
+        before = await response_cache.backend.max_seq(LOGS, (bucket, bucket))
+        async with AsyncSessionLocal() as db:
+            await bulk_insert_logs(db, [row])
+        return before, await response_cache.backend.max_seq(LOGS, (bucket, bucket))
+
+    before, after = run(scenario())
+    assert row["timestamp"] == now
+    assert "id" in row
+    assert after > before
+
+
+def test_local_entries_over_closed_ranges_expire():
+    cache = ResponseCache()
+    old = bucket_of(datetime.utcnow() - timedelta(days=30))
+    expires_at = cache._expiry((old, old))
+    assert expires_at is not None
+    assert expires_at - time.time() == pytest.approx(settings.RESPONSE_CACHE_CLOSED_TTL, abs=5)
@@ -0,0 +1,67 @@
+"""Rollup counters maintained at ingest and the stats built from them."""
+from datetime import datetime, timedelta
+
+from app.core.database import AsyncSessionLocal
+from app.services.ingest import bulk_insert_logs
+from app.services.rollups import plan_buckets, query_stats, rebuild_rollups
+
+# A day no other test writes to, as rollups are not per source
+DAY = datetime(2025, 7, 14)
+
+
+def _row(minute: int, source_ip: str, action: str, **extra):
+    return {
+        "timestamp": DAY + timedelta(minutes=minute, seconds=7),
+        "source_ip": source_ip,
+        "destination_ip": "192.0.2.50",
+        "protocol": "TCP",
+        "action": action,
+        "direction": "INBOUND",
+        "severity": "INFO",
+        "bytes_sent": 10,
+        "bytes_received": 5,
+        "packet_count": 2,
+        **extra,
+    }
+
+
+def test_plan_uses_coarse_buckets_inside_and_fine_ones_at_the_edges():
+    start, end = datetime(2026, 1, 1, 22, 58), datetime(2026, 1, 4, 1, 3)
+    assert plan_buckets(start, end) == [
+        ("minute", datetime(2026, 1, 1, 22, 58), datetime(2026, 1, 1, 23, 0)),
+        ("hour", datetime(2026, 1, 1, 23), datetime(2026, 1, 2)),
+        ("day", datetime(2026, 1, 2), datetime(2026, 1, 4)),
+        ("hour", datetime(2026, 1, 4), datetime(2026, 1, 4, 1)),
+        ("minute", datetime(2026, 1, 4, 1), datetime(2026, 1, 4, 1, 3)),
+    ]
+    assert plan_buckets(end, start) == []
+
+
+def test_counters_accumulate_across_chunks_and_match_a_rebuild(run):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            # Repeated writes to the same buckets exercise the upsert path
+            await bulk_insert_logs(db, [_row(0, "10.5.0.1", "DENY"), _row(61, "10.5.0.2", "ALLOW")])
+            await bulk_insert_logs(db, [_row(0, "10.5.0.1", "DENY")])
+            await bulk_insert_logs(db, [_row(900, "10.5.0.1", "DENY", event_count=4)])
+            window = await query_stats(db, DAY + timedelta(seconds=30), DAY + timedelta(hours=2), interval="hour")
+            day = await query_stats(db, DAY, DAY + timedelta(days=1), top=1)
+            await rebuild_rollups(db, DAY, DAY + timedelta(days=1))
+            rebuilt = await query_stats(db, DAY, DAY + timedelta(days=1), top=1)
+        return window, day, rebuilt
+
+    window, day, rebuilt = run(scenario())
+
+    # Minute edges: 00:00 and 01:01 fall in [00:00, 02:00) once floored
+    assert window["total"] == {"events": 3, "bytes_sent": 30, "bytes_received": 15, "packet_count": 6}
+    assert window["by_action"] == {"DENY": 2, "ALLOW": 1}
+    assert [(point["bucket_start"].hour, point["events"]) for point in window["series"]] == [(0, 2), (1, 1)]
+
+    # The flow record counts its four events
+    assert day["total"]["events"] == 7
+    assert day["top_source_ips"] == [
+        {"ip": "10.5.0.1", "events": 6, "bytes_sent": 30, "bytes_received": 15, "packet_count": 6}
+    ]
+    assert rebuilt["total"] == day["total"]
+    assert rebuilt["by_action"] == day["by_action"]
+    assert rebuilt["top_source_ips"] == day["top_source_ips"]
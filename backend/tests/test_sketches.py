@@ -0,0 +1,106 @@
+"""Count-Min, HyperLogLog and Space-Saving sketches and their window store."""
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app.core.database import AsyncSessionLocal
+from app.services.sketches import (
+    CountMinSketch,
+    HyperLogLog,
+    SketchStore,
+    SpaceSaving,
+    WindowSketch,
+    distinct_count,
+    frequency,
+    port_fanout,
+    top_k,
+)
+
+
+def _zipf_stream(size: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [f"10.6.{rank // 256}.{rank % 256}" for rank in (int(rng.paretovariate(1.1)) for _ in range(size))]
+
+
+def test_count_min_never_undercounts():
+    stream = _zipf_stream(20000)
+    exact = Counter(stream)
+    cms = CountMinSketch(width=512, depth=4)
+    for value, count in exact.items():
+        cms.add(value, count)
+
+    bound = cms.epsilon * cms.total
+    errors = [cms.estimate(value) - count for value, count in exact.items()]
+    assert min(errors) >= 0
+    # The eps * N bound holds for all but a delta fraction of values
+    assert sum(error > bound for error in errors) <= cms.delta * len(errors) + 1
+
+
+def test_hyperloglog_estimate_and_merge():
+    left, right = HyperLogLog(12), HyperLogLog(12)
+    for n in range(6000):
+        left.add(f"a{n}")
+        right.add(f"a{n + 3000}")
+    assert abs(left.estimate() - 6000) <= 3 * left.relative_error * 6000
+
+    left.merge(right)
+    assert abs(left.estimate() - 9000) <= 3 * left.relative_error * 9000
+
+
+def test_space_saving_bounds_hold_after_merges():
+    stream = _zipf_stream(30000, seed=11)
+    exact = Counter(stream)
+    summary = SpaceSaving(capacity=32)
+    for start in range(0, len(stream), 1000):
+        summary.update(Counter(stream[start:start + 1000]))
+
+    for value, count, error in summary.top(32):
+        assert count - error <= exact[value] <= count
+    untracked = [count for value, count in exact.items() if value not in summary.counters]
+    assert max(untracked) <= summary.min_count()
+    assert summary.top(1)[0][0] == exact.most_common(1)[0][0]
+
+
+def _rows(count: int):
+    return [
+        {
+            "timestamp": datetime(2025, 8, 1, 12, 0, n % 60),
+            "source_ip": "10.6.0.1" if n % 4 else f"10.6.1.{n % 200}",
+            "destination_ip": "192.0.2.60",
+            "destination_port": n % 50,
+            "action": "DENY",
+            "log_source": "sketch-test",
+        }
+        for n in range(count)
+    ]
+
+
+def test_window_survives_serialization():
+    sketch = WindowSketch()
+    sketch.update(_rows(400))
+    restored = WindowSketch.from_bytes(sketch.to_bytes())
+
+    assert restored.events == 400
+    assert top_k([restored], "source_ip", 1) == top_k([sketch], "source_ip", 1)
+    assert frequency([restored], "destination_port", "7") == frequency([sketch], "destination_port", "7")
+    assert port_fanout([restored], 1) == port_fanout([sketch], 1)
+
+
+def test_flushed_and_open_windows_are_merged(run):
+    store = SketchStore(window_seconds=300)
+    rows = _rows(300)
+    late = [{**row, "timestamp": row["timestamp"] + timedelta(minutes=5)} for row in rows[:100]]
+
+    async def scenario():
+        store.update(rows)
+        async with AsyncSessionLocal() as db:
+            assert await store.flush(db, force=True) == 1
+            store.update(late)
+            return await store.collect(db, datetime(2025, 8, 1, 12), datetime(2025, 8, 1, 12, 10), "sketch-test")
+
+    sketches = run(scenario())
+    assert sum(sketch.events for sketch in sketches) == 400
+    top = top_k(sketches, "source_ip", 1)["items"][0]
+    assert top["value"] == "10.6.0.1"
+    assert top["min_count"] <= 300 <= top["count"]
+    assert abs(distinct_count(sketches, "destination_port")["estimate"] - 50) <= 2
@@ -0,0 +1,87 @@
+"""Live stream fan-out, shared filters and slow-consumer policies."""
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.services.stream_hub import HubFull, StreamHub
+
+
+@pytest.fixture(autouse=True)
+def immediate(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_COALESCE_INTERVAL", 0)
+
+
+def _event(n: int, action: str = "DENY"):
+    return {"id": n, "timestamp": datetime(2026, 3, 1, 0, 0, n % 60), "action": action, "destination_port": 22}
+
+
+def _message(subscriber):
+    return json.loads(asyncio.run(subscriber.next_message(timeout=0.1)))
+
+
+def test_identical_filters_share_one_index_entry():
+    hub = StreamHub()
+    first = hub.subscribe({"action": "DENY"})
+    second = hub.subscribe({"action": "DENY"})
+    everything = hub.subscribe()
+
+    hub.publish([_event(1), _event(2, "ALLOW")])
+    assert hub.stats()["distinct_filters"] == 2
+    assert hub.stats()["matched"] == 2
+    assert [e["id"] for e in _message(first)["events"]] == [1]
+    assert [e["id"] for e in _message(second)["events"]] == [1]
+    assert [e["id"] for e in _message(everything)["events"]] == [1, 2]
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert hub.stats()["distinct_filters"] == 1
+    assert hub.stats()["delivered"] == 4
+
+
+def test_drop_policy_reports_skipped_events(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_QUEUE_SIZE", 3)
+    hub = StreamHub()
+    subscriber = hub.subscribe()
+    hub.publish([_event(n) for n in range(5)])
+
+    message = _message(subscriber)
+    assert [e["id"] for e in message["events"]] == [0, 1, 2]
+    assert message["skipped"] == 2
+    assert message["events"][0]["timestamp"] == "2026-03-01T00:00:00"
+    assert asyncio.run(subscriber.next_message(timeout=0.01)) is None
+
+
+def test_sample_policy_thins_a_filling_queue(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_QUEUE_SIZE", 8)
+    hub = StreamHub()
+    subscriber = hub.subscribe(policy="sample")
+    hub.publish([_event(n) for n in range(12)])
+
+    message = _message(subscriber)
+    ids = [e["id"] for e in message["events"]]
+    # The first half is kept in full, then every 2nd, then every 4th event
+    assert ids[:4] == [0, 1, 2, 3]
+    assert len(ids) + message["skipped"] == 12
+    assert subscriber.sampled > 0
+
+
+def test_messages_are_split_at_the_batch_limit(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_MAX_BATCH", 2)
+    hub = StreamHub()
+    subscriber = hub.subscribe()
+    hub.publish([_event(n) for n in range(3)])
+    assert len(_message(subscriber)["events"]) == 2
+    assert len(_message(subscriber)["events"]) == 1
+
+
+def test_subscriber_limit_and_bad_policy(monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_MAX_SUBSCRIBERS", 1)
+    hub = StreamHub()
+    hub.subscribe()
+    with pytest.raises(HubFull):
+        hub.subscribe()
+    with pytest.raises(ValueError):
+        StreamHub().subscribe(policy="buffer")
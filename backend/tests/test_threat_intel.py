@@ -0,0 +1,141 @@
+"""Threat-intel index build, longest-prefix lookups and enrichment."""
+import ipaddress
+import random
+
+import pytest
+
+from app.core.config import settings
+from app.services import threat_intel
+from app.services.threat_intel import PrefixIndex, ThreatEntry, ThreatIntel, ThreatIntelError
+
+
+def _write(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def index(tmp_path):
+    feeds = [
+        _write(tmp_path / "botnet.txt", [
+            "# C2 servers",
+            "10.0.0.0/8",
+            "10.1.0.0/16,scanner,medium",
+            "10.1.2.3  c2  critical",
+            "2001:db8::/32,,high",
+            "not-a-prefix",
+            "10.2.0.0/99",
+        ]),
+        _write(tmp_path / "tor.txt", ["198.51.100.0/24,tor,low"]),
+    ]
+    allowlists = [_write(tmp_path / "allow.txt", ["10.1.9.0/24", "2001:db8:ffff::/48"])]
+    path = str(tmp_path / "index.bin")
+    built = threat_intel.build_index(feeds, allowlists, path)
+    assert built["prefixes"] == 7
+    return PrefixIndex(path)
+
+
+@pytest.mark.parametrize(
+    "address, expected",
+    [
+        ("10.200.0.1", ThreatEntry("botnet", settings.THREAT_INTEL_DEFAULT_SEVERITY)),
+        ("10.1.0.1", ThreatEntry("scanner", "MEDIUM")),
+        ("10.1.2.3", ThreatEntry("c2", "CRITICAL")),
+        ("10.1.9.77", ThreatEntry("allowlist", "INFO", True)),
+        ("198.51.100.255", ThreatEntry("tor", "LOW")),
+        ("2001:db8:1::1", ThreatEntry("botnet", "HIGH")),
+        ("2001:db8:ffff::1", ThreatEntry("allowlist", "INFO", True)),
+        ("11.0.0.0", None),
+        ("2001:db9::", None),
+        ("fw01.example", None),
+        (None, None),
+    ],
+)
+def test_longest_prefix_wins_and_allowlists_win_over_feeds(index, address, expected):
+    assert index.lookup(address) == expected
+    assert index.lookup_many([address]) == [expected]
+
+
+def test_lookups_match_a_linear_scan(tmp_path):
+    rng = random.Random(18)
+    prefixes = []
+    for _ in range(300):
+        length = rng.randrange(8, 33)
+        network = ipaddress.ip_network(f"{ipaddress.IPv4Address(rng.getrandbits(32))}/{length}", strict=False)
+        prefixes.append((network, f"t{len(prefixes)}"))
+    feed = _write(tmp_path / "random.txt", [f"{network},{label}" for network, label in prefixes])
+    path = str(tmp_path / "random.bin")
+    threat_intel.build_index([feed], [], path)
+    index = PrefixIndex(path)
+
+    def scan(address):
+        # Longest prefix, then the later line
+        best = None
+        for line, (network, label) in enumerate(prefixes):
+            if address in network and (best is None or (network.prefixlen, line) >= best[:2]):
+                best = (network.prefixlen, line, label)
+        return best[2] if best else None
+
+    addresses = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(500)]
+    addresses += [str(network[rng.randrange(network.num_addresses)]) for network, _ in prefixes]
+    batch = index.lookup_many(addresses)
+    for address, entry in zip(addresses, batch):
+        expected = scan(ipaddress.ip_address(address))
+        assert (entry.threat_type if entry else None) == expected
+        assert index.lookup(address) == entry
+
+
+def test_enrich_sets_threat_type_and_only_raises_severity(index):
+    intel = ThreatIntel()
+    intel.index = index
+    rows = [
+        {"source_ip": "10.1.2.3", "destination_ip": "192.0.2.1", "severity": "INFO"},
+        {"source_ip": "192.0.2.1", "destination_ip": "198.51.100.7", "severity": "HIGH", "threat_type": "port_scan"},
+        {"source_ip": "10.1.9.1", "destination_ip": "192.0.2.1", "severity": "INFO"},
+        {"source_ip": "192.0.2.1", "destination_ip": "192.0.2.2"},
+    ]
+    assert intel.enrich(rows) == 2
+    assert (rows[0]["threat_type"], rows[0]["severity"]) == ("c2", "CRITICAL")
+    assert (rows[1]["threat_type"], rows[1]["severity"]) == ("port_scan", "HIGH")
+    assert "threat_type" not in rows[2] and "threat_type" not in rows[3]
+    assert intel.stats()["enriched"] == 2
+
+
+def test_rebuilt_index_is_swapped_in(tmp_path, monkeypatch):
+    path = str(tmp_path / "swap.bin")
+    feed = _write(tmp_path / "feed.txt", ["203.0.113.0/24,old"])
+    monkeypatch.setattr(settings, "THREAT_INTEL_INDEX_PATH", path)
+    monkeypatch.setattr(settings, "THREAT_INTEL_FEEDS", [feed])
+    monkeypatch.setattr(settings, "THREAT_INTEL_ALLOWLISTS", [])
+    intel = ThreatIntel()
+    assert intel.is_stale() and not intel.load()
+
+    threat_intel.build_index([feed], [], path)
+    assert intel.load() and not intel.load()
+    assert not intel.is_stale()
+    previous = intel.index
+
+    _write(tmp_path / "feed.txt", ["203.0.113.0/24,new", "203.0.114.0/24,new"])
+    assert intel.is_stale()
+    threat_intel.build_index([feed], [], path)
+    assert intel.load()
+    assert intel.index.lookup("203.0.113.9").threat_type == "new"
+    # Lookups holding the old mapping keep working
+    assert previous.lookup("203.0.113.9").threat_type == "old"
+
+
+def test_rebuild_is_skipped_while_another_build_holds_the_lock(tmp_path):
+    path = str(tmp_path / "locked.bin")
+    feed = _write(tmp_path / "feed.txt", ["203.0.113.0/24"])
+    (tmp_path / "locked.bin.lock").touch()
+    assert threat_intel.rebuild_index([feed], [], path) is None
+    assert threat_intel.rebuild_index([feed], [], path) is None  # fresh lock, still held
+    (tmp_path / "locked.bin.lock").unlink()
+    assert threat_intel.rebuild_index([feed], [], path)["ipv4_ranges"] == 1
+
+
+def test_other_files_are_not_loaded(tmp_path):
+    path = tmp_path / "bogus.bin"
+    path.write_bytes(b"x" * 64)
+    with pytest.raises(ThreatIntelError):
+        PrefixIndex(str(path))
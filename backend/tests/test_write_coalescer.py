@@ -0,0 +1,60 @@
+import asyncio
+
+from app.core.database import AsyncSessionLocal
+from app.services import ingest
+from app.services.log_query import count_logs
+from app.services.write_coalescer import WriteCoalescer
+
+
+async def _count() -> int:
+    async with AsyncSessionLocal() as db:
+        return await count_logs(db)
+
+
+async def _submit_all(rows):
+    coalescer = WriteCoalescer(delay=0.01)
+    results = await asyncio.gather(*[coalescer.submit(row) for row in rows], return_exceptions=True)
+    await coalescer.stop()
+    return coalescer, results
+
+
+def test_failure_after_commit_does_not_write_rows_twice(run, log_row, monkeypatch):
+    async def broken_after_commit(db, rows):
+        raise RuntimeError("post-commit stage failed")
+
+    monkeypatch.setattr(ingest, "_after_commit", broken_after_commit)
+
+    async def scenario():
+        before = await _count()
+        coalescer, ids = await _submit_all([log_row() for _ in range(4)])
+        return before, await _count(), coalescer, ids
+
+    before, after, coalescer, ids = run(scenario())
+    assert all(isinstance(log_id, int) for log_id in ids)
+    assert len(set(ids)) == 4
+    assert after - before == 4
+    assert coalescer.stats()["failed"] == 0
+
+
+def test_bad_row_fails_only_its_own_request(run, log_row, monkeypatch):
+    apply_rollups = ingest.apply_rollups
+
+    async def reject_marked_row(db, rows):
+        if any(row["source_ip"] == "10.9.9.9" for row in rows):
+            raise RuntimeError("cannot write row")
+        await apply_rollups(db, rows)
+
+    monkeypatch.setattr(ingest, "apply_rollups", reject_marked_row)
+
+    async def scenario():
+        before = await _count()
+        rows = [log_row(source_ip="10.9.9.9" if i == 2 else "10.0.0.2") for i in range(6)]
+        coalescer, results = await _submit_all(rows)
+        return before, await _count(), coalescer, results
+
+    before, after, coalescer, results = run(scenario())
+    assert isinstance(results[2], RuntimeError)
+    assert all(isinstance(log_id, int) for i, log_id in enumerate(results) if i != 2)
+    assert after - before == 5
+    assert coalescer.stats()["failed"] == 1
+    assert coalescer.stats()["written"] == 5